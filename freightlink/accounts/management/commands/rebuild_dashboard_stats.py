@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.stats import REBUILD_CHUNK_SIZE, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized dashboard counters for every user (or the given user ids).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Users recomputed and upserted per batch.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_stats(options['user_ids'] or None, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt dashboard stats for {written} users in {time.perf_counter() - started:.1f}s'
+        ))
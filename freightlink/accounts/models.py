@@ -39,6 +39,10 @@ class UserManager(BaseUserManager):
         return self._create_user(phone_number, email, password, **extra_fields)
 
 
+# Columns read by User.__str__, for only() on querysets that join users.
+USER_DISPLAY_FIELDS = ('first_name', 'last_name', 'phone_number', 'user_type')
+
+
 class User(AbstractUser):
     """Custom User model with phone authentication instead of username."""
     
@@ -90,6 +94,7 @@ class User(AbstractUser):
     # Platform metrics
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0, help_text='Sum of received ratings')
     
     # Last online timestamp
     last_online = models.DateTimeField(blank=True, null=True)
@@ -163,4 +168,25 @@ class UserVerification(models.Model):
         return f"Verification for {self.user.phone_number} - {self.status}"
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class UserStats(models.Model):
+    """
+    Denormalized dashboard counters for one user.
+
+    Kept current by accounts.stats from booking, payment and route status
+    changes and rebuilt in bulk by ``rebuild_dashboard_stats``.
+    """
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    active_routes = models.IntegerField(default=0)
+    pending_bookings = models.IntegerField(default=0)
+    active_bookings = models.IntegerField(default=0, help_text='Approved or in progress')
+    completed_bookings = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text='Completed payments received in KES')
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text='Completed payments made in KES')
+    payments_due = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text='Pending payments to make in KES')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Stats for user #{self.user_id}"
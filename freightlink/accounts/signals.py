@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings.models import Booking
+from freightlink.stored_state import deleted_state, saved_transition, track
+from payments.models import Payment
+from routes.models import Route
+
+from . import stats
+
+TRACKED = {
+    Booking: (stats.booking_state, stats.record_booking_transitions),
+    Payment: (stats.payment_state, stats.record_payment_transitions),
+    Route: (stats.route_state, stats.record_route_transitions),
+}
+track(*TRACKED)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Route)
+def update_stats_on_save(sender, instance, update_fields=None, **kwargs):
+    state, record = TRACKED[sender]
+    old, new = saved_transition(instance, state, update_fields)
+    if old != new:
+        record([(old, new)])
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Route)
+def update_stats_on_delete(sender, instance, **kwargs):
+    old = deleted_state(instance, TRACKED[sender][0])
+    if old is not None:
+        TRACKED[sender][1]([(old, None)])
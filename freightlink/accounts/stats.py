@@ -0,0 +1,173 @@
+"""
+Maintenance of the denormalized UserStats dashboard counters.
+
+Every tracked model re-reads its stored row, locked, right before a save
+(``freightlink.stored_state``), so a stale instance cannot count the same
+transition twice. A save turns the stored and saved states into per-user
+deltas that are applied with ``F()`` increments, so concurrent updates
+never lose counts. Code that changes rows with ``bulk_update``/``update``
+reports the transitions itself through ``record_payment_transitions``.
+A user without a stats row gets one computed from scratch, and
+``rebuild_stats`` recomputes everything in bulk to repair any drift.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from bookings.models import Booking
+from payments.models import Payment
+from routes.models import Route
+from trucks.models import Truck
+
+from .models import User, UserStats
+
+STAT_FIELDS = (
+    'active_routes', 'pending_bookings', 'active_bookings', 'completed_bookings',
+    'revenue', 'total_paid', 'payments_due',
+)
+BOOKING_STATUS_FIELDS = {
+    'pending': 'pending_bookings',
+    'approved': 'active_bookings',
+    'in_progress': 'active_bookings',
+    'completed': 'completed_bookings',
+}
+DUE_PAYMENT_STATUSES = ('pending', 'processing')
+REBUILD_CHUNK_SIZE = 2000
+
+
+def booking_state(booking):
+    # __dict__ so deferred fields are not loaded just to be recorded.
+    values = booking.__dict__
+    return values.get('status'), values.get('business_id'), values.get('truck_owner_id')
+
+
+def payment_state(payment):
+    values = payment.__dict__
+    amount = values.get('amount')
+    # Amounts assigned in code may still be ints or strings until the row is reloaded.
+    amount = None if amount is None else Decimal(str(amount))
+    return values.get('status'), values.get('payer_id'), values.get('receiver_id'), amount
+
+
+def route_state(route):
+    values = route.__dict__
+    return values.get('status'), values.get('truck_id')
+
+
+def booking_effects(state):
+    status, business_id, truck_owner_id = state
+    field = BOOKING_STATUS_FIELDS.get(status)
+    return [(business_id, field, 1), (truck_owner_id, field, 1)] if field else []
+
+
+def payment_effects(state):
+    status, payer_id, receiver_id, amount = state
+    if status == 'completed':
+        return [(receiver_id, 'revenue', amount), (payer_id, 'total_paid', amount)]
+    if status in DUE_PAYMENT_STATUSES:
+        return [(payer_id, 'payments_due', amount)]
+    return []
+
+
+def route_effects(state, owners):
+    status, truck_id = state
+    return [(owners[truck_id], 'active_routes', 1)] if status == 'active' and truck_id in owners else []
+
+
+def transition_deltas(effects, transitions):
+    """Sum ``effects(new) - effects(old)`` per user over ``(old, new)`` pairs; None stands for no row."""
+    deltas = defaultdict(Counter)
+    for old, new in transitions:
+        if new is not None:
+            for user_id, field, amount in effects(new):
+                deltas[user_id][field] += amount
+        if old is not None:
+            for user_id, field, amount in effects(old):
+                deltas[user_id][field] -= amount
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Increment each user's counters; users without a stats row get one rebuilt from the database."""
+    missing = []
+    now = timezone.now()
+    for user_id, changes in deltas.items():
+        changes = {field: F(field) + amount for field, amount in changes.items() if amount}
+        if user_id is None or not changes:
+            continue
+        if not UserStats.objects.filter(user_id=user_id).update(updated_at=now, **changes):
+            missing.append(user_id)
+    if missing:
+        rebuild_stats(missing)
+
+
+def record_booking_transitions(transitions):
+    apply_deltas(transition_deltas(booking_effects, transitions))
+
+
+def record_payment_transitions(transitions):
+    """Apply ``(old payment_state, new payment_state)`` pairs, for callers that bypass save()."""
+    apply_deltas(transition_deltas(payment_effects, transitions))
+
+
+def record_route_transitions(transitions):
+    truck_ids = {state[1] for pair in transitions for state in pair if state is not None}
+    owners = dict(Truck.objects.filter(pk__in=truck_ids).values_list('pk', 'owner_id'))
+    apply_deltas(transition_deltas(lambda state: route_effects(state, owners), transitions))
+
+
+def compute_stats(user_ids):
+    """Return ``{user_id: {field: value}}`` computed from bookings, payments and routes."""
+    stats = {user_id: dict.fromkeys(STAT_FIELDS, 0) for user_id in user_ids}
+    for party in ('business_id', 'truck_owner_id'):
+        rows = Booking.objects.filter(**{f'{party}__in': user_ids}, status__in=BOOKING_STATUS_FIELDS).order_by()
+        for row in rows.values(party, 'status').annotate(count=Count('id')):
+            stats[row[party]][BOOKING_STATUS_FIELDS[row['status']]] += row['count']
+    for party, status_filter, field in (
+        ('receiver_id', ('completed',), 'revenue'),
+        ('payer_id', ('completed',), 'total_paid'),
+        ('payer_id', DUE_PAYMENT_STATUSES, 'payments_due'),
+    ):
+        rows = Payment.objects.filter(**{f'{party}__in': user_ids}, status__in=status_filter).order_by()
+        for row in rows.values(party).annotate(total=Sum('amount')):
+            stats[row[party]][field] += row['total']
+    routes = Route.objects.filter(truck__owner_id__in=user_ids, status='active').order_by()
+    for row in routes.values('truck__owner_id').annotate(count=Count('id')):
+        stats[row['truck__owner_id']]['active_routes'] = row['count']
+    return stats
+
+
+def rebuild_stats(user_ids=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute and upsert stats for ``user_ids`` (all users by default); returns the number of rows written."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    written = 0
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) == chunk_size:
+            written += _write_stats(chunk)
+            chunk = []
+    if chunk:
+        written += _write_stats(chunk)
+    return written
+
+
+def _write_stats(user_ids):
+    now = timezone.now()
+    rows = [
+        UserStats(user_id=user_id, updated_at=now, **values)
+        for user_id, values in compute_stats(user_ids).items()
+    ]
+    UserStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user'], update_fields=[*STAT_FIELDS, 'updated_at'],
+    )
+    return len(rows)
+
+
+def get_dashboard_stats(user_id):
+    """Counters for one user's dashboard in a single primary-key lookup."""
+    stats = UserStats.objects.filter(pk=user_id).values(*STAT_FIELDS).first()
+    return stats or dict.fromkeys(STAT_FIELDS, 0)
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .stats import rebuild_stats
+
+
+@shared_task
+def rebuild_dashboard_stats_task():
+    """Nightly reconciliation of the dashboard counters against the source tables."""
+    return rebuild_stats()
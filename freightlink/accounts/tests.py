@@ -1,3 +1,115 @@
+import json
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from bookings.models import Booking
+from freightlink.testing import create_booking, create_business, create_cargo, create_owner, create_route, create_truck
+from payments.callbacks import apply_callbacks, parse_callback
+from payments.management.commands.mpesa_callback_load import stk_callback
+from payments.models import Payment
+from routes.models import Route
+
+from .models import UserStats
+from .stats import STAT_FIELDS, get_dashboard_stats, rebuild_stats
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        self.owner = create_owner()
+        self.truck = create_truck(self.owner)
+        self.route = self.create_route()
+        self.cargo = create_cargo(self.business)
+
+    def create_route(self):
+        return create_route(self.truck)
+
+    def create_booking(self):
+        return create_booking(self.cargo, self.route)
+
+    def create_payment(self, booking, checkout_id=None):
+        return Payment.objects.create(
+            booking=booking, payer=self.business, receiver=self.owner, amount='1500.00', payment_type='booking',
+            checkout_request_id=checkout_id,
+        )
+
+    def stored(self, user):
+        return UserStats.objects.filter(pk=user.pk).values(*STAT_FIELDS).get()
+
+    def test_status_transitions_move_counters(self):
+        booking = self.create_booking()
+        self.assertEqual(get_dashboard_stats(self.owner.pk)['pending_bookings'], 1)
+        self.assertEqual(get_dashboard_stats(self.owner.pk)['active_routes'], 1)
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = 'approved'
+        booking.save()
+        stats = get_dashboard_stats(self.business.pk)
+        self.assertEqual((stats['pending_bookings'], stats['active_bookings']), (0, 1))
+
+        payment = self.create_payment(booking)
+        self.assertEqual(get_dashboard_stats(self.business.pk)['payments_due'], Decimal('1500.00'))
+        payment.status = 'completed'
+        payment.save()
+        self.assertEqual(get_dashboard_stats(self.business.pk)['payments_due'], 0)
+        self.assertEqual(get_dashboard_stats(self.business.pk)['total_paid'], Decimal('1500.00'))
+        self.assertEqual(get_dashboard_stats(self.owner.pk)['revenue'], Decimal('1500.00'))
+
+        self.route.status = 'completed'
+        self.route.save()
+        booking.delete()
+        stats = get_dashboard_stats(self.owner.pk)
+        self.assertEqual((stats['active_routes'], stats['active_bookings'], stats['revenue']), (0, 0, 0))
+
+    def test_batched_callbacks_update_revenue(self):
+        booking = self.create_booking()
+        self.create_payment(booking, 'ws_CO_0000000001')
+        self.create_payment(booking, 'ws_CO_0000000002')
+        apply_callbacks([
+            parse_callback(stk_callback('ws_CO_0000000001')),
+            parse_callback(stk_callback('ws_CO_0000000002', success=False)),
+        ])
+        stats = get_dashboard_stats(self.business.pk)
+        self.assertEqual((stats['total_paid'], stats['payments_due']), (Decimal('1500.00'), 0))
+        self.assertEqual(get_dashboard_stats(self.owner.pk)['revenue'], Decimal('1500.00'))
+
+    def test_stale_instances_do_not_count_a_transition_twice(self):
+        payment = self.create_payment(self.create_booking())
+        other = Payment.objects.get(pk=payment.pk)
+        other.status = 'completed'
+        other.save()
+
+        payment.refresh_from_db()
+        payment.notes = 'Receipt sent'
+        payment.save()
+        payment.status = 'completed'
+        payment.save(update_fields=['status'])
+        self.assertEqual(get_dashboard_stats(self.owner.pk)['revenue'], Decimal('1500.00'))
+        self.assertEqual(get_dashboard_stats(self.business.pk)['payments_due'], 0)
+
+    def test_rebuild_matches_incremental_counters(self):
+        for status in ('pending', 'approved', 'completed', 'cancelled'):
+            booking = self.create_booking()
+            booking.status = status
+            booking.save()
+            payment = self.create_payment(booking)
+            payment.status = 'completed' if status == 'completed' else 'pending'
+            payment.save()
+        self.create_route()
+        Route.objects.filter(pk=self.route.pk).update(status='cancelled')
+
+        incremental = {user.pk: self.stored(user) for user in (self.business, self.owner)}
+        # update() bypasses the signals, so only the rebuild sees the cancelled route.
+        incremental[self.owner.pk]['active_routes'] -= 1
+        self.assertEqual(rebuild_stats(), 2)
+        self.assertEqual({user.pk: self.stored(user) for user in (self.business, self.owner)}, incremental)
 
-# Create your tests here.
+    def test_dashboard_is_a_single_lookup(self):
+        self.create_booking()
+        self.client.force_login(self.owner)
+        with self.assertNumQueries(3):  # session, user, stats
+            response = self.client.get(reverse('api:dashboard'))
+        body = json.loads(response.content)
+        self.assertEqual((body['pending_bookings'], body['active_routes']), (1, 1))
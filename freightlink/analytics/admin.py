@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import Corridor, CorridorStats
+
+
+@admin.register(Corridor)
+class CorridorAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'origin_row', 'origin_col', 'destination_row', 'destination_col')
+    search_fields = ('origin_name', 'destination_name')
+
+
+@admin.register(CorridorStats)
+class CorridorStatsAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'routes', 'bookings', 'booked_weight', 'offered_weight')
+    list_filter = ('period',)
+    list_select_related = ('corridor',)
+    raw_id_fields = ('corridor',)
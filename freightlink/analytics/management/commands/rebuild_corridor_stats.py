@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.rebuild import rebuild_corridor_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the corridor day, week and month rollups from raw routes and bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (defaults to the number of CPUs).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = rebuild_corridor_stats(workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {summary['rows']} rollup rows for {summary['corridors']} corridors "
+            f"from {summary['windows']} windows in {time.perf_counter() - started:.1f}s"
+        ))
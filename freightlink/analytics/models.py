@@ -0,0 +1,50 @@
+from django.db import models
+
+
+class Corridor(models.Model):
+    """An origin cell to destination cell pair of the ANALYTICS_CORRIDOR_KM grid."""
+
+    origin_row = models.IntegerField()
+    origin_col = models.IntegerField()
+    destination_row = models.IntegerField()
+    destination_col = models.IntegerField()
+    # Place names of the first route seen on the corridor, for chart labels.
+    origin_name = models.CharField(max_length=255)
+    destination_name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return f"{self.origin_name} to {self.destination_name}"
+
+    class Meta:
+        unique_together = ('origin_row', 'origin_col', 'destination_row', 'destination_col')
+
+
+class CorridorStats(models.Model):
+    """Route and booking totals of one corridor over a day, week (from Monday) or month."""
+
+    PERIOD_CHOICES = (
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    )
+
+    corridor = models.ForeignKey(Corridor, on_delete=models.CASCADE, related_name='stats')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateField()
+    routes = models.IntegerField(default=0)
+    price_per_km_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    offered_weight = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text='Truck capacity in tons')
+    bookings = models.IntegerField(default=0)
+    booked_weight = models.DecimalField(max_digits=18, decimal_places=6, default=0, help_text='Cargo weight in tons')
+    booked_value = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text='Booking prices in KES')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Corridor {self.corridor_id} {self.period} of {self.start}"
+
+    class Meta:
+        unique_together = ('corridor', 'period', 'start')
+        indexes = [
+            # Corridor rankings over a date range
+            models.Index(fields=['period', 'start'], name='corridor_stats_period_idx'),
+        ]
@@ -0,0 +1,48 @@
+"""Chart data read straight from the CorridorStats rollups."""
+from django.db.models import Sum
+
+from .models import CorridorStats
+from .rollups import STAT_FIELDS, period_start
+
+RANKING_FIELDS = ('booked_weight', 'bookings', 'booked_value', 'routes')
+
+
+def chart_point(values):
+    """Totals plus the averages charts plot; ratios are None where their denominator is zero."""
+    routes = values['routes']
+    offered = values['offered_weight']
+    point = {field: float(values[field]) if field not in ('routes', 'bookings') else values[field]
+             for field in STAT_FIELDS if field != 'price_per_km_total'}
+    point['average_price_per_km'] = round(float(values['price_per_km_total']) / routes, 2) if routes else None
+    point['utilization'] = round(float(values['booked_weight'] / offered), 4) if offered else None
+    return point
+
+
+def _rows(period, first, last):
+    # Rows are keyed by period start, so the period containing ``first`` is included.
+    return CorridorStats.objects.filter(period=period, start__range=(period_start(period, first), last))
+
+
+def corridor_series(corridor_id, period, first, last):
+    """One chart point per ``period`` of a corridor between two dates, oldest first."""
+    rows = _rows(period, first, last).filter(corridor_id=corridor_id).order_by('start').values('start', *STAT_FIELDS)
+    return [{'start': row['start'], **chart_point(row)} for row in rows]
+
+
+def top_corridors(period, first, last, order_by='booked_weight', limit=20):
+    """The ``limit`` corridors with the highest ``order_by`` total between two dates."""
+    rows = (
+        _rows(period, first, last)
+        .values('corridor_id', 'corridor__origin_name', 'corridor__destination_name')
+        .annotate(**{f'{field}_sum': Sum(field) for field in STAT_FIELDS})
+        .order_by(f'-{order_by}_sum', 'corridor_id')[:limit]
+    )
+    return [
+        {
+            'corridor': row['corridor_id'],
+            'origin_name': row['corridor__origin_name'],
+            'destination_name': row['corridor__destination_name'],
+            **chart_point({field: row[f'{field}_sum'] for field in STAT_FIELDS}),
+        }
+        for row in rows
+    ]
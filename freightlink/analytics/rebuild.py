@@ -0,0 +1,142 @@
+"""
+Full recomputation of the CorridorStats rollups from raw routes and bookings.
+
+The covered dates are split into Monday-aligned windows of
+``REBUILD_WINDOW_DAYS`` that worker processes aggregate independently; the parent merges their daily
+totals, derives the weeks and months and replaces every rollup row in one
+transaction. Changes committed while the workers read are not guaranteed
+to be counted, so run it off-peak.
+"""
+import datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from bookings.models import Booking
+from routes.models import Route
+
+from .models import Corridor, CorridorStats
+from .rollups import (
+    CORRIDOR_FIELDS, ENDPOINT_FIELDS, PERIODS, STAT_FIELDS, UNCOUNTED_BOOKING_STATUSES, UNCOUNTED_ROUTE_STATUSES,
+    corridor_ids, corridor_key, period_start,
+)
+
+REBUILD_WINDOW_DAYS = 7
+WRITE_BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 5000
+
+
+def aggregate_window(window):
+    """Return ``({(corridor key, day): {field: total}}, {corridor key: names})`` for ``[first, last]``."""
+    first, last = window
+    totals = defaultdict(lambda: defaultdict(int))
+    names = {}
+
+    routes = Route.objects.filter(departure_date__range=(first, last)).exclude(status__in=UNCOUNTED_ROUTE_STATUSES)
+    rows = routes.order_by().values_list('departure_date', 'price_per_km', 'truck__capacity_weight', *ENDPOINT_FIELDS)
+    for day, price_per_km, capacity, *endpoints in rows.iterator(chunk_size=READ_CHUNK_SIZE):
+        key = corridor_key(*endpoints[:4])
+        names.setdefault(key, tuple(endpoints[4:]))
+        values = totals[(key, day)]
+        values['routes'] += 1
+        values['price_per_km_total'] += price_per_km
+        values['offered_weight'] += capacity
+
+    bookings = Booking.objects.filter(pickup_date__range=(first, last)).exclude(status__in=UNCOUNTED_BOOKING_STATUSES)
+    rows = bookings.order_by().values_list(
+        'pickup_date', 'price', 'cargo_listing__weight', *(f'route__{field}' for field in ENDPOINT_FIELDS),
+    )
+    for day, price, weight, *endpoints in rows.iterator(chunk_size=READ_CHUNK_SIZE):
+        key = corridor_key(*endpoints[:4])
+        names.setdefault(key, tuple(endpoints[4:]))
+        values = totals[(key, day)]
+        values['bookings'] += 1
+        values['booked_weight'] += weight
+        values['booked_value'] += price
+    return {key: dict(values) for key, values in totals.items()}, names
+
+
+def _windows():
+    bounds = [
+        Route.objects.aggregate(first=Min('departure_date'), last=Max('departure_date')),
+        Booking.objects.aggregate(first=Min('pickup_date'), last=Max('pickup_date')),
+    ]
+    firsts = [bound['first'] for bound in bounds if bound['first']]
+    if not firsts:
+        return []
+    day, last = min(firsts), max(bound['last'] for bound in bounds if bound['last'])
+    day -= datetime.timedelta(days=day.weekday())
+    windows = []
+    while day <= last:
+        windows.append((day, day + datetime.timedelta(days=REBUILD_WINDOW_DAYS - 1)))
+        day += datetime.timedelta(days=REBUILD_WINDOW_DAYS)
+    return windows
+
+
+def rebuild_corridor_stats(workers=None):
+    """
+    Replace every CorridorStats row with totals recomputed from routes and bookings.
+
+    ``workers=1`` aggregates inline, which is what tests use; otherwise the
+    windows are fanned out over a process pool. Returns a summary dict.
+    """
+    windows = _windows()
+    if workers == 1:
+        results = list(map(aggregate_window, windows))
+    else:
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(aggregate_window, windows))
+
+    names = {}
+    daily = {}
+    for totals, window_names in results:
+        names.update(window_names)
+        daily.update(totals)
+    # Most corridors already exist, so read them all at once rather than key by key.
+    ids = {tuple(row[1:]): row[0] for row in Corridor.objects.values_list('pk', *CORRIDOR_FIELDS)}
+    missing = {key: value for key, value in names.items() if key not in ids}
+    if missing:
+        ids.update(corridor_ids(missing))
+
+    rows = defaultdict(lambda: defaultdict(int))
+    for (key, day), values in daily.items():
+        for period in PERIODS:
+            row = rows[(ids[key], period, period_start(period, day))]
+            for field, amount in values.items():
+                row[field] += amount
+
+    with transaction.atomic():
+        deleted, _ = CorridorStats.objects.all().delete()
+        _insert_stats(rows)
+    return {'windows': len(windows), 'corridors': len(ids), 'rows': len(rows), 'deleted': deleted}
+
+
+def _insert_stats(rows):
+    """
+    Insert ``{(corridor_id, period, start): totals}`` with executemany.
+
+    bulk_create spends most of a rebuild preparing each of the hundreds of
+    thousands of values through its field; these are plain ints, dates and
+    Decimals the driver can take as they are.
+    """
+    connection = connections[CorridorStats.objects.db]
+    columns = ('corridor_id', 'period', 'start', *STAT_FIELDS, 'updated_at')
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(CorridorStats._meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    values = [
+        (corridor_id, period, connection.ops.adapt_datefield_value(start))
+        + tuple(totals.get(field, 0) for field in STAT_FIELDS) + (now,)
+        for (corridor_id, period, start), totals in rows.items()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), WRITE_BATCH_SIZE):
+            cursor.executemany(sql, values[start:start + WRITE_BATCH_SIZE])
@@ -0,0 +1,191 @@
+"""
+Incremental maintenance of the CorridorStats rollups.
+
+Routes count towards the corridor of their endpoints on their departure
+date, bookings towards their route's corridor on their pickup date;
+cancelled routes and rejected or cancelled bookings count nowhere. Each
+change becomes ``effects(new) - effects(old)`` per ``(corridor, day)``,
+batched per transaction and applied when it commits as ``F()``
+increments to the day, week and month rows, so a chart never has to
+group raw routes or bookings.
+
+``QuerySet.update()`` sends no signals and a booking stays on the corridor
+its route had when it was counted; ``rebuild_corridor_stats`` recomputes
+everything from the raw rows to reconcile such drift.
+"""
+import datetime
+import functools
+import operator
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from cargo.models import CargoListing
+from freightlink.on_commit import queue_on_commit
+from matching.geo import grid_cell
+from routes.models import Route
+from trucks.models import Truck
+
+from .models import Corridor, CorridorStats
+
+STAT_FIELDS = ('routes', 'price_per_km_total', 'offered_weight', 'bookings', 'booked_weight', 'booked_value')
+PERIODS = ('day', 'week', 'month')
+UNCOUNTED_ROUTE_STATUSES = ('cancelled',)
+UNCOUNTED_BOOKING_STATUSES = ('rejected', 'cancelled')
+CORRIDOR_FIELDS = ('origin_row', 'origin_col', 'destination_row', 'destination_col')
+# Corridors looked up per query; each adds a four-column OR branch.
+LOOKUP_BATCH_SIZE = 200
+# Route columns a corridor is derived from, in corridor_key() argument order.
+ENDPOINT_FIELDS = (
+    'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+    'origin_name', 'destination_name',
+)
+
+
+def period_start(period, day):
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def corridor_key(origin_lat, origin_lng, destination_lat, destination_lng):
+    cell_km = settings.ANALYTICS_CORRIDOR_KM
+    return (
+        grid_cell(float(origin_lat), float(origin_lng), cell_km)
+        + grid_cell(float(destination_lat), float(destination_lng), cell_km)
+    )
+
+
+def route_state(route):
+    # __dict__ so deferred fields are not loaded just to be recorded.
+    values = route.__dict__
+    return (values.get('status'), values.get('departure_date'), values.get('price_per_km'), values.get('truck_id')) \
+        + tuple(values.get(field) for field in ENDPOINT_FIELDS)
+
+
+def booking_state(booking):
+    values = booking.__dict__
+    return tuple(values.get(field) for field in ('status', 'pickup_date', 'price', 'route_id', 'cargo_listing_id'))
+
+
+def _no_transitions():
+    return [], []
+
+
+def _apply_batch(batch):
+    apply_transitions(*batch)
+
+
+def queue_route_transition(old, new):
+    """Count a ``(old route_state, new route_state)`` change once the transaction commits; None means no row."""
+    queue_on_commit('corridor_rollups', lambda batch: batch[0].append((old, new)), _no_transitions, _apply_batch)
+
+
+def queue_booking_transition(old, new):
+    queue_on_commit('corridor_rollups', lambda batch: batch[1].append((old, new)), _no_transitions, _apply_batch)
+
+
+def _route_effects(state, capacities):
+    status, day, price_per_km, truck_id, *endpoints = state
+    capacity = capacities.get(truck_id)
+    if status in UNCOUNTED_ROUTE_STATUSES or None in (day, price_per_km, capacity) or None in endpoints:
+        return None
+    values = {'routes': 1, 'price_per_km_total': Decimal(str(price_per_km)), 'offered_weight': capacity}
+    return corridor_key(*endpoints[:4]), tuple(endpoints[4:]), day, values
+
+
+def _booking_effects(state, routes, weights):
+    status, day, price, route_id, cargo_id = state
+    endpoints, weight = routes.get(route_id), weights.get(cargo_id)
+    # A route or cargo listing deleted in the same transaction can no longer be placed; the rebuild settles it.
+    if status in UNCOUNTED_BOOKING_STATUSES or None in (day, price, endpoints, weight):
+        return None
+    values = {'bookings': 1, 'booked_weight': weight, 'booked_value': Decimal(str(price))}
+    return corridor_key(*endpoints[:4]), tuple(endpoints[4:]), day, values
+
+
+def apply_transitions(routes, bookings):
+    """Turn route and booking ``(old, new)`` state pairs into rollup increments."""
+    states = [state for pair in routes for state in pair if state is not None]
+    capacities = dict(Truck.objects.filter(pk__in={state[3] for state in states}).values_list('pk', 'capacity_weight'))
+    states = [state for pair in bookings for state in pair if state is not None]
+    route_rows = Route.objects.filter(pk__in={state[3] for state in states}).values_list('pk', *ENDPOINT_FIELDS)
+    endpoints = {row[0]: row[1:] for row in route_rows}
+    weights = dict(CargoListing.objects.filter(pk__in={state[4] for state in states}).values_list('pk', 'weight'))
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    names = {}
+    effects = [(lambda state: _route_effects(state, capacities), routes),
+               (lambda state: _booking_effects(state, endpoints, weights), bookings)]
+    for effect, transitions in effects:
+        for old, new in transitions:
+            for state, sign in ((new, 1), (old, -1)):
+                counted = effect(state) if state is not None else None
+                if counted is None:
+                    continue
+                key, corridor_names, day, values = counted
+                names.setdefault(key, corridor_names)
+                for field, value in values.items():
+                    deltas[(key, day)][field] += sign * value
+    apply_deltas(deltas, names)
+
+
+def corridor_ids(names):
+    """Map corridor keys to Corridor ids, creating missing corridors labelled with ``names[key]``."""
+    def lookup(keys):
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            condition = functools.reduce(
+                operator.or_, (Q(**dict(zip(CORRIDOR_FIELDS, key))) for key in keys[start:start + LOOKUP_BATCH_SIZE]),
+            )
+            rows = Corridor.objects.filter(condition).values_list('pk', *CORRIDOR_FIELDS)
+            found.update((tuple(row[1:]), row[0]) for row in rows)
+        return found
+
+    ids = lookup(names)
+    missing = [key for key in names if key not in ids]
+    if missing:
+        Corridor.objects.bulk_create(
+            [
+                Corridor(
+                    **dict(zip(CORRIDOR_FIELDS, key)), origin_name=names[key][0], destination_name=names[key][1],
+                )
+                for key in missing
+            ],
+            ignore_conflicts=True,
+            batch_size=LOOKUP_BATCH_SIZE,
+        )
+        ids.update(lookup(missing))
+    return ids
+
+
+def apply_deltas(deltas, names):
+    """Add ``{(corridor key, day): {field: amount}}`` to the day, week and month rows."""
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+    ids = corridor_ids({key: names[key] for key, _ in deltas})
+    rows = defaultdict(lambda: defaultdict(int))
+    for (key, day), values in deltas.items():
+        for period in PERIODS:
+            row = rows[(ids[key], period, period_start(period, day))]
+            for field, amount in values.items():
+                row[field] += amount
+
+    now = timezone.now()
+    with transaction.atomic():
+        CorridorStats.objects.bulk_create(
+            [CorridorStats(corridor_id=corridor_id, period=period, start=start) for corridor_id, period, start in rows],
+            ignore_conflicts=True,
+        )
+        for (corridor_id, period, start), values in rows.items():
+            CorridorStats.objects.filter(corridor_id=corridor_id, period=period, start=start).update(
+                updated_at=now, **{field: F(field) + amount for field, amount in values.items() if amount},
+            )
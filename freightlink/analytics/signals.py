@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings.models import Booking
+from freightlink.stored_state import deleted_state, saved_transition, track
+from routes.models import Route
+
+from . import rollups
+
+TRACKED = {
+    Booking: (rollups.booking_state, rollups.queue_booking_transition),
+    Route: (rollups.route_state, rollups.queue_route_transition),
+}
+track(*TRACKED)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Route)
+def queue_rollup_on_save(sender, instance, update_fields=None, **kwargs):
+    state, queue = TRACKED[sender]
+    old, new = saved_transition(instance, state, update_fields)
+    if old != new:
+        queue(old, new)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Route)
+def queue_rollup_on_delete(sender, instance, **kwargs):
+    old = deleted_state(instance, TRACKED[sender][0])
+    if old is not None:
+        TRACKED[sender][1](old, None)
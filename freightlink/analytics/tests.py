@@ -0,0 +1,122 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from bookings.models import Booking
+from freightlink.testing import (
+    MOMBASA, create_booking, create_business, create_cargo, create_owner, create_route, create_truck,
+)
+
+from .models import Corridor, CorridorStats
+from .rebuild import rebuild_corridor_stats
+from .rollups import STAT_FIELDS
+
+
+class CorridorRollupTests(TestCase):
+    day = datetime.date(2025, 1, 1)  # a Wednesday
+
+    def setUp(self):
+        self.business = create_business()
+        self.owner = create_owner()
+        self.truck = create_truck(self.owner)
+        self.cargo = create_cargo(self.business, day=self.day)
+
+    def create_route(self, day=None, price_per_km=100, destination=MOMBASA):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_route(self.truck, day or self.day, destination, price_per_km=price_per_km)
+
+    def create_booking(self, route, price=1000):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_booking(self.cargo, route, price=price)
+
+    def stats(self, period, start):
+        return CorridorStats.objects.values(*STAT_FIELDS).get(period=period, start=start)
+
+    def snapshot(self):
+        rows = CorridorStats.objects.values_list('corridor_id', 'period', 'start', *STAT_FIELDS)
+        return {row[:3]: row[3:] for row in rows}
+
+    def test_bookings_and_routes_roll_up_to_day_week_and_month(self):
+        route = self.create_route()
+        self.create_route(day=self.day + datetime.timedelta(days=1), price_per_km=120)
+        booking = self.create_booking(route, price=1500)
+
+        day = self.stats('day', self.day)
+        self.assertEqual((day['routes'], day['bookings']), (1, 1))
+        self.assertEqual((day['booked_weight'], day['booked_value']), (Decimal(5), Decimal(1500)))
+        week = self.stats('week', datetime.date(2024, 12, 30))
+        self.assertEqual((week['routes'], week['price_per_km_total'], week['offered_weight']), (2, 220, 40))
+        self.assertEqual(self.stats('month', datetime.date(2025, 1, 1))['routes'], 2)
+        self.assertEqual(Corridor.objects.get().origin_name, 'Nairobi')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'cancelled'
+            booking.save()
+        self.assertEqual(self.stats('week', datetime.date(2024, 12, 30))['bookings'], 0)
+
+    def test_moving_a_route_moves_its_totals(self):
+        route = self.create_route()
+        self.create_route(destination=(0.51, 35.27))
+        with self.captureOnCommitCallbacks(execute=True):
+            route.destination_latitude, route.destination_longitude = Decimal('0.51'), Decimal('35.27')
+            route.save()
+        rows = CorridorStats.objects.filter(period='day').values_list('corridor__destination_name', 'routes')
+        self.assertEqual(sorted(rows), [('Mombasa', 0), ('Mombasa', 2)])
+
+    def test_rolled_back_changes_are_not_counted(self):
+        route = self.create_route()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                route.price_per_km = 999
+                route.save()
+                raise ValueError
+        self.create_route()
+        day = self.stats('day', self.day)
+        self.assertEqual((day['routes'], day['price_per_km_total']), (2, 200))
+
+    def test_stale_instances_do_not_count_a_transition_twice(self):
+        booking = self.create_booking(self.create_route())
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Booking.objects.get(pk=booking.pk)
+            other.status = 'cancelled'
+            other.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.refresh_from_db()
+            booking.pickup_time = datetime.time(9)
+            booking.save()
+        self.assertEqual(self.stats('day', self.day)['bookings'], 0)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        routes = [self.create_route(self.day + datetime.timedelta(days=offset * 9)) for offset in range(6)]
+        for route in routes[::2]:
+            self.create_booking(route)
+        with self.captureOnCommitCallbacks(execute=True):
+            routes[1].status = 'cancelled'
+            routes[1].save()
+        incremental = {key: values for key, values in self.snapshot().items() if any(values)}
+        summary = rebuild_corridor_stats(workers=1)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(summary['rows'], len(incremental))
+
+    def test_api_serves_rankings_and_series(self):
+        route = self.create_route()
+        self.create_booking(route)
+        self.create_route(destination=(0.51, 35.27))
+        self.client.force_login(self.business)
+        params = {'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+
+        with self.assertNumQueries(3):  # session, user, rollup rows
+            ranking = self.client.get(reverse('api:corridor_ranking'), params).json()
+        self.assertEqual([item['bookings'] for item in ranking], [1, 0])
+        self.assertEqual(ranking[0]['utilization'], 0.25)
+
+        series = self.client.get(
+            reverse('api:corridor_series', kwargs={'pk': ranking[0]['corridor']}), {**params, 'period': 'day'},
+        ).json()
+        self.assertEqual(series, [{
+            'start': '2025-01-01', 'routes': 1, 'offered_weight': 20.0, 'bookings': 1, 'booked_weight': 5.0,
+            'booked_value': 1000.0, 'average_price_per_km': 100.0, 'utilization': 0.25,
+        }])
@@ -0,0 +1,148 @@
+"""Helpers for benchmarks that need a populated, disposable database."""
+import contextlib
+import datetime
+import os
+import random
+import resource
+from decimal import Decimal
+
+from django.db import connection
+
+from accounts.models import User
+from bookings.models import Booking
+from cargo.models import CargoListing
+from matching.synthetic import generate_cargo, generate_routes
+from payments.models import MpesaCallback, Payment
+from routes.models import Route
+from trucks.models import Truck
+
+BATCH_SIZE = 5000
+
+
+@contextlib.contextmanager
+def disposable_database():
+    """Run the block against a fresh test database that is dropped afterwards."""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def current_rss():
+    """Resident set size in bytes; falls back to the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _insert(model, objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def _decimal(value, places):
+    return Decimal(f'{value:.{places}f}')
+
+
+def seed_marketplace(rows, users=200, seed=0):
+    """
+    Bulk insert ``rows`` each of routes, cargo listings, bookings, payments
+    and M-Pesa callbacks, spread over ``users`` businesses and truck owners.
+    """
+    rng = random.Random(seed)
+    _insert(User, (
+        User(phone_number=f'+2547{index:08d}', user_type='business' if index % 2 else 'truck_owner')
+        for index in range(users * 2)
+    ))
+    businesses = list(User.objects.filter(user_type='business').values_list('id', flat=True))
+    owners = list(User.objects.filter(user_type='truck_owner').values_list('id', flat=True))
+    _insert(Truck, (
+        Truck(
+            owner_id=owner_id, licence_plate=f'K{owner_id:07d}', truck_type='lorry',
+            capacity_volume=Decimal('60.00'), capacity_weight=Decimal('20.00'),
+        )
+        for owner_id in owners
+    ))
+    trucks = dict(Truck.objects.values_list('owner_id', 'id'))
+
+    route_statuses = [status for status, _ in Route.STATUS_CHOICES]
+    _insert(Route, (
+        Route(
+            truck_id=trucks[owners[route.id % len(owners)]],
+            origin_name='Origin', destination_name='Destination',
+            origin_latitude=_decimal(route.origin_lat, 6), origin_longitude=_decimal(route.origin_lng, 6),
+            destination_latitude=_decimal(route.dest_lat, 6), destination_longitude=_decimal(route.dest_lng, 6),
+            departure_date=datetime.date.fromordinal(route.departure), departure_time=datetime.time(8),
+            estimated_arrival_date=datetime.date.fromordinal(route.departure + 1),
+            estimated_arrival_time=datetime.time(18),
+            available_capacity_volume=_decimal(route.capacity_volume, 2),
+            available_capacity_weight=_decimal(route.capacity_weight, 2),
+            price_per_km=_decimal(route.price_per_km, 2),
+            status=rng.choice(route_statuses),
+        )
+        for route in generate_routes(rows, seed=seed)
+    ))
+
+    cargo_statuses = [status for status, _ in CargoListing.STATUS_CHOICES]
+    _insert(CargoListing, (
+        CargoListing(
+            business_id=businesses[cargo.id % len(businesses)],
+            cargo_type='general', title=f'Cargo {cargo.id}', description='Synthetic cargo',
+            weight=_decimal(cargo.weight, 2),
+            origin_latitude=_decimal(cargo.origin_lat, 6), origin_logitude=_decimal(cargo.origin_lng, 6),
+            destination_latitude=_decimal(cargo.dest_lat, 6), destination_longitude=_decimal(cargo.dest_lng, 6),
+            pickup_date_from=datetime.date.fromordinal(cargo.pickup_from),
+            pickup_date_to=datetime.date.fromordinal(cargo.pickup_to),
+            delivery_date_from=datetime.date.fromordinal(cargo.pickup_to),
+            delivery_date_to=datetime.date.fromordinal(cargo.pickup_to + 3),
+            budget=_decimal(cargo.budget, 2) if cargo.budget else None,
+            status=rng.choice(cargo_statuses),
+        )
+        for cargo in generate_cargo(rows, seed=seed + 1)
+    ))
+
+    route_ids = Route.objects.order_by('id').values_list('id', 'truck__owner_id', 'departure_date')
+    cargo_ids = CargoListing.objects.order_by('id').values_list('id', 'business_id')
+    booking_statuses = [status for status, _ in Booking.STATUS_CHOICES]
+    _insert(Booking, (
+        Booking(
+            cargo_listing_id=cargo_id, route_id=route_id, business_id=business_id, truck_owner_id=owner_id,
+            price=_decimal(rng.uniform(5000, 150000), 2),
+            pickup_date=departure, pickup_time=datetime.time(8),
+            estimated_delivery_date=departure + datetime.timedelta(days=1),
+            estimated_delivery_time=datetime.time(18),
+            status=rng.choice(booking_statuses),
+        )
+        for (route_id, owner_id, departure), (cargo_id, business_id)
+        in zip(route_ids.iterator(chunk_size=BATCH_SIZE), cargo_ids.iterator(chunk_size=BATCH_SIZE))
+    ))
+
+    payment_statuses = [status for status, _ in Payment.STATUS_CHOICES]
+    bookings = Booking.objects.order_by('id').values_list('id', 'business_id', 'truck_owner_id', 'price')
+    _insert(Payment, (
+        Payment(
+            booking_id=booking_id, payer_id=business_id, receiver_id=owner_id, amount=price,
+            payment_type='booking', status=rng.choice(payment_statuses),
+            transaction_id=f'ws_CO_{booking_id:012d}', mpesa_receipt=f'R{booking_id:09d}',
+        )
+        for booking_id, business_id, owner_id, price in bookings.iterator(chunk_size=BATCH_SIZE)
+    ))
+
+    payments = Payment.objects.order_by('id').values_list('id', 'transaction_id', 'mpesa_receipt', 'amount')
+    _insert(MpesaCallback, (
+        MpesaCallback(
+            payment_id=payment_id, merchant_request_id=f'{payment_id}-1', checkout_request_id=checkout_id,
+            result_code='0', result_desc='The service request is processed successfully.',
+            mpesa_receipt_number=receipt, amount=amount,
+        )
+        for payment_id, checkout_id, receipt, amount in payments.iterator(chunk_size=BATCH_SIZE)
+    ))
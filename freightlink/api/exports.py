@@ -0,0 +1,144 @@
+"""
+Streaming CSV and newline-delimited JSON exports of bookings and payments.
+
+Rows are read as ``values_list`` tuples in keyset batches ordered by
+``(created_at, id)``, each batch a separate query of at most
+``EXPORT_CHUNK_SIZE`` rows, and written out before the next one is read.
+Memory therefore stays flat whatever the row count; ``iterator()`` alone
+would not do that here, since the MySQL client library buffers a whole
+result set even for chunked reads.
+
+Under ASGI the response must be fed an async iterator: Django consumes a
+synchronous one with ``sync_to_async(list)``, holding the whole export in
+memory before the first byte goes out. ``astream`` reads each chunk in the
+thread Django keeps for sync code and hands it over as soon as it is ready.
+"""
+import csv
+import datetime
+import io
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from bookings.models import Booking
+from payments.models import Payment
+
+from .fast import converter_for
+from .pagination import keyset_filter
+
+BOOKING_EXPORT_FIELDS = (
+    'id', 'created_at', 'status', 'price', 'cargo_listing_id', 'route_id',
+    'business_id', 'business__phone_number', 'business__company_name',
+    'truck_owner_id', 'truck_owner__phone_number', 'truck_owner__company_name',
+    'pickup_date', 'estimated_delivery_date', 'actual_delivery_date',
+)
+PAYMENT_EXPORT_FIELDS = (
+    'id', 'created_at', 'payment_date', 'status', 'payment_type', 'amount',
+    'mpesa_receipt', 'transaction_id', 'checkout_request_id', 'booking_id',
+    'payer_id', 'payer__phone_number', 'payer__company_name',
+    'receiver_id', 'receiver__phone_number', 'receiver__company_name',
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _model_field(model, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def month_range(month):
+    """Turn ``YYYY-MM`` into the ``[start, end)`` datetimes of that month in the current time zone."""
+    try:
+        first = datetime.datetime.strptime(month, '%Y-%m')
+    except (TypeError, ValueError):
+        raise ValidationError({'month': 'Expected a month as YYYY-MM.'})
+    following = first.replace(year=first.year + first.month // 12, month=first.month % 12 + 1)
+    return timezone.make_aware(first), timezone.make_aware(following)
+
+
+class Export:
+    """Streams ``fields`` of ``model`` rows created in ``[start, end)``, oldest first."""
+
+    ordering = ('created_at', 'id')
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.header = tuple(field.replace('__', '_') for field in fields)
+        self.converters = tuple(converter_for(_model_field(model, field)) for field in fields)
+        self.key_positions = tuple(fields.index(field) for field in self.ordering)
+
+    def batches(self, start=None, end=None, chunk_size=None):
+        """Yield lists of raw ``values_list`` rows, one bounded query per list."""
+        chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        queryset = self.model.objects.order_by(*self.ordering)
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+        queryset = queryset.values_list(*self.fields)
+        page = queryset
+        while True:
+            rows = list(page[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            page = queryset.filter(keyset_filter(self.ordering, [rows[-1][i] for i in self.key_positions]))
+
+    def converted(self, rows):
+        converters = self.converters
+        for row in rows:
+            yield [
+                value if convert is None or value is None else convert(value)
+                for convert, value in zip(converters, row)
+            ]
+
+    def csv(self, start=None, end=None, chunk_size=None):
+        """Yield the export as UTF-8 CSV, one bytes chunk per batch."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for rows in self.batches(start, end, chunk_size):
+            writer.writerows(self.converted(rows))
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    def ndjson(self, start=None, end=None, chunk_size=None):
+        """Yield the export as one JSON object per line, one bytes chunk per batch."""
+        header = self.header
+        for rows in self.batches(start, end, chunk_size):
+            yield b''.join(orjson.dumps(dict(zip(header, row))) + b'\n' for row in self.converted(rows))
+
+    def stream(self, output_format, start=None, end=None, chunk_size=None):
+        return getattr(self, output_format)(start, end, chunk_size)
+
+    async def astream(self, output_format, start=None, end=None, chunk_size=None):
+        """Async iterator over the same chunks as ``stream``, for responses served through ASGI."""
+        chunks = self.stream(output_format, start, end, chunk_size)
+        next_chunk = sync_to_async(next)
+        try:
+            while True:
+                chunk = await next_chunk(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await sync_to_async(chunks.close)()
+
+
+EXPORTS = {
+    'bookings': Export(Booking, BOOKING_EXPORT_FIELDS),
+    'payments': Export(Payment, PAYMENT_EXPORT_FIELDS),
+}
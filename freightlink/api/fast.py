@@ -0,0 +1,101 @@
+"""
+Read-only serialization straight from ``.values_list()`` rows.
+
+ModelSerializer builds a model instance and runs a Field object per value;
+for search results returning hundreds of rows that dominates the request.
+A ValuesSerializer picks a converter per column once, from the model's
+field types, and applies it to plain tuples. Output matches what
+ModelSerializer would emit for the same fields.
+"""
+import datetime
+
+from django.db import models
+from django.utils import timezone
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .pagination import keyset_ordering
+from .renderers import ORJSONRenderer
+
+
+def _decimal_converter(places):
+    return f'{{:.{places}f}}'.format
+
+
+def _datetime_to_string(value):
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def converter_for(field):
+    """Return a function turning a database value of ``field`` into its JSON form, or None if it is already JSON-ready."""
+    if isinstance(field, models.DecimalField):
+        return _decimal_converter(field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return _datetime_to_string
+    if isinstance(field, models.DateField):
+        return datetime.date.isoformat
+    if isinstance(field, models.TimeField):
+        return datetime.time.isoformat
+    return None
+
+
+class ValuesSerializer:
+    """
+    Serializes ``.values_list()`` tuples for ``model``; ``fields`` lists the
+    columns clients may request with ``?fields=a,b``. Foreign keys are
+    emitted as ids.
+    """
+
+    model = None
+    fields = ()
+
+    def __init__(self, fields=None):
+        self.names = tuple(self.parse_fields(fields) if fields else self.fields)
+        model_fields = [self.model._meta.get_field(name) for name in self.names]
+        self.columns = tuple(field.attname for field in model_fields)
+        self.converters = tuple(converter_for(field) for field in model_fields)
+
+    def parse_fields(self, fields):
+        requested = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = set(requested) - set(self.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        # Keep the declared order so responses are stable whatever order was asked for.
+        return [name for name in self.fields if name in requested]
+
+    def serialize(self, rows):
+        """Turn rows whose leading values follow ``columns`` into response dicts."""
+        names = self.names
+        converters = self.converters
+        return [
+            dict(zip(names, [
+                value if convert is None or value is None else convert(value)
+                for convert, value in zip(converters, row)
+            ]))
+            for row in rows
+        ]
+
+
+class ValuesListView(generics.ListAPIView):
+    """
+    List view that paginates ``.values_list()`` rows and serializes them with
+    ``values_serializer_class``; ``?fields=`` selects a sparse fieldset.
+    """
+
+    values_serializer_class = None
+    renderer_classes = [ORJSONRenderer]
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class(request.query_params.get('fields'))
+        queryset = self.filter_queryset(self.get_queryset())
+        # Ordering columns are appended so the paginator can build the next cursor.
+        ordering = [field.lstrip('-') for field in keyset_ordering(queryset)]
+        extra = [field for field in ordering if field not in serializer.columns]
+        queryset = queryset.values_list(*serializer.columns, *extra)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(queryset))
@@ -0,0 +1,83 @@
+import itertools
+import os
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import BATCH_SIZE, current_rss, disposable_database, seed_marketplace
+from api.exports import EXPORTS
+from bookings.models import Booking
+from payments.models import Payment
+
+
+class PeakSampler(threading.Thread):
+    """Samples RSS in the background and keeps the highest value seen."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+        return max(self.peak, current_rss())
+
+
+class Command(BaseCommand):
+    help = 'Export growing payment tables as CSV and NDJSON and report throughput and peak RSS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 5000000],
+                            help='Payment table sizes to export, ascending.')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            seed_marketplace(1000)
+            # An SQLite test database lives in memory, so 'before' grows with the table; 'growth' is the export's own.
+            self.stdout.write(f"{'rows':>10} {'format':<7} {'seconds':>8} {'rows/s':>9} {'MB out':>8} "
+                              f"{'RSS before':>11} {'RSS peak':>9} {'growth':>8}")
+            for size in sorted(options['rows']):
+                self._grow_payments(size)
+                for output_format in ('csv', 'ndjson'):
+                    self._export(size, output_format, options['chunk_size'])
+
+    def _grow_payments(self, size):
+        bookings = list(Booking.objects.values_list('id', 'business_id', 'truck_owner_id', 'price'))
+        missing = size - Payment.objects.count()
+        rows = itertools.islice(itertools.cycle(bookings), max(missing, 0))
+        batch = []
+        for booking_id, business_id, owner_id, price in rows:
+            batch.append(Payment(
+                booking_id=booking_id, payer_id=business_id, receiver_id=owner_id, amount=price,
+                payment_type='booking', status='completed', mpesa_receipt=f'R{len(batch):09d}',
+            ))
+            if len(batch) == BATCH_SIZE:
+                Payment.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Payment.objects.bulk_create(batch)
+
+    def _export(self, size, output_format, chunk_size):
+        sampler = PeakSampler()
+        before = current_rss()
+        written = 0
+        sampler.start()
+        started = time.perf_counter()
+        with open(os.devnull, 'wb') as sink:
+            for chunk in EXPORTS['payments'].stream(output_format, chunk_size=chunk_size):
+                written += len(chunk)
+                sink.write(chunk)
+        elapsed = time.perf_counter() - started
+        peak = sampler.stop()
+        self.stdout.write(
+            f'{size:>10} {output_format:<7} {elapsed:>8.1f} {size / elapsed:>9.0f} {written / 2**20:>8.1f} '
+            f'{before / 2**20:>9.1f}MB {peak / 2**20:>7.1f}MB {(peak - before) / 2**20:>6.1f}MB'
+        )
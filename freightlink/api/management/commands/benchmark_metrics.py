@@ -0,0 +1,44 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from api.benchmarking import disposable_database, seed_marketplace
+
+
+class Command(BaseCommand):
+    help = 'Measure the request overhead of RequestMetricsMiddleware at several sample rates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--rates', default='0,0.01,0.05,0.1,1')
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            seed_marketplace(2000, users=20)
+            user = User.objects.filter(user_type='business').first()
+            url = reverse('api:booking_list')
+            self.stdout.write(f"{'rate':>6} {'mean ms':>9} {'overhead':>9}")
+            baseline = None
+            for rate in (float(value) for value in options['rates'].split(',')):
+                with override_settings(METRICS_SAMPLE_RATE=rate):
+                    # A fresh client reloads the middleware chain with the new rate.
+                    client = Client(SERVER_NAME='localhost')
+                    client.force_login(user)
+                    mean = self._time(client, url, options['requests'])
+                baseline = baseline or mean
+                self.stdout.write(f'{rate:>6} {mean:>9.3f} {(mean / baseline - 1) * 100:>8.2f}%')
+
+    def _time(self, client, url, count):
+        for _ in range(50):
+            client.get(url)
+        samples = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(count // 5):
+                client.get(url)
+            samples.append((time.perf_counter() - started) * 1000 / (count // 5))
+        return statistics.median(samples)
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+
+from accounts.models import User
+from api.benchmarking import disposable_database, seed_marketplace
+from api.pagination import KeysetPagination, keyset_ordering
+from bookings.models import Booking
+from payments.models import Payment
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = 'Compare first and deep page latency of OFFSET and keyset pagination on the api list querysets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='Rows seeded per table.')
+        parser.add_argument('--page', type=int, default=10000, help='Deep page number to time.')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            # One business and one truck owner, so every booking and payment lands in a single user's list.
+            seed_marketplace(options['rows'], users=1)
+            business = User.objects.get(user_type='business')
+            owner = User.objects.get(user_type='truck_owner')
+            querysets = [
+                ('active routes', Route.objects.filter(status='active')),
+                ('business bookings', Booking.objects.filter(business=business)),
+                ('owner payments', Payment.objects.filter(receiver=owner)),
+            ]
+
+            self.stdout.write(f"{'list':<18} {'style':<8} {'page 1 ms':>10} {'page ' + str(options['page']) + ' ms':>14}")
+            for name, queryset in querysets:
+                available = queryset.count() // options['page_size']
+                page = max(min(options['page'], available), 2)
+                if page < options['page']:
+                    self.stderr.write(f'{name}: only {available} pages, timing page {page}')
+                for style, paginate in self._styles(queryset, page, options['page_size']):
+                    first = self._time(lambda: paginate(1), options['repeat'])
+                    deep = self._time(lambda: paginate(page), options['repeat'])
+                    self.stdout.write(f'{name:<18} {style:<8} {first:>10.2f} {deep:>14.2f}')
+
+    def _styles(self, queryset, page, page_size):
+        factory = RequestFactory()
+
+        def offset(number):
+            request = Request(factory.get('/', {'page': number, 'page_size': page_size}))
+            paginator = PageNumberPagination()
+            paginator.page_size_query_param = 'page_size'
+            return paginator.paginate_queryset(queryset, request)
+
+        # Cursor for the deep page is taken from the row just before it, outside the timed loop.
+        keyset = KeysetPagination()
+        keyset.ordering = keyset_ordering(queryset)
+        before = queryset.order_by(*keyset.ordering)[(page - 1) * page_size - 1]
+        cursors = {1: None, page: keyset.encode_cursor(keyset.row_values(before))}
+
+        def cursor(number):
+            params = {'page_size': page_size}
+            if cursors[number]:
+                params['cursor'] = cursors[number]
+            return KeysetPagination().paginate_queryset(queryset, Request(factory.get('/', params)))
+
+        return [('offset', offset), ('keyset', cursor)]
+
+    def _time(self, fetch, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fetch()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
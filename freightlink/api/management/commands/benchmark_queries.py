@@ -0,0 +1,87 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.benchmarking import disposable_database, seed_marketplace
+from api.queries import hot_queries, sample_arguments
+from bookings.models import Booking
+from cargo.models import CargoListing
+from payments.models import MpesaCallback, Payment
+from routes.models import Route
+
+INDEXED_MODELS = (Route, CargoListing, Booking, Payment, MpesaCallback)
+
+
+def _indexed_fields(model):
+    """Columns with an index of their own: foreign keys and unique fields other than the primary key."""
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and (field.db_index or field.unique)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Time the hot listing queries on seeded data with and without any secondary index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Rows seeded per table.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            started = time.perf_counter()
+            seed_marketplace(options['rows'])
+            self.stdout.write(f"Seeded {options['rows']} rows per table in {time.perf_counter() - started:.1f}s")
+
+            arguments = sample_arguments()
+            indexed = self._time_queries(arguments, options['repeat'])
+            self._set_indexes(present=False)
+            try:
+                unindexed = self._time_queries(arguments, options['repeat'])
+            finally:
+                self._set_indexes(present=True)
+
+        self.stdout.write(f"{'query':<34} {'no index ms':>12} {'indexed ms':>11} {'speedup':>8}")
+        for name, after in indexed.items():
+            before = unindexed[name]
+            self.stdout.write(f'{name:<34} {before:>12.2f} {after:>11.2f} {before / max(after, 1e-6):>7.1f}x')
+
+    def _time_queries(self, arguments, repeat):
+        medians = {}
+        for name, queryset in hot_queries(**arguments):
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                samples.append((time.perf_counter() - started) * 1000)
+            medians[name] = statistics.median(samples)
+        return medians
+
+    def _set_indexes(self, present):
+        """
+        Drop or restore every secondary index of the benchmarked tables, so the
+        baseline is a plain scan: the Meta.indexes, and the indexes the database
+        keeps for foreign keys and unique columns (such as the checkout request
+        ids). Unique constraints go with their indexes; foreign keys stay.
+        """
+        if not present:
+            self.column_indexes = {
+                model: [(field, field.db_index, field._unique) for field in _indexed_fields(model)]
+                for model in INDEXED_MODELS
+            }
+        # SQLite alters a column by rebuilding the table from the model's current fields and Meta.indexes,
+        # so every field is switched before any column is altered, and Meta.indexes exist while columns change.
+        with connection.schema_editor() as editor:
+            for model, fields in self.column_indexes.items():
+                for index in model._meta.indexes if present else ():
+                    editor.add_index(model, index)
+                before = [copy.copy(field) for field, _, _ in fields]
+                for field, db_index, unique in fields:
+                    field.db_index, field._unique = (db_index, unique) if present else (False, False)
+                for old, (field, _, _) in zip(before, fields):
+                    editor.alter_field(model, old, field)
+                for index in () if present else model._meta.indexes:
+                    editor.remove_index(model, index)
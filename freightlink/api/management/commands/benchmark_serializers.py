@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarking import disposable_database, seed_marketplace
+from api.renderers import ORJSONRenderer
+from api.serializers import (
+    CargoListingSerializer, CargoValuesSerializer, RouteSerializer, RouteValuesSerializer,
+)
+from cargo.models import CargoListing
+from routes.models import Route
+
+SPARSE_FIELDS = 'id,origin_name,destination_name,departure_date,price_per_km'
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer + JSONRenderer with the values() read path on route and cargo rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Comma-separated row counts.')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with disposable_database():
+            seed_marketplace(max(sizes), users=50)
+            self.stdout.write(f"{'rows':>6} {'model':<6} {'path':<18} {'ms':>9} {'KiB':>8}")
+            for size in sizes:
+                for name, model, model_serializer, values_serializer in (
+                    ('route', Route, RouteSerializer, RouteValuesSerializer),
+                    ('cargo', CargoListing, CargoListingSerializer, CargoValuesSerializer),
+                ):
+                    queryset = model.objects.order_by('id')[:size]
+                    paths = [
+                        ('ModelSerializer', lambda: JSONRenderer().render(
+                            model_serializer(queryset.all(), many=True).data,
+                        )),
+                        ('values + orjson', self._values_path(queryset, values_serializer())),
+                    ]
+                    if model is Route:
+                        paths.append(('values ?fields=', self._values_path(queryset, values_serializer(SPARSE_FIELDS))))
+                    for path, render in paths:
+                        elapsed, body = self._time(render, options['repeat'])
+                        self.stdout.write(f'{size:>6} {name:<6} {path:<18} {elapsed:>9.2f} {len(body) / 1024:>8.0f}')
+
+    def _values_path(self, queryset, serializer):
+        renderer = ORJSONRenderer()
+        return lambda: renderer.render(serializer.serialize(queryset.values_list(*serializer.columns)))
+
+    def _time(self, render, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = render()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), body
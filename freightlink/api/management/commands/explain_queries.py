@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.queries import hot_queries, sample_arguments
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the canonical hot queries and flag any full table scans.'
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('mysql', 'sqlite'):
+            raise CommandError(f'EXPLAIN parsing is not implemented for {connection.vendor}.')
+
+        scans = 0
+        for name, queryset in hot_queries(**sample_arguments()):
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'mysql':
+                    cursor.execute(f'EXPLAIN {sql}', params)
+                    columns = [column[0] for column in cursor.description]
+                    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    full_scans = [step for step in plan if step['type'] == 'ALL']
+                    lines = [
+                        f"{step['table']}: type={step['type']} key={step['key']} rows={step['rows']} {step['Extra'] or ''}"
+                        for step in plan
+                    ]
+                else:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                    lines = [row[-1] for row in cursor.fetchall()]
+                    full_scans = [line for line in lines if line.startswith('SCAN') and 'INDEX' not in line]
+
+            if full_scans:
+                scans += 1
+                self.stdout.write(self.style.ERROR(f'FULL SCAN  {name}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'indexed    {name}'))
+            for line in lines:
+                self.stdout.write(f'    {line}')
+
+        if scans:
+            raise CommandError(f'{scans} hot queries use a full table scan.')
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.exports import CONTENT_TYPES, EXPORTS, month_range
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings or payments as CSV or newline-delimited JSON, optionally for one month.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='output_format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--month', help='YYYY-MM; exports every row when omitted.')
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows fetched per query.')
+
+    def handle(self, *args, **options):
+        try:
+            start, end = month_range(options['month']) if options['month'] else (None, None)
+        except ValidationError:
+            raise CommandError('--month must look like YYYY-MM')
+        chunks = EXPORTS[options['kind']].stream(options['output_format'], start, end, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.buffer.flush()
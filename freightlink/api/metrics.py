@@ -0,0 +1,158 @@
+"""
+In-process request metrics exported in the Prometheus text format.
+
+Each worker process keeps its own histograms; Prometheus scrapes every
+worker (or a multiprocess-aware proxy) and sums them. Only a sampled
+fraction of requests is instrumented, set by ``METRICS_SAMPLE_RATE``.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Distinct duplicated statements remembered per route, to bound label cardinality.
+MAX_FINGERPRINTS = 20
+
+_IN_LIST = re.compile(r'(?:%s, )+%s')
+
+
+def fingerprint(sql):
+    """Collapse ``IN (%s, %s, ...)`` so statements differing only in list length share a fingerprint."""
+    return _IN_LIST.sub('%s', sql)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RouteStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicates = Histogram(QUERY_BUCKETS)
+        self.duplicate_sql = Counter()
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` hook counting, timing and fingerprinting statements."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicated(self):
+        """Return ``{fingerprint: extra executions}`` for statements run more than once."""
+        repeats = Counter()
+        for sql, count in self.statements.items():
+            repeats[fingerprint(sql)] += count
+        return {sql: count - 1 for sql, count in repeats.items() if count > 1}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._routes = defaultdict(RouteStats)
+        self._counters = Counter()
+
+    def count_request(self, route, method, status):
+        with self._lock:
+            self._requests[route, method, status] += 1
+
+    def increment(self, name, amount=1, **labels):
+        """Add to a free-form counter such as cache hits; ``labels`` become Prometheus labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def record(self, route, duration, recorder):
+        duplicated = recorder.duplicated()
+        with self._lock:
+            stats = self._routes[route]
+            stats.duration.observe(duration)
+            stats.db_duration.observe(recorder.duration)
+            stats.queries.observe(recorder.count)
+            stats.duplicates.observe(sum(duplicated.values()))
+            for sql, extra in duplicated.items():
+                if sql in stats.duplicate_sql or len(stats.duplicate_sql) < MAX_FINGERPRINTS:
+                    stats.duplicate_sql[sql] += extra
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._routes.clear()
+            self._counters.clear()
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP freightlink_requests_total Requests handled, sampled or not.',
+                '# TYPE freightlink_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'freightlink_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}'
+                )
+            for name, attribute, kind, description in (
+                ('freightlink_request_duration_seconds', 'duration', 'histogram', 'Wall time of sampled requests.'),
+                ('freightlink_request_db_duration_seconds', 'db_duration', 'histogram', 'Time spent in SQL per sampled request.'),
+                ('freightlink_request_queries', 'queries', 'histogram', 'SQL statements per sampled request.'),
+                ('freightlink_request_duplicate_queries', 'duplicates', 'histogram', 'Repeated SQL statements per sampled request.'),
+            ):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+                for route, stats in sorted(self._routes.items()):
+                    lines.extend(getattr(stats, attribute).lines(name, f'route="{_escape(route)}"'))
+            lines.append('# HELP freightlink_duplicate_queries_total Extra executions of repeated statements, by statement.')
+            lines.append('# TYPE freightlink_duplicate_queries_total counter')
+            for route, stats in sorted(self._routes.items()):
+                for sql, count in stats.duplicate_sql.most_common():
+                    lines.append(
+                        f'freightlink_duplicate_queries_total{{route="{_escape(route)}",query="{_escape(sql[:200])}"}} {count}'
+                    )
+            previous = None
+            for (name, labels), count in sorted(self._counters.items()):
+                if name != previous:
+                    lines.append(f'# TYPE {name} counter')
+                    previous = name
+                label_text = ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels)
+                lines.append(f'{name}{{{label_text}}} {count}' if label_text else f'{name} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry = MetricsRegistry()
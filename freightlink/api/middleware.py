@@ -0,0 +1,45 @@
+import contextlib
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import QueryRecorder, registry
+
+
+def route_label(request):
+    """URL pattern of the resolved view, so ``/api/routes/12/`` and ``/api/routes/13/`` share a series."""
+    match = getattr(request, 'resolver_match', None)
+    return f'/{match.route}' if match is not None else '<unmatched>'
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts every request and, for a ``METRICS_SAMPLE_RATE`` fraction of them,
+    records wall time, SQL count, SQL time and repeated statements per route.
+    Place it first in MIDDLEWARE so the timings cover the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            registry.count_request(route_label(request), request.method, response.status_code)
+            return response
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        route = route_label(request)
+        registry.count_request(route, request.method, response.status_code)
+        registry.record(route, duration, recorder)
+        return response
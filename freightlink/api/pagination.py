@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination over a queryset's ordering.
+
+Each page is fetched with a ``WHERE`` on the last row's ordering values
+instead of an ``OFFSET``, so deep pages cost the same as the first one and
+rows inserted while a client pages never shift or repeat entries. The
+ordering always ends with ``id`` so the key is unique.
+"""
+import base64
+import bisect
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_ordering(queryset):
+    """Return the queryset's ordering with an ``id`` tie-breaker in the same direction as the last field."""
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering or ['id'])
+    if ordering[-1].lstrip('-') not in ('id', 'pk'):
+        ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+    return ordering
+
+
+def keyset_filter(ordering, values):
+    """
+    Build ``a >= x & ((a > x) | (a = x & b > y) | ...)`` for the rows after ``values``.
+
+    The redundant bound on the leading field lets the database seek into the
+    index instead of scanning it. Ordering fields must be non-null; ``-field``
+    compares with ``<``.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    first = ordering[0]
+    return Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination; ``?page_size=`` may be raised up to
+    ``API_MAX_PAGE_SIZE`` for bulk consumers.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(requested, 1), self.max_page_size)
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            fields = [model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+            if len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = keyset_ordering(queryset)
+        # Set for values_list() querysets, whose rows are tuples.
+        self.row_fields = queryset._fields
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(keyset_filter(self.ordering, self.decode_cursor(cursor, queryset.model)))
+
+        rows = list(queryset[:page_size + 1])
+        self.page = rows[:page_size]
+        self.next_values = self.row_values(self.page[-1]) if len(rows) > page_size else None
+        return self.page
+
+    def paginate_sorted(self, rows, request, model, ordering):
+        """
+        Paginate cached ``(key, item)`` pairs sorted ascending by ``key``,
+        the values of the ascending ``ordering`` fields. Cursors are
+        interchangeable with those of paginate_queryset().
+        """
+        self.request = request
+        self.ordering = ordering
+        page_size = self.get_page_size(request)
+        start = 0
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            after = tuple(self.decode_cursor(cursor, model))
+            start = bisect.bisect_right([key for key, _ in rows], after)
+        window = rows[start:start + page_size + 1]
+        self.page = [item for _, item in window[:page_size]]
+        self.next_values = list(window[page_size - 1][0]) if len(window) > page_size else None
+        return self.page
+
+    def row_values(self, row):
+        if isinstance(row, tuple):
+            return [row[self.row_fields.index(field.lstrip('-'))] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,46 @@
+"""Canonical hot listing queries, shared by the EXPLAIN check and the query benchmark."""
+from django.utils import timezone
+
+from bookings.models import Booking
+from cargo.models import CargoListing
+from payments.models import MpesaCallback, Payment
+from routes.models import Route
+
+
+def hot_queries(business_id=1, truck_owner_id=1, booking_id=1, checkout_request_id='', day=None, limit=50):
+    """Return ``(name, queryset)`` pairs for the listing queries we expect to be indexed."""
+    day = day or timezone.localdate()
+    return [
+        ('active routes by departure', Route.objects.filter(
+            status='active', departure_date__gte=day,
+        ).order_by('departure_date', 'departure_time')[:limit]),
+        ('active cargo by pickup window', CargoListing.objects.filter(
+            status='active', pickup_date_from__lte=day, pickup_date_to__gte=day,
+        )[:limit]),
+        ('business bookings by status', Booking.objects.filter(
+            business_id=business_id, status='pending',
+        ).order_by('-created_at')[:limit]),
+        ('truck owner bookings by status', Booking.objects.filter(
+            truck_owner_id=truck_owner_id, status='approved',
+        ).order_by('-created_at')[:limit]),
+        ('payments by booking and status', Payment.objects.filter(
+            booking_id=booking_id, status='completed',
+        )),
+        ('callbacks by checkout request', MpesaCallback.objects.filter(
+            checkout_request_id=checkout_request_id,
+        )),
+    ]
+
+
+def sample_arguments():
+    """Pick hot_queries() arguments that hit existing rows so plans reflect real data."""
+    booking = Booking.objects.order_by().values('id', 'business_id', 'truck_owner_id').first() or {}
+    callback = MpesaCallback.objects.order_by().values('checkout_request_id').first() or {}
+    route = Route.objects.order_by().values('departure_date').first() or {}
+    return {
+        'business_id': booking.get('business_id', 1),
+        'truck_owner_id': booking.get('truck_owner_id', 1),
+        'booking_id': booking.get('id', 1),
+        'checkout_request_id': callback.get('checkout_request_id', ''),
+        'day': route.get('departure_date'),
+    }
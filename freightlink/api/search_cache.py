@@ -0,0 +1,292 @@
+"""
+Two-tier cache for route search results.
+
+Queries are normalised before lookup: coordinates are rounded to
+``COORD_STEP`` degrees, dates are widened to the matching index's weekly
+buckets and the weight is lowered to a band. Each cache entry holds the
+serialized routes of one (corridor, week, band), which is a superset of
+every query that normalises to it; the exact query is then applied in
+memory. Entries live in a short-lived in-process LRU in front of the
+shared Django cache.
+
+Invalidation is by corridor. Every pair of coarse origin/destination cells
+has a version token in the shared cache and entry keys embed it, so a
+route change only has to replace the tokens of the corridors it can
+appear in. Local entries keep at most ``ROUTE_SEARCH_LOCAL_TTL`` seconds
+of staleness from changes made by other processes.
+
+Entries are computed from the database rather than from this process's
+matching index: the index may still lag a change another process has
+committed, and a result built from it would be stored under the new token.
+"""
+import datetime
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from matching.geo import bounding_box, cell_span, grid_cell
+from matching.index import ROUTE_FIELDS as INDEX_ROUTE_FIELDS, CargoEntry, route_entry, route_matches_cargo
+from routes.models import Route
+
+from .metrics import registry
+from .pagination import keyset_ordering
+from .serializers import RouteValuesSerializer
+
+COORD_STEP = 0.05
+# Furthest a rounded coordinate can be from the original, in km.
+ROUNDING_SLACK_KM = 4.0
+WEIGHT_BANDS = (0, 1, 2, 5, 10, 15, 20, 30)
+ROUTE_ORDERING = keyset_ordering(Route.objects.all())
+# Seconds a process waits for another worker's recompute before doing its own.
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+
+class LocalCache:
+    """Thread-safe LRU with a per-entry TTL, remembering each entry's corridor."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            corridor, value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, corridor, value):
+        with self._lock:
+            self._entries[key] = (corridor, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, corridors):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] in corridors]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _round(value):
+    return round(value / COORD_STEP)
+
+
+def weight_band(weight):
+    return max(band for band in WEIGHT_BANDS if band <= weight)
+
+
+def corridor_of(origin, destination):
+    """Coarse (origin cell, destination cell) pair used as the invalidation unit."""
+    cell_km = settings.ROUTE_SEARCH_CORRIDOR_KM
+    return grid_cell(*origin, cell_km) + grid_cell(*destination, cell_km)
+
+
+def _cells_near(point, radius_km):
+    cell_km = settings.ROUTE_SEARCH_CORRIDOR_KM
+    row, col = grid_cell(*point, cell_km)
+    row_span, col_span = cell_span(point[0], radius_km, cell_km)
+    return [
+        (r, c)
+        for r in range(row - row_span, row + row_span + 1)
+        for c in range(col - col_span, col + col_span + 1)
+    ]
+
+
+def corridors_near(origin, destination):
+    """Every corridor whose searches can return a route between these endpoints."""
+    radius_km = settings.MATCHING_RADIUS_KM + ROUNDING_SLACK_KM
+    return {
+        start + end
+        for start, end in itertools.product(_cells_near(origin, radius_km), _cells_near(destination, radius_km))
+    }
+
+
+def _version_key(corridor):
+    return 'route-search:version:{}:{}:{}:{}'.format(*corridor)
+
+
+class RouteSearchCache:
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.local = LocalCache(settings.ROUTE_SEARCH_LOCAL_SIZE, settings.ROUTE_SEARCH_LOCAL_TTL)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def cacheable(self, date_from, date_to, radius_km=None):
+        """Only searches with the default radius and a bounded date range are cached."""
+        return (
+            radius_km in (None, settings.MATCHING_RADIUS_KM)
+            and (date_to - date_from).days < settings.ROUTE_SEARCH_MAX_DAYS
+        )
+
+    def search(self, origin, destination, date_from, date_to, weight=0):
+        """
+        Return ``(key, row)`` pairs for the matching routes sorted by departure,
+        where ``key`` is ``(departure_date, departure_time, id)``.
+        """
+        rounded = (_round(origin[0]), _round(origin[1]), _round(destination[0]), _round(destination[1]))
+        corridor = corridor_of(
+            (rounded[0] * COORD_STEP, rounded[1] * COORD_STEP), (rounded[2] * COORD_STEP, rounded[3] * COORD_STEP),
+        )
+        band = weight_band(weight)
+        bucket_days = settings.MATCHING_BUCKET_DAYS
+        weeks = range(date_from.toordinal() // bucket_days, date_to.toordinal() // bucket_days + 1)
+
+        buckets = {}
+        missing = []
+        for week in weeks:
+            local_key = rounded + (week, band)
+            value = self.local.get(local_key)
+            if value is None:
+                missing.append(week)
+            else:
+                buckets[week] = value
+        registry.increment('freightlink_route_search_cache_total', len(buckets), tier='local', result='hit')
+        if missing:
+            registry.increment('freightlink_route_search_cache_total', len(missing), tier='local', result='miss')
+            version = self._version(corridor)
+            keys = {f'route-search:{version}:{":".join(map(str, rounded))}:{week}:{band}': week for week in missing}
+            shared = cache.get_many(keys)
+            registry.increment('freightlink_route_search_cache_total', len(shared), tier='shared', result='hit')
+            registry.increment(
+                'freightlink_route_search_cache_total', len(keys) - len(shared), tier='shared', result='miss',
+            )
+            for key, week in keys.items():
+                value = shared.get(key)
+                if value is None:
+                    value = self._single_flight(key, lambda week=week: self._compute(rounded, week, band))
+                buckets[week] = value
+                self.local.set(rounded + (week, band), corridor, value)
+
+        query = CargoEntry(
+            None, origin[0], origin[1], destination[0], destination[1],
+            date_from.toordinal(), date_to.toordinal(), weight, None,
+        )
+        radius_km = settings.MATCHING_RADIUS_KM
+        results = [
+            (key, row)
+            for week in weeks
+            for route, key, row in buckets[week]
+            if route_matches_cargo(route, query, radius_km)
+        ]
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+    def _version(self, corridor):
+        key = _version_key(corridor)
+        version = cache.get(key)
+        if version is None:
+            # Create the token rather than defaulting, so an evicted token can never revive old entries.
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        return version
+
+    def _single_flight(self, key, compute):
+        """Compute a missing entry once per process and, through a cache lock, once across processes."""
+        with self._flights_lock:
+            lock = self._flights.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                value = cache.get(key)
+                if value is not None:
+                    return value
+                lock_key, token = f'{key}:lock', uuid.uuid4().hex
+                owned = cache.add(lock_key, token, LOCK_TIMEOUT)
+                if not owned:
+                    deadline = time.monotonic() + LOCK_TIMEOUT
+                    while time.monotonic() < deadline:
+                        time.sleep(POLL_INTERVAL)
+                        value = cache.get(key)
+                        if value is not None:
+                            return value
+                try:
+                    registry.increment('freightlink_route_search_recompute_total')
+                    value = compute()
+                    cache.set(key, value, settings.ROUTE_SEARCH_CACHE_TTL)
+                    return value
+                finally:
+                    # A waiter that timed out leaves the lock to its owner or to expiry; an owner whose
+                    # lock expired mid-compute must not release the next owner's.
+                    if owned and cache.get(lock_key) == token:
+                        cache.delete(lock_key)
+            finally:
+                with self._flights_lock:
+                    self._flights.pop(key, None)
+
+    def _compute(self, rounded, week, band):
+        """Serialize every active route that any query normalising to this entry could return."""
+        origin = (rounded[0] * COORD_STEP, rounded[1] * COORD_STEP)
+        destination = (rounded[2] * COORD_STEP, rounded[3] * COORD_STEP)
+        bucket_days = settings.MATCHING_BUCKET_DAYS
+        first_day = datetime.date.fromordinal(week * bucket_days)
+        last_day = datetime.date.fromordinal(week * bucket_days + bucket_days - 1)
+        radius_km = settings.MATCHING_RADIUS_KM + ROUNDING_SLACK_KM
+        query = CargoEntry(
+            None, origin[0], origin[1], destination[0], destination[1],
+            first_day.toordinal(), last_day.toordinal(), band, None,
+        )
+        origin_box, destination_box = bounding_box(*origin, radius_km), bounding_box(*destination, radius_km)
+        # The serializer reads the leading columns; the rest feed the exact filter and the sort key.
+        columns = list(dict.fromkeys(self.serializer.columns + INDEX_ROUTE_FIELDS + tuple(ROUTE_ORDERING)))
+        position = {column: index for index, column in enumerate(columns)}
+        rows = Route.objects.filter(
+            status='active', departure_date__range=(first_day, last_day), available_capacity_weight__gte=band,
+            origin_latitude__range=origin_box[0], origin_longitude__range=origin_box[1],
+            destination_latitude__range=destination_box[0], destination_longitude__range=destination_box[1],
+        ).order_by().values_list(*columns)
+        entries = [(route_entry([row[position[field]] for field in INDEX_ROUTE_FIELDS]), row) for row in rows]
+        entries = [(route, row) for route, row in entries if route_matches_cargo(route, query, radius_km)]
+        return [
+            (route, tuple(row[position[field]] for field in ROUTE_ORDERING), data)
+            for (route, row), data in zip(entries, self.serializer.serialize([row for _, row in entries]))
+        ]
+
+    def invalidate(self, endpoints):
+        """Replace the version token of every corridor a route with these ``(origin, destination)`` pairs can match."""
+        corridors = set()
+        for origin, destination in endpoints:
+            corridors |= corridors_near(origin, destination)
+        if not corridors:
+            return
+        cache.set_many({_version_key(corridor): uuid.uuid4().hex for corridor in corridors}, None)
+        self.local.invalidate(corridors)
+        registry.increment('freightlink_route_search_invalidations_total', len(corridors))
+
+
+_route_search_cache = None
+
+
+def get_route_search_cache():
+    global _route_search_cache
+    if _route_search_cache is None:
+        _route_search_cache = RouteSearchCache(RouteValuesSerializer())
+    return _route_search_cache
+
+
+def invalidate_route_ids(route_ids):
+    """Invalidate searches for routes changed with ``QuerySet.update()``, which sends no signals."""
+    rows = Route.objects.filter(id__in=route_ids).values_list(
+        'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+    )
+    get_route_search_cache().invalidate([
+        ((float(origin_lat), float(origin_lng)), (float(dest_lat), float(dest_lng)))
+        for origin_lat, origin_lng, dest_lat, dest_lng in rows
+    ])
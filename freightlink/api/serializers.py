@@ -0,0 +1,166 @@
+import math
+
+from django.conf import settings
+from rest_framework import serializers
+
+from analytics.models import CorridorStats
+from analytics.queries import RANKING_FIELDS
+from bookings.models import Booking
+from cargo.models import CargoListing
+from matching.models import BackhaulSuggestion, ConsolidationPlan
+from payments.models import Payment
+from routes.models import Route
+
+from .fast import ValuesSerializer
+
+ROUTE_FIELDS = (
+    'id', 'truck', 'origin_name', 'origin_latitude', 'origin_longitude',
+    'destination_name', 'destination_latitude', 'destination_longitude',
+    'departure_date', 'departure_time', 'estimated_arrival_date', 'estimated_arrival_time',
+    'available_capacity_volume', 'available_capacity_weight', 'price_per_km', 'status',
+)
+CARGO_FIELDS = (
+    'id', 'business', 'cargo_type', 'title', 'weight', 'volume',
+    'origin_latitude', 'origin_logitude', 'destination_latitude', 'destination_longitude',
+    'pickup_date_from', 'pickup_date_to', 'delivery_date_from', 'delivery_date_to',
+    'budget', 'status', 'created_at',
+)
+
+
+class RouteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Route
+        fields = ROUTE_FIELDS
+
+
+class RouteValuesSerializer(ValuesSerializer):
+    model = Route
+    fields = ROUTE_FIELDS
+
+
+class CargoListingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CargoListing
+        fields = CARGO_FIELDS
+
+
+class CargoValuesSerializer(ValuesSerializer):
+    model = CargoListing
+    fields = CARGO_FIELDS
+
+
+class BookingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Booking
+        fields = [
+            'id', 'cargo_listing', 'route', 'business', 'truck_owner', 'price',
+            'pickup_date', 'pickup_time', 'estimated_delivery_date', 'estimated_delivery_time',
+            'status', 'created_at',
+        ]
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = [
+            'id', 'booking', 'payer', 'receiver', 'amount', 'payment_type', 'status',
+            'mpesa_receipt', 'payment_date', 'created_at',
+        ]
+
+
+class BackhaulSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BackhaulSuggestion
+        fields = [
+            'id', 'route', 'cargo', 'score', 'deadhead_km', 'wait_hours', 'homeward_km', 'status', 'created_at',
+        ]
+
+
+class ConsolidationPlanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConsolidationPlan
+        fields = ['route', 'objective', 'cargo', 'revenue', 'weight', 'volume', 'optimal', 'updated_at']
+
+
+class ConsolidationRequestSerializer(serializers.Serializer):
+    """Body of the route load planning endpoint."""
+
+    objective = serializers.ChoiceField(
+        choices=ConsolidationPlan.OBJECTIVE_CHOICES, default=lambda: settings.CONSOLIDATION_OBJECTIVE,
+    )
+    time_limit_ms = serializers.IntegerField(
+        min_value=1, max_value=settings.CONSOLIDATION_MAX_TIME_LIMIT_MS,
+        default=lambda: settings.CONSOLIDATION_TIME_LIMIT_MS,
+    )
+
+
+class SearchSerializer(serializers.Serializer):
+    """Query parameters shared by the route and cargo search endpoints."""
+
+    origin_lat = serializers.FloatField(min_value=-90, max_value=90)
+    origin_lng = serializers.FloatField(min_value=-180, max_value=180)
+    destination_lat = serializers.FloatField(min_value=-90, max_value=90)
+    destination_lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=1, max_value=500, required=False)
+
+
+class RouteSearchSerializer(SearchSerializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    weight = serializers.FloatField(min_value=0, default=0)
+    # Also find routes passing the origin and then the destination on their way.
+    along_path = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['date_to'] < data['date_from']:
+            raise serializers.ValidationError({'date_to': 'Must not be before date_from.'})
+        return data
+
+
+class CargoSearchSerializer(SearchSerializer):
+    date = serializers.DateField()
+    capacity_weight = serializers.FloatField(min_value=0)
+
+
+class CorridorStatsSerializer(serializers.Serializer):
+    """Query parameters of the corridor analytics endpoints."""
+
+    period = serializers.ChoiceField(choices=CorridorStats.PERIOD_CHOICES, default='week')
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+
+    def validate(self, data):
+        if data['date_to'] < data['date_from']:
+            raise serializers.ValidationError({'date_to': 'Must not be before date_from.'})
+        return data
+
+
+class CorridorRankingSerializer(CorridorStatsSerializer):
+    order_by = serializers.ChoiceField(choices=RANKING_FIELDS, default='booked_weight')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    """Body of the road distance matrix endpoint: ``[lat, lng]`` pairs."""
+
+    origins = serializers.ListField(child=serializers.ListField(
+        child=serializers.FloatField(min_value=-180, max_value=180), min_length=2, max_length=2,
+    ), min_length=1)
+    destinations = serializers.ListField(child=serializers.ListField(
+        child=serializers.FloatField(min_value=-180, max_value=180), min_length=2, max_length=2,
+    ), min_length=1)
+
+    def _validate_points(self, points):
+        if len(points) > settings.ROUTING_MATRIX_MAX_POINTS:
+            raise serializers.ValidationError(f'At most {settings.ROUTING_MATRIX_MAX_POINTS} points.')
+        if not all(math.isfinite(value) for point in points for value in point):
+            raise serializers.ValidationError('Coordinates must be finite numbers.')
+        if any(abs(lat) > 90 for lat, _ in points):
+            raise serializers.ValidationError('Latitudes must be between -90 and 90.')
+        return [tuple(point) for point in points]
+
+    def validate_origins(self, points):
+        return self._validate_points(points)
+
+    def validate_destinations(self, points):
+        return self._validate_points(points)
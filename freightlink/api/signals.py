@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings.capacity import route_capacity_changed
+from routes.models import Route
+
+from .search_cache import get_route_search_cache, invalidate_route_ids
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def route_changed(sender, instance, **kwargs):
+    endpoints = {instance.endpoints(), getattr(instance, 'loaded_endpoints', None)} - {None}
+    if endpoints:
+        transaction.on_commit(lambda: get_route_search_cache().invalidate(endpoints), robust=True)
+
+
+@receiver(route_capacity_changed)
+def route_capacity_updated(sender, route_id, **kwargs):
+    transaction.on_commit(lambda: invalidate_route_ids([route_id]), robust=True)
@@ -1,3 +1,456 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import threading
+import time
+import warnings
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from api.exports import EXPORTS
+from api.metrics import QueryRecorder, registry
+from api.search_cache import get_route_search_cache, invalidate_route_ids
+from api.serializers import CargoListingSerializer, RouteSerializer
+from bookings.models import Booking, BookingStatusUpdate
+from cargo.models import CargoListing
+from freightlink.testing import (
+    booking_fields, create_booking, create_business, create_cargo, create_owner, create_route, create_truck,
+)
+from matching.index import reset_indexes
+from matching.models import BackhaulSuggestion
+from payments.models import MpesaCallback, Payment
+from routes.models import Route
+
+
+class MarketplaceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.owner = create_owner()
+        cls.route = create_route(create_truck(cls.owner))
+        cls.cargo = create_cargo(cls.business)
+
+    @classmethod
+    def make_booking(cls):
+        return create_booking(cls.cargo, cls.route)
+
+    def setUp(self):
+        self.client.force_login(self.business)
+
+
+class KeysetPaginationTests(MarketplaceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bookings = [cls.make_booking() for _ in range(25)]
+        # Identical timestamps force the id tie-breaker to decide the order.
+        Booking.objects.update(created_at=timezone.now())
+
+    def collect(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(row['id'] for row in page['results'])
+            url = page['next']
+        return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        ids = self.collect(reverse('api:booking_list'))
+        self.assertEqual(ids, sorted((booking.id for booking in self.bookings), reverse=True))
+
+    def test_inserts_do_not_shift_later_pages(self):
+        first = self.client.get(reverse('api:booking_list')).json()
+        self.make_booking()
+        rest = self.collect(first['next'])
+        seen = [row['id'] for row in first['results']] + rest
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), len(self.bookings))
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=7):
+            page = self.client.get(reverse('api:booking_list'), {'page_size': 500}).json()
+        self.assertEqual(len(page['results']), 7)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('api:booking_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+
+class ValuesSerializerTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_indexes()
+
+    def search_routes(self, **params):
+        query = {
+            'origin_lat': -1.3, 'origin_lng': 36.8, 'destination_lat': -4.0, 'destination_lng': 39.7,
+            'date_from': '2024-12-30', 'date_to': '2025-01-05',
+        }
+        query.update(params)
+        return self.client.get(reverse('api:route_search'), query)
+
+    def test_route_output_matches_model_serializer(self):
+        page = self.client.get(reverse('api:route_list')).json()
+        self.assertEqual(page['results'], [json.loads(json.dumps(RouteSerializer(self.route).data))])
+
+    def test_cargo_output_matches_model_serializer(self):
+        cargo = CargoListing.objects.get(pk=self.cargo.pk)
+        response = self.client.get(reverse('api:cargo_search'), {
+            'origin_lat': -1.3, 'origin_lng': 36.8, 'destination_lat': -4.0, 'destination_lng': 39.7,
+            'date': '2025-01-01', 'capacity_weight': 20,
+        })
+        self.assertEqual(response.json()['results'], [json.loads(json.dumps(CargoListingSerializer(cargo).data))])
+
+    def test_search_filters_by_corridor_and_dates(self):
+        self.assertEqual([row['id'] for row in self.search_routes().json()['results']], [self.route.id])
+        self.assertEqual(self.search_routes(date_from='2025-02-01', date_to='2025-02-02').json()['results'], [])
+        self.assertEqual(self.search_routes(destination_lat=0.5, destination_lng=35.3).json()['results'], [])
+
+    def test_search_along_path(self):
+        # On the way from Nairobi to Mombasa, but nowhere near either end.
+        params = {'origin_lat': -2.0, 'origin_lng': 37.55, 'destination_lat': -3.2, 'destination_lng': 38.8}
+        self.assertEqual(self.search_routes(**params).json()['results'], [])
+        rows = self.search_routes(along_path='true', **params).json()['results']
+        self.assertEqual([row['id'] for row in rows], [self.route.id])
+        backwards = {'origin_lat': -3.2, 'origin_lng': 38.8, 'destination_lat': -2.0, 'destination_lng': 37.55}
+        self.assertEqual(self.search_routes(along_path='true', **backwards).json()['results'], [])
+
+    def test_rows_changed_behind_the_index_are_filtered_out(self):
+        cargo_query = {
+            'origin_lat': -1.3, 'origin_lng': 36.8, 'destination_lat': -4.0, 'destination_lng': 39.7,
+            'date': '2025-01-01', 'capacity_weight': 20,
+        }
+        self.assertEqual(len(self.search_routes(along_path='true').json()['results']), 1)
+        self.assertEqual(len(self.client.get(reverse('api:cargo_search'), cargo_query).json()['results']), 1)
+        # update() sends no signals, so the indexes still hold the old rows.
+        Route.objects.filter(pk=self.route.pk).update(status='cancelled')
+        CargoListing.objects.filter(pk=self.cargo.pk).update(weight=25)
+        self.assertEqual(self.search_routes(along_path='true').json()['results'], [])
+        self.assertEqual(self.client.get(reverse('api:cargo_search'), cargo_query).json()['results'], [])
+
+    def test_sparse_fieldset(self):
+        rows = self.search_routes(fields='price_per_km,id').json()['results']
+        self.assertEqual(rows, [{'id': self.route.id, 'price_per_km': '100.00'}])
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.search_routes(fields='id,truck__owner').status_code, 400)
+
+
+class ListingQueryCountTests(MarketplaceTestCase):
+    """Listings must cost a fixed number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create(
+            phone_number='+254700000009', user_type='admin', is_staff=True, is_superuser=True,
+        )
+
+    def populate(self, count):
+        """Top every listed table up to ``count`` rows."""
+        missing = count - Booking.objects.count()
+        bookings = Booking.objects.bulk_create(
+            Booking(**booking_fields(self.cargo, self.route))
+            for _ in range(missing)
+        )
+        BookingStatusUpdate.objects.bulk_create(
+            BookingStatusUpdate(booking=booking, status='approved', updated_by=self.owner) for booking in bookings
+        )
+        payments = Payment.objects.bulk_create(
+            Payment(
+                booking=booking, payer=self.business, receiver=self.owner, amount=1000, payment_type='booking',
+                checkout_request_id=f'ws_CO_{booking.pk}',
+            )
+            for booking in bookings
+        )
+        MpesaCallback.objects.bulk_create(
+            MpesaCallback(
+                payment=payment, merchant_request_id='m', checkout_request_id=payment.checkout_request_id,
+                result_code='0', result_desc='ok',
+            )
+            for payment in payments
+        )
+
+    def assert_constant_queries(self, expected, fetch):
+        for count in (10, 1000):
+            self.populate(count)
+            with self.subTest(rows=count), self.assertNumQueries(expected):
+                fetch()
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model, expected in (
+            (Booking, 5), (BookingStatusUpdate, 5), (Payment, 5), (MpesaCallback, 6), (CargoListing, 5),
+        ):
+            url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+            with self.subTest(model=model.__name__):
+                self.assert_constant_queries(expected, lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_admin_changelists_load_only_listed_columns(self):
+        self.client.force_login(self.admin)
+        booking = self.make_booking()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin:bookings_booking_changelist'))
+        self.assertFalse([query for query in queries if 'estimated_delivery_time' in query['sql']])
+        change = self.client.get(reverse('admin:bookings_booking_change', args=[booking.pk]))
+        self.assertContains(change, 'estimated_delivery_time')
+
+    def test_list_querysets_render_str_in_one_query(self):
+        def render(queryset):
+            return lambda: [str(row) for row in queryset.all()]
+
+        self.assert_constant_queries(1, render(Booking.objects.for_list()))
+        self.assert_constant_queries(1, render(Payment.objects.for_list()))
+        self.assert_constant_queries(1, render(BookingStatusUpdate.objects.for_list()))
+        self.assert_constant_queries(1, render(MpesaCallback.objects.all()))
+
+    def test_api_listings(self):
+        for name in ('api:booking_list', 'api:payment_list'):
+            with self.subTest(listing=name):
+                self.assert_constant_queries(3, lambda: self.client.get(reverse(name), {'page_size': 1000}))
+
+
+class HotQueryIndexTests(MarketplaceTestCase):
+    def test_hot_queries_use_indexes(self):
+        self.make_booking()
+        output = io.StringIO()
+        call_command('explain_queries', stdout=output)
+        self.assertNotIn('FULL SCAN', output.getvalue())
+        self.assertEqual(output.getvalue().count('indexed'), 6)
+
+
+class BackhaulListTests(MarketplaceTestCase):
+    def test_owner_sees_pending_backhauls_of_routes_in_progress(self):
+        suggestion = BackhaulSuggestion.objects.create(
+            route=self.route, cargo=self.cargo, score=80, deadhead_km=10, wait_hours=2, homeward_km=5,
+        )
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse('api:backhaul_list')).json()['results'], [])
+
+        Route.objects.filter(id=self.route.id).update(status='in_progress')
+        results = self.client.get(reverse('api:backhaul_list')).json()['results']
+        self.assertEqual(
+            [(row['id'], row['cargo'], row['score']) for row in results], [(suggestion.id, self.cargo.id, '80.00')],
+        )
+
+        self.client.force_login(self.business)
+        self.assertEqual(self.client.get(reverse('api:backhaul_list')).json()['results'], [])
+
+
+class RouteConsolidationTests(MarketplaceTestCase):
+    def test_owner_plans_and_reads_a_route_load(self):
+        url = reverse('api:route_consolidation', args=[self.route.id])
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(url, {'time_limit_ms': 0}).status_code, 400)
+        planned = self.client.post(url, {'objective': 'utilization'}).json()
+        self.assertEqual(
+            (planned['cargo'], planned['objective'], planned['optimal']), ([self.cargo.id], 'utilization', True),
+        )
+        self.assertEqual(self.client.get(url).json(), planned)
+
+
+class RequestMetricsTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def scrape(self):
+        return self.client.get(reverse('metrics')).content.decode()
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_request_records_queries_per_route(self):
+        self.client.get(reverse('api:booking_list'))
+        metrics = self.scrape()
+        self.assertIn('freightlink_requests_total{route="/api/bookings/",method="GET",status="200"} 1', metrics)
+        self.assertIn('freightlink_request_queries_count{route="/api/bookings/"} 1', metrics)
+        self.assertIn('freightlink_request_duration_seconds_bucket{route="/api/bookings/",le="+Inf"} 1', metrics)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        self.client.get(reverse('api:booking_list'))
+        metrics = self.scrape()
+        self.assertIn('freightlink_requests_total{route="/api/bookings/",method="GET",status="200"} 1', metrics)
+        self.assertNotIn('freightlink_request_queries_count{route="/api/bookings/"}', metrics)
+
+    def test_duplicates_share_a_fingerprint(self):
+        recorder = QueryRecorder()
+        for sql in ('SELECT 1 WHERE id IN (%s, %s)', 'SELECT 1 WHERE id IN (%s, %s, %s)', 'SELECT 2'):
+            recorder(lambda *args: None, sql, (), False, {})
+        self.assertEqual(recorder.duplicated(), {'SELECT 1 WHERE id IN (%s)': 1})
+
+    def test_scrape_is_limited_to_allowed_addresses(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 403)
+
+
+class RouteSearchCacheTests(MarketplaceTestCase):
+    query = {
+        'origin_lat': -1.3, 'origin_lng': 36.8, 'destination_lat': -4.0, 'destination_lng': 39.7,
+        'date_from': '2024-12-30', 'date_to': '2025-01-05',
+    }
+
+    def setUp(self):
+        super().setUp()
+        reset_indexes()
+        cache.clear()
+        get_route_search_cache().local.clear()
+        registry.reset()
+
+    def search(self, **params):
+        return self.client.get(reverse('api:route_search'), {**self.query, **params}).json()['results']
+
+    def counter(self, tier, result):
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        line = f'freightlink_route_search_cache_total{{result="{result}",tier="{tier}"}} '
+        return next((int(row[len(line):]) for row in metrics.splitlines() if row.startswith(line)), 0)
+
+    def test_cached_results_match_uncached_search(self):
+        for params in ({}, {'weight': 25}, {'date_from': '2025-01-02'}, {'destination_lat': -3.0}):
+            with self.subTest(**params):
+                with self.settings(ROUTE_SEARCH_MAX_DAYS=0):
+                    uncached = self.search(**params)
+                self.assertEqual(self.search(**params), uncached)
+
+    def test_repeat_search_is_served_locally(self):
+        # The date range spans two weekly buckets.
+        self.search()
+        self.search(origin_lat=-1.31)
+        self.assertEqual(self.counter('shared', 'miss'), 2)
+        self.assertEqual(self.counter('local', 'hit'), 2)
+
+    def test_route_change_invalidates_its_corridor(self):
+        self.assertEqual(len(self.search(weight=10)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            route = Route.objects.get(pk=self.route.pk)
+            route.available_capacity_weight = 5
+            route.save()
+        self.assertEqual(self.search(weight=10), [])
+
+    def test_entries_are_computed_from_the_database(self):
+        self.search()
+        # update() sends no signals, like a change committed by another process; only the token moves.
+        Route.objects.filter(pk=self.route.pk).update(status='cancelled')
+        invalidate_route_ids([self.route.pk])
+        self.assertEqual(self.search(), [])
+
+    def test_cold_key_is_computed_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return ['value']
+
+        search_cache = get_route_search_cache()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(search_cache._single_flight('route-search:test', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['value']] * 8)
+
+    def test_waiter_that_times_out_leaves_the_lock_alone(self):
+        cache.add('route-search:test:lock', 'other-process', 60)
+        with mock.patch('api.search_cache.LOCK_TIMEOUT', 0.1):
+            value = get_route_search_cache()._single_flight('route-search:test', lambda: ['value'])
+        self.assertEqual(value, ['value'])
+        self.assertEqual(cache.get('route-search:test:lock'), 'other-process')
+
+
+class ExportTests(MarketplaceTestCase):
+    def setUp(self):
+        self.admin = User.objects.create(phone_number='+254700000009', user_type='admin', is_staff=True)
+        self.client.force_login(self.admin)
+        booking = self.make_booking()
+        self.payments = Payment.objects.bulk_create(
+            Payment(
+                booking=booking, payer=self.business, receiver=self.owner, amount=1000 + index,
+                payment_type='booking', status='completed', mpesa_receipt=f'R{index:09d}',
+            )
+            for index in range(5)
+        )
+        march = timezone.make_aware(datetime.datetime(2025, 3, 10))
+        Payment.objects.filter(pk__in=[payment.pk for payment in self.payments[:3]]).update(created_at=march)
+
+    def export(self, kind, output_format, **params):
+        response = self.client.get(
+            reverse('api:export', kwargs={'kind': kind, 'output_format': output_format}), params,
+        )
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_header_and_every_row(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('payments', 'csv'))))
+        self.assertEqual([row['id'] for row in rows], [str(payment.pk) for payment in self.payments])
+        self.assertEqual(rows[0]['amount'], '1000.00')
+        self.assertEqual(rows[0]['mpesa_receipt'], 'R000000000')
+        self.assertEqual(rows[0]['payer_phone_number'], self.business.phone_number)
+
+    def test_ndjson_is_limited_to_the_month(self):
+        lines = self.export('payments', 'ndjson', month='2025-03').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [payment.pk for payment in self.payments[:3]])
+        self.assertEqual(self.export('bookings', 'ndjson', month='2025-03'), '')
+
+    def test_rows_are_read_in_bounded_batches(self):
+        with self.assertNumQueries(3):
+            chunks = list(EXPORTS['payments'].csv(chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count(b'\n') for chunk in chunks), 6)
+
+    async def test_asgi_streams_chunk_by_chunk(self):
+        # As the test client does, keep the handler from closing the test transaction's connection.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        path = reverse('api:export', kwargs={'kind': 'payments', 'output_format': 'csv'})
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [
+                (b'host', b'testserver'), (b'cookie', f'sessionid={self.client.cookies["sessionid"].value}'.encode()),
+            ],
+            'client': ('127.0.0.1', 5000), 'server': ('testserver', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        with self.settings(EXPORT_CHUNK_SIZE=2), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            await ASGIHandler()(scope, receive, send)
+        self.assertEqual(messages[0]['status'], 200)
+        # Django warns when it has to buffer a synchronous iterator for an ASGI response.
+        self.assertFalse([warning for warning in caught if 'StreamingHttpResponse' in str(warning.message)])
+        bodies = [message['body'] for message in messages[1:] if message.get('body')]
+        self.assertEqual(len(bodies), 3)
+        self.assertEqual(b''.join(bodies).count(b'\n'), 6)
+
+    def test_exports_are_staff_only(self):
+        self.client.force_login(self.business)
+        url = reverse('api:export', kwargs={'kind': 'payments', 'output_format': 'csv'})
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url, {'month': '2025-13'}).status_code, 400)
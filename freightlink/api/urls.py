@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('routes/', views.RouteListView.as_view(), name='route_list'),
+    path('routes/search/', views.RouteSearchView.as_view(), name='route_search'),
+    path('routes/<int:pk>/consolidation/', views.RouteConsolidationView.as_view(), name='route_consolidation'),
+    path('cargo/search/', views.CargoSearchView.as_view(), name='cargo_search'),
+    path('bookings/', views.BookingListView.as_view(), name='booking_list'),
+    path('backhauls/', views.BackhaulListView.as_view(), name='backhaul_list'),
+    path('payments/', views.PaymentListView.as_view(), name='payment_list'),
+    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('analytics/corridors/', views.CorridorRankingView.as_view(), name='corridor_ranking'),
+    path('analytics/corridors/<int:pk>/', views.CorridorSeriesView.as_view(), name='corridor_series'),
+    path('routing/matrix/', views.DistanceMatrixView.as_view(), name='distance_matrix'),
+    path('exports/<str:kind>.<str:output_format>', views.ExportView.as_view(), name='export'),
+]
@@ -1,3 +1,241 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from accounts.stats import get_dashboard_stats
+from analytics.queries import corridor_series, top_corridors
+from bookings.models import Booking
+from cargo.models import CargoListing
+from matching.consolidation import consolidate_route
+from matching.engine import search_cargo, search_routes, search_routes_along_path
+from matching.models import BackhaulSuggestion, ConsolidationPlan
+from payments.models import Payment
+from routes.models import Route
+from routing.network import get_road_network
+
+from .exports import CONTENT_TYPES, EXPORTS, month_range
+from .fast import ValuesListView
+from .metrics import registry
+from .search_cache import ROUTE_ORDERING, get_route_search_cache
+from .serializers import (
+    BackhaulSuggestionSerializer, BookingSerializer, CargoSearchSerializer, CargoValuesSerializer,
+    ConsolidationPlanSerializer, ConsolidationRequestSerializer, CorridorRankingSerializer, CorridorStatsSerializer,
+    DistanceMatrixSerializer, PaymentSerializer, RouteSearchSerializer, RouteValuesSerializer,
+)
+
+
+def _validated(serializer_class, request):
+    params = serializer_class(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return params.validated_data
+
+
+def _search_params(serializer_class, request):
+    data = _validated(serializer_class, request)
+    origin = (data['origin_lat'], data['origin_lng'])
+    destination = (data['destination_lat'], data['destination_lng'])
+    return origin, destination, data
+
+
+class RouteListView(ValuesListView):
+    """Active routes in departure order."""
+
+    values_serializer_class = RouteValuesSerializer
+
+    def get_queryset(self):
+        return Route.objects.filter(status='active')
+
+
+class RouteSearchView(ValuesListView):
+    """
+    Active routes near an origin and destination that depart within a date range.
+
+    With ``along_path=true`` routes whose path passes the origin and then the
+    destination qualify too. Searches with the default radius are answered
+    from the route search cache.
+    """
+
+    values_serializer_class = RouteValuesSerializer
+
+    def list(self, request, *args, **kwargs):
+        origin, destination, data = _search_params(RouteSearchSerializer, request)
+        search_cache = get_route_search_cache()
+        cacheable = search_cache.cacheable(data['date_from'], data['date_to'], data.get('radius_km'))
+        if data['along_path'] or not cacheable:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.values_serializer_class(request.query_params.get('fields'))
+        rows = search_cache.search(origin, destination, data['date_from'], data['date_to'], data['weight'])
+        page = self.paginator.paginate_sorted(rows, request, Route, ROUTE_ORDERING)
+        if serializer.names != search_cache.serializer.names:
+            page = [{name: row[name] for name in serializer.names} for row in page]
+        return self.paginator.get_paginated_response(page)
+
+    def get_queryset(self):
+        origin, destination, data = _search_params(RouteSearchSerializer, self.request)
+        route_ids = search_routes(
+            origin, destination, data['date_from'], data['date_to'], data['weight'], data.get('radius_km'),
+        )
+        if data['along_path']:
+            route_ids += search_routes_along_path(
+                origin, destination, data['date_from'], data['date_to'], data['weight'],
+            )
+        # The index can lag other processes' changes, so re-check what it filtered on against the rows.
+        return Route.objects.filter(
+            id__in=route_ids, status='active', departure_date__range=(data['date_from'], data['date_to']),
+            available_capacity_weight__gte=data['weight'],
+        )
+
+
+class CargoSearchView(ValuesListView):
+    """Active cargo a truck could carry between an origin and destination on a given day."""
+
+    values_serializer_class = CargoValuesSerializer
+
+    def get_queryset(self):
+        origin, destination, data = _search_params(CargoSearchSerializer, self.request)
+        cargo_ids = search_cargo(origin, destination, data['date'], data['capacity_weight'], data.get('radius_km'))
+        return CargoListing.objects.filter(
+            id__in=cargo_ids, status='active', pickup_date_from__lte=data['date'], pickup_date_to__gte=data['date'],
+            weight__lte=data['capacity_weight'],
+        )
+
+
+class BookingListView(generics.ListAPIView):
+    """The requesting user's bookings, newest first."""
+
+    serializer_class = BookingSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'truck_owner':
+            return Booking.objects.filter(truck_owner=user)
+        return Booking.objects.filter(business=user)
+
+
+class BackhaulListView(generics.ListAPIView):
+    """Pending return loads for the requesting truck owner's routes in progress, best first."""
+
+    serializer_class = BackhaulSuggestionSerializer
+
+    def get_queryset(self):
+        return BackhaulSuggestion.objects.filter(
+            route__truck__owner=self.request.user, route__status='in_progress', status='pending',
+        )
+
+
+class RouteConsolidationView(APIView):
+    """
+    The combination of compatible cargo that best fills one of the
+    requesting truck owner's routes. GET returns the stored plan; POST
+    plans the route again now and stores the result.
+    """
+
+    def _route_id(self, request, pk):
+        if not Route.objects.filter(pk=pk, truck__owner=request.user).exists():
+            raise NotFound()
+        return pk
+
+    def get(self, request, pk):
+        plan = ConsolidationPlan.objects.filter(route_id=self._route_id(request, pk)).first()
+        if plan is None:
+            raise NotFound('This route has not been planned yet.')
+        return Response(ConsolidationPlanSerializer(plan).data)
+
+    def post(self, request, pk):
+        params = ConsolidationRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        plan = consolidate_route(self._route_id(request, pk), **params.validated_data)
+        return Response(ConsolidationPlanSerializer(plan).data)
+
+
+class PaymentListView(generics.ListAPIView):
+    """Payments made (businesses) or received (truck owners), newest first."""
+
+    serializer_class = PaymentSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'truck_owner':
+            return Payment.objects.filter(receiver=user)
+        return Payment.objects.filter(payer=user)
+
+
+class DashboardView(APIView):
+    """The requesting user's dashboard counters, read from their UserStats row."""
+
+    def get(self, request):
+        return Response(get_dashboard_stats(request.user.pk))
+
+
+class CorridorRankingView(APIView):
+    """Busiest corridors over a date range, read from the analytics rollups."""
+
+    def get(self, request):
+        data = _validated(CorridorRankingSerializer, request)
+        return Response(top_corridors(
+            data['period'], data['date_from'], data['date_to'], data['order_by'], data['limit'],
+        ))
+
+
+class CorridorSeriesView(APIView):
+    """One corridor's totals per day, week or month, for charts."""
+
+    def get(self, request, pk):
+        data = _validated(CorridorStatsSerializer, request)
+        return Response(corridor_series(pk, data['period'], data['date_from'], data['date_to']))
+
+
+class DistanceMatrixView(APIView):
+    """
+    Road distance and driving time from every origin to every destination.
+
+    ``null`` marks pairs without a road connection or with a point too far
+    from the road network.
+    """
+
+    def post(self, request):
+        params = DistanceMatrixSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            network = get_road_network()
+        except OSError:
+            return Response({'detail': 'Road graph is not available.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        matrix = network.matrix(params.validated_data['origins'], params.validated_data['destinations'])
+        return Response({
+            'distances_km': [[round(cell[0], 2) if cell else None for cell in row] for row in matrix],
+            'durations_min': [[round(cell[1], 1) if cell else None for cell in row] for row in matrix],
+        })
+
+
+class ExportView(APIView):
+    """
+    Staff-only streaming export, e.g. ``/api/exports/payments.csv?month=2025-03``;
+    without ``month`` every row is exported.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind, output_format):
+        export = EXPORTS.get(kind)
+        if export is None or output_format not in CONTENT_TYPES:
+            raise NotFound()
+        month = request.query_params.get('month')
+        start, end = month_range(month) if month else (None, None)
+        # An ASGI server needs an async iterator to stream; given a sync one Django buffers the whole export.
+        stream = export.astream if isinstance(request._request, ASGIRequest) else export.stream
+        response = StreamingHttpResponse(stream(output_format, start, end), content_type=CONTENT_TYPES[output_format])
+        response['Content-Disposition'] = f'attachment; filename="{kind}-{month or "all"}.{output_format}"'
+        return response
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; only answers addresses listed in METRICS_ALLOWED_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
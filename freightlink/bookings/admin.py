@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from freightlink.list_admin import ForListAdmin
+
+from .models import Booking, BookingStatusUpdate
+
+
+@admin.register(Booking)
+class BookingAdmin(ForListAdmin):
+    list_display = ('__str__', 'business', 'truck_owner', 'price', 'pickup_date', 'status', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('cargo_listing', 'business', 'truck_owner')
+    raw_id_fields = ('cargo_listing', 'route', 'business', 'truck_owner')
+
+
+@admin.register(BookingStatusUpdate)
+class BookingStatusUpdateAdmin(ForListAdmin):
+    list_display = ('__str__', 'booking_id', 'status', 'updated_by', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('updated_by',)
+    raw_id_fields = ('booking', 'updated_by')
@@ -0,0 +1,100 @@
+"""
+Route capacity reservation.
+
+Capacity is taken with a single conditional ``UPDATE ... SET available =
+available - requested WHERE available >= requested``, so concurrent
+bookings can never oversell a route and no row lock is held beyond that
+statement. Every reservation is recorded as a CapacityHold; releasing a
+hold is a conditional status change that gives the capacity back only
+when it succeeds, which makes releases idempotent.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from routes.models import Route
+
+from .models import CapacityHold
+
+
+class CapacityError(Exception):
+    """The route is not active or has less capacity left than requested."""
+
+
+class HoldExpired(Exception):
+    """The hold was released (usually by expiry) before it could be confirmed."""
+
+
+# Sent with ``route_id`` whenever a reservation or release changed a route's capacity. The changes are
+# made with update(), which sends no model signals, so matching and the search cache listen for this instead.
+route_capacity_changed = Signal()
+
+
+def reserve(route_id, weight, volume=0, booking=None, hold_seconds=None):
+    """
+    Take ``weight`` tons and ``volume`` cubic meters off a route and return
+    the CapacityHold. Raises CapacityError when the route cannot take them.
+    """
+    if weight < 0 or volume < 0:
+        raise ValueError('Reserved capacity must not be negative')
+    hold_seconds = settings.CAPACITY_HOLD_SECONDS if hold_seconds is None else hold_seconds
+    with transaction.atomic():
+        taken = Route.objects.filter(
+            pk=route_id, status='active',
+            available_capacity_weight__gte=weight, available_capacity_volume__gte=volume,
+        ).update(
+            available_capacity_weight=F('available_capacity_weight') - weight,
+            available_capacity_volume=F('available_capacity_volume') - volume,
+            updated_at=timezone.now(),
+        )
+        if not taken:
+            raise CapacityError(f'Route #{route_id} cannot take {weight} t / {volume} m3')
+        hold = CapacityHold.objects.create(
+            route_id=route_id, booking=booking, weight=weight, volume=volume,
+            expires_at=timezone.now() + datetime.timedelta(seconds=hold_seconds),
+        )
+        route_capacity_changed.send(sender=Route, route_id=route_id)
+    return hold
+
+
+def confirm(hold, booking):
+    """Attach a held reservation to its booking so it no longer expires."""
+    confirmed = CapacityHold.objects.filter(pk=hold.pk, status='held').update(
+        status='confirmed', booking=booking, expires_at=None,
+    )
+    if not confirmed:
+        raise HoldExpired(f'Capacity hold #{hold.pk} is no longer held')
+    hold.status, hold.booking, hold.expires_at = 'confirmed', booking, None
+    return hold
+
+
+def release(hold):
+    """Return a hold's capacity to its route; returns False if it was already released."""
+    with transaction.atomic():
+        released = CapacityHold.objects.filter(pk=hold.pk, status__in=('held', 'confirmed')).update(status='released')
+        if not released:
+            return False
+        Route.objects.filter(pk=hold.route_id).update(
+            available_capacity_weight=F('available_capacity_weight') + hold.weight,
+            available_capacity_volume=F('available_capacity_volume') + hold.volume,
+            updated_at=timezone.now(),
+        )
+        route_capacity_changed.send(sender=Route, route_id=hold.route_id)
+    hold.status = 'released'
+    return True
+
+
+def release_for_booking(booking):
+    """Release every active hold of a booking; returns how many were released."""
+    holds = CapacityHold.objects.filter(booking=booking, status__in=('held', 'confirmed'))
+    return sum(release(hold) for hold in holds)
+
+
+def expire_holds(now=None, limit=1000):
+    """Release up to ``limit`` unconfirmed holds past their expiry."""
+    holds = CapacityHold.objects.filter(status='held', expires_at__lte=now or timezone.now()).order_by('expires_at')
+    return sum(release(hold) for hold in holds[:limit])
@@ -0,0 +1,73 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+
+from api.benchmarking import disposable_database, seed_marketplace
+from bookings.capacity import CapacityError, reserve
+from bookings.models import CapacityHold
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = 'Book one route from many threads at once and check that capacity is never oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--attempts', type=int, default=100, help='Reservations tried per thread.')
+        parser.add_argument('--capacity', type=int, default=1000, help='Tons available on the route.')
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            seed_marketplace(10, users=2)
+            route = Route.objects.filter(status='active').first() or Route.objects.first()
+            Route.objects.filter(pk=route.pk).update(
+                status='active', available_capacity_weight=options['capacity'], available_capacity_volume=10 ** 6,
+            )
+            counts = {'reserved': 0, 'refused': 0, 'retried': 0}
+            lock = threading.Lock()
+
+            def book():
+                close_old_connections()
+                for _ in range(options['attempts']):
+                    while True:
+                        try:
+                            reserve(route.pk, Decimal('1'), Decimal('1'))
+                            outcome = 'reserved'
+                        except CapacityError:
+                            outcome = 'refused'
+                        except OperationalError:
+                            # SQLite reports write contention as an error instead of waiting.
+                            with lock:
+                                counts['retried'] += 1
+                            continue
+                        break
+                    with lock:
+                        counts[outcome] += 1
+                connection.close()
+
+            workers = [threading.Thread(target=book) for _ in range(options['threads'])]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            route.refresh_from_db()
+            held = CapacityHold.objects.filter(route=route).count()
+            attempts = options['threads'] * options['attempts']
+            self.stdout.write(f"Attempts: {attempts} from {options['threads']} threads in {elapsed:.2f}s")
+            self.stdout.write(f"Throughput: {attempts / elapsed:,.0f} reservation attempts/s")
+            self.stdout.write(
+                f"Reserved {counts['reserved']}, refused {counts['refused']}, retried {counts['retried']}; "
+                f"{held} holds, {route.available_capacity_weight} t left"
+            )
+            expected = min(attempts, options['capacity'])
+            oversold = counts['reserved'] != expected or held != expected or route.available_capacity_weight < 0
+            if oversold:
+                self.stderr.write('Capacity accounting is inconsistent!')
+            else:
+                self.stdout.write('No overbooking.')
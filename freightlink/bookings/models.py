@@ -1,10 +1,31 @@
 # bookings/models.py
 from django.db import models
-from accounts.models import User
+from accounts.models import USER_DISPLAY_FIELDS, User
 from cargo.models import CargoListing
 from routes.models import Route
+from freightlink.stored_state import LockedSaveModel
 
-class Booking(models.Model):
+
+class BookingQuerySet(models.QuerySet):
+    def for_list(self):
+        """Columns and joins needed to list bookings and render their ``__str__`` without extra queries."""
+        return self.select_related('cargo_listing', 'business', 'truck_owner').only(
+            'cargo_listing', 'route', 'business', 'truck_owner', 'price', 'pickup_date', 'status', 'created_at',
+            'cargo_listing__title',
+            *[f'business__{field}' for field in USER_DISPLAY_FIELDS],
+            *[f'truck_owner__{field}' for field in USER_DISPLAY_FIELDS],
+        )
+
+
+class BookingStatusUpdateQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('updated_by').only(
+            'booking', 'status', 'created_at', 'updated_by',
+            *[f'updated_by__{field}' for field in USER_DISPLAY_FIELDS],
+        )
+
+
+class Booking(LockedSaveModel):
     STATUS_CHOICES = (
         ('pending', 'Pending Approval'),
         ('approved', 'Approved'),
@@ -29,12 +50,24 @@ class Booking(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookingQuerySet.as_manager()
     
     def __str__(self):
         return f"Booking #{self.id} - {self.cargo_listing.title}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dashboards list each party's bookings by status, newest first
+            models.Index(fields=['business', 'status', '-created_at'], name='booking_business_status_idx'),
+            models.Index(fields=['truck_owner', 'status', '-created_at'], name='booking_owner_status_idx'),
+            # Keyset pagination of each party's bookings
+            models.Index(fields=['business', '-created_at', '-id'], name='booking_business_created_idx'),
+            models.Index(fields=['truck_owner', '-created_at', '-id'], name='booking_owner_created_idx'),
+            # Monthly finance exports
+            models.Index(fields=['created_at', 'id'], name='booking_created_idx'),
+        ]
 
 class BookingStatusUpdate(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='status_updates')
@@ -42,9 +75,43 @@ class BookingStatusUpdate(models.Model):
     notes = models.TextField(blank=True, null=True)
     updated_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='status_updates')
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BookingStatusUpdateQuerySet.as_manager()
     
     def __str__(self):
-        return f"Status update for Booking #{self.booking.id}: {self.status}"
+        return f"Status update for Booking #{self.booking_id}: {self.status}"
     
     class Meta:
         ordering = ['-created_at']
+
+
+class CapacityHold(models.Model):
+    """
+    Capacity taken off a route for a pending or confirmed booking.
+
+    A ``held`` reservation expires at ``expires_at`` unless it is confirmed;
+    releasing a hold returns its capacity to the route exactly once.
+    """
+    STATUS_CHOICES = (
+        ('held', 'Held'),
+        ('confirmed', 'Confirmed'),
+        ('released', 'Released'),
+    )
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='capacity_holds')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='capacity_holds', null=True, blank=True)
+    weight = models.DecimalField(max_digits=10, decimal_places=2, help_text='Reserved weight in tons')
+    volume = models.DecimalField(max_digits=10, decimal_places=2, help_text='Reserved volume in cubic meters')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.weight} t / {self.volume} m3 on route #{self.route_id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Expiry sweep
+            models.Index(fields=['status', 'expires_at'], name='hold_status_expiry_idx'),
+        ]
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from trucks.tracking import publish_booking_status
+
+from .capacity import release_for_booking
+from .models import Booking
+
+RELEASING_STATUSES = ('rejected', 'cancelled')
+
+
+@receiver(post_init, sender=Booking)
+def remember_status(sender, instance, **kwargs):
+    instance.loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    # Releasing is idempotent, so re-saving a cancelled booking is harmless.
+    if instance.status in RELEASING_STATUSES:
+        release_for_booking(instance)
+    if not created and instance.status != instance.loaded_status:
+        booking_id, status = instance.pk, instance.status
+        transaction.on_commit(lambda: publish_booking_status(booking_id, status), robust=True)
+    instance.loaded_status = instance.status
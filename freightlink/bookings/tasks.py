@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .capacity import expire_holds
+
+
+@shared_task
+def expire_capacity_holds_task():
+    """Return capacity held by bookings that were never confirmed."""
+    return expire_holds()
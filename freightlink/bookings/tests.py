@@ -1,3 +1,117 @@
-from django.test import TestCase
+import datetime
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from freightlink.testing import create_booking, create_business, create_cargo, create_owner, create_route, create_truck
+
+from .capacity import CapacityError, HoldExpired, confirm, expire_holds, release, reserve, route_capacity_changed
+from .models import CapacityHold
+
+
+def create_full_route(weight=20, volume=60):
+    """A route whose whole truck capacity is still available."""
+    truck = create_truck(create_owner(), capacity_weight=weight, capacity_volume=volume)
+    return create_route(truck, available_capacity_weight=weight, available_capacity_volume=volume)
+
+
+class CapacityReservationTests(TestCase):
+    def setUp(self):
+        self.route = create_full_route()
+
+    def capacity(self):
+        self.route.refresh_from_db()
+        return self.route.available_capacity_weight, self.route.available_capacity_volume
+
+    def test_reserve_takes_capacity(self):
+        hold = reserve(self.route.pk, Decimal('5'), Decimal('10'))
+        self.assertEqual(hold.status, 'held')
+        self.assertEqual(self.capacity(), (Decimal('15'), Decimal('50')))
+
+    def test_reserve_refuses_more_than_available(self):
+        reserve(self.route.pk, Decimal('15'))
+        with self.assertRaises(CapacityError):
+            reserve(self.route.pk, Decimal('6'))
+        self.assertEqual(self.capacity(), (Decimal('5'), Decimal('60')))
+
+    def test_release_returns_capacity_once(self):
+        hold = reserve(self.route.pk, Decimal('5'), Decimal('10'))
+        self.assertTrue(release(hold))
+        self.assertFalse(release(hold))
+        self.assertEqual(self.capacity(), (Decimal('20'), Decimal('60')))
+
+    def test_capacity_changes_are_announced(self):
+        changed = []
+
+        def receiver(sender, route_id, **kwargs):
+            changed.append(route_id)
+
+        route_capacity_changed.connect(receiver)
+        self.addCleanup(route_capacity_changed.disconnect, receiver)
+        hold = reserve(self.route.pk, Decimal('5'))
+        release(hold)
+        release(hold)
+        with self.assertRaises(CapacityError):
+            reserve(self.route.pk, Decimal('50'))
+        self.assertEqual(changed, [self.route.pk, self.route.pk])
+
+    def test_expired_holds_are_released_and_cannot_be_confirmed(self):
+        stale = reserve(self.route.pk, Decimal('5'), hold_seconds=0)
+        fresh = reserve(self.route.pk, Decimal('3'))
+        self.assertEqual(expire_holds(timezone.now() + datetime.timedelta(seconds=1)), 1)
+        self.assertEqual(self.capacity()[0], Decimal('17'))
+        with self.assertRaises(HoldExpired):
+            confirm(stale, None)
+        self.assertEqual(confirm(fresh, None).status, 'confirmed')
+
+    def test_cancelling_a_booking_releases_its_capacity(self):
+        cargo = create_cargo(create_business())
+        hold = reserve(self.route.pk, Decimal('5'))
+        booking = create_booking(cargo, self.route)
+        confirm(hold, booking)
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(CapacityHold.objects.get(pk=hold.pk).status, 'released')
+        self.assertEqual(self.capacity()[0], Decimal('20'))
+
+
+class CapacityContentionTests(TransactionTestCase):
+    """Many threads reserving one route must never take more than it has."""
+
+    threads = 8
+    attempts = 20
+
+    def test_concurrent_reservations_never_oversell(self):
+        route = create_full_route(weight=50, volume=1000)
+        outcomes = []
+        lock = threading.Lock()
+
+        def book():
+            for _ in range(self.attempts):
+                while True:
+                    try:
+                        reserve(route.pk, Decimal('1'), Decimal('1'))
+                        result = 'reserved'
+                    except CapacityError:
+                        result = 'refused'
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; other backends block.
+                        continue
+                    break
+                with lock:
+                    outcomes.append(result)
+            connection.close()
+
+        workers = [threading.Thread(target=book) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        route.refresh_from_db()
+        self.assertEqual(outcomes.count('reserved'), 50)
+        self.assertEqual(route.available_capacity_weight, Decimal('0'))
+        self.assertEqual(CapacityHold.objects.filter(route=route).count(), 50)
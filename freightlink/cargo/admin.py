@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CargoListing
+
+
+@admin.register(CargoListing)
+class CargoListingAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'business', 'weight', 'pickup_date_from', 'pickup_date_to', 'status', 'created_at')
+    list_filter = ('status', 'cargo_type')
+    list_select_related = ('business',)
+    raw_id_fields = ('business',)
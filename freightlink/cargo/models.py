@@ -25,15 +25,16 @@ class CargoListing(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     weight = models.DecimalField(max_digits=9, decimal_places=6)
+    volume = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, help_text='Volume in cubic meters')
     origin_latitude = models.DecimalField(max_digits=9 , decimal_places=6)
     origin_logitude = models.DecimalField(max_digits=9, decimal_places=6)
-    destination_latitude = models.DecimalField(max_digits=9, decimal_places=9)
+    destination_latitude = models.DecimalField(max_digits=9, decimal_places=6)
     destination_longitude = models.DecimalField(max_digits=9, decimal_places=6)
     pickup_date_from = models.DateField()
     pickup_date_to = models.DateField()
     delivery_date_from = models.DateField()
     delivery_date_to = models.DateField()
-    budget = models.DecimalField(max_digits=9 , decimal_places=5 , blank=True, null=True, help_text='maximum budget in KES')
+    budget = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, help_text='maximum budget in KES')
     special_requirements = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,10 +42,17 @@ class CargoListing(models.Model):
 
 
     def __str__(self):
-        return f"{self.title} - {self.origin_name} to {self.destination_name}"
+        return f"{self.title} ({self.get_cargo_type_display()})"
     
-    class meta:
-        oderering = ['-created_at']
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Active cargo by pickup window
+            models.Index(fields=['status', 'pickup_date_from', 'pickup_date_to'], name='cargo_status_pickup_idx'),
+            models.Index(fields=['status', '-created_at'], name='cargo_status_created_idx'),
+            # Rows changed since a process last synced its matching indexes
+            models.Index(fields=['updated_at'], name='cargo_updated_idx'),
+        ]
 
 class CargoPhoto(models.Model):
     cargo = models.ForeignKey(CargoListing, on_delete=models.CASCADE, related_name='photos')
@@ -2,6 +2,7 @@
 ASGI config for freightlink project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP is served by Django; WebSocket connections go to live tracking.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +14,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freightlink.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup: the tracking endpoint and the matching indexes use models.
+from matching.index import warm_indexes_in_background  # noqa: E402
+from trucks.websocket import tracking_application  # noqa: E402
+
+warm_indexes_in_background()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await tracking_application(scope, receive, send)
+    return await django_application(scope, receive, send)
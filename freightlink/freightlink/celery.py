@@ -0,0 +1,17 @@
+import os
+
+from celery import Celery
+from celery.signals import worker_process_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freightlink.settings')
+
+app = Celery('freightlink')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_matching_indexes(**kwargs):
+    """Build each worker process's matching indexes before its first task needs them."""
+    from matching.index import warm_indexes_in_background
+    warm_indexes_in_background()
@@ -0,0 +1,17 @@
+"""
+Admin changelists that load their rows through the model's ``for_list()``
+queryset preset, so each page is a single query over only the listed
+columns. Change forms keep loading whole rows.
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+
+
+class ForListChangeList(ChangeList):
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+
+class ForListAdmin(admin.ModelAdmin):
+    def get_changelist(self, request, **kwargs):
+        return ForListChangeList
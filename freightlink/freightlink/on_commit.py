@@ -0,0 +1,62 @@
+"""
+Batches of follow-up work tied to the transaction that caused them.
+
+Signal handlers queue changes with ``queue_on_commit``; every change queued
+in the same transaction or savepoint lands in one batch, and the batch is
+registered with ``transaction.on_commit``. The batch therefore shares the
+fate of its callback: when the savepoint or transaction rolls back, Django
+drops the callback and the queued changes go with it, instead of leaking
+into whatever commits next on the thread.
+"""
+import threading
+
+from django.db import transaction
+
+
+class CommitBatch:
+    """Items queued in one transaction or savepoint, handed to ``apply`` by ``callback`` when it commits."""
+
+    def __init__(self, apply, items, savepoints, position):
+        self.items = items
+        self.savepoints = savepoints
+        self.position = position
+        self.done = False
+
+        def callback():
+            self.done = True
+            apply(self.items)
+
+        callback.__qualname__ = apply.__qualname__
+        self.callback = callback
+
+    def open_in(self, connection):
+        """Whether more items may still join this batch: same savepoint and still waiting to commit."""
+        if self.done or self.savepoints != tuple(connection.savepoint_ids):
+            return False
+        # A rolled-back savepoint removes its callbacks, so a batch only counts while it is still registered.
+        callbacks = connection.run_on_commit
+        return self.position < len(callbacks) and callbacks[self.position][1] is self.callback
+
+
+_open_batches = threading.local()
+
+
+def queue_on_commit(name, add, factory, apply, using=None):
+    """
+    Queue a change for the batch called ``name`` in the current transaction.
+
+    ``add(items)`` records the change in the batch's items, which start as
+    ``factory()``; ``apply(items)`` runs once the transaction commits. Outside
+    a transaction the batch is applied straight away.
+    """
+    connection = transaction.get_connection(using)
+    batches = _open_batches.__dict__.setdefault(connection.alias, {})
+    batch = batches.get(name)
+    if connection.in_atomic_block and batch is not None and batch.open_in(connection):
+        add(batch.items)
+        return
+    batch = CommitBatch(apply, factory(), tuple(connection.savepoint_ids), len(connection.run_on_commit))
+    add(batch.items)
+    if connection.in_atomic_block:
+        batches[name] = batch
+    transaction.on_commit(batch.callback, using=using, robust=True)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import os
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 #Load environment Variables
@@ -58,12 +59,16 @@ INSTALLED_APPS = [
     'payments',
     'matching',
     'notifications',
+    'reviews',
+    'analytics',
+    'routing',
     'api',
 
 
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -76,6 +81,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'freightlink.urls'
 
+# Request metrics
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0.05'))  # Fraction of requests instrumented
+METRICS_ALLOWED_IPS = ['127.0.0.1']  # Addresses allowed to scrape /metrics
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -179,9 +188,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
 }
+API_MAX_PAGE_SIZE = 1000  # Upper bound for ?page_size= on list endpoints
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per query by streaming exports
+ANALYTICS_CORRIDOR_KM = 25  # Grid cell size grouping route endpoints into corridors
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only in development
@@ -197,6 +209,40 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'nightly-rematch': {
+        'task': 'matching.tasks.rematch_all_task',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'dispatch-notifications': {
+        'task': 'notifications.tasks.dispatch_notifications_task',
+        'schedule': 30.0,
+    },
+    'flush-notification-digests': {
+        'task': 'notifications.tasks.flush_digests_task',
+        'schedule': 300.0,
+    },
+    'expire-capacity-holds': {
+        'task': 'bookings.tasks.expire_capacity_holds_task',
+        'schedule': 60.0,
+    },
+    'rebuild-backhaul-suggestions': {
+        'task': 'matching.tasks.rebuild_backhauls_task',
+        'schedule': 900.0,
+    },
+    'consolidate-tomorrows-departures': {
+        'task': 'matching.tasks.consolidate_departures_task',
+        'schedule': crontab(hour=18, minute=0),
+    },
+    'rebuild-dashboard-stats': {
+        'task': 'accounts.tasks.rebuild_dashboard_stats_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'manage-position-partitions': {
+        'task': 'trucks.tasks.manage_position_partitions_task',
+        'schedule': crontab(hour=0, minute=30),
+    },
+}
 
 # M-Pesa API settings
 MPESA_ENVIRONMENT = 'sandbox'  # Change to 'production' for live environment
@@ -204,7 +250,77 @@ MPESA_CONSUMER_KEY = os.getenv('MPESA_CONSUMER_KEY')
 MPESA_CONSUMER_SECRET = os.getenv('MPESA_CONSUMER_SECRET')
 MPESA_SHORTCODE = os.getenv('MPESA_SHORTCODE')
 MPESA_PASSKEY = os.getenv('MPESA_PASSKEY')
+MPESA_CALLBACK_URL = os.getenv('MPESA_CALLBACK_URL')
+MPESA_MAX_CONCURRENCY = 20  # Simultaneous Daraja requests per process
+MPESA_CALLBACK_QUEUE_PATH = os.getenv('MPESA_CALLBACK_QUEUE_PATH', os.path.join(BASE_DIR, 'var', 'mpesa_callbacks.sqlite3'))
+MPESA_CALLBACK_LEASE_SECONDS = 60  # A queued callback batch is offered to another worker after this long
+MPESA_ORPHAN_CALLBACK_HOURS = 24  # How long a callback that arrived before its payment is matched up later
 
 # Africa's Talking API settings (for SMS)
 AFRICASTALKING_USERNAME = os.getenv('AFRICA_TALKING_USERNAME')
-AFRICASTALKING_API_KEY = os.getenv('AFRICA_TALKING_API_KEY')
\ No newline at end of file
+AFRICASTALKING_API_KEY = os.getenv('AFRICA_TALKING_API_KEY')
+AFRICASTALKING_SENDER_ID = os.getenv('AFRICA_TALKING_SENDER_ID')
+AFRICASTALKING_MAX_RECIPIENTS = 1000  # Recipients per bulk send request
+AFRICASTALKING_REQUESTS_PER_SECOND = 10
+SMS_PROVIDER = 'notifications.sms.AfricasTalkingProvider'
+NOTIFICATION_DIGEST_WINDOW_MINUTES = 60  # At most one digest per user per window
+NOTIFICATION_DIGEST_CHUNK_SIZE = 500  # Users summarized per transaction
+NOTIFICATION_CLAIM_SECONDS = 300  # A crashed dispatcher's claimed notifications are retried after this long
+NOTIFICATION_MAX_ATTEMPTS = 5  # Dispatches a notification may fail before it is skipped for good
+
+# GPS telemetry settings
+TELEMETRY_FLUSH_SIZE = 5000  # Rows per bulk insert
+TELEMETRY_FLUSH_INTERVAL = 0.5  # Max seconds a ping waits in the write buffer
+TELEMETRY_MAX_BUFFER = 200000  # Pings held in memory before the oldest are dropped
+TELEMETRY_MAX_PING_AGE = 7 * 24 * 3600  # Reject fixes older than a week
+TELEMETRY_LAST_POSITION_TTL = 24 * 3600
+TELEMETRY_RETENTION_DAYS = 90
+TRACKING_REDIS_URL = os.getenv('TRACKING_REDIS_URL', os.getenv('REDIS_CACHE_URL'))  # Pub/sub from web workers to ASGI
+TRACKING_CHANNEL = 'freightlink:tracking'
+TRACKING_MAX_BACKLOG = 32  # Queued status events before a slow WebSocket client is closed
+
+# Shared cache; set REDIS_CACHE_URL so every worker shares entries, otherwise each process has its own.
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL'),
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Capacity reservation settings
+CAPACITY_HOLD_SECONDS = 900  # Unconfirmed capacity holds are released after this long
+
+# Route search cache settings
+ROUTE_SEARCH_CACHE_TTL = 300  # Seconds an entry stays in the shared cache
+ROUTE_SEARCH_LOCAL_TTL = 5  # Seconds an entry stays in a worker's memory
+ROUTE_SEARCH_LOCAL_SIZE = 2048  # Entries kept in each worker's LRU
+ROUTE_SEARCH_CORRIDOR_KM = 100  # Size of the origin/destination cells used for invalidation
+ROUTE_SEARCH_MAX_DAYS = 31  # Longer date ranges bypass the cache
+
+# Matching engine settings
+MATCHING_RADIUS_KM = 50  # Max distance between cargo and route endpoints
+MATCHING_CELL_KM = 50  # Grid cell size of the in-process route index
+MATCHING_REGION_KM = 200  # Origin region size used to partition bulk re-matching
+MATCHING_BUCKET_DAYS = 7  # Pickup date bucket used to partition bulk re-matching
+MATCHING_MAX_PER_CARGO = 20  # Suggestions kept per cargo listing
+MATCHING_PARTITIONS_PER_TASK = 50  # Partitions matched by each subtask of the nightly re-match
+MATCHING_CORRIDOR_KM = 20  # Max distance between cargo endpoints and a route's path
+MATCHING_CORRIDOR_CELL_KM = 25  # Grid cell size of the corridor index
+MATCHING_INDEX_SYNC_SECONDS = 15  # How often a process re-reads routes and cargo saved by other processes
+MATCHING_INDEX_SYNC_LAG_SECONDS = 120  # Overlap re-read on every sync, covering transactions that committed late
+MATCHING_INDEX_REBUILD_SECONDS = 3600  # Full background rebuild; also drops rows deleted by other processes
+MATCHING_WARM_INDEXES = True  # Build the indexes when a web or Celery worker starts, not on first use
+BACKHAUL_RADIUS_KM = 50  # Max empty drive from a route's destination to a backhaul pickup
+BACKHAUL_MAX_WAIT_DAYS = 3  # Max days after arrival until a backhaul pickup window opens
+BACKHAUL_MAX_PER_ROUTE = 10  # Backhaul suggestions kept per route
+CONSOLIDATION_OBJECTIVE = 'revenue'  # 'revenue' or 'utilization', when a request does not say
+CONSOLIDATION_TIME_LIMIT_MS = 200  # Search time per route for on-demand load plans
+CONSOLIDATION_MAX_TIME_LIMIT_MS = 2000  # Upper bound for a requested search time
+CONSOLIDATION_BATCH_TIME_LIMIT_MS = 50  # Search time per route in the nightly batch
+CONSOLIDATION_MAX_CANDIDATES = 200  # Compatible cargo considered per route
+
+# Road routing settings
+ROAD_GRAPH_PATH = os.getenv('ROAD_GRAPH_PATH', os.path.join(BASE_DIR, 'var', 'east_africa_roads.npz'))
+ROUTING_MAX_SNAP_KM = 10  # Points further than this from any road get no road distance
+ROUTING_MATRIX_MAX_POINTS = 100  # Origins, and separately destinations, per distance-matrix request
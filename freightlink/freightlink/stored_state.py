@@ -0,0 +1,64 @@
+"""
+The stored state of rows whose saves feed incremental counters.
+
+Counters are kept up to date from the difference between a row's state
+before and after a save. Taking "before" from the instance as it was loaded
+goes wrong as soon as the instance is stale: after ``refresh_from_db()``,
+or when another instance saved the row in between, the same transition is
+counted twice. Tracked models therefore re-read the row, locked, right
+before it is written, and every tracker of the model shares that one read.
+"""
+from types import SimpleNamespace
+
+from django.db import models, router, transaction
+from django.db.models.signals import pre_delete, pre_save
+
+
+class LockedSaveModel(models.Model):
+    """Saves in a transaction, so the row read before the save stays locked until it commits."""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+def _load_stored(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.pk is None:
+        instance._stored = None
+        return
+    # Deletes already run in the collector's transaction and saves in LockedSaveModel's.
+    instance._stored = sender._base_manager.using(using).select_for_update().filter(pk=instance.pk).first()
+
+
+def track(*models):
+    """Read the stored row before every save and delete of ``models``."""
+    for model in models:
+        uid = f'stored-state:{model._meta.label}'
+        pre_save.connect(_load_stored, sender=model, dispatch_uid=uid)
+        pre_delete.connect(_load_stored, sender=model, dispatch_uid=uid)
+
+
+def saved_transition(instance, state, update_fields=None):
+    """
+    Return the ``(old, new)`` ``state()`` of the row a save just wrote; None
+    stands for no row. Fields the save did not write keep their stored value.
+    """
+    stored = getattr(instance, '_stored', None)
+    if stored is None:
+        return None, state(instance)
+    values = dict(stored.__dict__)
+    for field in instance._meta.concrete_fields:
+        written = update_fields is None or field.name in update_fields or field.attname in update_fields
+        if written and field.attname in instance.__dict__:
+            values[field.attname] = instance.__dict__[field.attname]
+    return state(stored), state(SimpleNamespace(**values))
+
+
+def deleted_state(instance, state):
+    """Return ``state()`` of the row a delete just removed, or None if it was already gone."""
+    stored = getattr(instance, '_stored', None)
+    return None if stored is None else state(stored)
@@ -0,0 +1,73 @@
+"""
+Marketplace rows shared by the app test suites: a business and a truck owner,
+a truck, a Nairobi to Mombasa route, a maize listing along it and a booking.
+
+Every helper takes field overrides as keyword arguments.
+"""
+import datetime
+
+from accounts.models import User
+from bookings.models import Booking
+from cargo.models import CargoListing
+from routes.models import Route
+from trucks.models import Truck
+
+DAY = datetime.date(2025, 1, 1)
+NAIROBI = (-1.29, 36.82)
+MOMBASA = (-4.04, 39.67)
+
+
+def create_business(**fields):
+    return User.objects.create(**{'phone_number': '+254700000001', 'user_type': 'business', **fields})
+
+
+def create_owner(**fields):
+    return User.objects.create(**{'phone_number': '+254700000002', 'user_type': 'truck_owner', **fields})
+
+
+def create_truck(owner, **fields):
+    return Truck.objects.create(**{
+        'owner': owner, 'licence_plate': 'KAA001A', 'truck_type': 'lorry', 'capacity_volume': 60,
+        'capacity_weight': 20, **fields,
+    })
+
+
+def route_fields(truck, day=DAY, destination=MOMBASA, **fields):
+    """Field values of a route departing at 08:00 on ``day`` and arriving the same evening."""
+    return {
+        'truck': truck, 'origin_name': 'Nairobi', 'destination_name': 'Mombasa',
+        'origin_latitude': NAIROBI[0], 'origin_longitude': NAIROBI[1],
+        'destination_latitude': destination[0], 'destination_longitude': destination[1],
+        'departure_date': day, 'departure_time': datetime.time(8), 'estimated_arrival_date': day,
+        'estimated_arrival_time': datetime.time(18), 'available_capacity_volume': 60,
+        'available_capacity_weight': 20, 'price_per_km': 100, **fields,
+    }
+
+
+def create_route(truck, day=DAY, destination=MOMBASA, **fields):
+    return Route.objects.create(**route_fields(truck, day, destination, **fields))
+
+
+def create_cargo(business, day=DAY, origin=NAIROBI, destination=MOMBASA, **fields):
+    """A listing picked up and delivered on ``day``."""
+    return CargoListing.objects.create(**{
+        'business': business, 'title': 'Maize', 'description': 'Bags of maize', 'cargo_type': 'general',
+        'weight': 5, 'origin_latitude': origin[0], 'origin_logitude': origin[1],
+        'destination_latitude': destination[0], 'destination_longitude': destination[1],
+        'pickup_date_from': day, 'pickup_date_to': day, 'delivery_date_from': day, 'delivery_date_to': day,
+        **fields,
+    })
+
+
+def booking_fields(cargo, route, **fields):
+    """Field values of a pending booking of ``cargo`` on ``route``, picked up on the departure day."""
+    return {
+        'cargo_listing': cargo, 'route': route, 'business_id': cargo.business_id,
+        'truck_owner_id': route.truck.owner_id, 'price': 1000, 'pickup_date': route.departure_date,
+        'pickup_time': datetime.time(8), 'estimated_delivery_date': route.departure_date,
+        'estimated_delivery_time': datetime.time(18), **fields,
+    }
+
+
+def create_booking(cargo, route, **fields):
+    return Booking.objects.create(**booking_fields(cargo, route, **fields))
@@ -15,8 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from api.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('payments/', include('payments.urls')),
+    path('trucks/', include('trucks.urls')),
+    path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
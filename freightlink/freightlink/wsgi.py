@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'freightlink.settings')
 
 application = get_wsgi_application()
+
+# Imported after setup; each worker process builds its matching indexes before the first request needs them.
+from matching.index import warm_indexes_in_background  # noqa: E402
+
+warm_indexes_in_background()
@@ -0,0 +1,223 @@
+"""
+Backhaul suggestions: cargo a truck can take on near where its current
+route ends, so it does not drive home empty.
+
+Active cargo is indexed by origin cell and by every pickup day, so finding
+the loads near one destination that can be picked up within
+``BACKHAUL_MAX_WAIT_DAYS`` of arrival reads a few dozen buckets. The whole
+in-progress fleet is re-ranked from scratch by ``rebuild_backhaul_suggestions``.
+"""
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cargo.models import CargoListing
+from notifications.digest import record_events
+from routes.models import Route
+
+from .geo import haversine_km
+from .index import CARGO_FIELDS, GridIndex, cargo_entry
+from .models import BackhaulSuggestion
+
+BACKHAUL_ROUTE_FIELDS = (
+    'id',
+    'origin_latitude',
+    'origin_longitude',
+    'destination_latitude',
+    'destination_longitude',
+    'estimated_arrival_date',
+    'estimated_arrival_time',
+    # On the way back the whole truck is free, not just the route's spare capacity.
+    'truck__capacity_weight',
+    'truck__owner_id',
+)
+BACKHAUL_WEIGHTS = {
+    'deadhead': 0.40,
+    'homeward': 0.30,
+    'wait': 0.20,
+    'fill': 0.10,
+}
+# BackhaulSuggestion columns filled from a ScoredBackhaul, in ScoredBackhaul order.
+BACKHAUL_VALUE_FIELDS = ('score', 'deadhead_km', 'wait_hours', 'homeward_km')
+WRITE_BATCH_SIZE = 5000
+
+BackhaulRoute = namedtuple('BackhaulRoute', [
+    'id', 'origin_lat', 'origin_lng', 'dest_lat', 'dest_lng', 'arrival', 'capacity_weight', 'owner_id',
+])
+ScoredBackhaul = namedtuple('ScoredBackhaul', [
+    'route_id', 'cargo_id', 'score', 'deadhead_km', 'wait_hours', 'homeward_km',
+])
+
+
+def backhaul_route(row):
+    """Build a BackhaulRoute from a BACKHAUL_ROUTE_FIELDS row; ``arrival`` is a fractional day ordinal."""
+    arrival_time = row[6]
+    arrival = row[5].toordinal() + (arrival_time.hour * 3600 + arrival_time.minute * 60) / 86400
+    return BackhaulRoute(
+        row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), arrival, float(row[7]), row[8],
+    )
+
+
+def backhaul_feasible(route, cargo, radius_km, max_wait_days):
+    """
+    Exact test shared by the index and the naive scan: the cargo is picked
+    up within ``radius_km`` of where the route ends, fits the truck, and its
+    pickup window is still open at arrival and opens within ``max_wait_days``.
+    """
+    return (
+        cargo.pickup_to + 1 > route.arrival
+        and cargo.pickup_from <= route.arrival + max_wait_days
+        and cargo.weight <= route.capacity_weight
+        and haversine_km(route.dest_lat, route.dest_lng, cargo.origin_lat, cargo.origin_lng) <= radius_km
+    )
+
+
+def score_backhaul(route, cargo, radius_km, max_wait_days):
+    """Score a feasible backhaul from 0 to 100; loads that start close, soon and head home rank first."""
+    deadhead_km = haversine_km(route.dest_lat, route.dest_lng, cargo.origin_lat, cargo.origin_lng)
+    homeward_km = haversine_km(cargo.dest_lat, cargo.dest_lng, route.origin_lat, route.origin_lng)
+    trip_km = max(haversine_km(route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng), 1.0)
+    wait_days = max(cargo.pickup_from - route.arrival, 0.0)
+    score = 100 * (
+        BACKHAUL_WEIGHTS['deadhead'] * (1 - deadhead_km / radius_km)
+        + BACKHAUL_WEIGHTS['homeward'] * (1 - min(homeward_km / trip_km, 1.0))
+        + BACKHAUL_WEIGHTS['wait'] * (1 - wait_days / (max_wait_days + 1))
+        + BACKHAUL_WEIGHTS['fill'] * min(cargo.weight / max(route.capacity_weight, 1e-9), 1.0)
+    )
+    return ScoredBackhaul(route.id, cargo.id, score, deadhead_km, wait_days * 24, homeward_km)
+
+
+def rank_backhauls(route, candidates, radius_km, max_wait_days, limit, excluded=()):
+    """Return the best ``limit`` ScoredBackhaul tuples for feasible ``candidates``, ties by cargo id."""
+    scored = [
+        score_backhaul(route, cargo, radius_km, max_wait_days)
+        for cargo in candidates
+        if (route.id, cargo.id) not in excluded
+    ]
+    scored.sort(key=lambda item: (-item.score, item.cargo_id))
+    return scored[:limit]
+
+
+class BackhaulIndex(GridIndex):
+    """Grid index of cargo keyed by origin cell and every pickup day."""
+
+    fields = CARGO_FIELDS
+    entry_from_row = staticmethod(cargo_entry)
+
+    def __init__(self, cell_km=None, bucket_days=1):
+        super().__init__(cell_km, bucket_days)
+
+    def add_entry(self, cargo):
+        self.add(cargo.id, cargo, ((cargo.origin_lat, cargo.origin_lng),), cargo.pickup_from, cargo.pickup_to)
+
+    def match(self, route, radius_km, max_wait_days):
+        """Return the cargo ``route`` could take on after arriving, in index order."""
+        points = ((route.dest_lat, route.dest_lng),)
+        return [
+            cargo
+            for cargo in self.candidates(points, radius_km, int(route.arrival), int(route.arrival + max_wait_days))
+            if backhaul_feasible(route, cargo, radius_km, max_wait_days)
+        ]
+
+
+def compute_backhauls(routes, cargo, radius_km=None, max_wait_days=None, limit=None, excluded=()):
+    """Return ScoredBackhaul tuples for the best backhauls of every BackhaulRoute."""
+    radius_km = radius_km or settings.BACKHAUL_RADIUS_KM
+    max_wait_days = max_wait_days if max_wait_days is not None else settings.BACKHAUL_MAX_WAIT_DAYS
+    limit = limit or settings.BACKHAUL_MAX_PER_ROUTE
+    index = BackhaulIndex.from_entries(cargo)
+    results = []
+    for route in routes:
+        candidates = index.match(route, radius_km, max_wait_days)
+        results.extend(rank_backhauls(route, candidates, radius_km, max_wait_days, limit, excluded))
+    return results
+
+
+def naive_backhauls(route, cargo, radius_km, max_wait_days):
+    """Reference O(n) scan over CargoEntry tuples, used to check the index."""
+    return [item for item in cargo if backhaul_feasible(route, item, radius_km, max_wait_days)]
+
+
+def build_suggestion(scored):
+    return BackhaulSuggestion(
+        route_id=scored.route_id,
+        cargo_id=scored.cargo_id,
+        **{
+            field: Decimal(f'{value:.2f}')
+            for field, value in zip(BACKHAUL_VALUE_FIELDS, scored[2:])
+        },
+    )
+
+
+def rebuild_backhaul_suggestions(route_ids=None):
+    """
+    Re-rank backhauls for every in-progress route, or only ``route_ids``.
+
+    Pending suggestions that no longer qualify are deleted, changed ones are
+    rescored and new ones are created and announced to the truck owner
+    through their notification digest. Accepted and dismissed suggestions
+    are left alone and never suggested again. Returns a summary dict.
+    """
+    routes = Route.objects.filter(status='in_progress')
+    if route_ids is not None:
+        routes = routes.filter(id__in=route_ids)
+    routes = [
+        backhaul_route(row)
+        for row in routes.order_by().values_list(*BACKHAUL_ROUTE_FIELDS).iterator(chunk_size=WRITE_BATCH_SIZE)
+    ]
+    by_id = {route.id: route for route in routes}
+
+    cargo = []
+    if routes:
+        first_day = datetime.date.fromordinal(int(min(route.arrival for route in routes)))
+        rows = CargoListing.objects.filter(status='active', pickup_date_to__gte=first_day)
+        cargo = [
+            cargo_entry(row)
+            for row in rows.order_by().values_list(*CARGO_FIELDS).iterator(chunk_size=WRITE_BATCH_SIZE)
+        ]
+
+    stale = BackhaulSuggestion.objects.filter(status='pending')
+    if route_ids is not None:
+        stale = stale.filter(route_id__in=route_ids)
+    existing = BackhaulSuggestion.objects.filter(route_id__in=by_id)
+    decided = set(existing.exclude(status='pending').values_list('route_id', 'cargo_id'))
+    scored = compute_backhauls(routes, cargo, excluded=decided)
+    desired = {(item.route_id, item.cargo_id): build_suggestion(item) for item in scored}
+
+    created, rescored = [], []
+    now = timezone.now()
+    with transaction.atomic():
+        # Rebuilds touching the same routes take turns, so each one sees the rows the previous one wrote, and
+        # everything in ``created`` is really inserted and announced once.
+        list(Route.objects.select_for_update().filter(id__in=by_id).order_by('id').values_list('id', flat=True))
+        current = {
+            (suggestion.route_id, suggestion.cargo_id): suggestion
+            for suggestion in existing.select_for_update()
+        }
+        deleted, _ = stale.exclude(id__in=[
+            suggestion.id for key, suggestion in current.items() if key in desired
+        ]).delete()
+        for key, wanted in desired.items():
+            suggestion = current.get(key)
+            if suggestion is None:
+                created.append(wanted)
+            elif suggestion.status != 'pending':
+                continue  # Decided after the scoring read
+            elif any(getattr(suggestion, field) != getattr(wanted, field) for field in BACKHAUL_VALUE_FIELDS):
+                for field in BACKHAUL_VALUE_FIELDS:
+                    setattr(suggestion, field, getattr(wanted, field))
+                suggestion.updated_at = now
+                rescored.append(suggestion)
+        BackhaulSuggestion.objects.bulk_create(created, batch_size=WRITE_BATCH_SIZE)
+        BackhaulSuggestion.objects.bulk_update(
+            rescored, BACKHAUL_VALUE_FIELDS + ('updated_at',), batch_size=WRITE_BATCH_SIZE,
+        )
+        record_events((by_id[item.route_id].owner_id, 'backhaul', item.cargo_id) for item in created)
+    return {
+        'routes': len(routes), 'cargo': len(cargo), 'created': len(created),
+        'rescored': len(rescored), 'deleted': deleted,
+    }
@@ -0,0 +1,109 @@
+"""Full re-matching of every active cargo listing against every active route."""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from cargo.models import CargoListing
+from routes.models import Route
+
+from .index import CARGO_FIELDS, ROUTE_FIELDS, CargoEntry, RouteEntry, cargo_entry, route_entry
+from .models import RouteMatch
+from .partition import match_partition, partition_work
+
+WRITE_BATCH_SIZE = 5000
+# RouteMatch columns filled from a ScoredRoute, in ScoredRoute order.
+MATCH_VALUE_FIELDS = (
+    'match_score',
+    'price_estimate',
+    'distance_km',
+    'pickup_deviation_km',
+    'delivery_deviation_km',
+)
+
+
+def load_active_cargo():
+    rows = CargoListing.objects.filter(status='active').order_by().values_list(*CARGO_FIELDS)
+    return [cargo_entry(row) for row in rows.iterator(chunk_size=WRITE_BATCH_SIZE)]
+
+
+def load_active_routes():
+    rows = Route.objects.filter(status='active').order_by().values_list(*ROUTE_FIELDS)
+    return [route_entry(row) for row in rows.iterator(chunk_size=WRITE_BATCH_SIZE)]
+
+
+def partition_tasks(cargo, routes, limit=None, radius_km=None):
+    """Return the ``match_partition()`` task of every independent partition of the join."""
+    radius_km = radius_km or settings.MATCHING_RADIUS_KM
+    limit = limit or settings.MATCHING_MAX_PER_CARGO
+    return [
+        (members, selected, radius_km, settings.MATCHING_CELL_KM, limit)
+        for members, selected in partition_work(
+            cargo, routes, settings.MATCHING_REGION_KM, settings.MATCHING_BUCKET_DAYS, radius_km,
+        )
+    ]
+
+
+def match_serialized_partitions(tasks):
+    """Run ``match_partition()`` over tasks that went through JSON, which turned every entry into a list."""
+    return [
+        row
+        for cargo, routes, *params in tasks
+        for row in match_partition(
+            ([CargoEntry(*item) for item in cargo], [RouteEntry(*item) for item in routes], *params),
+        )
+    ]
+
+
+def compute_all_matches(cargo, routes, workers=None, limit=None, radius_km=None):
+    """
+    Return ``(cargo_id, route_id, score, price, distance, pickup_km, delivery_km)``
+    tuples for the best feasible routes of every cargo entry.
+
+    Partitions are fanned out over a process pool; ``workers=1`` runs them
+    inline, which is what tests and the consistency checker use.
+    """
+    tasks = partition_tasks(cargo, routes, limit, radius_km)
+    if workers == 1:
+        results = map(match_partition, tasks)
+        return [row for part in results for row in part]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(match_partition, tasks, chunksize=max(1, len(tasks) // 256))
+        return [row for part in results for row in part]
+
+
+def build_route_match(row):
+    """Build an unsaved RouteMatch from a compute_all_matches() result tuple."""
+    cargo_id, route_id, *values = row
+    return RouteMatch(
+        cargo_id=cargo_id,
+        route_id=route_id,
+        **{field: Decimal(f'{value:.2f}') for field, value in zip(MATCH_VALUE_FIELDS, values)},
+    )
+
+
+def replace_pending_matches(matches):
+    """Replace every pending RouteMatch with ``matches``; return how many were deleted."""
+    with transaction.atomic():
+        deleted, _ = RouteMatch.objects.filter(status='pending').delete()
+        for start in range(0, len(matches), WRITE_BATCH_SIZE):
+            RouteMatch.objects.bulk_create(
+                [build_route_match(row) for row in matches[start:start + WRITE_BATCH_SIZE]],
+                ignore_conflicts=True,
+            )
+    return deleted
+
+
+def rematch_all(workers=None, limit=None):
+    """
+    Recompute every pending RouteMatch from scratch.
+
+    Pending suggestions are replaced wholesale; accepted, rejected and expired
+    rows are left alone and are not re-suggested.
+    """
+    cargo = load_active_cargo()
+    routes = load_active_routes()
+    matches = compute_all_matches(cargo, routes, workers=workers, limit=limit)
+    deleted = replace_pending_matches(matches)
+    return {'cargo': len(cargo), 'routes': len(routes), 'matches': len(matches), 'deleted': deleted}
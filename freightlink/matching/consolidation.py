@@ -0,0 +1,171 @@
+"""
+Load consolidation: the set of compatible cargo that best fills a route.
+
+Cargo is compatible with a route when it is picked up and dropped off along
+the route's path (see ``corridor.py``) and its pickup window covers the
+departure day. Choosing among it is a two-dimensional knapsack over the
+route's spare weight and volume (see ``knapsack.py``), maximizing either the
+revenue earned or the share of capacity filled. Cargo without a volume only
+counts against the weight limit.
+"""
+import datetime
+import math
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cargo.models import CargoListing
+from routes.models import Route
+
+from .corridor import CORRIDOR_FIELDS, CorridorIndex, corridor_entry
+from .geo import KM_PER_DEGREE
+from .index import CARGO_FIELDS, cargo_entry
+from .knapsack import Item, solve
+from .models import ConsolidationPlan
+
+CONSOLIDATION_ROUTE_FIELDS = CORRIDOR_FIELDS + ('available_capacity_volume', 'price_per_km')
+CONSOLIDATION_CARGO_FIELDS = CARGO_FIELDS + ('volume',)
+WRITE_BATCH_SIZE = 1000
+
+RoutePlan = namedtuple('RoutePlan', [
+    'route_id', 'objective', 'cargo_ids', 'revenue', 'weight', 'volume', 'optimal',
+])
+
+
+def cargo_price(price_per_km, match, budget):
+    """What the carrier earns: its rate over the distance carried, capped by the shipper's budget."""
+    price = price_per_km * (match.delivery_along_km - match.pickup_along_km)
+    return min(price, budget) if budget else price
+
+
+def consolidation_items(capacity_weight, capacity_volume, candidates, objective):
+    """
+    Knapsack Items for ``(CargoEntry, volume, price)`` candidates.
+
+    Only the ``CONSOLIDATION_MAX_CANDIDATES`` worth most per unit of
+    capacity are kept; the rest would rarely make the cut and each one
+    doubles the worst case of the exact search.
+    """
+    items = []
+    for cargo, volume, price in candidates:
+        if objective == 'utilization':
+            value = cargo.weight / capacity_weight + (volume / capacity_volume if capacity_volume else 0.0)
+        else:
+            value = price
+        items.append(Item(cargo.id, cargo.weight, volume, value))
+    items.sort(key=lambda item: -item.value / max(
+        item.weight / capacity_weight + (item.volume / capacity_volume if capacity_volume else 0.0), 1e-9,
+    ))
+    return items[:settings.CONSOLIDATION_MAX_CANDIDATES]
+
+
+def _load_cargo(routes):
+    """Active cargo that could ride on any of ``routes``: ``{id: (CargoEntry, volume)}``."""
+    first = min(route.departure for route, _, _ in routes)
+    last = max(route.departure for route, _, _ in routes)
+    rows = CargoListing.objects.filter(
+        status='active',
+        pickup_date_from__lte=datetime.date.fromordinal(last),
+        pickup_date_to__gte=datetime.date.fromordinal(first),
+        weight__lte=max(route.capacity_weight for route, _, _ in routes),
+    )
+    if len(routes) == 1:
+        # One route only needs the cargo picked up inside its path's buffered bounding box.
+        latitudes, longitudes = zip(*routes[0][0].points)
+        pad = settings.MATCHING_CORRIDOR_KM / KM_PER_DEGREE
+        # A degree of longitude is shortest at the latitude furthest from the equator.
+        widest = math.radians(min(max(abs(lat) for lat in latitudes) + pad, 89.0))
+        lng_pad = pad / max(math.cos(widest), 0.01)
+        rows = rows.filter(
+            origin_latitude__range=(min(latitudes) - pad, max(latitudes) + pad),
+            origin_logitude__range=(min(longitudes) - lng_pad, max(longitudes) + lng_pad),
+        )
+    return {
+        row[0]: (cargo_entry(row[:-1]), float(row[-1] or 0))
+        for row in rows.order_by().values_list(*CONSOLIDATION_CARGO_FIELDS).iterator(chunk_size=5000)
+    }
+
+
+def plan_routes(queryset, objective=None, time_limit_ms=None):
+    """
+    Return a RoutePlan for every route in ``queryset``.
+
+    Each route's search stops after ``time_limit_ms``; ``RoutePlan.optimal``
+    says whether it finished and proved its plan the best there is.
+    """
+    objective = objective or settings.CONSOLIDATION_OBJECTIVE
+    time_limit_ms = time_limit_ms or settings.CONSOLIDATION_TIME_LIMIT_MS
+    routes = [
+        (corridor_entry(row[:len(CORRIDOR_FIELDS)]), float(row[-2]), float(row[-1]))
+        for row in queryset.order_by().values_list(*CONSOLIDATION_ROUTE_FIELDS).iterator(chunk_size=5000)
+    ]
+    if not routes:
+        return []
+    cargo = _load_cargo(routes)
+    index = CorridorIndex.from_entries(route for route, _, _ in routes)
+    candidates = {route.id: [] for route, _, _ in routes}
+    price_per_km = {route.id: price for route, _, price in routes}
+    for entry, volume in cargo.values():
+        for match in index.match(entry):
+            price = cargo_price(price_per_km[match.route_id], match, entry.budget)
+            candidates[match.route_id].append((entry, volume, price))
+
+    plans = []
+    for route, capacity_volume, _ in routes:
+        prices = {entry.id: price for entry, _, price in candidates[route.id]}
+        items = consolidation_items(route.capacity_weight, capacity_volume, candidates[route.id], objective)
+        packing = solve(items, route.capacity_weight, capacity_volume, time_limit_ms / 1000)
+        plans.append(RoutePlan(
+            route.id, objective, packing.ids, sum(prices[cargo_id] for cargo_id in packing.ids),
+            packing.weight, packing.volume, packing.optimal,
+        ))
+    return plans
+
+
+def save_plans(plans):
+    """Replace the stored ConsolidationPlan of every planned route; returns the new plans."""
+    through = ConsolidationPlan.cargo.through
+    with transaction.atomic():
+        ConsolidationPlan.objects.filter(route_id__in=[plan.route_id for plan in plans]).delete()
+        created = ConsolidationPlan.objects.bulk_create([
+            ConsolidationPlan(
+                route_id=plan.route_id, objective=plan.objective, revenue=Decimal(f'{plan.revenue:.2f}'),
+                weight=Decimal(f'{plan.weight:.2f}'), volume=Decimal(f'{plan.volume:.2f}'), optimal=plan.optimal,
+            )
+            for plan in plans
+        ], batch_size=WRITE_BATCH_SIZE)
+        through.objects.bulk_create([
+            through(consolidationplan_id=stored.id, cargolisting_id=cargo_id)
+            for stored, plan in zip(created, plans)
+            for cargo_id in plan.cargo_ids
+        ], batch_size=WRITE_BATCH_SIZE)
+    return created
+
+
+def consolidate_route(route_id, objective=None, time_limit_ms=None):
+    """Plan and store one route's load; returns its ConsolidationPlan, or None if the route does not exist."""
+    plans = plan_routes(Route.objects.filter(id=route_id), objective, time_limit_ms)
+    return save_plans(plans)[0] if plans else None
+
+
+def consolidate_departures(day=None, objective=None, time_limit_ms=None):
+    """
+    Plan and store the load of every active route departing on ``day``,
+    tomorrow by default. Returns a summary dict.
+    """
+    day = day or timezone.localdate() + datetime.timedelta(days=1)
+    plans = plan_routes(
+        Route.objects.filter(status='active', departure_date=day),
+        objective, time_limit_ms or settings.CONSOLIDATION_BATCH_TIME_LIMIT_MS,
+    )
+    save_plans(plans)
+    return {
+        'routes': len(plans),
+        'loaded': sum(1 for plan in plans if plan.cargo_ids),
+        'cargo': sum(len(plan.cargo_ids) for plan in plans),
+        'optimal': sum(1 for plan in plans if plan.optimal),
+        'revenue': round(sum(plan.revenue for plan in plans), 2),
+    }
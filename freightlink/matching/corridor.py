@@ -0,0 +1,287 @@
+"""
+Route path geometry and the corridor index.
+
+A route's planned path is a simplified polyline stored on ``Route.path``
+in the encoded polyline format (1e-5 degree precision); routes without one
+are treated as a straight line between their endpoints. The corridor index
+files every route under each grid cell within ``MATCHING_CORRIDOR_KM`` of
+its path, together with the range of path segments that pass near that
+cell. Cargo picked up and dropped off along the way is then found with two
+bucket lookups, and only those few segments are measured exactly.
+"""
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from routing.network import get_road_network
+
+from .geo import KM_PER_DEGREE, grid_cell, haversine_km
+from .index import GridIndex, _load_index
+
+CORRIDOR_FIELDS = (
+    'id',
+    'origin_latitude',
+    'origin_longitude',
+    'destination_latitude',
+    'destination_longitude',
+    'path',
+    'departure_date',
+    'available_capacity_weight',
+)
+WRITE_BATCH_SIZE = 500
+# Detail below this is dropped from stored paths; it is far finer than the corridor width.
+PATH_TOLERANCE_KM = 0.5
+
+CorridorEntry = namedtuple('CorridorEntry', ['id', 'departure', 'capacity_weight', 'points', 'along'])
+CorridorMatch = namedtuple('CorridorMatch', [
+    'route_id', 'pickup_km', 'delivery_km', 'pickup_along_km', 'delivery_along_km',
+])
+
+
+def encode_polyline(points):
+    """Encode ``(lat, lng)`` points with the encoded polyline algorithm."""
+    chunks = []
+    previous = (0, 0)
+    for point in points:
+        current = (round(point[0] * 1e5), round(point[1] * 1e5))
+        for value in (current[0] - previous[0], current[1] - previous[1]):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous = current
+    return ''.join(chunks)
+
+
+def decode_polyline(text):
+    """Decode an encoded polyline into ``(lat, lng)`` points."""
+    points = []
+    coordinates = [0, 0]
+    position = 0
+    while position < len(text):
+        for axis in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(text[position]) - 63
+                position += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            coordinates[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append((coordinates[0] / 1e5, coordinates[1] / 1e5))
+    return points
+
+
+def simplify_path(points, tolerance_km=PATH_TOLERANCE_KM):
+    """Douglas-Peucker simplification: drop points within ``tolerance_km`` of the line that replaces them."""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        furthest, distance = None, tolerance_km
+        for index in range(first + 1, last):
+            offset = _segment_offset(points[index], points[first], points[last])[0]
+            if offset > distance:
+                furthest, distance = index, offset
+        if furthest is not None:
+            keep[furthest] = True
+            stack.extend(((first, furthest), (furthest, last)))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _segment_offset(point, start, end):
+    """``(km, fraction)``: distance from ``point`` to a segment and how far along it the closest point lies."""
+    # Flat projection centred on the point; segments are short next to the earth's radius.
+    scale = math.cos(math.radians(point[0])) * KM_PER_DEGREE
+    ax, ay = (start[1] - point[1]) * scale, (start[0] - point[0]) * KM_PER_DEGREE
+    dx, dy = (end[1] - start[1]) * scale, (end[0] - start[0]) * KM_PER_DEGREE
+    length = dx * dx + dy * dy
+    fraction = min(max(-(ax * dx + ay * dy) / length, 0.0), 1.0) if length else 0.0
+    return math.hypot(ax + fraction * dx, ay + fraction * dy), fraction
+
+
+def route_path(origin, destination, encoded):
+    """The points of a route's path, or the straight line between its endpoints if none is stored."""
+    return decode_polyline(encoded) if encoded else [origin, destination]
+
+
+def corridor_entry(row):
+    """Build a CorridorEntry from a CORRIDOR_FIELDS row; ``along`` is the path distance to each point."""
+    route_id, olat, olng, dlat, dlng, encoded, departure, capacity_weight = row
+    points = route_path((float(olat), float(olng)), (float(dlat), float(dlng)), encoded)
+    along = [0.0]
+    for start, end in zip(points, points[1:]):
+        along.append(along[-1] + haversine_km(*start, *end))
+    return CorridorEntry(route_id, departure.toordinal(), float(capacity_weight), tuple(points), tuple(along))
+
+
+def _pieces(points, max_km):
+    """Yield ``(segment, start, end)`` for the path cut into pieces no longer than ``max_km``."""
+    for segment, (start, end) in enumerate(zip(points, points[1:])):
+        count = max(1, math.ceil(haversine_km(*start, *end) / max_km))
+        for piece in range(count):
+            yield segment, *(
+                (start[0] + (end[0] - start[0]) * step / count, start[1] + (end[1] - start[1]) * step / count)
+                for step in (piece, piece + 1)
+            )
+
+
+def _claim(cells, box, segments, pad_km, cell_km):
+    """Claim the cells under a ``[min lat, max lat, min lng, max lng]`` box widened by ``pad_km``."""
+    lat_pad = pad_km / KM_PER_DEGREE
+    # A degree of longitude is shortest at the edge furthest from the equator.
+    widest = math.radians(min(max(abs(box[0]), abs(box[1])) + lat_pad, 89.0))
+    lng_pad = lat_pad / max(math.cos(widest), 0.01)
+    first_row, first_col = grid_cell(box[0] - lat_pad, box[2] - lng_pad, cell_km)
+    last_row, last_col = grid_cell(box[1] + lat_pad, box[3] + lng_pad, cell_km)
+    for row in range(first_row, last_row + 1):
+        for col in range(first_col, last_col + 1):
+            cells[(row, col)] = (cells.get((row, col), segments)[0], segments[1])
+
+
+def corridor_cells(points, buffer_km, cell_km):
+    """
+    Return ``{cell: (first segment, last segment)}`` for every cell within ``buffer_km`` of the path.
+
+    The path is cut into runs whose bounding box fits in a cell, and each
+    run claims the cells under its box widened by ``buffer_km``. Claiming
+    per run rather than per segment keeps winding paths cheap to index.
+    """
+    span = cell_km / KM_PER_DEGREE
+    cells = {}
+    box = first = last = None
+    for segment, start, end in _pieces(points, cell_km):
+        if box is not None:
+            grown = [min(box[0], end[0]), max(box[1], end[0]), min(box[2], end[1]), max(box[3], end[1])]
+            if grown[1] - grown[0] <= span and grown[3] - grown[2] <= span:
+                box, last = grown, segment
+                continue
+            _claim(cells, box, (first, last), buffer_km, cell_km)
+        box = [min(start[0], end[0]), max(start[0], end[0]), min(start[1], end[1]), max(start[1], end[1])]
+        first = last = segment
+    if box is not None:
+        _claim(cells, box, (first, last), buffer_km, cell_km)
+    return cells
+
+
+def locate(route, lat, lng, first=0, last=None):
+    """``(km off the path, km along it)`` for the closest point of segments ``first..last`` of a CorridorEntry."""
+    last = len(route.points) - 2 if last is None else last
+    best = (math.inf, 0.0)
+    for segment in range(first, last + 1):
+        offset, fraction = _segment_offset((lat, lng), route.points[segment], route.points[segment + 1])
+        if offset < best[0]:
+            start, end = route.along[segment], route.along[segment + 1]
+            best = (offset, start + fraction * (end - start))
+    return best
+
+
+def corridor_match(route, cargo, buffer_km, pickup_segments=None, delivery_segments=None):
+    """
+    Return a CorridorMatch if ``route`` passes within ``buffer_km`` of the
+    cargo's origin and then of its destination, else None.
+
+    The segment ranges restrict the exact test to the segments the index
+    found near each end; without them the whole path is measured.
+    """
+    if not (cargo.pickup_from <= route.departure <= cargo.pickup_to and route.capacity_weight >= cargo.weight):
+        return None
+    pickup = locate(route, cargo.origin_lat, cargo.origin_lng, *(pickup_segments or ()))
+    if pickup[0] > buffer_km:
+        return None
+    delivery = locate(route, cargo.dest_lat, cargo.dest_lng, *(delivery_segments or ()))
+    if delivery[0] > buffer_km or delivery[1] <= pickup[1]:
+        return None
+    return CorridorMatch(route.id, pickup[0], delivery[0], pickup[1], delivery[1])
+
+
+class CorridorIndex(GridIndex):
+    """Grid index of routes keyed by every cell along their buffered path and their departure week."""
+
+    fields = CORRIDOR_FIELDS
+    entry_from_row = staticmethod(corridor_entry)
+
+    def __init__(self, cell_km=None, buffer_km=None, bucket_days=7):
+        super().__init__(cell_km or settings.MATCHING_CORRIDOR_CELL_KM, bucket_days)
+        self.buffer_km = buffer_km or settings.MATCHING_CORRIDOR_KM
+
+    def add_entry(self, route):
+        day = route.departure // self.bucket_days
+        self._store(route.id, [
+            (cell + (day,), (route, segments))
+            for cell, segments in corridor_cells(route.points, self.buffer_km, self.cell_km).items()
+        ])
+
+    def get(self, entry_id):
+        found = super().get(entry_id)
+        return found[0] if found else None
+
+    def match(self, cargo):
+        """Return CorridorMatch tuples for the routes passing the cargo's origin and then its destination."""
+        pickup_cell = self._cell(cargo.origin_lat, cargo.origin_lng)
+        delivery_cell = self._cell(cargo.dest_lat, cargo.dest_lng)
+        matches = []
+        for day in self._day_buckets(cargo.pickup_from, cargo.pickup_to):
+            pickups = self._buckets.get(pickup_cell + (day,))
+            deliveries = self._buckets.get(delivery_cell + (day,))
+            if not pickups or not deliveries:
+                continue
+            if len(deliveries) < len(pickups):
+                pairs = ((route_id, pickups.get(route_id), found) for route_id, found in deliveries.items())
+            else:
+                pairs = ((route_id, found, deliveries.get(route_id)) for route_id, found in pickups.items())
+            for route_id, pickup, delivery in pairs:
+                # Skip routes that only reach the delivery cell before the pickup cell.
+                if pickup is None or delivery is None or delivery[1][1] < pickup[1][0]:
+                    continue
+                match = corridor_match(pickup[0], cargo, self.buffer_km, pickup[1], delivery[1])
+                if match:
+                    matches.append(match)
+        return matches
+
+
+def get_corridor_index():
+    """Return the process-wide corridor index of active routes, building it on first use."""
+    from routes.models import Route
+    return _load_index('corridor', CorridorIndex, Route.objects.filter(status='active'))
+
+
+def plan_route_paths(queryset, chunk_size=WRITE_BATCH_SIZE):
+    """
+    Store the simplified fastest road path on every route in ``queryset``.
+
+    Routes the road network cannot connect keep an empty path, i.e. a
+    straight line. This writes with bulk_update, so processes that already
+    built their corridor index only see the new paths once it is rebuilt.
+    Returns ``(planned, unroutable)`` counts; raises OSError without a road graph.
+    """
+    from routes.models import Route
+
+    network = get_road_network()
+    planned = unroutable = 0
+    rows = queryset.order_by().values_list(
+        'id', 'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+    )
+    batch = []
+    for route_id, olat, olng, dlat, dlng in rows.iterator(chunk_size=chunk_size):
+        points = network.path((float(olat), float(olng)), (float(dlat), float(dlng)))
+        if points is None:
+            unroutable += 1
+            continue
+        batch.append(Route(id=route_id, path=encode_polyline(simplify_path(points))))
+        planned += 1
+        if len(batch) >= chunk_size:
+            with transaction.atomic():
+                Route.objects.bulk_update(batch, ['path'])
+            batch = []
+    if batch:
+        with transaction.atomic():
+            Route.objects.bulk_update(batch, ['path'])
+    return planned, unroutable
@@ -0,0 +1,64 @@
+from django.conf import settings
+
+from .corridor import corridor_match, get_corridor_index
+from .index import (
+    CargoEntry, RouteEntry, cargo_entry_from_model, get_cargo_index, get_route_index, route_matches_cargo,
+)
+
+
+def find_candidate_routes(cargo, radius_km=None):
+    """
+    Return the active routes (as RouteEntry tuples) that can take a CargoListing.
+
+    A route qualifies when its origin and destination both lie within
+    ``radius_km`` of the cargo's, it departs inside the cargo's pickup window
+    and it has enough weight capacity left.
+    """
+    return get_route_index().match(cargo_entry_from_model(cargo), radius_km)
+
+
+def naive_candidate_routes(routes, cargo, radius_km=None):
+    """Reference O(n) scan over RouteEntry tuples, used to check the index."""
+    radius_km = radius_km or settings.MATCHING_RADIUS_KM
+    return [route for route in routes if route_matches_cargo(route, cargo, radius_km)]
+
+
+def search_routes(origin, destination, first_day, last_day, weight=0, radius_km=None):
+    """Return ids of active routes between two ``(lat, lng)`` points departing within the date range."""
+    cargo = CargoEntry(
+        None, origin[0], origin[1], destination[0], destination[1],
+        first_day.toordinal(), last_day.toordinal(), weight, None,
+    )
+    return [route.id for route in get_route_index().match(cargo, radius_km)]
+
+
+def search_cargo(origin, destination, day, capacity_weight, radius_km=None):
+    """Return ids of active cargo a truck leaving on ``day`` with ``capacity_weight`` tons could carry."""
+    route = RouteEntry(
+        None, origin[0], origin[1], destination[0], destination[1],
+        day.toordinal(), capacity_weight, 0.0, 0.0, 0.0,
+    )
+    return [cargo.id for cargo in get_cargo_index().match(route, radius_km)]
+
+
+def find_corridor_routes(cargo):
+    """
+    Return CorridorMatch tuples for active routes whose path passes the cargo's
+    origin and then its destination within ``MATCHING_CORRIDOR_KM``.
+    """
+    return get_corridor_index().match(cargo_entry_from_model(cargo))
+
+
+def naive_corridor_routes(routes, cargo, buffer_km=None):
+    """Reference scan measuring every CorridorEntry's whole path, used to check the corridor index."""
+    buffer_km = buffer_km or settings.MATCHING_CORRIDOR_KM
+    return [match for match in (corridor_match(route, cargo, buffer_km) for route in routes) if match]
+
+
+def search_routes_along_path(origin, destination, first_day, last_day, weight=0):
+    """Return ids of active routes passing ``origin`` and then ``destination`` and departing within the date range."""
+    cargo = CargoEntry(
+        None, origin[0], origin[1], destination[0], destination[1],
+        first_day.toordinal(), last_day.toordinal(), weight, None,
+    )
+    return [match.route_id for match in get_corridor_index().match(cargo)]
@@ -0,0 +1,34 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres between two lat/lng points."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_cell(lat, lng, cell_km):
+    """Return the (row, col) of the roughly square grid cell containing a point."""
+    return math.floor(lat * KM_PER_DEGREE / cell_km), math.floor(lng * KM_PER_DEGREE / cell_km)
+
+
+def cell_span(lat, radius_km, cell_km):
+    """Return how many (rows, cols) away from a cell at ``lat`` a radius can reach."""
+    # A degree of longitude shrinks away from the equator.
+    return (
+        math.ceil(radius_km / cell_km),
+        math.ceil(radius_km / (cell_km * max(math.cos(math.radians(lat)), 0.01))),
+    )
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return the ``((min lat, max lat), (min lng, max lng))`` box around a circle of ``radius_km``."""
+    pad = radius_km / KM_PER_DEGREE
+    # A degree of longitude is shortest at the edge of the box furthest from the equator.
+    lng_pad = pad / max(math.cos(math.radians(min(abs(lat) + pad, 89.0))), 0.01)
+    return (lat - pad, lat + pad), (lng - lng_pad, lng + lng_pad)
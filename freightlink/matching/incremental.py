@@ -0,0 +1,264 @@
+"""
+Incremental maintenance of RouteMatch suggestions.
+
+Route and CargoListing saves and deletes are batched per transaction and
+applied when it commits, so a burst of saves to one object costs a single
+recompute and a rolled-back save costs nothing. Only the cargo whose
+candidate routes can have changed is re-ranked, and only the suggestions
+that differ are written.
+
+Each process keeps its own indexes. Changes committed here are filed into
+them straight away; those committed by other processes arrive through the
+periodic sync in ``index.py``. A process whose indexes are not built yet
+does not build them inside the commit hook: it ranks the changes against
+just the nearby rows, read from the database. ``QuerySet.update()`` sends
+no signals; ``check_matches`` and the nightly ``rematch_all`` job reconcile
+the stored suggestions this path misses.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cargo.models import CargoListing
+from freightlink.on_commit import queue_on_commit
+from notifications.digest import record_events
+from routes.models import Route
+
+from .bulk import MATCH_VALUE_FIELDS, build_route_match, compute_all_matches, load_active_cargo, load_active_routes
+from .corridor import CORRIDOR_FIELDS, corridor_entry
+from .geo import bounding_box
+from .index import (
+    CARGO_FIELDS, ROUTE_FIELDS, CargoIndex, RouteIndex, cargo_entry, loaded_index, route_entry,
+)
+from .models import RouteMatch
+from .scoring import columns_from_entries, top_k
+
+# Marks an object whose indexed state was unknown when its change was queued.
+UNKNOWN = object()
+
+
+def _indexed_state(name, object_id):
+    index = loaded_index(name)
+    return UNKNOWN if index is None else index.get(object_id)
+
+
+def _no_changes():
+    return {}, {}
+
+
+def _apply_batch(batch):
+    apply_changes(*batch)
+
+
+def queue_route_change(route_id):
+    """Schedule a route for re-matching once the current transaction commits."""
+    queue_on_commit(
+        'route_matches', lambda batch: batch[0].setdefault(route_id, _indexed_state('route', route_id)),
+        _no_changes, _apply_batch,
+    )
+
+
+def queue_cargo_change(cargo_id):
+    """Schedule a cargo listing for re-matching once the current transaction commits."""
+    queue_on_commit(
+        'route_matches', lambda batch: batch[1].setdefault(cargo_id, _indexed_state('cargo', cargo_id)),
+        _no_changes, _apply_batch,
+    )
+
+
+def _active_entries(model, fields, build, ids):
+    rows = model.objects.filter(id__in=ids, status='active').order_by().values_list(*fields)
+    return {row[0]: build(row) for row in rows}
+
+
+def _near(lat_field, lng_field, lat, lng, radius_km):
+    """Q for rows whose point lies in the bounding box of a ``radius_km`` circle around ``(lat, lng)``."""
+    lat_range, lng_range = bounding_box(lat, lng, radius_km)
+    return Q(**{f'{lat_field}__range': lat_range, f'{lng_field}__range': lng_range})
+
+
+def _nearby_cargo_index(routes, cargo_ids, radius_km):
+    """A CargoIndex of ``cargo_ids`` and the active cargo that could ride on any of the RouteEntry ``routes``."""
+    condition = Q(id__in=cargo_ids)
+    for route in routes:
+        day = datetime.date.fromordinal(route.departure)
+        condition |= _near('origin_latitude', 'origin_logitude', route.origin_lat, route.origin_lng, radius_km) & Q(
+            pickup_date_from__lte=day, pickup_date_to__gte=day, weight__lte=route.capacity_weight,
+        )
+    return CargoIndex.from_queryset(CargoListing.objects.filter(condition, status='active'))
+
+
+def _nearby_route_index(cargo, radius_km):
+    """A RouteIndex of the active routes that could carry any of the CargoEntry ``cargo``."""
+    condition = Q(pk__in=[])
+    for item in cargo:
+        window = (datetime.date.fromordinal(item.pickup_from), datetime.date.fromordinal(item.pickup_to))
+        condition |= _near('origin_latitude', 'origin_longitude', item.origin_lat, item.origin_lng, radius_km) & Q(
+            departure_date__range=window,
+            available_capacity_weight__gte=item.weight,
+        )
+    return RouteIndex.from_queryset(Route.objects.filter(condition, status='active'))
+
+
+def apply_changes(routes, cargo):
+    """
+    Update the indexes and suggestions for changed routes and cargo.
+
+    ``routes`` and ``cargo`` map object ids to the entry that was indexed
+    before the change: None if it was not indexed, UNKNOWN if the index had
+    not been built yet. Objects whose active state is unchanged are skipped.
+    """
+    radius_km = settings.MATCHING_RADIUS_KM
+    current_cargo = _active_entries(CargoListing, CARGO_FIELDS, cargo_entry, cargo)
+    current_routes = _active_entries(Route, ROUTE_FIELDS, route_entry, routes)
+    route_index, cargo_index = loaded_index('route'), loaded_index('cargo')
+    cold = route_index is None or cargo_index is None
+    if cold:
+        # Scratch indexes of the rows near the changes; the route index is filled once the affected cargo is known.
+        routes, cargo = dict.fromkeys(routes, UNKNOWN), dict.fromkeys(cargo, UNKNOWN)
+        suggested = RouteMatch.objects.filter(route_id__in=routes).values_list('cargo_id', flat=True)
+        cargo_index = _nearby_cargo_index(current_routes.values(), set(suggested) | set(current_cargo), radius_km)
+        route_index = RouteIndex()
+    affected = {}
+    inactive_cargo = []
+
+    for cargo_id, before in cargo.items():
+        after = current_cargo.get(cargo_id)
+        if before is not UNKNOWN and before == after:
+            continue
+        if after:
+            cargo_index.add_entry(after)
+            affected[cargo_id] = after
+        else:
+            cargo_index.remove(cargo_id)
+            inactive_cargo.append(cargo_id)
+
+    changed_routes = []
+    for route_id, before in routes.items():
+        after = current_routes.get(route_id)
+        if before is not UNKNOWN and before == after:
+            continue
+        changed_routes.append(route_id)
+        for entry in (before, after):
+            if entry and entry is not UNKNOWN:
+                affected.update((item.id, item) for item in cargo_index.match(entry, radius_km))
+        if after:
+            route_index.add_entry(after)
+        else:
+            route_index.remove(route_id)
+    refresh_corridors(routes)
+
+    # Cargo already suggested a changed route may lose it or gain a replacement.
+    if changed_routes:
+        suggested = RouteMatch.objects.filter(route_id__in=changed_routes).values_list('cargo_id', flat=True)
+        for cargo_id in set(suggested):
+            entry = cargo_index.get(cargo_id)
+            if entry:
+                affected[cargo_id] = entry
+
+    if cold:
+        route_index = _nearby_route_index(affected.values(), radius_km)
+    with transaction.atomic():
+        if inactive_cargo:
+            RouteMatch.objects.filter(cargo_id__in=inactive_cargo, status='pending').delete()
+        sync_cargo_matches(affected.values(), route_index)
+
+
+def refresh_corridors(route_ids):
+    """Re-file changed routes in the corridor index, if this process has built it."""
+    corridor_index = loaded_index('corridor')
+    if corridor_index is None or not route_ids:
+        return
+    current = _active_entries(Route, CORRIDOR_FIELDS, corridor_entry, route_ids)
+    for route_id in route_ids:
+        if route_id in current:
+            corridor_index.add_entry(current[route_id])
+        else:
+            corridor_index.remove(route_id)
+
+
+def sync_cargo_matches(cargo, route_index):
+    """
+    Re-rank CargoEntry items against ``route_index`` and write only the
+    suggestions that changed.
+
+    Accepted, rejected and expired suggestions are never touched, matching
+    the behaviour of the bulk job.
+    """
+    cargo = list(cargo)
+    if not cargo:
+        return
+    radius_km = settings.MATCHING_RADIUS_KM
+    limit = settings.MATCHING_MAX_PER_CARGO
+
+    desired = {}
+    for item in cargo:
+        candidates = route_index.match(item, radius_km)
+        if candidates:
+            for scored in top_k(item, columns_from_entries(candidates), limit, radius_km):
+                desired[(item.id, scored.route_id)] = build_route_match((item.id,) + tuple(scored))
+
+    existing = {
+        (match.cargo_id, match.route_id): match
+        for match in RouteMatch.objects.filter(cargo_id__in=[item.id for item in cargo])
+    }
+    stale = [match.id for key, match in existing.items() if key not in desired and match.status == 'pending']
+    created = [match for key, match in desired.items() if key not in existing]
+    rescored = []
+    now = timezone.now()
+    for key, match in existing.items():
+        wanted = desired.get(key)
+        if wanted is None or match.status != 'pending':
+            continue
+        if any(getattr(match, field) != getattr(wanted, field) for field in MATCH_VALUE_FIELDS):
+            for field in MATCH_VALUE_FIELDS:
+                setattr(match, field, getattr(wanted, field))
+            match.updated_at = now
+            rescored.append(match)
+
+    if stale:
+        RouteMatch.objects.filter(id__in=stale).delete()
+    if created:
+        RouteMatch.objects.bulk_create(created, ignore_conflicts=True)
+        # Truck owners hear about new cargo through their notification digest.
+        owners = dict(
+            Route.objects.filter(id__in={match.route_id for match in created}).values_list('id', 'truck__owner_id')
+        )
+        record_events(
+            (owners[match.route_id], 'route_match', match.cargo_id) for match in created if match.route_id in owners
+        )
+    if rescored:
+        RouteMatch.objects.bulk_update(rescored, MATCH_VALUE_FIELDS + ('updated_at',))
+
+
+def check_consistency():
+    """
+    Compare stored suggestions with a full recompute.
+
+    Returns a dict of ``(cargo_id, route_id)`` lists: ``missing`` pairs the
+    full recompute suggests but are not stored, ``unexpected`` pending pairs
+    it no longer suggests and ``rescored`` pending pairs whose values differ.
+    """
+    expected = {
+        (row[0], row[1]): build_route_match(row)
+        for row in compute_all_matches(load_active_cargo(), load_active_routes(), workers=1)
+    }
+    stored = RouteMatch.objects.values_list('cargo_id', 'route_id', 'status', *MATCH_VALUE_FIELDS)
+    report = {'missing': [], 'unexpected': [], 'rescored': []}
+    seen = set()
+    for cargo_id, route_id, status, *values in stored.iterator(chunk_size=5000):
+        key = (cargo_id, route_id)
+        seen.add(key)
+        if status != 'pending':
+            continue
+        wanted = expected.get(key)
+        if wanted is None:
+            report['unexpected'].append(key)
+        elif any(Decimal(value) != getattr(wanted, field) for field, value in zip(MATCH_VALUE_FIELDS, values)):
+            report['rescored'].append(key)
+    report['missing'] = sorted(key for key in expected if key not in seen)
+    return report
@@ -0,0 +1,374 @@
+import abc
+import datetime
+import functools
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .geo import cell_span, grid_cell, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Columns pulled with values_list() so the index never materializes model instances.
+ROUTE_FIELDS = (
+    'id',
+    'origin_latitude',
+    'origin_longitude',
+    'destination_latitude',
+    'destination_longitude',
+    'departure_date',
+    'available_capacity_weight',
+    'available_capacity_volume',
+    'price_per_km',
+    # Joined in the same query, so ranking by carrier rating costs no extra lookup.
+    'truck__owner__average_rating',
+)
+CARGO_FIELDS = (
+    'id',
+    'origin_latitude',
+    'origin_logitude',
+    'destination_latitude',
+    'destination_longitude',
+    'pickup_date_from',
+    'pickup_date_to',
+    'weight',
+    'budget',
+)
+
+RouteEntry = namedtuple('RouteEntry', [
+    'id', 'origin_lat', 'origin_lng', 'dest_lat', 'dest_lng',
+    'departure', 'capacity_weight', 'capacity_volume', 'price_per_km', 'owner_rating',
+])
+CargoEntry = namedtuple('CargoEntry', [
+    'id', 'origin_lat', 'origin_lng', 'dest_lat', 'dest_lng',
+    'pickup_from', 'pickup_to', 'weight', 'budget',
+])
+
+
+def route_entry(row):
+    """Build a RouteEntry from a ROUTE_FIELDS row; dates become day ordinals."""
+    return RouteEntry(
+        row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]),
+        row[5].toordinal(), float(row[6]), float(row[7]), float(row[8]), float(row[9] or 0),
+    )
+
+
+def cargo_entry(row):
+    """Build a CargoEntry from a CARGO_FIELDS row; dates become day ordinals."""
+    return CargoEntry(
+        row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]),
+        row[5].toordinal(), row[6].toordinal(), float(row[7]),
+        float(row[8]) if row[8] is not None else None,
+    )
+
+
+def route_entry_from_model(route):
+    return route_entry([functools.reduce(getattr, field.split('__'), route) for field in ROUTE_FIELDS])
+
+
+def cargo_entry_from_model(cargo):
+    return cargo_entry([getattr(cargo, field) for field in CARGO_FIELDS])
+
+
+def route_matches_cargo(route, cargo, radius_km):
+    """Exact feasibility test shared by the index and the naive scan."""
+    return (
+        cargo.pickup_from <= route.departure <= cargo.pickup_to
+        and route.capacity_weight >= cargo.weight
+        and haversine_km(cargo.origin_lat, cargo.origin_lng, route.origin_lat, route.origin_lng) <= radius_km
+        and haversine_km(cargo.dest_lat, cargo.dest_lng, route.dest_lat, route.dest_lng) <= radius_km
+    )
+
+
+class GridIndex(abc.ABC):
+    """
+    Buckets entries by the grid cells of one or more points plus a day bucket.
+
+    A lookup only visits the cells within the search radius of each point and
+    the day buckets overlapping the requested window, so its cost depends on
+    local density rather than on the total number of entries.
+
+    Once ``share`` is called the index is read by many threads while one
+    writer at a time changes it: buckets are then replaced, never changed in
+    place, so a reader iterating a bucket always sees a consistent snapshot.
+    """
+
+    def __init__(self, cell_km=None, bucket_days=7):
+        self.cell_km = cell_km or settings.MATCHING_CELL_KM
+        self.bucket_days = bucket_days
+        self._buckets = {}
+        self._entry_keys = {}
+        self._shared = False
+        self._write_lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entry_keys)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entry_keys
+
+    def share(self):
+        """Switch to copy-on-write buckets before other threads can see the index."""
+        self._shared = True
+        return self
+
+    def _cell(self, lat, lng):
+        return grid_cell(lat, lng, self.cell_km)
+
+    def _neighbourhood(self, lat, lng, radius_km):
+        row, col = self._cell(lat, lng)
+        row_span, col_span = cell_span(lat, radius_km, self.cell_km)
+        return [
+            (r, c)
+            for r in range(row - row_span, row + row_span + 1)
+            for c in range(col - col_span, col + col_span + 1)
+        ]
+
+    def _day_buckets(self, first_day, last_day):
+        return range(first_day // self.bucket_days, last_day // self.bucket_days + 1)
+
+    def add(self, entry_id, entry, points, first_day, last_day):
+        """Index ``entry`` under ``points`` for every day bucket in the window."""
+        cells = tuple(self._cell(lat, lng) for lat, lng in points)
+        self._store(entry_id, [(cells + (day,), entry) for day in self._day_buckets(first_day, last_day)])
+
+    def _store(self, entry_id, items):
+        """File ``entry_id`` under each ``(key, value)`` of ``items``, replacing any earlier version of it."""
+        with self._write_lock:
+            self.remove(entry_id)
+            for key, value in items:
+                bucket = self._buckets.get(key)
+                if bucket is None or self._shared:
+                    bucket = dict(bucket or ())
+                    bucket[entry_id] = value
+                    self._buckets[key] = bucket
+                else:
+                    bucket[entry_id] = value
+            self._entry_keys[entry_id] = [key for key, _ in items]
+
+    def remove(self, entry_id):
+        with self._write_lock:
+            for key in self._entry_keys.pop(entry_id, ()):
+                bucket = self._buckets.get(key)
+                if bucket is None or entry_id not in bucket:
+                    continue
+                if len(bucket) == 1:
+                    del self._buckets[key]
+                elif self._shared:
+                    self._buckets[key] = {other: value for other, value in bucket.items() if other != entry_id}
+                else:
+                    del bucket[entry_id]
+
+    def get(self, entry_id):
+        keys = self._entry_keys.get(entry_id)
+        bucket = self._buckets.get(keys[0]) if keys else None
+        return bucket.get(entry_id) if bucket else None
+
+    @abc.abstractmethod
+    def add_entry(self, entry):
+        """Index one entry built by ``entry_from_row``, replacing any earlier version of it."""
+
+    @classmethod
+    def from_entries(cls, entries, **kwargs):
+        index = cls(**kwargs)
+        for entry in entries:
+            index.add_entry(entry)
+        return index
+
+    @classmethod
+    def from_queryset(cls, queryset, **kwargs):
+        rows = queryset.order_by().values_list(*cls.fields).iterator(chunk_size=5000)
+        return cls.from_entries((cls.entry_from_row(row) for row in rows), **kwargs)
+
+    def candidates(self, points, radius_km, first_day, last_day):
+        """Yield each entry whose buckets may lie within ``radius_km`` of every point."""
+        neighbourhoods = [self._neighbourhood(lat, lng, radius_km) for lat, lng in points]
+        days = self._day_buckets(first_day, last_day)
+        seen = set()
+        for cells in itertools.product(*neighbourhoods):
+            for day in days:
+                bucket = self._buckets.get(cells + (day,))
+                if not bucket:
+                    continue
+                for entry_id, entry in bucket.items():
+                    if entry_id not in seen:
+                        seen.add(entry_id)
+                        yield entry
+
+
+class RouteIndex(GridIndex):
+    """Grid index of routes keyed by origin cell, destination cell and departure week."""
+
+    fields = ROUTE_FIELDS
+    entry_from_row = staticmethod(route_entry)
+
+    def add_entry(self, route):
+        self.add(
+            route.id, route,
+            ((route.origin_lat, route.origin_lng), (route.dest_lat, route.dest_lng)),
+            route.departure, route.departure,
+        )
+
+    def match(self, cargo, radius_km=None):
+        """Return the routes that can carry ``cargo``, in index order."""
+        radius_km = radius_km or settings.MATCHING_RADIUS_KM
+        points = ((cargo.origin_lat, cargo.origin_lng), (cargo.dest_lat, cargo.dest_lng))
+        return [
+            route
+            for route in self.candidates(points, radius_km, cargo.pickup_from, cargo.pickup_to)
+            if route_matches_cargo(route, cargo, radius_km)
+        ]
+
+
+class CargoIndex(GridIndex):
+    """Grid index of cargo keyed by origin cell, destination cell and every pickup week."""
+
+    fields = CARGO_FIELDS
+    entry_from_row = staticmethod(cargo_entry)
+
+    def add_entry(self, cargo):
+        self.add(
+            cargo.id, cargo,
+            ((cargo.origin_lat, cargo.origin_lng), (cargo.dest_lat, cargo.dest_lng)),
+            cargo.pickup_from, cargo.pickup_to,
+        )
+
+    def match(self, route, radius_km=None):
+        """Return the cargo that ``route`` can carry, in index order."""
+        radius_km = radius_km or settings.MATCHING_RADIUS_KM
+        points = ((route.origin_lat, route.origin_lng), (route.dest_lat, route.dest_lng))
+        return [
+            cargo
+            for cargo in self.candidates(points, radius_km, route.departure, route.departure)
+            if route_matches_cargo(route, cargo, radius_km)
+        ]
+
+
+class LoadedIndex:
+    """
+    A process-wide index and how far it has caught up with the database.
+
+    Saves in this process reach the index through ``incremental.py``; saves
+    in other processes are picked up by ``sync``, which re-reads the rows
+    whose ``updated_at`` moved since the last sync. ``QuerySet.update()``
+    calls that leave ``updated_at`` alone and rows deleted elsewhere are only
+    settled by the periodic full rebuild.
+    """
+
+    def __init__(self, name, index_class, queryset):
+        self.name = name
+        self.index_class = index_class
+        self.queryset = queryset
+        self.lock = threading.Lock()
+        self.rebuilding = False
+        self.synced_at = timezone.now()
+        self.index = index_class.from_queryset(queryset).share()
+        self.checked = self.built = time.monotonic()
+
+    def refresh(self):
+        """Sync with other processes' changes when due, and start a full rebuild when one is due."""
+        now = time.monotonic()
+        if now - self.checked < settings.MATCHING_INDEX_SYNC_SECONDS or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.checked = now
+            if now - self.built >= settings.MATCHING_INDEX_REBUILD_SECONDS and not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self.rebuild, name=f'rebuild-{self.name}-index', daemon=True).start()
+            self.sync()
+        finally:
+            self.lock.release()
+
+    def sync(self):
+        """Re-file every row changed since the last sync, less a safety lag for transactions that committed late."""
+        started = timezone.now()
+        since = self.synced_at - datetime.timedelta(seconds=settings.MATCHING_INDEX_SYNC_LAG_SECONDS)
+        changed = self.queryset.model.objects.filter(updated_at__gte=since).order_by()
+        active = {
+            row[0]: self.index_class.entry_from_row(row)
+            for row in self.queryset.filter(updated_at__gte=since).order_by().values_list(*self.index_class.fields)
+        }
+        index = self.index
+        for entry_id in changed.values_list('id', flat=True):
+            if entry_id in active:
+                index.add_entry(active[entry_id])
+            else:
+                index.remove(entry_id)
+        self.synced_at = started
+
+    def rebuild(self):
+        """Build a replacement index in the background; requests keep using the current one meanwhile."""
+        try:
+            started = timezone.now()
+            index = self.index_class.from_queryset(self.queryset).share()
+            with self.lock:
+                # The next sync re-reads everything saved while the replacement was being built.
+                self.index, self.synced_at = index, min(self.synced_at, started)
+                self.built = time.monotonic()
+        except Exception:
+            logger.exception('Rebuilding the %s index failed', self.name)
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_index(name, index_class, queryset):
+    """Return the process-wide ``index_class`` index of ``queryset``, building it on first use."""
+    loaded = _indexes.get(name)
+    if loaded is None:
+        with _indexes_lock:
+            loaded = _indexes.get(name)
+            if loaded is None:
+                loaded = _indexes[name] = LoadedIndex(name, index_class, queryset)
+    loaded.refresh()
+    return loaded.index
+
+
+def get_route_index():
+    """Return the process-wide index of active routes, building it on first use."""
+    from routes.models import Route
+    return _load_index('route', RouteIndex, Route.objects.filter(status='active'))
+
+
+def get_cargo_index():
+    """Return the process-wide index of active cargo, building it on first use."""
+    from cargo.models import CargoListing
+    return _load_index('cargo', CargoIndex, CargoListing.objects.filter(status='active'))
+
+
+def loaded_index(name):
+    """Return the ``'route'``, ``'cargo'`` or ``'corridor'`` index if it is already built, else None."""
+    loaded = _indexes.get(name)
+    return None if loaded is None else loaded.index
+
+
+def reset_indexes():
+    """Drop the process-wide indexes so the next lookup rebuilds them from the database."""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def warm_indexes():
+    """Build the route, cargo and corridor indexes now rather than on the first request or commit."""
+    from .corridor import get_corridor_index
+    try:
+        for get_index in (get_route_index, get_cargo_index, get_corridor_index):
+            get_index()
+    finally:
+        connection.close()
+
+
+def warm_indexes_in_background():
+    """Start ``warm_indexes`` in a daemon thread, so a starting worker can serve while the indexes build."""
+    if settings.MATCHING_WARM_INDEXES:
+        threading.Thread(target=warm_indexes, name='warm-matching-indexes', daemon=True).start()
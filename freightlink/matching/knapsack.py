@@ -0,0 +1,219 @@
+"""
+Two-dimensional 0/1 knapsack: the most valuable set of items within a
+weight and a volume limit.
+
+``solve`` is an anytime search. Greedy fills and a local search give a
+good packing in under a millisecond. Branch and bound then improves it
+until it either proves it optimal or runs out of time. Without a time limit
+it is exact. Nothing here touches Django.
+"""
+import math
+import time
+from collections import namedtuple
+
+# Slack on capacity comparisons so float sums of exact fits still fit.
+EPSILON = 1e-9
+# Nodes between clock reads in branch and bound.
+CLOCK_INTERVAL = 16
+
+Item = namedtuple('Item', ['id', 'weight', 'volume', 'value'])
+Packing = namedtuple('Packing', ['ids', 'value', 'weight', 'volume', 'optimal'])
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _packing(items, chosen, optimal):
+    picked = [items[index] for index in sorted(chosen)]
+    return Packing(
+        tuple(item.id for item in picked),
+        sum(item.value for item in picked),
+        sum(item.weight for item in picked),
+        sum(item.volume for item in picked),
+        optimal,
+    )
+
+
+def _sizes(items, capacity_weight, capacity_volume):
+    """
+    Each item's size in one combined dimension, and that dimension's capacity.
+
+    Any packing that fits both limits also fits ``a * weight + b * volume``
+    within the same combination of the limits. Weighting each limit by how
+    oversubscribed it is keeps the combined bound close to the binding one.
+    """
+    a = sum(item.weight for item in items) / capacity_weight if capacity_weight > 0 else 0.0
+    b = sum(item.volume for item in items) / capacity_volume if capacity_volume > 0 else 0.0
+    sizes = [
+        (a * item.weight / capacity_weight if a else 0.0) + (b * item.volume / capacity_volume if b else 0.0)
+        for item in items
+    ]
+    return sizes, a + b
+
+
+def _density(value, size):
+    """Sort key putting free items first, then the most value per unit of size."""
+    return (size > 0, -value / size if size else 0.0)
+
+
+def greedy(items, capacity_weight, capacity_volume):
+    """Indices of the best of a few greedy fills, each taking items in one order while they fit."""
+    sizes, _ = _sizes(items, capacity_weight, capacity_volume)
+    orders = (
+        lambda index: _density(items[index].value, sizes[index]),
+        lambda index: _density(items[index].value, items[index].weight),
+        lambda index: _density(items[index].value, items[index].volume),
+        lambda index: -items[index].value,
+    )
+    best, best_value = set(), 0.0
+    for order in orders:
+        chosen, weight, volume, value = set(), 0.0, 0.0, 0.0
+        for index in sorted(range(len(items)), key=order):
+            item = items[index]
+            if weight + item.weight <= capacity_weight + EPSILON and volume + item.volume <= capacity_volume + EPSILON:
+                chosen.add(index)
+                weight += item.weight
+                volume += item.volume
+                value += item.value
+        if value > best_value:
+            best, best_value = chosen, value
+    return best
+
+
+def improve(items, chosen, capacity_weight, capacity_volume, deadline=None):
+    """
+    Local search from ``chosen``: add any item that fits, else swap one item
+    out for a more valuable one that then fits. Stops at a local optimum or
+    the deadline; returns the improved set of indices.
+    """
+    chosen = set(chosen)
+    weight = sum(items[index].weight for index in chosen)
+    volume = sum(items[index].volume for index in chosen)
+    by_value = sorted(range(len(items)), key=lambda index: -items[index].value)
+    improved = True
+    while improved and (deadline is None or time.perf_counter() < deadline):
+        improved = False
+        for index in by_value:
+            item = items[index]
+            if index in chosen:
+                continue
+            if weight + item.weight <= capacity_weight + EPSILON and volume + item.volume <= capacity_volume + EPSILON:
+                chosen.add(index)
+                weight += item.weight
+                volume += item.volume
+                improved = True
+                continue
+            for out in chosen:
+                removed = items[out]
+                if (
+                    removed.value < item.value
+                    and weight - removed.weight + item.weight <= capacity_weight + EPSILON
+                    and volume - removed.volume + item.volume <= capacity_volume + EPSILON
+                ):
+                    chosen.remove(out)
+                    chosen.add(index)
+                    weight += item.weight - removed.weight
+                    volume += item.volume - removed.volume
+                    improved = True
+                    break
+    return chosen
+
+
+def branch_and_bound(items, capacity_weight, capacity_volume, incumbent=(), deadline=None):
+    """
+    ``(indices, proven)``: the best packing found by depth-first branch and
+    bound, starting from ``incumbent``. ``proven`` is False when the
+    deadline stopped the search before it covered every branch.
+
+    A branch is cut when even a fractional fill of what is left could not
+    beat the best packing so far. That fill is computed against the weight
+    limit, the volume limit and a combination of both, and the lowest wins.
+    """
+    sizes, capacity = _sizes(items, capacity_weight, capacity_volume)
+    # Items are branched on in order of value per unit of combined size, the combined bound's own order.
+    order = sorted(range(len(items)), key=lambda index: _density(items[index].value, sizes[index]))
+    ordered = [items[index] for index in order]
+    count = len(ordered)
+    # (sizes, capacity, positions by density) for each relaxation.
+    relaxations = []
+    for dimension_sizes, dimension_capacity in (
+        ([sizes[index] for index in order], capacity),
+        ([item.weight for item in ordered], capacity_weight),
+        ([item.volume for item in ordered], capacity_volume),
+    ):
+        by_density = sorted(
+            range(count), key=lambda position: _density(ordered[position].value, dimension_sizes[position]),
+        )
+        relaxations.append((dimension_sizes, dimension_capacity, by_density))
+
+    best_value = sum(items[index].value for index in incumbent)
+    position_of = {index: position for position, index in enumerate(order)}
+    best = [position_of[index] for index in incumbent]
+    taken = []
+    nodes = 0
+
+    def bound(position, used, value):
+        lowest = math.inf
+        for (dimension_sizes, dimension_capacity, by_density), dimension_used in zip(relaxations, used):
+            room = dimension_capacity - dimension_used
+            total = value
+            for index in by_density:
+                if index < position:
+                    continue
+                size = dimension_sizes[index]
+                if size <= room:
+                    room -= size
+                    total += ordered[index].value
+                else:
+                    total += ordered[index].value * room / size
+                    break
+            lowest = min(lowest, total)
+        return lowest
+
+    def search(position, used, value):
+        nonlocal best, best_value, nodes
+        nodes += 1
+        if deadline is not None and nodes % CLOCK_INTERVAL == 0 and time.perf_counter() > deadline:
+            raise _OutOfTime
+        if value > best_value + EPSILON:
+            best, best_value = list(taken), value
+        if position == count or bound(position, used, value) <= best_value + EPSILON:
+            return
+        item = ordered[position]
+        if used[1] + item.weight <= capacity_weight + EPSILON and used[2] + item.volume <= capacity_volume + EPSILON:
+            taken.append(position)
+            search(
+                position + 1,
+                (used[0] + relaxations[0][0][position], used[1] + item.weight, used[2] + item.volume),
+                value + item.value,
+            )
+            taken.pop()
+        search(position + 1, used, value)
+
+    try:
+        search(0, (0.0, 0.0, 0.0), 0.0)
+        proven = True
+    except _OutOfTime:
+        proven = False
+    return {order[position] for position in best}, proven
+
+
+def solve(items, capacity_weight, capacity_volume, time_limit=None):
+    """
+    Return the Packing of ``items`` with the most value within both limits.
+
+    ``time_limit`` is in seconds; None searches until the packing is proven
+    optimal, which can take exponential time. ``Packing.optimal`` says
+    whether it was.
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    items = [
+        item for item in items
+        if item.weight <= capacity_weight + EPSILON and item.volume <= capacity_volume + EPSILON and item.value > 0
+    ]
+    chosen = improve(items, greedy(items, capacity_weight, capacity_volume), capacity_weight, capacity_volume, deadline)
+    if deadline is not None and time.perf_counter() >= deadline:
+        return _packing(items, chosen, False)
+    chosen, proven = branch_and_bound(items, capacity_weight, capacity_volume, chosen, deadline)
+    return _packing(items, chosen, proven)
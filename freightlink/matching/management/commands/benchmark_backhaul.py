@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.backhaul import BackhaulIndex, naive_backhauls
+from matching.synthetic import generate_backhaul_routes, generate_cargo, generate_routes
+
+
+class Command(BaseCommand):
+    help = 'Compare backhaul index lookups with a naive scan over synthetic arriving trucks and cargo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--routes', type=int, default=1000)
+        parser.add_argument('--naive-routes', type=int, default=50,
+                            help='Naive scans are slow at large sizes, so fewer are timed.')
+        parser.add_argument('--radius-km', type=float, default=50)
+        parser.add_argument('--max-wait-days', type=float, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        radius_km, max_wait_days = options['radius_km'], options['max_wait_days']
+        routes = generate_backhaul_routes(generate_routes(options['routes'], seed=options['seed']))
+        self.stdout.write(
+            f"{'cargo':>8} {'build s':>8} {'index ms':>9} {'naive ms':>9} {'speedup':>8} {'hits':>6}"
+        )
+        for size in options['sizes']:
+            cargo = generate_cargo(size, seed=options['seed'] + 1)
+
+            started = time.perf_counter()
+            index = BackhaulIndex.from_entries(cargo)
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            hits = sum(len(index.match(route, radius_km, max_wait_days)) for route in routes)
+            index_ms = (time.perf_counter() - started) * 1000 / len(routes)
+
+            sample = routes[:options['naive_routes']]
+            started = time.perf_counter()
+            expected = [naive_backhauls(route, cargo, radius_km, max_wait_days) for route in sample]
+            naive_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+            for route, naive in zip(sample, expected):
+                if sorted(index.match(route, radius_km, max_wait_days)) != sorted(naive):
+                    self.stderr.write(self.style.ERROR(f'Index and naive scan disagree for route {route.id}'))
+                    return
+
+            self.stdout.write(
+                f'{size:>8} {build_s:>8.2f} {index_ms:>9.3f} {naive_ms:>9.3f} '
+                f'{naive_ms / index_ms:>7.0f}x {hits / len(routes):>6.1f}'
+            )
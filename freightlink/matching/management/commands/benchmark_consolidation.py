@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.knapsack import solve
+from matching.synthetic import generate_consolidation_instance
+
+
+class Command(BaseCommand):
+    help = 'Plan quality against search time on synthetic route loads, compared with exact solutions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100, 200],
+                            help='Compatible cargo per route.')
+        parser.add_argument('--instances', type=int, default=20)
+        parser.add_argument('--limits-ms', type=float, nargs='+', default=[0, 0.2, 1, 5, 20, 100],
+                            help='Search time limits; 0 is the greedy fill alone.')
+        parser.add_argument('--exact-limit-ms', type=float, default=10000,
+                            help='Reference searches that are not proven optimal by then are reported.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'cargo':>6} {'limit ms':>9} {'mean ms':>8} {'gap %':>7} {'worst %':>8} {'at best':>8} {'proven':>7}"
+        )
+        for size in options['sizes']:
+            instances = [
+                generate_consolidation_instance(size, seed=options['seed'] + number)
+                for number in range(options['instances'])
+            ]
+            started = time.perf_counter()
+            references = [solve(*instance, options['exact_limit_ms'] / 1000) for instance in instances]
+            exact_ms = (time.perf_counter() - started) * 1000 / len(instances)
+            unproven = sum(1 for reference in references if not reference.optimal)
+            if unproven:
+                self.stderr.write(f'{unproven} of the {size}-cargo references are not proven optimal')
+
+            for limit_ms in options['limits_ms']:
+                gaps, proven, elapsed = [], 0, []
+                for instance, reference in zip(instances, references):
+                    started = time.perf_counter()
+                    packing = solve(*instance, limit_ms / 1000)
+                    elapsed.append((time.perf_counter() - started) * 1000)
+                    gaps.append(100 * (1 - packing.value / reference.value) if reference.value else 0.0)
+                    proven += packing.optimal
+                self.stdout.write(
+                    f'{size:>6} {limit_ms:>9g} {statistics.mean(elapsed):>8.2f} {statistics.mean(gaps):>7.3f} '
+                    f'{max(gaps):>8.3f} {sum(1 for gap in gaps if gap < 1e-9) / len(gaps):>8.0%} '
+                    f'{proven / len(instances):>7.0%}'
+                )
+            self.stdout.write(f'{size:>6} {"exact":>9} {exact_ms:>8.2f} {0:>7.3f} {0:>8.3f} {"100%":>8} '
+                              f'{1 - unproven / len(instances):>7.0%}')
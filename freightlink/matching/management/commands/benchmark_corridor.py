@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.corridor import CorridorIndex
+from matching.engine import naive_corridor_routes
+from matching.synthetic import generate_corridor_cargo, generate_corridor_routes, generate_routes
+
+
+class Command(BaseCommand):
+    help = 'Compare corridor index lookups with per-route path tests over synthetic winding routes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--naive-queries', type=int, default=20,
+                            help='Naive scans are slow at large sizes, so fewer are timed.')
+        parser.add_argument('--buffer-km', type=float, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        buffer_km = options['buffer_km']
+        self.stdout.write(
+            f"{'routes':>8} {'points':>13} {'cells':>6} {'build s':>8} {'index ms':>9} {'naive ms':>9} "
+            f"{'speedup':>8} {'hits':>6}"
+        )
+        for size in options['sizes']:
+            routes, raw_points = generate_corridor_routes(generate_routes(size, seed=options['seed']))
+            cargo = generate_corridor_cargo(options['queries'], routes, seed=options['seed'] + 1, spread_km=buffer_km)
+
+            started = time.perf_counter()
+            index = CorridorIndex.from_entries(routes, buffer_km=buffer_km)
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            hits = sum(len(index.match(item)) for item in cargo)
+            index_ms = (time.perf_counter() - started) * 1000 / len(cargo)
+
+            sample = cargo[:options['naive_queries']]
+            started = time.perf_counter()
+            expected = [naive_corridor_routes(routes, item, buffer_km) for item in sample]
+            naive_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+            for item, naive in zip(sample, expected):
+                if sorted(index.match(item)) != sorted(naive):
+                    self.stderr.write(self.style.ERROR(f'Index and naive scan disagree for cargo {item.id}'))
+                    return
+
+            stored_points = sum(len(route.points) for route in routes)
+            cells = sum(len(keys) for keys in index._entry_keys.values()) / size
+            self.stdout.write(
+                f'{size:>8} {f"{raw_points // size}->{stored_points // size}":>13} {cells:>6.0f} {build_s:>8.2f} '
+                f'{index_ms:>9.3f} {naive_ms:>9.3f} {naive_ms / index_ms:>7.0f}x {hits / len(cargo):>6.1f}'
+            )
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.engine import naive_candidate_routes
+from matching.index import RouteIndex
+from matching.synthetic import generate_cargo, generate_routes
+
+
+class Command(BaseCommand):
+    help = 'Compare spatial index lookups with a naive scan over synthetic routes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--naive-queries', type=int, default=20,
+                            help='Naive scans are slow at large sizes, so fewer are timed.')
+        parser.add_argument('--radius-km', type=float, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        radius_km = options['radius_km']
+        cargo = generate_cargo(options['queries'], seed=options['seed'] + 1)
+
+        self.stdout.write(f"{'routes':>10} {'build s':>9} {'index ms':>10} {'naive ms':>10} {'speedup':>9} {'hits':>7}")
+        for size in options['sizes']:
+            routes = generate_routes(size, seed=options['seed'])
+
+            started = time.perf_counter()
+            index = RouteIndex.from_entries(routes)
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            hits = sum(len(index.match(item, radius_km)) for item in cargo)
+            index_ms = (time.perf_counter() - started) * 1000 / len(cargo)
+
+            sample = cargo[:options['naive_queries']]
+            started = time.perf_counter()
+            expected = [naive_candidate_routes(routes, item, radius_km) for item in sample]
+            naive_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+            for item, naive in zip(sample, expected):
+                found = {route.id for route in index.match(item, radius_km)}
+                if found != {route.id for route in naive}:
+                    self.stderr.write(self.style.ERROR(f'Index and naive scan disagree for cargo {item.id}'))
+                    return
+
+            self.stdout.write(
+                f'{size:>10} {build_s:>9.2f} {index_ms:>10.3f} {naive_ms:>10.3f} '
+                f'{naive_ms / index_ms:>8.0f}x {hits / len(cargo):>7.1f}'
+            )
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.scoring import route_columns, top_k, top_k_reference
+from matching.synthetic import as_route_rows, generate_cargo, generate_routes
+
+
+class Command(BaseCommand):
+    help = 'Compare the vectorized route scorer with the per-row Decimal reference.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        k = options['top']
+        cargo = generate_cargo(options['queries'], seed=options['seed'] + 1)
+
+        self.stdout.write(f"{'candidates':>10} {'numpy ms':>10} {'python ms':>10} {'speedup':>9} {'rankings':>9}")
+        for size in options['candidates']:
+            rows = as_route_rows(generate_routes(size, seed=options['seed']))
+            numpy_s = python_s = 0.0
+            identical = True
+            for item in cargo:
+                started = time.perf_counter()
+                ranked = top_k(item, route_columns(rows), k)
+                numpy_s += time.perf_counter() - started
+
+                started = time.perf_counter()
+                expected = top_k_reference(item, rows, k)
+                python_s += time.perf_counter() - started
+
+                identical &= self._same_ranking(ranked, expected)
+
+            numpy_ms = numpy_s * 1000 / len(cargo)
+            python_ms = python_s * 1000 / len(cargo)
+            self.stdout.write(
+                f'{size:>10} {numpy_ms:>10.2f} {python_ms:>10.2f} {python_ms / numpy_ms:>8.1f}x '
+                f"{'same' if identical else 'DIFFER':>9}"
+            )
+            if not identical:
+                self.stderr.write(self.style.ERROR('Vectorized and reference rankings differ.'))
+
+    @staticmethod
+    def _same_ranking(ranked, expected, tolerance=1e-9):
+        """Equal route order, allowing swaps only between float-level ties."""
+        if len(ranked) != len(expected):
+            return False
+        for got, want in zip(ranked, expected):
+            if got.route_id != want.route_id and abs(got.score - want.score) > tolerance:
+                return False
+            if abs(got.score - want.score) > tolerance:
+                return False
+        return True
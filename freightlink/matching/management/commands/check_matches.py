@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matching.incremental import check_consistency
+
+
+class Command(BaseCommand):
+    help = 'Compare stored match suggestions with a full recompute.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', type=int, default=10, help='Pairs listed per problem type.')
+
+    def handle(self, *args, **options):
+        report = check_consistency()
+        for problem, pairs in report.items():
+            self.stdout.write(f'{problem}: {len(pairs)}')
+            for cargo_id, route_id in pairs[:options['show']]:
+                self.stdout.write(f'  cargo {cargo_id} / route {route_id}')
+        if any(report.values()):
+            raise CommandError('Match suggestions are out of sync; run rematch_all to repair them.')
+        self.stdout.write(self.style.SUCCESS('Match suggestions are consistent.'))
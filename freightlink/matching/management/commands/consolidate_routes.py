@@ -0,0 +1,25 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.consolidation import consolidate_departures
+from matching.models import ConsolidationPlan
+
+
+class Command(BaseCommand):
+    help = 'Plan the load of every active route departing on a day, tomorrow by default.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None)
+        parser.add_argument('--objective', choices=[choice for choice, _ in ConsolidationPlan.OBJECTIVE_CHOICES])
+        parser.add_argument('--time-limit-ms', type=int, default=None, help='Search time per route.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = consolidate_departures(options['date'], options['objective'], options['time_limit_ms'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {summary['routes']} routes: {summary['cargo']} cargo on {summary['loaded']} routes "
+            f"worth KES {summary['revenue']:,.2f}, {summary['optimal']} proven optimal "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
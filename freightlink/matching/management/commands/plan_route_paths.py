@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matching.corridor import plan_route_paths
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = 'Store the road path of active routes from the road graph, for corridor matching.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('route_ids', nargs='*', type=int, help='Only these routes.')
+        parser.add_argument('--replace', action='store_true', help='Also re-plan routes that already have a path.')
+
+    def handle(self, *args, **options):
+        routes = Route.objects.filter(status='active')
+        if options['route_ids']:
+            routes = routes.filter(id__in=options['route_ids'])
+        if not options['replace']:
+            routes = routes.filter(path='')
+        started = time.perf_counter()
+        try:
+            planned, unroutable = plan_route_paths(routes)
+        except OSError as error:
+            raise CommandError(f'Road graph is not available: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Planned {planned} route paths in {time.perf_counter() - started:.1f}s; '
+            f'{unroutable} routes could not be routed and stay straight lines'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.backhaul import rebuild_backhaul_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute pending backhaul suggestions for every route in progress.'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = rebuild_backhaul_suggestions()
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {summary['cargo']} cargo for {summary['routes']} routes: "
+            f"{summary['created']} suggestions created, {summary['rescored']} rescored, "
+            f"{summary['deleted']} removed in {time.perf_counter() - started:.1f}s"
+        ))
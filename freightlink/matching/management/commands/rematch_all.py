@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matching.bulk import rematch_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute pending match suggestions for all active cargo and routes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (defaults to the number of CPUs).')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Maximum suggestions kept per cargo listing.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = rematch_all(workers=options['workers'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Matched {summary['cargo']} cargo against {summary['routes']} routes: "
+            f"{summary['matches']} suggestions written, {summary['deleted']} replaced "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
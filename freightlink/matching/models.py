@@ -1,3 +1,77 @@
 from django.db import models
+from cargo.models import CargoListing
+from routes.models import Route
 
-# Create your models here.
+class RouteMatch(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+        ('expired', 'Expired'),
+    )
+    
+    cargo = models.ForeignKey(CargoListing, on_delete=models.CASCADE, related_name='route_matches')
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='cargo_matches')
+    match_score = models.DecimalField(max_digits=5, decimal_places=2, help_text='Score from 0-100')
+    price_estimate = models.DecimalField(max_digits=10, decimal_places=2)
+    distance_km = models.DecimalField(max_digits=10, decimal_places=2)
+    pickup_deviation_km = models.DecimalField(max_digits=10, decimal_places=2, help_text='Deviation from route for pickup')
+    delivery_deviation_km = models.DecimalField(max_digits=10, decimal_places=2, help_text='Deviation from route for delivery')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Match: {self.cargo.title} with route {self.route.id} (Score: {self.match_score})"
+    
+    class Meta:
+        ordering = ['-match_score']
+        # One suggestion per cargo/route pair so bulk writes can skip existing rows
+        unique_together = ('cargo', 'route')
+
+
+class BackhaulSuggestion(models.Model):
+    """Cargo a truck could take on from where its current route ends."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('dismissed', 'Dismissed'),
+    )
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='backhaul_suggestions')
+    cargo = models.ForeignKey(CargoListing, on_delete=models.CASCADE, related_name='backhaul_suggestions')
+    score = models.DecimalField(max_digits=5, decimal_places=2, help_text='Score from 0-100')
+    deadhead_km = models.DecimalField(max_digits=10, decimal_places=2, help_text='Empty drive from the route destination to the pickup')
+    wait_hours = models.DecimalField(max_digits=10, decimal_places=2, help_text='Wait after arrival until the pickup window opens')
+    homeward_km = models.DecimalField(max_digits=10, decimal_places=2, help_text='Distance from the drop-off back to the route origin')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Backhaul: cargo {self.cargo_id} after route {self.route_id} (Score: {self.score})"
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('route', 'cargo')
+
+
+class ConsolidationPlan(models.Model):
+    """The combination of cargo that best fills a route's spare capacity."""
+    OBJECTIVE_CHOICES = (
+        ('revenue', 'Revenue'),
+        ('utilization', 'Utilization'),
+    )
+
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, related_name='consolidation_plan')
+    cargo = models.ManyToManyField(CargoListing, related_name='consolidation_plans', blank=True)
+    objective = models.CharField(max_length=20, choices=OBJECTIVE_CHOICES)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, help_text='Sum of the planned cargo prices in KES')
+    weight = models.DecimalField(max_digits=10, decimal_places=2, help_text='Planned weight in tons')
+    volume = models.DecimalField(max_digits=10, decimal_places=2, help_text='Planned volume in cubic meters')
+    optimal = models.BooleanField(default=False, help_text='Whether the search proved no better combination exists')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Plan for route {self.route_id}: {self.weight} t, KES {self.revenue}"
@@ -0,0 +1,65 @@
+"""
+Partitioning of the full cargo × route join for the bulk re-matching job.
+
+Nothing here touches the ORM, so partitions can be matched in worker
+processes that never configure Django.
+"""
+from collections import defaultdict
+
+from .geo import KM_PER_DEGREE, cell_span, grid_cell
+from .index import RouteIndex
+from .scoring import columns_from_entries, top_k
+
+
+def partition_work(cargo, routes, region_km, bucket_days, radius_km):
+    """
+    Yield ``(cargo, routes)`` groups that can be matched independently.
+
+    Cargo is grouped by origin region and pickup-date bucket. Each group only
+    receives the routes that depart from a region within ``radius_km`` while
+    one of its pickup windows is open.
+    """
+    groups = defaultdict(list)
+    for item in cargo:
+        row, col = grid_cell(item.origin_lat, item.origin_lng, region_km)
+        groups[(row, col, item.pickup_from // bucket_days)].append(item)
+
+    route_buckets = defaultdict(list)
+    for route in routes:
+        row, col = grid_cell(route.origin_lat, route.origin_lng, region_km)
+        route_buckets[(row, col, route.departure // bucket_days)].append(route)
+
+    for (row, col, _), members in groups.items():
+        first_day = min(item.pickup_from for item in members)
+        last_day = max(item.pickup_to for item in members)
+        # Size the column span for the region edge furthest from the equator.
+        edge_lat = max(abs(row), abs(row + 1)) * region_km / KM_PER_DEGREE
+        row_span, col_span = cell_span(edge_lat, radius_km, region_km)
+        selected = [
+            route
+            for r in range(row - row_span, row + row_span + 1)
+            for c in range(col - col_span, col + col_span + 1)
+            for day in range(first_day // bucket_days, last_day // bucket_days + 1)
+            for route in route_buckets.get((r, c, day), ())
+            if first_day <= route.departure <= last_day
+        ]
+        if selected:
+            yield members, selected
+
+
+def match_partition(task):
+    """
+    Match one partition and return plain result tuples.
+
+    ``task`` is ``(cargo, routes, radius_km, cell_km, limit)``; each result is
+    ``(cargo_id,) + ScoredRoute`` for the best ``limit`` routes per cargo.
+    """
+    cargo, routes, radius_km, cell_km, limit = task
+    index = RouteIndex.from_entries(routes, cell_km=cell_km)
+    results = []
+    for item in cargo:
+        candidates = index.match(item, radius_km)
+        if candidates:
+            for scored in top_k(item, columns_from_entries(candidates), limit, radius_km):
+                results.append((item.id,) + tuple(scored))
+    return results
@@ -0,0 +1,193 @@
+"""
+Vectorized ranking of candidate routes for a cargo listing.
+
+Route columns are pulled with ``values_list`` into NumPy float arrays and
+every candidate is scored in one pass, so ranking thousands of routes never
+builds a ``Route`` instance or does per-row ``Decimal`` arithmetic.
+"""
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .index import ROUTE_FIELDS, RouteEntry
+
+# Relative weight of each component in the 0-100 match score.
+SCORE_WEIGHTS = {
+    'proximity': 0.25,
+    'detour': 0.20,
+    'budget': 0.20,
+    'capacity': 0.10,
+    'timing': 0.15,
+    'rating': 0.10,
+}
+# Rating assumed for carriers nobody has reviewed yet, so they are not ranked below poorly rated ones.
+UNRATED_RATING = 3.0
+MAX_RATING = 5.0
+# Detour at which the detour component drops to one half.
+DETOUR_HALF_KM = 100.0
+
+RouteColumns = namedtuple('RouteColumns', RouteEntry._fields)
+ScoredRoute = namedtuple('ScoredRoute', [
+    'route_id', 'score', 'price_estimate', 'distance_km', 'pickup_deviation_km', 'delivery_deviation_km',
+])
+
+
+def columns_from_entries(routes):
+    """Stack RouteEntry tuples into RouteColumns arrays."""
+    if not routes:
+        return RouteColumns(*(np.empty(0) for _ in RouteColumns._fields))
+    return RouteColumns(*(np.asarray(column) for column in zip(*routes)))
+
+
+def route_columns(rows):
+    """Convert ROUTE_FIELDS rows from values_list() into RouteColumns arrays."""
+    rows = list(rows)
+    if not rows:
+        return columns_from_entries([])
+    count = len(rows)
+    columns = list(zip(*rows))
+    arrays = []
+    for position, column in enumerate(columns):
+        if position == 0:
+            arrays.append(np.fromiter(column, np.int64, count))
+        elif position == 5:
+            arrays.append(np.fromiter(map(datetime.date.toordinal, column), np.int64, count))
+        else:
+            arrays.append(np.fromiter(map(float, column), np.float64, count))
+    return RouteColumns(*arrays)
+
+
+def load_route_columns(queryset):
+    """Fetch RouteColumns, casting decimals to floats in SQL so no Decimal is built."""
+    casts = {
+        f"{field.replace('__', '_')}_float": Cast(field, FloatField())
+        for field in ROUTE_FIELDS
+        if field not in ('id', 'departure_date')
+    }
+    fields = [
+        f"{field.replace('__', '_')}_float" if f"{field.replace('__', '_')}_float" in casts else field
+        for field in ROUTE_FIELDS
+    ]
+    return route_columns(queryset.order_by().annotate(**casts).values_list(*fields))
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(value) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def score_columns(cargo, columns, radius_km=None):
+    """
+    Score every route in ``columns`` for a CargoEntry.
+
+    Returns ``(scores, price_estimate, distance_km, pickup_km, delivery_km)``
+    arrays aligned with the columns; ``distance_km`` is a scalar.
+    """
+    radius_km = radius_km or settings.MATCHING_RADIUS_KM
+    pickup_km = _haversine(cargo.origin_lat, cargo.origin_lng, columns.origin_lat, columns.origin_lng)
+    delivery_km = _haversine(cargo.dest_lat, cargo.dest_lng, columns.dest_lat, columns.dest_lng)
+    route_km = _haversine(columns.origin_lat, columns.origin_lng, columns.dest_lat, columns.dest_lng)
+    distance_km = haversine_km(cargo.origin_lat, cargo.origin_lng, cargo.dest_lat, cargo.dest_lng)
+
+    detour_km = np.maximum(pickup_km + distance_km + delivery_km - route_km, 0.0)
+    price = columns.price_per_km * distance_km
+
+    proximity = 1.0 - np.minimum((pickup_km + delivery_km) / (2 * radius_km), 1.0)
+    detour = DETOUR_HALF_KM / (DETOUR_HALF_KM + detour_km)
+    if cargo.budget:
+        budget = np.clip(1.0 - np.maximum(price - cargo.budget, 0.0) / cargo.budget, 0.0, 1.0)
+    else:
+        budget = np.ones_like(price)
+    capacity = np.minimum(cargo.weight / np.maximum(columns.capacity_weight, 1e-9), 1.0)
+    window_days = cargo.pickup_to - cargo.pickup_from + 1
+    timing = np.clip(1.0 - (columns.departure - cargo.pickup_from) / window_days, 0.0, 1.0)
+    rating = np.where(columns.owner_rating > 0, columns.owner_rating, UNRATED_RATING) / MAX_RATING
+
+    scores = 100 * (
+        SCORE_WEIGHTS['proximity'] * proximity
+        + SCORE_WEIGHTS['detour'] * detour
+        + SCORE_WEIGHTS['budget'] * budget
+        + SCORE_WEIGHTS['capacity'] * capacity
+        + SCORE_WEIGHTS['timing'] * timing
+        + SCORE_WEIGHTS['rating'] * rating
+    )
+    return scores, price, distance_km, pickup_km, delivery_km
+
+
+def top_k(cargo, columns, k=10, radius_km=None):
+    """Return the ``k`` best routes as ScoredRoute tuples, best first, ties by route id."""
+    if not len(columns.id):
+        return []
+    scores, price, distance_km, pickup_km, delivery_km = score_columns(cargo, columns, radius_km)
+    if k < len(scores):
+        # Keep every route tied with the k-th best so the id tie-break stays exact.
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.lexsort((columns.id[candidates], -scores[candidates]))][:k]
+    return [
+        ScoredRoute(
+            int(columns.id[i]), float(scores[i]), float(price[i]),
+            distance_km, float(pickup_km[i]), float(delivery_km[i]),
+        )
+        for i in order
+    ]
+
+
+def rank_routes(cargo, queryset, k=10, radius_km=None):
+    """Rank the routes in ``queryset`` for a CargoEntry without loading Route instances."""
+    return top_k(cargo, load_route_columns(queryset), k, radius_km)
+
+
+def score_route_reference(cargo, row, radius_km):
+    """
+    Per-row reference scorer over raw ``Decimal`` values_list rows.
+
+    Kept for benchmarks and for checking the vectorized scorer; do not use it
+    on hot paths.
+    """
+    route_id, olat, olng, dlat, dlng, departure, capacity_weight, _, price_per_km, owner_rating = row
+    pickup_km = haversine_km(cargo.origin_lat, cargo.origin_lng, float(olat), float(olng))
+    delivery_km = haversine_km(cargo.dest_lat, cargo.dest_lng, float(dlat), float(dlng))
+    route_km = haversine_km(float(olat), float(olng), float(dlat), float(dlng))
+    distance_km = haversine_km(cargo.origin_lat, cargo.origin_lng, cargo.dest_lat, cargo.dest_lng)
+
+    detour_km = max(pickup_km + distance_km + delivery_km - route_km, 0.0)
+    price = price_per_km * Decimal(distance_km)
+
+    proximity = 1 - min((pickup_km + delivery_km) / (2 * radius_km), 1.0)
+    detour = DETOUR_HALF_KM / (DETOUR_HALF_KM + detour_km)
+    if cargo.budget:
+        budget_limit = Decimal(cargo.budget)
+        budget = float(min(max(1 - max(price - budget_limit, Decimal(0)) / budget_limit, Decimal(0)), Decimal(1)))
+    else:
+        budget = 1.0
+    capacity = min(Decimal(cargo.weight) / max(capacity_weight, Decimal('1e-9')), Decimal(1))
+    window_days = cargo.pickup_to - cargo.pickup_from + 1
+    timing = min(max(1 - (departure.toordinal() - cargo.pickup_from) / window_days, 0.0), 1.0)
+    rating = (float(owner_rating) if owner_rating else UNRATED_RATING) / MAX_RATING
+
+    score = 100 * (
+        SCORE_WEIGHTS['proximity'] * proximity
+        + SCORE_WEIGHTS['detour'] * detour
+        + SCORE_WEIGHTS['budget'] * budget
+        + SCORE_WEIGHTS['capacity'] * float(capacity)
+        + SCORE_WEIGHTS['timing'] * timing
+        + SCORE_WEIGHTS['rating'] * rating
+    )
+    return ScoredRoute(route_id, score, float(price), distance_km, pickup_km, delivery_km)
+
+
+def top_k_reference(cargo, rows, k=10, radius_km=None):
+    radius_km = radius_km or settings.MATCHING_RADIUS_KM
+    scored = [score_route_reference(cargo, row, radius_km) for row in rows]
+    scored.sort(key=lambda item: (-item.score, item.route_id))
+    return scored[:k]
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings.capacity import route_capacity_changed
+from cargo.models import CargoListing
+from routes.models import Route
+
+from .incremental import queue_cargo_change, queue_route_change
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def route_changed(sender, instance, **kwargs):
+    queue_route_change(instance.pk)
+
+
+@receiver(route_capacity_changed)
+def route_capacity_updated(sender, route_id, **kwargs):
+    queue_route_change(route_id)
+
+
+@receiver(post_save, sender=CargoListing)
+@receiver(post_delete, sender=CargoListing)
+def cargo_changed(sender, instance, **kwargs):
+    queue_cargo_change(instance.pk)
@@ -0,0 +1,179 @@
+"""Synthetic East African routes and cargo for benchmarks."""
+import datetime
+import math
+import random
+from decimal import Decimal
+
+from .backhaul import BackhaulRoute
+from .corridor import corridor_entry, encode_polyline, simplify_path
+from .geo import KM_PER_DEGREE, haversine_km
+from .index import CargoEntry, RouteEntry
+from .knapsack import Item
+
+# (name, latitude, longitude)
+CITIES = (
+    ('Nairobi', -1.286389, 36.817223),
+    ('Mombasa', -4.043477, 39.668206),
+    ('Kisumu', -0.091702, 34.767956),
+    ('Nakuru', -0.303099, 36.080026),
+    ('Eldoret', 0.514277, 35.269779),
+    ('Kampala', 0.347596, 32.582520),
+    ('Dar es Salaam', -6.792354, 39.208328),
+    ('Arusha', -3.386925, 36.682995),
+    ('Kigali', -1.970579, 30.104429),
+    ('Dodoma', -6.162959, 35.751607),
+    ('Mwanza', -2.516430, 32.917500),
+    ('Garissa', -0.453229, 39.646099),
+    ('Malaba', 0.635790, 34.281650),
+    ('Namanga', -2.545130, 36.790560),
+)
+
+BASE_DAY = datetime.date(2025, 1, 1).toordinal()
+
+
+def _jitter(rng, city, spread_deg):
+    _, lat, lng = city
+    return lat + rng.gauss(0, spread_deg), lng + rng.gauss(0, spread_deg)
+
+
+def generate_routes(count, seed=0, days=90, spread_deg=0.4):
+    """Return ``count`` RouteEntry tuples between jittered city pairs."""
+    rng = random.Random(seed)
+    # Ratings come from their own stream so earlier seeds still produce the same routes.
+    ratings = random.Random(seed + 1000)
+    routes = []
+    for route_id in range(1, count + 1):
+        origin, destination = rng.sample(CITIES, 2)
+        olat, olng = _jitter(rng, origin, spread_deg)
+        dlat, dlng = _jitter(rng, destination, spread_deg)
+        routes.append(RouteEntry(
+            route_id, olat, olng, dlat, dlng,
+            BASE_DAY + rng.randrange(days),
+            round(rng.uniform(1, 30), 2),
+            round(rng.uniform(5, 80), 2),
+            round(rng.uniform(80, 250), 2),
+            round(ratings.uniform(1, 5), 2) if ratings.random() < 0.7 else 0.0,
+        ))
+    return routes
+
+
+def generate_cargo(count, seed=1, days=90, spread_deg=0.4):
+    """Return ``count`` CargoEntry tuples with pickup windows of up to a week."""
+    rng = random.Random(seed)
+    cargo = []
+    for cargo_id in range(1, count + 1):
+        origin, destination = rng.sample(CITIES, 2)
+        olat, olng = _jitter(rng, origin, spread_deg)
+        dlat, dlng = _jitter(rng, destination, spread_deg)
+        pickup_from = BASE_DAY + rng.randrange(days)
+        cargo.append(CargoEntry(
+            cargo_id, olat, olng, dlat, dlng,
+            pickup_from, pickup_from + rng.randrange(1, 8),
+            round(rng.uniform(0.5, 20), 2),
+            round(rng.uniform(20000, 200000), 2) if rng.random() < 0.8 else None,
+        ))
+    return cargo
+
+
+def as_route_rows(routes):
+    """Render RouteEntry tuples as the Decimal/date rows values_list(*ROUTE_FIELDS) returns."""
+    return [
+        (
+            route.id,
+            Decimal(f'{route.origin_lat:.6f}'), Decimal(f'{route.origin_lng:.6f}'),
+            Decimal(f'{route.dest_lat:.6f}'), Decimal(f'{route.dest_lng:.6f}'),
+            datetime.date.fromordinal(route.departure),
+            Decimal(f'{route.capacity_weight:.2f}'), Decimal(f'{route.capacity_volume:.2f}'),
+            Decimal(f'{route.price_per_km:.2f}'), Decimal(f'{route.owner_rating:.2f}'),
+        )
+        for route in routes
+    ]
+
+
+def _winding_path(rng, start, end, step_km):
+    """A road-like walk from ``start`` to ``end`` that drifts up to 60 degrees off the direct bearing."""
+    points = [start]
+    lat, lng = start
+    drift = 0.0
+    while haversine_km(lat, lng, *end) > step_km:
+        drift = max(min(0.9 * drift + rng.gauss(0, 0.15), 1.0), -1.0)
+        scale = math.cos(math.radians(lat))
+        heading = math.atan2((end[0] - lat), (end[1] - lng) * scale) + drift
+        lat += step_km * math.sin(heading) / KM_PER_DEGREE
+        lng += step_km * math.cos(heading) / KM_PER_DEGREE / scale
+        points.append((lat, lng))
+    points.append(end)
+    return points
+
+
+def generate_corridor_routes(routes, seed=2, step_km=2.0):
+    """
+    Return ``(CorridorEntry tuples, raw point count)`` giving each RouteEntry a
+    winding path sampled every ``step_km``, simplified and encoded as Route.path stores it.
+    """
+    rng = random.Random(seed)
+    entries = []
+    raw_points = 0
+    for route in routes:
+        points = _winding_path(rng, (route.origin_lat, route.origin_lng), (route.dest_lat, route.dest_lng), step_km)
+        raw_points += len(points)
+        entries.append(corridor_entry((
+            route.id, route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng,
+            encode_polyline(simplify_path(points)), datetime.date.fromordinal(route.departure),
+            route.capacity_weight,
+        )))
+    return entries, raw_points
+
+
+def generate_corridor_cargo(count, routes, seed=3, spread_km=25):
+    """
+    Return ``count`` CargoEntry tuples picked up and dropped off near two
+    points of a random CorridorEntry's path, in either order.
+    """
+    rng = random.Random(seed)
+    cargo = []
+    for cargo_id in range(1, count + 1):
+        route = rng.choice(routes)
+        ends = [route.points[rng.randrange(len(route.points))] for _ in range(2)]
+        (olat, olng), (dlat, dlng) = [
+            (lat + rng.gauss(0, spread_km / 2) / KM_PER_DEGREE, lng + rng.gauss(0, spread_km / 2) / KM_PER_DEGREE)
+            for lat, lng in ends
+        ]
+        pickup_from = route.departure - rng.randrange(4)
+        cargo.append(CargoEntry(
+            cargo_id, olat, olng, dlat, dlng, pickup_from, pickup_from + rng.randrange(1, 8),
+            round(rng.uniform(0.5, 20), 2), None,
+        ))
+    return cargo
+
+
+def generate_backhaul_routes(routes, seed=4, speed_kmh=50):
+    """Turn RouteEntry tuples into BackhaulRoutes arriving after a straight drive at ``speed_kmh``."""
+    rng = random.Random(seed)
+    return [
+        BackhaulRoute(
+            route.id, route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng,
+            route.departure + rng.random() + haversine_km(
+                route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng,
+            ) / speed_kmh / 24,
+            route.capacity_weight, None,
+        )
+        for route in routes
+    ]
+
+
+def generate_consolidation_instance(count, seed=5):
+    """
+    Return ``(items, capacity_weight, capacity_volume)``: a truck's spare
+    capacity and ``count`` knapsack Items for the cargo along its route,
+    priced by weight and distance. About a fifth have no recorded volume.
+    """
+    rng = random.Random(seed)
+    items = []
+    for cargo_id in range(1, count + 1):
+        weight = round(rng.uniform(0.2, 6), 2)
+        volume = round(weight * rng.uniform(0.8, 4), 2) if rng.random() < 0.8 else 0.0
+        items.append(Item(cargo_id, weight, volume, round(weight * rng.uniform(50, 600) * rng.uniform(80, 250), 2)))
+    demand_weight = sum(item.weight for item in items)
+    demand_volume = sum(item.volume for item in items)
+    return items, round(min(demand_weight * 0.4, 30), 2), round(min(demand_volume * 0.4, 80), 2)
@@ -0,0 +1,54 @@
+from celery import chord, shared_task
+from django.conf import settings
+
+from .backhaul import rebuild_backhaul_suggestions
+from .bulk import (
+    load_active_cargo, load_active_routes, match_serialized_partitions, partition_tasks, replace_pending_matches,
+)
+from .consolidation import consolidate_departures
+
+
+@shared_task
+def rematch_all_task(limit=None):
+    """
+    Nightly full re-match of active cargo against active routes.
+
+    Prefork pool workers are daemonic and may not start a process pool of
+    their own, so the partitions are fanned out as a chord of subtasks whose
+    callback writes the matches.
+    """
+    cargo = load_active_cargo()
+    routes = load_active_routes()
+    tasks = partition_tasks(cargo, routes, limit)
+    step = settings.MATCHING_PARTITIONS_PER_TASK
+    header = [match_partitions_task.s(tasks[start:start + step]) for start in range(0, len(tasks), step)]
+    summary = {'cargo': len(cargo), 'routes': len(routes)}
+    if not header:
+        return save_matches_task([], summary)
+    chord(header)(save_matches_task.s(summary))
+    return {**summary, 'subtasks': len(header)}
+
+
+@shared_task
+def match_partitions_task(tasks):
+    """Match a slice of the nightly re-match's partitions."""
+    return match_serialized_partitions(tasks)
+
+
+@shared_task
+def save_matches_task(results, summary):
+    """Replace the pending suggestions with the matches of every nightly re-match subtask."""
+    matches = [row for part in results for row in part]
+    return {**summary, 'matches': len(matches), 'deleted': replace_pending_matches(matches)}
+
+
+@shared_task
+def rebuild_backhauls_task():
+    """Re-rank return loads for trucks on the road as new cargo comes in."""
+    return rebuild_backhaul_suggestions()
+
+
+@shared_task
+def consolidate_departures_task(objective=None):
+    """Evening load plans for every route departing tomorrow."""
+    return consolidate_departures(objective=objective)
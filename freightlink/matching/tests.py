@@ -1,3 +1,535 @@
-from django.test import TestCase
+import datetime
+import itertools
+import json
+import random
+import sys
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from cargo.models import CargoListing
+from freightlink.testing import (
+    DAY, MOMBASA, create_business, create_cargo, create_owner, create_route, create_truck, route_fields,
+)
+from notifications.models import DigestEvent
+from routes.models import Route
+
+from .backhaul import BackhaulIndex, compute_backhauls, naive_backhauls, rebuild_backhaul_suggestions
+from .bulk import compute_all_matches
+from .consolidation import consolidate_departures, consolidate_route
+from .corridor import (
+    CorridorIndex, corridor_entry, decode_polyline, encode_polyline, get_corridor_index, simplify_path,
+)
+from .engine import find_corridor_routes, naive_candidate_routes, naive_corridor_routes
+from .incremental import apply_changes, check_consistency
+from .index import (
+    CargoEntry, CargoIndex, GridIndex, RouteIndex, get_cargo_index, get_route_index, loaded_index, reset_indexes,
+    route_matches_cargo,
+)
+from .knapsack import EPSILON, Item, solve
+from .models import BackhaulSuggestion, ConsolidationPlan, RouteMatch
+from .partition import partition_work
+from .scoring import columns_from_entries, route_columns, score_columns, top_k, top_k_reference
+from .synthetic import (
+    BASE_DAY, as_route_rows, generate_backhaul_routes, generate_cargo, generate_consolidation_instance,
+    generate_corridor_cargo, generate_corridor_routes, generate_routes,
+)
+from .tasks import match_partitions_task, rematch_all_task, save_matches_task
+
+# Nairobi to Mombasa through Voi, bending south-east of the straight line.
+NAIROBI_MOMBASA = [(-1.29, 36.82), (-2.2, 37.6), (-3.4, 38.56), (-4.04, 39.67)]
+
+
+class GridIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.routes = generate_routes(2000, days=30)
+        self.cargo = generate_cargo(300, days=30)
+
+    def test_route_index_agrees_with_naive_scan(self):
+        index = RouteIndex.from_entries(self.routes).share()
+        found = 0
+        for item in self.cargo:
+            expected = sorted(route.id for route in naive_candidate_routes(self.routes, item, 50))
+            self.assertEqual(sorted(route.id for route in index.match(item, 50)), expected)
+            found += len(expected)
+        self.assertGreater(found, 0)
+
+    def test_cargo_index_agrees_with_naive_scan(self):
+        index = CargoIndex.from_entries(self.cargo)
+        for route in self.routes[:300]:
+            expected = sorted(item.id for item in self.cargo if route_matches_cargo(route, item, 50))
+            self.assertEqual(sorted(item.id for item in index.match(route, 50)), expected)
+
+    def test_readers_iterate_safely_while_a_writer_refiles(self):
+        index = RouteIndex.from_entries(self.routes).share()
+        errors = []
+        stop = threading.Event()
+        # Switch threads often, so a reader is regularly caught halfway through a bucket.
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+
+        def read():
+            try:
+                while not stop.is_set():
+                    for item in self.cargo[:50]:
+                        index.match(item, 50)
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        try:
+            for _ in range(10):
+                for route in self.routes:
+                    index.remove(route.id)
+                for route in self.routes:
+                    index.add_entry(route)
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(index), len(self.routes))
+
+    def test_moved_and_removed_entries_are_refiled(self):
+        index = RouteIndex.from_entries(self.routes).share()
+        route = self.routes[0]
+        cargo = CargoEntry(1, route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng,
+                           route.departure, route.departure, route.capacity_weight, None)
+        self.assertIn(route.id, [found.id for found in index.match(cargo)])
+
+        index.add_entry(route._replace(departure=route.departure + 30))
+        self.assertNotIn(route.id, [found.id for found in index.match(cargo)])
+        self.assertEqual(len(index), len(self.routes))
+        index.remove(route.id)
+        self.assertNotIn(route.id, index)
+        self.assertIsNone(index.get(route.id))
+
+
+class CorridorIndexTests(SimpleTestCase):
+    def test_polyline_round_trip(self):
+        points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(encode_polyline(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline(encode_polyline(points)), points)
+
+    def test_simplify_keeps_only_real_bends(self):
+        straight = [(-1.0 - step / 100, 36.0) for step in range(101)]
+        self.assertEqual(simplify_path(straight), [straight[0], straight[-1]])
+        bent = straight + [(-2.0, 36.0 + step / 100) for step in range(1, 101)]
+        self.assertEqual(simplify_path(bent), [bent[0], (-2.0, 36.0), bent[-1]])
+
+    def test_index_agrees_with_scanning_every_path(self):
+        routes, _ = generate_corridor_routes(generate_routes(300, seed=4))
+        index = CorridorIndex.from_entries(routes, buffer_km=20)
+        cargo = generate_corridor_cargo(300, routes, seed=5, spread_km=20)
+        found = 0
+        for item in cargo:
+            matches = sorted(index.match(item))
+            self.assertEqual(matches, sorted(naive_corridor_routes(routes, item, 20)))
+            found += len(matches)
+        self.assertGreater(found, 50)
+
+    def test_direction_and_distance_from_the_path(self):
+        day = datetime.date(2025, 1, 1).toordinal()
+        route = corridor_entry((1, -1.29, 36.82, -4.04, 39.67, encode_polyline(NAIROBI_MOMBASA),
+                                datetime.date.fromordinal(day), 20))
+        index = CorridorIndex.from_entries([route], buffer_km=20)
+
+        def cargo(origin, destination):
+            return CargoEntry(1, *origin, *destination, day, day, 5, None)
+
+        # Emali to Voi, both a few km off the road.
+        [match] = index.match(cargo((-2.1, 37.45), (-3.35, 38.6)))
+        self.assertLess(match.pickup_km, 20)
+        self.assertLess(match.pickup_along_km, match.delivery_along_km)
+        self.assertEqual(index.match(cargo((-3.35, 38.6), (-2.1, 37.45))), [])
+        # On the straight line between the endpoints but over 20 km from the road.
+        self.assertEqual(index.match(cargo((-1.9, 37.7), (-3.35, 38.6))), [])
+
+
+class IncrementalMatchingTests(TestCase):
+    def setUp(self):
+        reset_indexes()
+        self.addCleanup(reset_indexes)
+        self.business = create_business()
+        self.truck = create_truck(create_owner())
+        self.day = DAY
+
+    def make_route(self, destination=MOMBASA, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_route(self.truck, self.day, destination, **fields)
+
+    def make_cargo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_cargo(
+                self.business, self.day, (-1.3, 36.85), (-4.0, 39.6), title='Cement', description='Bags of cement',
+                pickup_date_to=self.day + datetime.timedelta(days=2),
+                delivery_date_to=self.day + datetime.timedelta(days=7),
+            )
+
+    def save(self, instance, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(instance, name, value)
+            instance.save()
+
+    def suggested(self):
+        return sorted(RouteMatch.objects.values_list('cargo_id', 'route_id'))
+
+    def assertConsistent(self):
+        self.assertEqual(check_consistency(), {'missing': [], 'unexpected': [], 'rescored': []})
+
+    def test_saves_add_update_and_remove_suggestions(self):
+        get_route_index()
+        get_cargo_index()
+        cargo = self.make_cargo()
+        route = self.make_route()
+        self.assertEqual(self.suggested(), [(cargo.id, route.id)])
+        self.assertIn(route.id, loaded_index('route'))
+        self.assertConsistent()
+
+        self.save(route, price_per_km=150)
+        self.assertEqual(loaded_index('route').get(route.id).price_per_km, 150)
+        self.assertConsistent()
+
+        # Kisumu is nowhere near the cargo's destination.
+        self.save(route, destination_latitude=-0.09, destination_longitude=34.77)
+        self.assertEqual(self.suggested(), [])
+        self.save(route, destination_latitude=-4.04, destination_longitude=39.67)
+        self.assertEqual(self.suggested(), [(cargo.id, route.id)])
+
+        self.save(cargo, status='cancelled')
+        self.assertEqual(self.suggested(), [])
+        self.assertNotIn(cargo.id, loaded_index('cargo'))
+        self.assertConsistent()
+
+    def test_cold_process_matches_without_building_indexes(self):
+        cargo = self.make_cargo()
+        route = self.make_route()
+        self.assertEqual(self.suggested(), [(cargo.id, route.id)])
+        self.save(route, status='cancelled')
+        self.assertEqual(self.suggested(), [])
+        self.assertIsNone(loaded_index('route'))
+        self.assertIsNone(loaded_index('cargo'))
+
+    def test_rolled_back_changes_are_not_applied(self):
+        get_route_index()
+        get_cargo_index()
+        cargo = self.make_cargo()
+        route = self.make_route()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                route.status = 'cancelled'
+                route.save()
+                raise ValueError
+        with mock.patch('matching.incremental.apply_changes', wraps=apply_changes) as applied:
+            other = self.make_route(destination=(-0.09, 34.77))
+        self.assertEqual([list(call.args[0]) for call in applied.call_args_list], [[other.id]])
+        self.assertIn(route.id, loaded_index('route'))
+        self.assertEqual(self.suggested(), [(cargo.id, route.id)])
+
+    def test_consistency_check_reports_drift(self):
+        cargo = self.make_cargo()
+        route = self.make_route()
+        RouteMatch.objects.update(match_score=1)
+        self.assertEqual(check_consistency()['rescored'], [(cargo.id, route.id)])
+        RouteMatch.objects.all().delete()
+        self.assertEqual(check_consistency()['missing'], [(cargo.id, route.id)])
+
+        self.save(route)
+        # update() sends no signals, so the suggestion outlives the route.
+        Route.objects.filter(pk=route.pk).update(status='cancelled')
+        self.assertEqual(check_consistency()['unexpected'], [(cargo.id, route.id)])
+
+    @override_settings(MATCHING_INDEX_SYNC_SECONDS=0)
+    def test_indexes_pick_up_changes_saved_by_other_processes(self):
+        get_route_index()
+        # bulk_create sends no signals, like a save committed by another process.
+        [route] = Route.objects.bulk_create([Route(**route_fields(self.truck, self.day))])
+        self.assertIn(route.id, get_route_index())
+        Route.objects.filter(pk=route.pk).update(status='cancelled', updated_at=timezone.now())
+        self.assertNotIn(route.id, get_route_index())
+
+    def test_grid_index_requires_add_entry(self):
+        with self.assertRaises(TypeError):
+            GridIndex()
+
+    def test_nightly_task_fans_out_subtasks_instead_of_a_process_pool(self):
+        cargo = self.make_cargo()
+        route = self.make_route()
+        RouteMatch.objects.all().delete()
+        with mock.patch('matching.bulk.ProcessPoolExecutor', side_effect=AssertionError('pool started')), \
+                mock.patch('matching.tasks.chord') as fan_out:
+            self.assertEqual(rematch_all_task()['subtasks'], 1)
+        [header], _ = fan_out.call_args
+        [callback], _ = fan_out.return_value.call_args
+        # Pass arguments and results through JSON, as the broker and the result backend would.
+        results = [json.loads(json.dumps(match_partitions_task(*json.loads(json.dumps(task.args))))) for task in header]
+        summary = save_matches_task(results, *callback.args)
+        self.assertEqual((summary['matches'], summary['deleted']), (1, 0))
+        self.assertEqual(self.suggested(), [(cargo.id, route.id)])
+
+
+class BulkMatchingTests(SimpleTestCase):
+    radius_km = 50
+
+    def setUp(self):
+        self.cargo = generate_cargo(400, days=30)
+        self.routes = generate_routes(800, days=30)
+
+    def test_partitions_hold_every_feasible_route(self):
+        partitions = list(partition_work(self.cargo, self.routes, 200, 7, self.radius_km))
+        placed = [item.id for members, _ in partitions for item in members]
+        self.assertEqual(len(placed), len(set(placed)))
+        paired = 0
+        for members, selected in partitions:
+            selected = {route.id for route in selected}
+            for item in members:
+                feasible = {route.id for route in self.routes if route_matches_cargo(route, item, self.radius_km)}
+                self.assertLessEqual(feasible, selected)
+                paired += len(feasible)
+        self.assertGreater(paired, 0)
+
+    def test_parallel_run_matches_a_single_process_run(self):
+        single = compute_all_matches(self.cargo, self.routes, workers=1, limit=5, radius_km=self.radius_km)
+        parallel = compute_all_matches(self.cargo, self.routes, workers=2, limit=5, radius_km=self.radius_km)
+        self.assertEqual(sorted(parallel), sorted(single))
+
+        expected = []
+        for item in self.cargo:
+            feasible = [route for route in self.routes if route_matches_cargo(route, item, self.radius_km)]
+            if feasible:
+                expected += [(item.id,) + tuple(scored)
+                             for scored in top_k(item, columns_from_entries(feasible), 5, self.radius_km)]
+        self.assertEqual(sorted(single), sorted(expected))
+        self.assertTrue(single)
+
+
+class ScoringTests(SimpleTestCase):
+    def assertSameRanking(self, cargo, rows, k=10, radius_km=150):
+        expected = top_k_reference(cargo, rows, k, radius_km)
+        ranked = top_k(cargo, route_columns(rows), k, radius_km)
+        self.assertEqual([route.route_id for route in ranked], [route.route_id for route in expected])
+        for got, want in zip(ranked, expected):
+            for field, value in zip(got._fields[1:], got[1:]):
+                self.assertAlmostEqual(value, getattr(want, field), places=6, msg=field)
+        return ranked
+
+    def test_vectorized_scores_match_the_scalar_scorer(self):
+        rows = as_route_rows(generate_routes(300, days=20))
+        for cargo in generate_cargo(40, days=20):
+            self.assertSameRanking(cargo, rows, k=15, radius_km=2000)
+
+    def test_ties_are_broken_by_route_id(self):
+        route = generate_routes(1)[0]
+        # Identical routes listed out of id order, with k cutting through the tie.
+        rows = as_route_rows([route._replace(id=route_id) for route_id in (7, 3, 9, 1, 5)])
+        cargo = CargoEntry(1, route.origin_lat, route.origin_lng, route.dest_lat, route.dest_lng,
+                           route.departure, route.departure, 1.0, None)
+        ranked = self.assertSameRanking(cargo, rows, k=3)
+        self.assertEqual([scored.route_id for scored in ranked], [1, 3, 5])
+        self.assertEqual(len({scored.score for scored in ranked}), 1)
+
+    def test_routes_without_volume(self):
+        routes = [route._replace(capacity_volume=0.0) for route in generate_routes(50, days=5)]
+        for cargo in generate_cargo(10, days=5):
+            self.assertSameRanking(cargo, as_route_rows(routes), radius_km=2000)
+
+    def test_zero_budget_counts_as_no_budget(self):
+        rows = as_route_rows(generate_routes(50, days=5))
+        cargo = CargoEntry(1, -1.29, 36.82, -4.04, 39.67, BASE_DAY, BASE_DAY + 4, 5.0, 0.0)
+        zero = self.assertSameRanking(cargo, rows, radius_km=2000)
+        unbounded = top_k(cargo._replace(budget=None), route_columns(rows), 10, 2000)
+        self.assertEqual(zero, unbounded)
+        # A budget every route overshoots scores lower than none at all.
+        tight = score_columns(cargo._replace(budget=1.0), route_columns(rows), 2000)[0]
+        self.assertTrue((tight < score_columns(cargo, route_columns(rows), 2000)[0]).all())
+
+
+class CorridorMaintenanceTests(TestCase):
+    def setUp(self):
+        reset_indexes()
+        self.addCleanup(reset_indexes)
+        self.truck = create_truck(create_owner())
+        self.day = DAY
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cargo = create_cargo(
+                create_business(), self.day, (-2.1, 37.45), (-3.35, 38.6), title='Cement', description='Bags of cement',
+            )
+
+    def test_saved_routes_are_refiled(self):
+        get_corridor_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            route = create_route(self.truck, self.day, path=encode_polyline(NAIROBI_MOMBASA))
+        self.assertEqual([match.route_id for match in find_corridor_routes(self.cargo)], [route.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            route.path = encode_polyline([(-1.29, 36.82), (-1.0, 38.0), (-4.04, 39.67)])
+            route.save()
+        self.assertEqual(find_corridor_routes(self.cargo), [])
+
+
+class BackhaulTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        self.owner = create_owner()
+        self.day = DAY
+        # Nairobi to Mombasa, arriving in the evening of the first day.
+        self.route = create_route(
+            create_truck(self.owner), self.day, departure_time=datetime.time(6), available_capacity_volume=10,
+            available_capacity_weight=2, status='in_progress',
+        )
+
+    def make_cargo(self, origin, destination, first=0, last=1, weight=5):
+        return create_cargo(
+            self.business, self.day, origin, destination, title='Cement', description='Bags of cement', weight=weight,
+            pickup_date_from=self.day + datetime.timedelta(days=first),
+            pickup_date_to=self.day + datetime.timedelta(days=last),
+            delivery_date_to=self.day + datetime.timedelta(days=7),
+        )
+
+    def suggested(self):
+        return list(BackhaulSuggestion.objects.order_by('-score').values_list('cargo_id', 'status'))
+
+    def test_index_agrees_with_naive_scan(self):
+        routes = generate_backhaul_routes(generate_routes(100))
+        cargo = generate_cargo(2000)
+        index = BackhaulIndex.from_entries(cargo)
+        for route in routes:
+            self.assertEqual(sorted(index.match(route, 50, 3)), sorted(naive_backhauls(route, cargo, 50, 3)))
+
+    def test_suggests_feasible_loads_homeward_first(self):
+        mombasa, nairobi, dar = (-4.05, 39.6), (-1.3, 36.8), (-6.79, 39.21)
+        homeward = self.make_cargo(mombasa, nairobi, weight=15)
+        onward = self.make_cargo(mombasa, dar, first=2, last=3, weight=15)
+        self.make_cargo((-0.09, 34.77), nairobi)  # Picked up in Kisumu
+        self.make_cargo(mombasa, nairobi, first=-3, last=-1)  # Window closed before arrival
+        self.make_cargo(mombasa, nairobi, first=5, last=6)  # Opens too long after arrival
+        self.make_cargo(mombasa, nairobi, weight=25)  # Heavier than the truck
+
+        summary = rebuild_backhaul_suggestions()
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(self.suggested(), [(homeward.id, 'pending'), (onward.id, 'pending')])
+        # The whole truck is free on the way back, not just the route's spare capacity.
+        suggestion = BackhaulSuggestion.objects.get(cargo=onward)
+        self.assertEqual(suggestion.wait_hours, 30)
+        self.assertEqual(
+            sorted(DigestEvent.objects.values_list('user_id', 'event_type', 'object_id')),
+            sorted([(self.owner.id, 'backhaul', homeward.id), (self.owner.id, 'backhaul', onward.id)]),
+        )
+
+    def test_rebuild_keeps_decisions_and_drops_stale(self):
+        mombasa, nairobi = (-4.05, 39.6), (-1.3, 36.8)
+        accepted = self.make_cargo(mombasa, nairobi)
+        booked = self.make_cargo(mombasa, nairobi)
+        rebuild_backhaul_suggestions()
+        BackhaulSuggestion.objects.filter(cargo=accepted).update(status='accepted')
+        CargoListing.objects.filter(id=booked.id).update(status='booked')
+
+        summary = rebuild_backhaul_suggestions()
+        self.assertEqual((summary['created'], summary['deleted']), (0, 1))
+        self.assertEqual(self.suggested(), [(accepted.id, 'accepted')])
+
+        fresh = self.make_cargo(mombasa, nairobi)
+        self.assertEqual(rebuild_backhaul_suggestions()['created'], 1)
+        self.assertEqual(rebuild_backhaul_suggestions()['created'], 0)
+
+        Route.objects.filter(id=self.route.id).update(status='completed')
+        self.assertEqual(rebuild_backhaul_suggestions()['deleted'], 1)
+        self.assertEqual(self.suggested(), [(accepted.id, 'accepted')])
+        self.assertFalse(BackhaulSuggestion.objects.filter(cargo=fresh).exists())
+
+
+    def test_suggestions_decided_during_a_rebuild_are_not_announced_again(self):
+        cargo = self.make_cargo((-4.05, 39.6), (-1.3, 36.8))
+        rebuild_backhaul_suggestions()
+        DigestEvent.objects.all().delete()
+
+        def compute_then_accept(*args, **kwargs):
+            scored = compute_backhauls(*args, **kwargs)
+            # The owner accepts the suggestion between the scoring read and the write.
+            BackhaulSuggestion.objects.filter(cargo=cargo).update(status='accepted')
+            return scored
+
+        with mock.patch('matching.backhaul.compute_backhauls', side_effect=compute_then_accept):
+            self.assertEqual(rebuild_backhaul_suggestions()['created'], 0)
+        self.assertEqual(self.suggested(), [(cargo.id, 'accepted')])
+        self.assertFalse(DigestEvent.objects.exists())
+
+
+class KnapsackTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            items = [
+                Item(number, rng.uniform(0.5, 10), rng.uniform(0, 30) * (rng.random() < 0.8), rng.uniform(1, 100))
+                for number in range(rng.randrange(1, 11))
+            ]
+            capacity_weight, capacity_volume = rng.uniform(5, 30), rng.uniform(10, 60)
+            best = max(
+                sum(item.value for item in combination)
+                for size in range(len(items) + 1)
+                for combination in itertools.combinations(items, size)
+                if sum(item.weight for item in combination) <= capacity_weight + EPSILON
+                and sum(item.volume for item in combination) <= capacity_volume + EPSILON
+            )
+            packing = solve(items, capacity_weight, capacity_volume)
+            self.assertTrue(packing.optimal)
+            self.assertAlmostEqual(packing.value, best)
+
+    def test_time_limit_still_returns_a_packing_that_fits(self):
+        items, capacity_weight, capacity_volume = generate_consolidation_instance(300)
+        packing = solve(items, capacity_weight, capacity_volume, time_limit=0)
+        self.assertFalse(packing.optimal)
+        self.assertTrue(packing.ids)
+        self.assertLessEqual(packing.weight, capacity_weight + EPSILON)
+        self.assertLessEqual(packing.volume, capacity_volume + EPSILON)
+
+
+class ConsolidationTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        self.truck = create_truck(create_owner())
+        self.day = DAY + datetime.timedelta(days=1)
+        self.route = self.make_route(self.day)
+
+    def make_route(self, day):
+        return create_route(
+            self.truck, day, available_capacity_volume=20, available_capacity_weight=10,
+            path=encode_polyline(NAIROBI_MOMBASA),
+        )
+
+    def make_cargo(self, weight, volume, budget, origin=(-1.3, 36.85), day=None):
+        day = day or self.day
+        return create_cargo(
+            self.business, day, origin, (-4.0, 39.6), title='Cement', description='Bags of cement', weight=weight,
+            volume=volume, budget=budget,
+        )
+
+    def test_plans_the_most_valuable_combination_that_fits(self):
+        # Budgets cap each price below the rate over the ~430 km carried.
+        large = self.make_cargo(6, 4, 40000)
+        self.make_cargo(4, 4, 25000)
+        bulky = self.make_cargo(4, 15, 30000)
+        self.make_cargo(4, 1, 90000, origin=(-0.09, 34.77))  # Picked up in Kisumu, off the path
+        self.make_cargo(4, 1, 90000, day=self.day + datetime.timedelta(days=3))  # Picked up after departure
+
+        plan = consolidate_route(self.route.id)
+        self.assertEqual(set(plan.cargo.values_list('id', flat=True)), {large.id, bulky.id})
+        self.assertEqual((plan.revenue, plan.weight, plan.volume), (70000, 10, 19))
+        self.assertTrue(plan.optimal)
+
+    def test_departures_are_planned_in_one_batch(self):
+        cargo = self.make_cargo(6, None, 50000)
+        later = self.make_route(self.day + datetime.timedelta(days=1))
+        summary = consolidate_departures(self.day)
+        self.assertEqual((summary['routes'], summary['cargo'], summary['optimal']), (1, 1, 1))
+        self.assertEqual(list(ConsolidationPlan.objects.values_list('route_id', 'cargo')), [(self.route.id, cargo.id)])
+
+        consolidate_departures(self.day)
+        self.assertEqual(ConsolidationPlan.objects.count(), 1)
+        self.assertFalse(ConsolidationPlan.objects.filter(route=later).exists())
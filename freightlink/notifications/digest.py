@@ -0,0 +1,86 @@
+"""
+Per-user digesting of high-volume events.
+
+Events are buffered as DigestEvent rows, deduplicated by (user, event type,
+object id). Once a user's oldest buffered event is a full window old, the
+buffer is summarized into a single digest Notification that the normal
+dispatcher delivers, so each user gets at most one digest per window.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import DigestEvent, Notification
+
+EVENT_LABELS = {
+    'route_match': ('new cargo match', 'new cargo matches'),
+    'backhaul': ('return load', 'return loads'),
+    'booking_request': ('booking request', 'booking requests'),
+    'booking_update': ('booking update', 'booking updates'),
+    'payment': ('payment update', 'payment updates'),
+    'system': ('announcement', 'announcements'),
+}
+
+
+def record_events(events):
+    """Buffer ``(user_id, event_type, object_id)`` events for the users' next digests."""
+    DigestEvent.objects.bulk_create(
+        [DigestEvent(user_id=user_id, event_type=event_type, object_id=object_id)
+         for user_id, event_type, object_id in events],
+        ignore_conflicts=True,
+    )
+
+
+def record_event(user_id, event_type, object_id):
+    record_events([(user_id, event_type, object_id)])
+
+
+def digest_message(counts):
+    parts = []
+    for event_type, count in sorted(counts.items(), key=lambda item: -item[1]):
+        singular, plural = EVENT_LABELS.get(event_type, (event_type, event_type))
+        parts.append(f'{count} {singular if count == 1 else plural}')
+    return f"FreightLink: {', '.join(parts)}. Open the app for details."
+
+
+def flush_digests(now=None, window=None, chunk_size=None):
+    """
+    Turn buffered events into digest notifications for every user whose
+    window has elapsed, ``chunk_size`` users at a time. Returns the number
+    of digests created.
+    """
+    now = now or timezone.now()
+    window = window or timedelta(minutes=settings.NOTIFICATION_DIGEST_WINDOW_MINUTES)
+    chunk_size = chunk_size or settings.NOTIFICATION_DIGEST_CHUNK_SIZE
+    due = list(
+        DigestEvent.objects.order_by().values('user_id').annotate(first=Min('created_at'))
+        .filter(first__lte=now - window).values_list('user_id', flat=True)
+    )
+
+    created = 0
+    for start in range(0, len(due), chunk_size):
+        user_ids = due[start:start + chunk_size]
+        with transaction.atomic():
+            events = list(
+                DigestEvent.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'event_type')
+            )
+            if not events:
+                continue
+            counts = defaultdict(Counter)
+            for _, user_id, event_type in events:
+                counts[user_id][event_type] += 1
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id, notification_type='digest',
+                    title='Your FreightLink updates', message=digest_message(user_counts),
+                )
+                for user_id, user_counts in counts.items()
+            ])
+            # Events buffered while this chunk was read wait for the next window.
+            DigestEvent.objects.filter(user_id__in=user_ids, id__lte=max(row[0] for row in events)).delete()
+        created += len(counts)
+    return created
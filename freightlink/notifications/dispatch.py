@@ -0,0 +1,169 @@
+"""
+Queueing and batched delivery of user notifications.
+
+``notify()`` only inserts Notification rows; ``dispatch_notifications()``
+later sends everything unsent. Each dispatcher first claims the rows it
+will send, skipping rows another dispatcher has locked or claimed, so
+overlapping runs never deliver a message twice. Rows of users who opted
+out are marked skipped in the same pass, and identical SMS texts are
+delivered through the provider's multi-recipient send. A message the
+provider or mail server keeps refusing is skipped after
+``NOTIFICATION_MAX_ATTEMPTS`` dispatches, and one the mail server rejects
+permanently is skipped at once.
+"""
+import datetime
+import logging
+import smtplib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification
+from .sms import SmsError, get_sms_provider, get_sms_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def notify(user_ids, notification_type, title, message, related_object=None):
+    """Queue the same notification for every user in ``user_ids``."""
+    related = {}
+    if related_object is not None:
+        related = {
+            'related_object_id': related_object.pk,
+            'related_object_type': related_object._meta.label_lower,
+        }
+    return Notification.objects.bulk_create([
+        Notification(user_id=user_id, notification_type=notification_type, title=title, message=message, **related)
+        for user_id in user_ids
+    ])
+
+
+def claim_pending(channel, columns, limit):
+    """
+    Claim up to ``limit`` unsent ``'sms'`` or ``'email'`` notifications,
+    oldest first, and return their ``columns`` rows.
+
+    Rows another dispatcher holds locked are skipped rather than waited for.
+    A claim is only honoured for ``NOTIFICATION_CLAIM_SECONDS``, after which
+    the rows of a dispatcher that died mid-send are picked up again.
+    """
+    now = timezone.now()
+    claimed_at = f'{channel}_claimed_at'
+    expired = now - datetime.timedelta(seconds=settings.NOTIFICATION_CLAIM_SECONDS)
+    pending = Notification.objects.filter(
+        Q(**{f'{claimed_at}__isnull': True}) | Q(**{f'{claimed_at}__lt': expired}),
+        **{f'{channel}_sent': False, f'{channel}_skipped': False},
+    ).order_by('created_at', 'id')
+    with transaction.atomic():
+        rows = list(pending.select_for_update(skip_locked=True, of=('self',)).values_list(*columns)[:limit])
+        if rows:
+            Notification.objects.filter(id__in=[row[0] for row in rows]).update(**{
+                claimed_at: now, f'{channel}_attempts': F(f'{channel}_attempts') + 1,
+            })
+    return rows
+
+
+def _finish(channel, delivered, skipped, released):
+    """
+    Record a dispatch: ``delivered`` rows are sent, ``skipped`` never will be,
+    ``released`` are retried next time unless they are out of attempts.
+    """
+    if released:
+        exhausted = Notification.objects.filter(
+            id__in=released, **{f'{channel}_attempts__gte': settings.NOTIFICATION_MAX_ATTEMPTS},
+        )
+        if exhausted.update(**{f'{channel}_skipped': True}):
+            logger.warning(
+                'Gave up on %s notifications that failed %d times', channel, settings.NOTIFICATION_MAX_ATTEMPTS,
+            )
+    for ids, values in (
+        (delivered, {f'{channel}_sent': True}),
+        (skipped, {f'{channel}_skipped': True}),
+        (released, {f'{channel}_claimed_at': None}),
+    ):
+        if ids:
+            Notification.objects.filter(id__in=ids).update(**values)
+
+
+def dispatch_pending_sms(limit=5000, provider=None, limiter=None):
+    """Send up to ``limit`` unsent SMS notifications; returns how many were delivered."""
+    provider = provider or get_sms_provider()
+    limiter = limiter or get_sms_rate_limiter()
+    rows = claim_pending(
+        'sms', ('id', 'message', 'user__phone_number', 'user__sms_notifications', 'user__is_active'), limit,
+    )
+
+    groups = defaultdict(lambda: defaultdict(list))
+    skipped = []
+    for notification_id, message, phone_number, wanted, active in rows:
+        if wanted and active:
+            groups[message][phone_number].append(notification_id)
+        else:
+            skipped.append(notification_id)
+
+    chunk = settings.AFRICASTALKING_MAX_RECIPIENTS
+    delivered = []
+    try:
+        for message, recipients in groups.items():
+            numbers = list(recipients)
+            for start in range(0, len(numbers), chunk):
+                limiter.acquire()
+                try:
+                    accepted = provider.send(message, numbers[start:start + chunk])
+                except SmsError:
+                    logger.exception('SMS batch failed; it will be retried on the next dispatch')
+                    continue
+                delivered.extend(
+                    notification_id for number in accepted for notification_id in recipients.get(number, ())
+                )
+    finally:
+        sent = set(delivered) | set(skipped)
+        _finish('sms', delivered, skipped, [row[0] for row in rows if row[0] not in sent])
+    return len(delivered)
+
+
+def _rejected_for_good(error):
+    """Whether the mail server refused a message with a permanent (5xx) reply."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def dispatch_pending_email(limit=5000):
+    """
+    Send up to ``limit`` unsent email notifications over one SMTP connection.
+
+    Messages go out one at a time, so a refusal neither loses track of the
+    messages already sent nor holds back the rest of the batch.
+    """
+    rows = claim_pending(
+        'email', ('id', 'title', 'message', 'user__email', 'user__email_notifications', 'user__is_active'), limit,
+    )
+    pending = [row for row in rows if row[3] and row[4] and row[5]]
+    skipped = [row[0] for row in rows if not (row[3] and row[4] and row[5])]
+    delivered = []
+    try:
+        if pending:
+            with get_connection() as connection:
+                for notification_id, title, message, email, _, _ in pending:
+                    try:
+                        connection.send_messages([EmailMessage(title, message, to=[email])])
+                    except smtplib.SMTPException as error:
+                        if not _rejected_for_good(error):
+                            raise
+                        logger.warning('Mail server rejected notification %s: %s', notification_id, error)
+                        skipped.append(notification_id)
+                        continue
+                    delivered.append(notification_id)
+    finally:
+        done = set(delivered) | set(skipped)
+        _finish('email', delivered, skipped, [row[0] for row in pending if row[0] not in done])
+    return len(delivered)
+
+
+def dispatch_notifications(limit=5000):
+    return {'sms': dispatch_pending_sms(limit), 'email': dispatch_pending_email(limit)}
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from api.benchmarking import disposable_database
+from notifications.dispatch import dispatch_pending_sms
+from notifications.models import Notification
+from notifications.sms import FakeSmsProvider, RateLimiter
+
+
+class Command(BaseCommand):
+    help = 'Compare batched SMS dispatch with one provider call and preference lookup per notification.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--notifications', type=int, default=20000)
+        parser.add_argument('--distinct-messages', type=int, default=20)
+        parser.add_argument('--provider-latency-ms', type=float, default=20.0)
+        parser.add_argument('--naive-sample', type=int, default=500,
+                            help='Notifications sent the naive way; its rate is extrapolated.')
+
+    def handle(self, *args, **options):
+        latency = options['provider_latency_ms'] / 1000
+        with disposable_database():
+            self._seed(options)
+
+            sample = list(Notification.objects.values_list('id', flat=True)[:options['naive_sample']])
+            provider = FakeSmsProvider(latency)
+            started = time.perf_counter()
+            for notification in Notification.objects.filter(id__in=sample):
+                user = User.objects.get(id=notification.user_id)
+                if user.sms_notifications:
+                    provider.send(notification.message, [user.phone_number])
+                    notification.sms_sent = True
+                    notification.save(update_fields=['sms_sent'])
+            naive_rate = len(sample) / (time.perf_counter() - started)
+            naive_requests = len(provider.requests)
+            Notification.objects.filter(id__in=sample).update(sms_sent=False)
+
+            provider = FakeSmsProvider(latency)
+            limiter = RateLimiter(rate=1000)
+            started = time.perf_counter()
+            delivered = 0
+            while sent := dispatch_pending_sms(provider=provider, limiter=limiter):
+                delivered += sent
+            batched_rate = delivered / (time.perf_counter() - started)
+
+        self.stdout.write(f"{'dispatcher':<10} {'msgs/s':>10} {'provider calls':>15}")
+        self.stdout.write(f"{'naive':<10} {naive_rate:>10.0f} {naive_requests:>15} (for {len(sample)} messages)")
+        self.stdout.write(f"{'batched':<10} {batched_rate:>10.0f} {len(provider.requests):>15} (for {delivered} messages)")
+
+    def _seed(self, options):
+        rng = random.Random(0)
+        User.objects.bulk_create([
+            User(phone_number=f'+2547{index:08d}', sms_notifications=rng.random() > 0.1)
+            for index in range(options['users'])
+        ], batch_size=5000)
+        user_ids = list(User.objects.values_list('id', flat=True))
+        messages = [f'FreightLink: new cargo matches your route ({index})' for index in range(options['distinct_messages'])]
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=rng.choice(user_ids), notification_type='route_match',
+                title='New match', message=rng.choice(messages),
+            )
+            for _ in range(options['notifications'])
+        ], batch_size=5000)
@@ -1,3 +1,61 @@
 from django.db import models
+from accounts.models import User
 
-# Create your models here.
+class Notification(models.Model):
+    TYPE_CHOICES = (
+        ('booking_request', 'Booking Request'),
+        ('booking_update', 'Booking Status Update'),
+        ('payment', 'Payment Notification'),
+        ('route_match', 'Route Match'),
+        ('backhaul', 'Backhaul Suggestion'),
+        ('system', 'System Notification'),
+        ('digest', 'Digest'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    related_object_id = models.PositiveIntegerField(blank=True, null=True)
+    related_object_type = models.CharField(max_length=50, blank=True, null=True)
+    is_read = models.BooleanField(default=False)
+    email_sent = models.BooleanField(default=False)
+    sms_sent = models.BooleanField(default=False)
+    # Never sent because the user opted out or was deactivated, so dispatchers stop scanning them
+    email_skipped = models.BooleanField(default=False)
+    sms_skipped = models.BooleanField(default=False)
+    # When a dispatcher took the row; overlapping dispatchers leave claimed rows alone until the claim expires
+    email_claimed_at = models.DateTimeField(blank=True, null=True)
+    sms_claimed_at = models.DateTimeField(blank=True, null=True)
+    # Deliveries tried; a message that keeps failing is skipped once it reaches NOTIFICATION_MAX_ATTEMPTS
+    email_attempts = models.PositiveSmallIntegerField(default=0)
+    sms_attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.notification_type}: {self.title} for {self.user.phone_number}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Dispatcher scans for messages not yet sent
+            models.Index(fields=['sms_sent', 'sms_skipped', 'created_at'], name='notification_sms_pending_idx'),
+            models.Index(fields=['email_sent', 'email_skipped', 'created_at'], name='notification_email_pending_idx'),
+        ]
+
+
+class DigestEvent(models.Model):
+    """An event waiting to be summarized in the user's next digest."""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='digest_events')
+    event_type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
+    object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.event_type} #{self.object_id} for {self.user_id}"
+    
+    class Meta:
+        ordering = ['created_at']
+        # Repeated events about the same object collapse into one entry
+        unique_together = ('user', 'event_type', 'object_id')
@@ -0,0 +1,131 @@
+"""SMS providers and the rate limiters used by the notification dispatcher."""
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+AFRICASTALKING_URL = 'https://api.africastalking.com/version1/messaging'
+AFRICASTALKING_SANDBOX_URL = 'https://api.sandbox.africastalking.com/version1/messaging'
+
+
+class SmsError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+            self._tokens -= 1
+        if wait:
+            self._sleep(wait)
+
+
+class SharedRateLimiter:
+    """
+    Allows ``rate`` calls per second across every process sharing the Django cache.
+
+    Calls are counted in one cache key per wall-clock second; a call over the
+    limit sleeps until the next second and tries again there.
+    """
+
+    def __init__(self, rate, key, clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.key = key
+        self._clock = clock
+        self._sleep = sleep
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            now = self._clock()
+            counter = f'{self.key}:{int(now)}'
+            cache.add(counter, 0, 5)
+            try:
+                count = cache.incr(counter)
+            except ValueError:
+                # Evicted between add() and incr(); count again.
+                continue
+            if count <= self.rate:
+                return
+            self._sleep(int(now) + 1 - now)
+
+
+class AfricasTalkingProvider:
+    """Sends one message to many recipients per request through Africa's Talking."""
+
+    def __init__(self, username=None, api_key=None, sender_id=None, timeout=10.0):
+        self.username = username or settings.AFRICASTALKING_USERNAME
+        self.sender_id = sender_id or settings.AFRICASTALKING_SENDER_ID
+        self.url = AFRICASTALKING_SANDBOX_URL if self.username == 'sandbox' else AFRICASTALKING_URL
+        self._http = httpx.Client(timeout=timeout, headers={
+            'apiKey': api_key or settings.AFRICASTALKING_API_KEY,
+            'Accept': 'application/json',
+        })
+
+    def send(self, message, phone_numbers):
+        """Send ``message`` to every number; returns the numbers the provider accepted."""
+        data = {'username': self.username, 'to': ','.join(phone_numbers), 'message': message}
+        if self.sender_id:
+            data['from'] = self.sender_id
+        try:
+            response = self._http.post(self.url, data=data)
+            response.raise_for_status()
+            recipients = response.json()['SMSMessageData']['Recipients']
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            raise SmsError(f"Africa's Talking bulk send failed: {exc}") from exc
+        return {recipient['number'] for recipient in recipients if recipient.get('status') == 'Success'}
+
+
+class FakeSmsProvider:
+    """Records sends in memory; optional ``latency`` mimics a provider round trip."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+
+    def send(self, message, phone_numbers):
+        time.sleep(self.latency)
+        self.requests.append((message, list(phone_numbers)))
+        return set(phone_numbers)
+
+    @property
+    def messages_sent(self):
+        return sum(len(numbers) for _, numbers in self.requests)
+
+
+_provider = None
+_limiter = None
+
+
+def get_sms_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.SMS_PROVIDER)()
+    return _provider
+
+
+def get_sms_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        # Africa's Talking limits the account, not the process, so every dispatcher counts against one budget.
+        _limiter = SharedRateLimiter(settings.AFRICASTALKING_REQUESTS_PER_SECOND, 'sms-rate')
+    return _limiter
@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .digest import flush_digests
+from .dispatch import dispatch_notifications
+
+
+@shared_task
+def dispatch_notifications_task(limit=5000):
+    """Deliver queued SMS and email notifications."""
+    return dispatch_notifications(limit)
+
+
+@shared_task
+def flush_digests_task():
+    """Summarize buffered events into one digest per user whose window has elapsed."""
+    return flush_digests()
@@ -1,3 +1,176 @@
-from django.test import TestCase
+import smtplib
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+
+from .digest import flush_digests, record_event, record_events
+from .dispatch import claim_pending, dispatch_pending_email, dispatch_pending_sms, notify
+from .models import DigestEvent, Notification
+from .sms import FakeSmsProvider, RateLimiter, SharedRateLimiter, SmsError
+
+
+class DispatchPendingSmsTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(phone_number=f'+25470000000{index}') for index in range(4)]
+        self.users[3].sms_notifications = False
+        self.users[3].save()
+        self.provider = FakeSmsProvider()
+        self.limiter = RateLimiter(rate=1000)
+
+    def test_identical_messages_share_one_bulk_send(self):
+        notify([user.id for user in self.users], 'route_match', 'New match', 'Cargo matches your route')
+        notify([self.users[0].id], 'payment', 'Payment', 'Payment received')
+
+        # Claim (savepoint, select, update, release), then mark sent and skipped rows.
+        with self.assertNumQueries(6):
+            delivered = dispatch_pending_sms(provider=self.provider, limiter=self.limiter)
+
+        self.assertEqual(delivered, 4)
+        self.assertEqual(sorted(len(numbers) for _, numbers in self.provider.requests), [1, 3])
+        self.assertEqual(Notification.objects.filter(sms_sent=False).count(), 1)
+        # The opted-out user's row is settled, not scanned again on every dispatch.
+        self.assertEqual(Notification.objects.get(sms_sent=False).sms_skipped, True)
+        self.assertEqual(claim_pending('sms', ('id',), 10), [])
+
+    def test_sent_notifications_are_not_resent(self):
+        notify([self.users[0].id], 'system', 'Hello', 'Welcome')
+        dispatch_pending_sms(provider=self.provider, limiter=self.limiter)
+        self.assertEqual(dispatch_pending_sms(provider=self.provider, limiter=self.limiter), 0)
+        self.assertEqual(len(self.provider.requests), 1)
+
+    def test_rows_claimed_by_another_dispatcher_are_left_alone(self):
+        notify([self.users[0].id], 'system', 'Hello', 'Welcome')
+        self.assertEqual(len(claim_pending('sms', ('id',), 10)), 1)
+        self.assertEqual(dispatch_pending_sms(provider=self.provider, limiter=self.limiter), 0)
+        # The other dispatcher died without sending; its claim runs out.
+        Notification.objects.update(sms_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(dispatch_pending_sms(provider=self.provider, limiter=self.limiter), 1)
+
+    def test_failed_batches_are_retried(self):
+        class FailingProvider:
+            def send(self, message, phone_numbers):
+                raise SmsError('Provider unavailable')
+
+        notify([self.users[0].id], 'system', 'Hello', 'Welcome')
+        with self.assertLogs('notifications.dispatch', 'ERROR'):
+            self.assertEqual(dispatch_pending_sms(provider=FailingProvider(), limiter=self.limiter), 0)
+        self.assertEqual(dispatch_pending_sms(provider=self.provider, limiter=self.limiter), 1)
+
+    def test_numbers_never_accepted_are_given_up_on(self):
+        class RefusingProvider:
+            def send(self, message, phone_numbers):
+                return []
+
+        notify([self.users[0].id], 'system', 'Hello', 'Welcome')
+        with self.assertLogs('notifications.dispatch', 'WARNING'):
+            for _ in range(settings.NOTIFICATION_MAX_ATTEMPTS):
+                self.assertEqual(dispatch_pending_sms(provider=RefusingProvider(), limiter=self.limiter), 0)
+        notification = Notification.objects.get()
+        self.assertTrue(notification.sms_skipped)
+        self.assertFalse(notification.sms_sent)
+        self.assertEqual(claim_pending('sms', ('id',), 10), [])
+
+
+class RefusingEmailBackend(EmailBackend):
+    """Locmem backend whose server rejects one mailbox, permanently or for now."""
+
+    refused = {}
+
+    def send_messages(self, messages):
+        for message in messages:
+            code = self.refused.get(message.to[0])
+            if code:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (code, b'Mailbox unavailable')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='notifications.tests.RefusingEmailBackend')
+class DispatchPendingEmailTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(phone_number=f'+25470000000{index}', email=f'user{index}@example.com')
+            for index in range(3)
+        ]
+        self.addCleanup(RefusingEmailBackend.refused.clear)
+
+    def test_permanent_rejection_is_skipped_and_the_rest_delivered(self):
+        RefusingEmailBackend.refused['user1@example.com'] = 550
+        notify([user.id for user in self.users], 'system', 'Hello', 'Welcome')
+        with self.assertLogs('notifications.dispatch', 'WARNING'):
+            self.assertEqual(dispatch_pending_email(), 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['user0@example.com', 'user2@example.com'])
+        self.assertTrue(Notification.objects.get(user=self.users[1]).email_skipped)
+
+        self.assertEqual(dispatch_pending_email(), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_temporary_rejection_keeps_the_sent_messages_sent(self):
+        RefusingEmailBackend.refused['user1@example.com'] = 451
+        notify([user.id for user in self.users], 'system', 'Hello', 'Welcome')
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            dispatch_pending_email()
+        self.assertEqual([message.to[0] for message in mail.outbox], ['user0@example.com'])
+
+        RefusingEmailBackend.refused.clear()
+        self.assertEqual(dispatch_pending_email(), 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            'user0@example.com', 'user1@example.com', 'user2@example.com',
+        ])
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_waits_once_burst_is_spent(self):
+        now = [0.0]
+        waits = []
+        limiter = RateLimiter(rate=2, clock=lambda: now[0], sleep=waits.append)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(waits, [0.5, 1.0])
+
+
+class SharedRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_processes_share_one_budget(self):
+        now = [100.25]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        # Two dispatchers in different processes see the same cache.
+        limiters = [SharedRateLimiter(2, 'test-rate', clock=lambda: now[0], sleep=sleep) for _ in range(2)]
+        for limiter in limiters + limiters:
+            limiter.acquire()
+        self.assertEqual(waits, [0.75])
+        self.assertEqual(now[0], 101.0)
+
+
+class FlushDigestsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone_number='+254711111111')
+
+    def test_events_are_deduplicated_into_one_digest(self):
+        record_events([(self.user.id, 'route_match', cargo_id) for cargo_id in (1, 2, 2, 3)])
+        record_event(self.user.id, 'payment', 7)
+
+        self.assertEqual(flush_digests(now=timezone.now() + timedelta(hours=2), window=timedelta(hours=1)), 1)
+
+        digest = Notification.objects.get(user=self.user, notification_type='digest')
+        self.assertEqual(digest.message, 'FreightLink: 3 new cargo matches, 1 payment update. Open the app for details.')
+        self.assertFalse(DigestEvent.objects.exists())
+
+    def test_users_inside_their_window_are_not_flushed(self):
+        record_event(self.user.id, 'route_match', 1)
+        self.assertEqual(flush_digests(window=timedelta(hours=1)), 0)
+        self.assertEqual(DigestEvent.objects.count(), 1)
@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from freightlink.list_admin import ForListAdmin
+
+from .models import MpesaCallback, Payment
+
+
+@admin.register(Payment)
+class PaymentAdmin(ForListAdmin):
+    list_display = ('__str__', 'payer', 'receiver', 'amount', 'payment_type', 'status', 'mpesa_receipt', 'created_at')
+    list_filter = ('status', 'payment_type')
+    list_select_related = ('payer', 'receiver')
+    raw_id_fields = ('booking', 'payer', 'receiver')
+
+
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'payment_id', 'result_code', 'amount', 'phone_number', 'created_at')
+    list_filter = ('result_code',)
+    raw_id_fields = ('payment',)
@@ -0,0 +1,257 @@
+"""
+Batch processing of queued M-Pesa STK callbacks.
+
+A callback can beat its payment's CheckoutRequestID into the database when
+Safaricom answers faster than the STK push response is saved. Such a
+callback is stored without a payment and attached, settling the payment,
+once the id is written; ``attach_orphan_callbacks`` also sweeps recent
+orphans after every batch in case the two raced.
+"""
+import datetime
+import json
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from accounts.stats import payment_state, record_payment_transitions
+
+from .models import MpesaCallback, Payment
+from .queue import get_callback_queue
+
+logger = logging.getLogger(__name__)
+
+# Payments still waiting on Safaricom; anything else is never overwritten by a callback.
+OPEN_PAYMENT_STATUSES = ('pending', 'processing')
+# MpesaCallback.amount holds ten digits, two of them decimals.
+MAX_AMOUNT = Decimal(10) ** 8
+# Errors a parsed callback can still cause when it is stored; the row is set aside rather than retried.
+ROW_ERRORS = (DataError, IntegrityError, ValueError, TypeError, ArithmeticError)
+# Errors of a payload too malformed to parse.
+PARSE_ERRORS = (ValueError, KeyError, TypeError, AttributeError, ArithmeticError)
+
+
+def _text(value, field, numeric=False, required=False):
+    """Check one callback value against its MpesaCallback column; Safaricom sends some ids as numbers."""
+    if value is None and not required:
+        return None
+    if numeric and isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or (required and not value):
+        raise ValueError(f'{field} must be a {"number or " if numeric else ""}string, got {value!r}')
+    if len(value) > MpesaCallback._meta.get_field(field).max_length:
+        raise ValueError(f'{field} is too long')
+    return value
+
+
+def _amount(value):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'Amount must be a number, got {value!r}')
+    try:
+        amount = Decimal(str(value))
+    except ArithmeticError:
+        raise ValueError(f'Amount must be a number, got {value!r}') from None
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT:
+        raise ValueError(f'Amount out of range: {value!r}')
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_callback(payload):
+    """
+    Turn a raw STK callback body into MpesaCallback field values.
+
+    Every value is checked against the column it lands in, so a payload
+    that gets past here can be stored; anything else raises ValueError.
+    """
+    stk = json.loads(payload)['Body']['stkCallback']
+    items = stk.get('CallbackMetadata', {}).get('Item', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) and 'Name' in item for item in items):
+        raise ValueError('CallbackMetadata items must be objects with a Name')
+    metadata = {item['Name']: item.get('Value') for item in items if isinstance(item['Name'], str)}
+    result_desc = stk.get('ResultDesc', '')
+    if not isinstance(result_desc, str):
+        raise ValueError('ResultDesc must be a string')
+    return {
+        'merchant_request_id': _text(stk['MerchantRequestID'], 'merchant_request_id', required=True),
+        'checkout_request_id': _text(stk['CheckoutRequestID'], 'checkout_request_id', required=True),
+        'result_code': _text(stk['ResultCode'], 'result_code', numeric=True, required=True),
+        'result_desc': result_desc[:255],
+        'mpesa_receipt_number': _text(metadata.get('MpesaReceiptNumber'), 'mpesa_receipt_number'),
+        'transaction_date': _text(metadata.get('TransactionDate'), 'transaction_date', numeric=True),
+        'phone_number': _text(metadata.get('PhoneNumber'), 'phone_number', numeric=True),
+        'amount': _amount(metadata.get('Amount')),
+        'raw_response': payload.decode() if isinstance(payload, bytes) else payload,
+    }
+
+
+def _payment_date(transaction_date):
+    """Parse Safaricom's YYYYMMDDHHMMSS timestamp, falling back to now."""
+    try:
+        parsed = datetime.datetime.strptime(transaction_date, '%Y%m%d%H%M%S')
+    except (TypeError, ValueError):
+        return timezone.now()
+    return timezone.make_aware(parsed)
+
+
+PAYMENT_FIELDS = ('id', 'checkout_request_id', 'status', 'mpesa_receipt', 'payment_date', 'payer', 'receiver', 'amount')
+
+
+def _settle(payments, results):
+    """
+    Complete or fail the open ``{checkout_id: Payment}`` that ``{checkout_id:
+    callback fields}`` results report on, in one bulk update.
+    """
+    now = timezone.now()
+    settled = []
+    transitions = []
+    for checkout_id, fields in results.items():
+        payment = payments.get(checkout_id)
+        if payment is None or payment.status not in OPEN_PAYMENT_STATUSES:
+            continue
+        old_state = payment_state(payment)
+        if fields['result_code'] == '0':
+            payment.status = 'completed'
+            payment.mpesa_receipt = fields['mpesa_receipt_number']
+            payment.payment_date = _payment_date(fields['transaction_date'])
+        else:
+            payment.status = 'failed'
+        payment.updated_at = now
+        settled.append(payment)
+        transitions.append((old_state, payment_state(payment)))
+
+    Payment.objects.bulk_update(settled, ['status', 'mpesa_receipt', 'payment_date', 'updated_at'])
+    # bulk_update sends no signals, so dashboard counters are told directly.
+    record_payment_transitions(transitions)
+
+
+def _locked_payments(checkout_ids):
+    return {
+        payment.checkout_request_id: payment
+        for payment in Payment.objects.select_for_update().filter(checkout_request_id__in=checkout_ids).only(
+            *PAYMENT_FIELDS,
+        )
+    }
+
+
+def apply_callbacks(callbacks):
+    """
+    Store parsed callbacks and settle their payments in a handful of queries.
+
+    Callbacks whose checkout_request_id is already stored are duplicates and
+    are skipped, so replaying a batch is harmless. Returns the number of new
+    callbacks stored.
+    """
+    unique = {}
+    for fields in callbacks:
+        unique.setdefault(fields['checkout_request_id'], fields)
+
+    with transaction.atomic():
+        seen = set(
+            MpesaCallback.objects.filter(checkout_request_id__in=unique).values_list('checkout_request_id', flat=True)
+        )
+        fresh = {checkout_id: fields for checkout_id, fields in unique.items() if checkout_id not in seen}
+        if not fresh:
+            return 0
+
+        payments = _locked_payments(fresh)
+        _settle(payments, fresh)
+        MpesaCallback.objects.bulk_create(
+            [MpesaCallback(payment=payments.get(checkout_id), **fields) for checkout_id, fields in fresh.items()],
+            ignore_conflicts=True,
+        )
+    return len(fresh)
+
+
+def attach_orphan_callbacks(checkout_ids=None):
+    """
+    Attach stored callbacks that arrived before their payment had a
+    CheckoutRequestID, and settle those payments. Without ``checkout_ids``
+    every orphan from the last ``MPESA_ORPHAN_CALLBACK_HOURS`` is tried.
+    Returns the number of callbacks attached.
+    """
+    orphans = MpesaCallback.objects.filter(
+        payment__isnull=True,
+        checkout_request_id__in=Payment.objects.filter(checkout_request_id__isnull=False).values('checkout_request_id'),
+    )
+    if checkout_ids is None:
+        cutoff = timezone.now() - datetime.timedelta(hours=settings.MPESA_ORPHAN_CALLBACK_HOURS)
+        orphans = orphans.filter(created_at__gte=cutoff)
+    else:
+        orphans = orphans.filter(checkout_request_id__in=checkout_ids)
+
+    with transaction.atomic():
+        found = {
+            callback.checkout_request_id: callback
+            for callback in orphans.select_for_update().only(
+                'id', 'checkout_request_id', 'result_code', 'mpesa_receipt_number', 'transaction_date',
+            )
+        }
+        if not found:
+            return 0
+        payments = _locked_payments(found)
+        _settle(payments, {
+            checkout_id: {
+                'result_code': callback.result_code,
+                'mpesa_receipt_number': callback.mpesa_receipt_number,
+                'transaction_date': callback.transaction_date,
+            }
+            for checkout_id, callback in found.items()
+        })
+        for checkout_id, callback in found.items():
+            callback.payment = payments.get(checkout_id)
+        MpesaCallback.objects.bulk_update(found.values(), ['payment'])
+    return len(found)
+
+
+def _apply_isolating(entries):
+    """
+    Apply ``(entry_id, fields)`` pairs, halving the batch around rows the
+    database rejects; returns the ids of the rejected entries.
+    """
+    try:
+        apply_callbacks([fields for _, fields in entries])
+        return []
+    except ROW_ERRORS:
+        if len(entries) == 1:
+            logger.exception('M-Pesa callback %s was rejected', entries[0][0])
+            return [entries[0][0]]
+    middle = len(entries) // 2
+    return _apply_isolating(entries[:middle]) + _apply_isolating(entries[middle:])
+
+
+def process_callback_batch(size=500, queue=None):
+    """
+    Apply up to ``size`` queued callbacks; returns how many entries were taken.
+
+    Entries are acknowledged only after the database transaction commits, so
+    a crash in between just replays them as duplicates once their lease
+    runs out. Payloads that cannot be parsed or stored are buried; any other
+    failure, such as a lost connection, hands the batch back for the next run.
+    """
+    queue = queue or get_callback_queue()
+    entries = queue.get_batch(size)
+    if not entries:
+        return 0
+
+    parsed, broken = [], []
+    for entry_id, payload in entries:
+        try:
+            parsed.append((entry_id, parse_callback(payload)))
+        except PARSE_ERRORS:
+            logger.exception('Unreadable M-Pesa callback %s', entry_id)
+            broken.append(entry_id)
+    queue.bury(broken)
+
+    try:
+        rejected = _apply_isolating(parsed) if parsed else []
+    except Exception:
+        queue.release(entry_id for entry_id, _ in parsed)
+        raise
+    queue.bury(rejected)
+    queue.ack(entry_id for entry_id, _ in parsed if entry_id not in rejected)
+    attach_orphan_callbacks()
+    return len(entries)
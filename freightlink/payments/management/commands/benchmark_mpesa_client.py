@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+from payments.mpesa import MpesaClient
+from payments.testing import FakeDaraja
+
+
+async def naive_stk_push(base_url, index):
+    """What a client without pooling or token caching does for every push."""
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        token = (await http.get(
+            '/oauth/v1/generate', params={'grant_type': 'client_credentials'}, auth=('key', 'secret'),
+        )).json()['access_token']
+        response = await http.post(
+            '/mpesa/stkpush/v1/processrequest',
+            json={'AccountReference': f'Booking{index}'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        return response.json()
+
+
+class Command(BaseCommand):
+    help = 'Compare STK push throughput of the pooled client with a per-request-token client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--latency-ms', type=float, default=5.0, help='Fake Daraja API latency.')
+        parser.add_argument('--token-latency-ms', type=float, default=50.0, help='Fake OAuth latency.')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+        with FakeDaraja(latency=options['latency_ms'] / 1000, token_latency=options['token_latency_ms'] / 1000) as daraja:
+            pooled = asyncio.run(self._pooled(daraja.url, total, concurrency))
+            pooled_connections, pooled_tokens = daraja.connections, daraja.token_requests
+            naive = asyncio.run(self._naive(daraja.url, total, concurrency))
+            naive_connections = daraja.connections - pooled_connections
+            naive_tokens = daraja.token_requests - pooled_tokens
+
+        self.stdout.write(f"{'client':<10} {'req/s':>8} {'connections':>12} {'token calls':>12}")
+        self.stdout.write(f"{'pooled':<10} {total / pooled:>8.0f} {pooled_connections:>12} {pooled_tokens:>12}")
+        self.stdout.write(f"{'naive':<10} {total / naive:>8.0f} {naive_connections:>12} {naive_tokens:>12}")
+
+    async def _pooled(self, url, total, concurrency):
+        async with MpesaClient('key', 'secret', '174379', 'passkey', url,
+                               callback_url='https://example.com/callback', max_concurrency=concurrency) as client:
+            await client.tokens.get()
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                client.stk_push('254700000000', 100, f'Booking{index}', 'Benchmark') for index in range(total)
+            ))
+            return time.perf_counter() - started
+
+    async def _naive(self, url, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def push(index):
+            async with semaphore:
+                return await naive_stk_push(url, index)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(push(index) for index in range(total)))
+        return time.perf_counter() - started
@@ -0,0 +1,104 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from payments.callbacks import process_callback_batch
+
+
+def stk_callback(checkout_id, success=True):
+    """Build an STK callback body shaped like Safaricom's."""
+    callback = {
+        'MerchantRequestID': f'{checkout_id}-m',
+        'CheckoutRequestID': checkout_id,
+        'ResultCode': 0 if success else 1032,
+        'ResultDesc': 'The service request is processed successfully.' if success else 'Request cancelled by user',
+    }
+    if success:
+        callback['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': 1500.0},
+            {'Name': 'MpesaReceiptNumber', 'Value': f'R{checkout_id[-9:]}'},
+            {'Name': 'TransactionDate', 'Value': 20250101120000},
+            {'Name': 'PhoneNumber', 'Value': 254700000000},
+        ]}
+    return json.dumps({'Body': {'stkCallback': callback}}).encode()
+
+
+class Command(BaseCommand):
+    help = 'Replay synthetic M-Pesa callbacks at a fixed rate and report ingestion latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+        parser.add_argument('--per-minute', type=int, default=10000)
+        parser.add_argument('--duplicates', type=float, default=0.05, help='Fraction of callbacks resent.')
+        parser.add_argument('--url', help='Callback URL of a running server; defaults to an in-process client.')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--drain', action='store_true', help='Run the batch worker afterwards and time it.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        bodies = [stk_callback(f'ws_CO_LOAD{index:010d}', rng.random() > 0.1) for index in range(options['count'])]
+        bodies += rng.sample(bodies, int(len(bodies) * options['duplicates']))
+        rng.shuffle(bodies)
+
+        send = self._http_sender(options['url']) if options['url'] else self._client_sender()
+        interval = 60.0 / options['per_minute']
+        latencies = []
+        lock = threading.Lock()
+
+        def fire(body):
+            started = time.perf_counter()
+            send(body)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            for position, body in enumerate(bodies):
+                delay = started + position * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(fire, body)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        self.stdout.write(
+            f'Sent {len(bodies)} callbacks in {elapsed:.1f}s ({len(bodies) / elapsed * 60:.0f}/min); '
+            f'ack latency p50={statistics.median(latencies):.2f}ms '
+            f'p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms max={latencies[-1]:.2f}ms'
+        )
+
+        if options['drain']:
+            started = time.perf_counter()
+            processed = 0
+            while taken := process_callback_batch():
+                processed += taken
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Worker applied {processed} queued callbacks in {elapsed:.1f}s '
+                f'({processed / max(elapsed, 1e-9) * 60:.0f}/min)'
+            )
+
+    def _http_sender(self, url):
+        def send(body):
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        return send
+
+    def _client_sender(self):
+        local = threading.local()
+        url = reverse('payments:mpesa_callback')
+
+        def send(body):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            local.client.post(url, data=body, content_type='application/json')
+        return send
@@ -0,0 +1,40 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.callbacks import process_callback_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Apply queued M-Pesa callbacks in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--idle-sleep', type=float, default=0.5,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit.')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            try:
+                taken = process_callback_batch(options['batch_size'])
+            except Exception:
+                if options['once']:
+                    raise
+                # The batch was handed back to the queue; wait for the database before retrying.
+                logger.exception('Applying M-Pesa callbacks failed')
+                close_old_connections()
+                time.sleep(options['idle_sleep'])
+                continue
+            processed += taken
+            if taken:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['idle_sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} callbacks.'))
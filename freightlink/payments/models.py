@@ -1,8 +1,21 @@
 from django.db import models
 from bookings.models import Booking
-from accounts.models import User
+from accounts.models import USER_DISPLAY_FIELDS, User
+from freightlink.stored_state import LockedSaveModel
 
-class Payment(models.Model):
+
+class PaymentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Columns and joins needed to list payments with their payer and receiver."""
+        return self.select_related('payer', 'receiver').only(
+            'booking', 'payer', 'receiver', 'amount', 'payment_type', 'status', 'mpesa_receipt',
+            'payment_date', 'created_at',
+            *[f'payer__{field}' for field in USER_DISPLAY_FIELDS],
+            *[f'receiver__{field}' for field in USER_DISPLAY_FIELDS],
+        )
+
+
+class Payment(LockedSaveModel):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('processing', 'Processing'),
@@ -25,22 +38,33 @@ class Payment(models.Model):
     payment_type = models.CharField(max_length=20, choices=PAYMENT_TYPE_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    checkout_request_id = models.CharField(max_length=100, unique=True, blank=True, null=True, help_text='STK push CheckoutRequestID')
     mpesa_receipt = models.CharField(max_length=100, blank=True, null=True)
     payment_date = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PaymentQuerySet.as_manager()
     
     def __str__(self):
-        return f"Payment of KES {self.amount} for Booking #{self.booking.id}"
+        return f"Payment of KES {self.amount} for Booking #{self.booking_id}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['booking', 'status'], name='payment_booking_status_idx'),
+            # Keyset pagination of payments made and received
+            models.Index(fields=['payer', '-created_at', '-id'], name='payment_payer_created_idx'),
+            models.Index(fields=['receiver', '-created_at', '-id'], name='payment_receiver_created_idx'),
+            # Monthly finance exports
+            models.Index(fields=['created_at', 'id'], name='payment_created_idx'),
+        ]
 
 class MpesaCallback(models.Model):
     payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='mpesa_callbacks', null=True, blank=True)
     merchant_request_id = models.CharField(max_length=100)
-    checkout_request_id = models.CharField(max_length=100)
+    checkout_request_id = models.CharField(max_length=100, unique=True)
     result_code = models.CharField(max_length=20)
     result_desc = models.CharField(max_length=255)
     mpesa_receipt_number = models.CharField(max_length=100, blank=True, null=True)
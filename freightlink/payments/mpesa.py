@@ -0,0 +1,208 @@
+"""
+Async client for Safaricom's Daraja (M-Pesa) API.
+
+One client instance is meant to be shared by a process: it keeps a pooled
+HTTP session, caches the OAuth token and refreshes it in the background
+before it expires, and caps the number of in-flight requests.
+"""
+import asyncio
+import base64
+import logging
+import random
+import time
+from decimal import Decimal
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .callbacks import attach_orphan_callbacks
+
+logger = logging.getLogger(__name__)
+
+BASE_URLS = {
+    'sandbox': 'https://sandbox.safaricom.co.ke',
+    'production': 'https://api.safaricom.co.ke',
+}
+# Only failures where Daraja cannot have acted on the request are retried, so
+# an STK push is never sent twice.
+RETRY_STATUSES = (429, 503)
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class MpesaError(Exception):
+    pass
+
+
+def whole_shillings(amount):
+    """Daraja only takes whole shillings, so refuse amounts it would have to round."""
+    value = Decimal(str(amount))
+    if not value.is_finite() or value <= 0 or value != value.to_integral_value():
+        raise ValueError(f'M-Pesa amounts must be a positive whole number of shillings, not {amount}')
+    return int(value)
+
+
+class TokenCache:
+    """Shared OAuth token that is refreshed ``refresh_margin`` seconds before it expires."""
+
+    def __init__(self, fetch, refresh_margin=300):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background = None
+
+    async def get(self):
+        now = time.monotonic()
+        if self._token and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin and self._background is None:
+                self._background = asyncio.create_task(self._refresh_in_background())
+            return self._token
+        return await self.refresh()
+
+    async def refresh(self, stale=None):
+        """Fetch a new token unless a fresh one (other than ``stale``) is already cached."""
+        async with self._lock:
+            fresh = time.monotonic() < self._expires_at - self.refresh_margin
+            if self._token and self._token != stale and fresh:
+                return self._token
+            token, expires_in = await self._fetch()
+            self._token, self._expires_at = token, time.monotonic() + expires_in
+            return token
+
+    async def _refresh_in_background(self):
+        try:
+            await self.refresh()
+        except Exception:
+            # Callers keep using the current token until it actually expires.
+            logger.warning('Background M-Pesa token refresh failed', exc_info=True)
+        finally:
+            self._background = None
+
+
+class MpesaClient:
+    def __init__(self, consumer_key, consumer_secret, shortcode, passkey, base_url,
+                 callback_url=None, max_concurrency=20, max_retries=3, backoff=0.5, timeout=10.0,
+                 token_refresh_margin=300):
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.shortcode = shortcode
+        self.passkey = passkey
+        self.callback_url = callback_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self.tokens = TokenCache(self._fetch_token, token_refresh_margin)
+
+    @classmethod
+    def from_settings(cls, **kwargs):
+        kwargs.setdefault('callback_url', settings.MPESA_CALLBACK_URL)
+        kwargs.setdefault('max_concurrency', settings.MPESA_MAX_CONCURRENCY)
+        return cls(
+            settings.MPESA_CONSUMER_KEY,
+            settings.MPESA_CONSUMER_SECRET,
+            settings.MPESA_SHORTCODE,
+            settings.MPESA_PASSKEY,
+            BASE_URLS[settings.MPESA_ENVIRONMENT],
+            **kwargs,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _send(self, method, path, **kwargs):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                async with self._semaphore:
+                    response = await self._http.request(method, path, **kwargs)
+            except RETRY_ERRORS as exc:
+                error = exc
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            error = MpesaError(f'{method} {path} returned {response.status_code}')
+        raise MpesaError(f'{method} {path} failed after {self.max_retries + 1} attempts') from error
+
+    async def _fetch_token(self):
+        response = await self._send(
+            'GET', '/oauth/v1/generate',
+            params={'grant_type': 'client_credentials'},
+            auth=(self.consumer_key, self.consumer_secret),
+        )
+        if response.status_code != 200:
+            raise MpesaError(f'OAuth token request returned {response.status_code}: {response.text}')
+        data = response.json()
+        return data['access_token'], int(data['expires_in'])
+
+    async def _call(self, path, payload):
+        token = await self.tokens.get()
+        response = await self._send('POST', path, json=payload, headers={'Authorization': f'Bearer {token}'})
+        if response.status_code == 401:
+            # Token revoked or expired early; fetch a new one and try once more.
+            token = await self.tokens.refresh(stale=token)
+            response = await self._send('POST', path, json=payload, headers={'Authorization': f'Bearer {token}'})
+        if response.status_code != 200:
+            raise MpesaError(f'POST {path} returned {response.status_code}: {response.text}')
+        return response.json()
+
+    def _password(self, timestamp):
+        return base64.b64encode(f'{self.shortcode}{self.passkey}{timestamp}'.encode()).decode()
+
+    async def stk_push(self, phone_number, amount, account_reference, description, callback_url=None):
+        """Prompt ``phone_number`` to pay ``amount`` KES; returns Daraja's response body."""
+        amount = whole_shillings(amount)
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        return await self._call('/mpesa/stkpush/v1/processrequest', {
+            'BusinessShortCode': self.shortcode,
+            'Password': self._password(timestamp),
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': amount,
+            'PartyA': phone_number,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone_number,
+            'CallBackURL': callback_url or self.callback_url,
+            'AccountReference': account_reference,
+            'TransactionDesc': description,
+        })
+
+    async def stk_query(self, checkout_request_id):
+        """Ask Daraja for the status of an STK push."""
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        return await self._call('/mpesa/stkpushquery/v1/query', {
+            'BusinessShortCode': self.shortcode,
+            'Password': self._password(timestamp),
+            'Timestamp': timestamp,
+            'CheckoutRequestID': checkout_request_id,
+        })
+
+
+async def request_payment(client, payment, phone_number):
+    """Send the STK push for a Payment and record its CheckoutRequestID."""
+    response = await client.stk_push(
+        phone_number, payment.amount,
+        account_reference=f'Booking{payment.booking_id}',
+        description=f'FreightLink payment {payment.id}',
+    )
+    payment.checkout_request_id = response['CheckoutRequestID']
+    payment.status = 'processing'
+    await payment.asave(update_fields=['checkout_request_id', 'status', 'updated_at'])
+    # Safaricom may already have called back before the id was saved.
+    await sync_to_async(attach_orphan_callbacks)([payment.checkout_request_id])
+    return response
@@ -0,0 +1,113 @@
+"""
+Durable on-disk queue for raw M-Pesa callbacks.
+
+The callback view only appends the request body here, so Safaricom gets its
+acknowledgement without waiting on MySQL. Entries live in a local SQLite
+file (WAL mode, shared by every web worker on the host) until a worker has
+applied them; payloads that cannot be parsed are kept aside as buried.
+
+A batch is leased to the worker that took it: other workers skip it until
+the lease runs out, so a worker that dies before acknowledging its batch
+only delays those entries by ``MPESA_CALLBACK_LEASE_SECONDS``.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+READY = 0
+BURIED = 1
+
+
+class CallbackQueue:
+    def __init__(self, path, lease_seconds=None, clock=time.time):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds or settings.MPESA_CALLBACK_LEASE_SECONDS
+        self._clock = clock
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS callbacks ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'state INTEGER NOT NULL DEFAULT 0, '
+                'payload BLOB NOT NULL, '
+                'leased_until REAL)'
+            )
+            columns = {row[1] for row in connection.execute('PRAGMA table_info(callbacks)')}
+            if 'leased_until' not in columns:
+                # Queue files written before leases existed.
+                connection.execute('ALTER TABLE callbacks ADD COLUMN leased_until REAL')
+            self._local.connection = connection
+        return connection
+
+    def put(self, payload):
+        """Append one raw payload; returns once it is on disk."""
+        self._connection().execute('INSERT INTO callbacks (payload) VALUES (?)', (payload,))
+
+    def put_many(self, payloads):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany('INSERT INTO callbacks (payload) VALUES (?)', ((p,) for p in payloads))
+
+    def get_batch(self, size):
+        """
+        Lease up to ``size`` ``(entry_id, payload)`` pairs, oldest first, without
+        removing them; entries leased to another worker are left out.
+        """
+        connection = self._connection()
+        now = self._clock()
+        with connection:
+            # IMMEDIATE takes the write lock up front, so two workers cannot lease the same rows.
+            connection.execute('BEGIN IMMEDIATE')
+            entries = connection.execute(
+                'SELECT id, payload FROM callbacks WHERE state = ? AND (leased_until IS NULL OR leased_until < ?) '
+                'ORDER BY id LIMIT ?', (READY, now, size),
+            ).fetchall()
+            if entries:
+                placeholders = ', '.join('?' * len(entries))
+                connection.execute(
+                    f'UPDATE callbacks SET leased_until = ? WHERE id IN ({placeholders})',
+                    [now + self.lease_seconds] + [entry_id for entry_id, _ in entries],
+                )
+        return entries
+
+    def release(self, entry_ids):
+        """Hand leased entries back so the next batch retries them straight away."""
+        self._execute_for_ids('UPDATE callbacks SET leased_until = NULL WHERE id IN ({})', entry_ids)
+
+    def ack(self, entry_ids):
+        """Remove processed entries."""
+        self._execute_for_ids('DELETE FROM callbacks WHERE id IN ({})', entry_ids)
+
+    def bury(self, entry_ids):
+        """Keep entries that cannot be processed out of future batches."""
+        self._execute_for_ids(f'UPDATE callbacks SET state = {BURIED} WHERE id IN ({{}})', entry_ids)
+
+    def _execute_for_ids(self, statement, entry_ids):
+        entry_ids = list(entry_ids)
+        if entry_ids:
+            placeholders = ', '.join('?' * len(entry_ids))
+            self._connection().execute(statement.format(placeholders), entry_ids)
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM callbacks WHERE state = ?', (READY,)).fetchone()[0]
+
+
+_queue = None
+
+
+def get_callback_queue():
+    global _queue
+    if _queue is None:
+        _queue = CallbackQueue(settings.MPESA_CALLBACK_QUEUE_PATH)
+    return _queue
@@ -0,0 +1,129 @@
+"""Local fake of the Daraja API for tests and client benchmarks."""
+import itertools
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeDaraja:
+    """
+    Threaded HTTP server answering the OAuth, STK push and STK query endpoints.
+
+    ``latency`` and ``token_latency`` add server-side delay per request, and
+    the next ``fail_next`` API calls answer ``fail_status`` so retries can be
+    exercised. Counters record what clients actually did.
+    """
+
+    def __init__(self, token_ttl=3599, latency=0.0, token_latency=0.0, fail_status=503):
+        self.token_ttl = token_ttl
+        self.latency = latency
+        self.token_latency = token_latency
+        self.fail_status = fail_status
+        self.fail_next = 0
+        self.tokens = set()
+        self.token_requests = 0
+        self.api_requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def revoke_tokens(self):
+        with self._lock:
+            self.tokens.clear()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if not self.path.startswith('/oauth/v1/generate') or 'Authorization' not in self.headers:
+                    return self._reply(400, {'errorMessage': 'Invalid request'})
+                time.sleep(fake.token_latency)
+                token = uuid.uuid4().hex
+                with fake._lock:
+                    fake.token_requests += 1
+                    fake.tokens.add(token)
+                self._reply(200, {'access_token': token, 'expires_in': str(fake.token_ttl)})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with fake._lock:
+                    fake.api_requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    failing = fake.fail_next > 0
+                    fake.fail_next -= failing
+                    authorized = self.headers.get('Authorization', '').removeprefix('Bearer ') in fake.tokens
+                try:
+                    time.sleep(fake.latency)
+                    if failing:
+                        return self._reply(fake.fail_status, {'errorMessage': 'Service unavailable'})
+                    if not authorized:
+                        return self._reply(401, {'errorMessage': 'Invalid Access Token'})
+                    if self.path == '/mpesa/stkpush/v1/processrequest':
+                        request_id = next(fake._ids)
+                        return self._reply(200, {
+                            'MerchantRequestID': f'{request_id}-1',
+                            'CheckoutRequestID': f'ws_CO_FAKE{request_id:010d}',
+                            'ResponseCode': '0',
+                            'ResponseDescription': 'Success. Request accepted for processing',
+                            'CustomerMessage': 'Success. Request accepted for processing',
+                        })
+                    if self.path == '/mpesa/stkpushquery/v1/query':
+                        return self._reply(200, {
+                            'ResponseCode': '0',
+                            'CheckoutRequestID': payload.get('CheckoutRequestID'),
+                            'ResultCode': '0',
+                            'ResultDesc': 'The service request is processed successfully.',
+                        })
+                    self._reply(404, {'errorMessage': 'Not found'})
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+        return Handler
@@ -1,3 +1,233 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import DataError
+from django.test import SimpleTestCase, TestCase
+
+from freightlink.testing import create_booking, create_business, create_cargo, create_owner, create_route, create_truck
+
+from . import callbacks
+from .callbacks import process_callback_batch
+from .management.commands.mpesa_callback_load import stk_callback
+from .models import MpesaCallback, Payment
+from .mpesa import MpesaClient, MpesaError, request_payment
+from .queue import CallbackQueue
+from .testing import FakeDaraja
+
+
+class MpesaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.daraja = FakeDaraja().start()
+        self.addCleanup(self.daraja.stop)
+
+    def mpesa_client(self, **kwargs):
+        kwargs.setdefault('backoff', 0.01)
+        return MpesaClient('key', 'secret', '174379', 'passkey', self.daraja.url,
+                           callback_url='https://example.com/callback', **kwargs)
+
+    async def test_token_and_connections_are_reused(self):
+        async with self.mpesa_client(max_concurrency=5) as client:
+            responses = await asyncio.gather(*(
+                client.stk_push('254700000000', 100, 'Booking1', 'Test') for _ in range(50)
+            ))
+        self.assertEqual(len({response['CheckoutRequestID'] for response in responses}), 50)
+        self.assertEqual(self.daraja.token_requests, 1)
+        self.assertLessEqual(self.daraja.connections, 6)
+
+    async def test_fractional_amounts_are_refused(self):
+        async with self.mpesa_client() as client:
+            for amount in (Decimal('1500.50'), 0.5, 0, -100, float('nan')):
+                with self.subTest(amount=amount), self.assertRaises(ValueError):
+                    await client.stk_push('254700000000', amount, 'Booking1', 'Test')
+            await client.stk_push('254700000000', Decimal('1500.00'), 'Booking1', 'Test')
+        self.assertEqual(self.daraja.api_requests, 1)
+
+    async def test_concurrency_is_capped(self):
+        self.daraja.latency = 0.02
+        async with self.mpesa_client(max_concurrency=3) as client:
+            await asyncio.gather(*(client.stk_query(f'ws_CO_{index}') for index in range(20)))
+        self.assertLessEqual(self.daraja.max_in_flight, 3)
+
+    async def test_unavailable_responses_are_retried(self):
+        self.daraja.fail_next = 2
+        async with self.mpesa_client(max_retries=3) as client:
+            response = await client.stk_query('ws_CO_1')
+        self.assertEqual(response['ResultCode'], '0')
+        self.assertEqual(self.daraja.api_requests, 3)
+
+    async def test_gives_up_after_max_retries(self):
+        self.daraja.fail_next = 10
+        async with self.mpesa_client(max_retries=2) as client:
+            with self.assertRaises(MpesaError):
+                await client.stk_query('ws_CO_1')
+        self.assertEqual(self.daraja.api_requests, 3)
+
+    async def test_revoked_token_is_replaced(self):
+        async with self.mpesa_client() as client:
+            await client.stk_query('ws_CO_1')
+            self.daraja.revoke_tokens()
+            await client.stk_query('ws_CO_2')
+        self.assertEqual(self.daraja.token_requests, 2)
+
+    async def test_token_is_refreshed_in_background_before_expiry(self):
+        self.daraja.token_ttl = 2
+        async with self.mpesa_client(token_refresh_margin=1.8) as client:
+            await client.stk_query('ws_CO_1')
+            await asyncio.sleep(0.3)
+            await client.stk_query('ws_CO_2')
+            await asyncio.sleep(0.1)
+            self.assertEqual(self.daraja.token_requests, 2)
+            await client.stk_query('ws_CO_3')
+        self.assertEqual(self.daraja.api_requests, 3)
+
+
+class FakeStkClient:
+    def __init__(self, checkout_id):
+        self.checkout_id = checkout_id
+
+    async def stk_push(self, phone_number, amount, account_reference, description):
+        return {'CheckoutRequestID': self.checkout_id, 'ResponseCode': '0'}
+
+
+class CallbackProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = create_business()
+        cls.owner = create_owner()
+        route = create_route(create_truck(cls.owner))
+        cls.booking = create_booking(create_cargo(cls.business), route, price=1500)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.now = 1000.0
+        self.queue = CallbackQueue(os.path.join(directory.name, 'callbacks.sqlite3'), lease_seconds=60,
+                                   clock=lambda: self.now)
+
+    def make_payment(self, checkout_id=None, status='processing'):
+        return Payment.objects.create(
+            booking=self.booking, payer=self.business, receiver=self.owner, amount=1500, payment_type='booking',
+            status=status, checkout_request_id=checkout_id,
+        )
+
+    def test_duplicate_callbacks_are_applied_once(self):
+        payment = self.make_payment('ws_CO_0000000001')
+        self.queue.put_many([stk_callback('ws_CO_0000000001')] * 3)
+        self.assertEqual(process_callback_batch(queue=self.queue), 3)
+        self.queue.put(stk_callback('ws_CO_0000000001', success=False))
+        process_callback_batch(queue=self.queue)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.mpesa_receipt, 'R000000001')
+        self.assertEqual(MpesaCallback.objects.get().payment, payment)
+        self.assertEqual(len(self.queue), 0)
+
+    def test_callback_before_checkout_id_is_attached_when_the_id_is_saved(self):
+        payment = self.make_payment(status='pending')
+        self.queue.put(stk_callback('ws_CO_0000000002'))
+        process_callback_batch(queue=self.queue)
+        self.assertIsNone(MpesaCallback.objects.get().payment)
+
+        async_to_sync(request_payment)(FakeStkClient('ws_CO_0000000002'), payment, '254700000000')
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(MpesaCallback.objects.get().payment, payment)
+
+    def test_orphans_are_swept_after_a_batch(self):
+        self.queue.put(stk_callback('ws_CO_0000000003', success=False))
+        process_callback_batch(queue=self.queue)
+        # The checkout id lands without going through request_payment, e.g. from another worker.
+        payment = self.make_payment('ws_CO_0000000003')
+        self.queue.put(stk_callback('ws_CO_0000000004'))
+        process_callback_batch(queue=self.queue)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(MpesaCallback.objects.get(checkout_request_id='ws_CO_0000000003').payment, payment)
+
+    def test_batch_that_fails_midway_is_retried(self):
+        payment = self.make_payment('ws_CO_0000000005')
+        self.queue.put_many([stk_callback('ws_CO_0000000005'), stk_callback('ws_CO_0000000006')])
+        with mock.patch('payments.callbacks.record_payment_transitions', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                process_callback_batch(queue=self.queue)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'processing')
+        self.assertFalse(MpesaCallback.objects.exists())
+
+        self.assertEqual(process_callback_batch(queue=self.queue), 2)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(MpesaCallback.objects.count(), 2)
+        self.assertEqual(len(self.queue), 0)
+
+    def test_leased_entries_are_skipped_until_the_lease_runs_out(self):
+        self.queue.put_many([stk_callback(f'ws_CO_000000001{index}') for index in range(4)])
+        first = self.queue.get_batch(2)
+        second = self.queue.get_batch(10)
+        self.assertEqual(len(first) + len(second), 4)
+        self.assertFalse({entry_id for entry_id, _ in first} & {entry_id for entry_id, _ in second})
+        self.assertEqual(self.queue.get_batch(10), [])
+
+        # The worker holding ``first`` died without acknowledging it.
+        self.queue.ack(entry_id for entry_id, _ in second)
+        self.now += 61
+        self.assertEqual(self.queue.get_batch(10), first)
+
+    def test_malformed_payloads_are_buried(self):
+        def tampered(checkout_id, **changes):
+            body = json.loads(stk_callback(checkout_id))
+            stk = body['Body']['stkCallback']
+            for name, value in changes.items():
+                if name in stk:
+                    stk[name] = value
+                else:
+                    next(item for item in stk['CallbackMetadata']['Item'] if item['Name'] == name)['Value'] = value
+            return json.dumps(body).encode()
+
+        payment = self.make_payment('ws_CO_0000000020')
+        self.queue.put_many([
+            tampered('ws_CO_0000000021', Amount='n/a'),
+            tampered('ws_CO_0000000022', Amount=float('nan')),
+            tampered('ws_CO_0000000023', Amount=1e12),
+            tampered('ws_CO_0000000024', CheckoutRequestID=['ws_CO_0000000024']),
+            tampered('ws_CO_0000000025', MerchantRequestID='m' * 101),
+            tampered('ws_CO_0000000026', PhoneNumber={'number': 1}),
+            b'{"Body": []}',
+            b'\xff',
+            stk_callback('ws_CO_0000000020'),
+        ])
+        with self.assertLogs('payments.callbacks', 'ERROR') as logs:
+            self.assertEqual(process_callback_batch(queue=self.queue), 9)
+        self.assertEqual(len(logs.records), 8)
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(list(MpesaCallback.objects.values_list('checkout_request_id', flat=True)), [
+            'ws_CO_0000000020',
+        ])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_rows_the_database_rejects_are_isolated(self):
+        apply_callbacks = callbacks.apply_callbacks
+
+        def reject_one(parsed):
+            if any(fields['checkout_request_id'] == 'ws_CO_0000000033' for fields in parsed):
+                raise DataError('Data too long')
+            return apply_callbacks(parsed)
+
+        self.queue.put_many([stk_callback(f'ws_CO_000000003{index}') for index in range(6)])
+        with mock.patch('payments.callbacks.apply_callbacks', side_effect=reject_one):
+            with self.assertLogs('payments.callbacks', 'ERROR'):
+                self.assertEqual(process_callback_batch(queue=self.queue), 6)
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(
+            sorted(MpesaCallback.objects.values_list('checkout_request_id', flat=True)),
+            [f'ws_CO_000000003{index}' for index in range(6) if index != 3],
+        )
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'payments'
+
+urlpatterns = [
+    path('mpesa/callback/', views.mpesa_callback, name='mpesa_callback'),
+]
@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
-# Create your views here.
+from .queue import get_callback_queue
+
+
+@csrf_exempt
+@require_POST
+def mpesa_callback(request):
+    """Queue the raw STK callback and acknowledge Safaricom straight away."""
+    get_callback_queue().put(request.body)
+    return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
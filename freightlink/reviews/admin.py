@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Review
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'reviewer', 'reviewee', 'rating', 'created_at')
+    list_filter = ('rating',)
+    list_select_related = ('reviewer', 'reviewee')
+    raw_id_fields = ('booking', 'reviewer', 'reviewee')
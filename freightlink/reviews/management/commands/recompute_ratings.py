@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.ratings import RECOMPUTE_CHUNK_SIZE, recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild average_rating and total_reviews from the reviews table, for backfills and repairs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument('--chunk-size', type=int, default=RECOMPUTE_CHUNK_SIZE,
+                            help='Users recomputed per transaction.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = recompute_ratings(options['user_ids'] or None, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed ratings for {written} users in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,29 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+from accounts.models import User
+from bookings.models import Booking
+from freightlink.stored_state import LockedSaveModel
+
+
+class Review(LockedSaveModel):
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='reviews')
+    reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews_given')
+    reviewee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews_received')
+    rating = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)], help_text='Rating from 1-5',
+    )
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Review of booking {self.booking_id} - {self.rating}/5"
+
+    class Meta:
+        ordering = ['-created_at']
+        # Ensure one review per user per booking
+        unique_together = ('booking', 'reviewer')
+        indexes = [
+            models.Index(fields=['reviewee', 'created_at'], name='review_reviewee_created_idx'),
+        ]
@@ -0,0 +1,127 @@
+"""
+Incremental maintenance of ``User.average_rating`` and ``total_reviews``.
+
+Each user also carries ``rating_total``, the sum of the ratings they have
+received. A new, edited or deleted review becomes a ``(total, count)``
+delta applied with one conditional-free UPDATE that recomputes the average
+from the updated totals inside the database, so concurrent reviews never
+lose each other's changes and no review is ever rescanned.
+``recompute_ratings`` rebuilds the columns from the reviews in chunks for
+backfills and to repair rows changed by ``QuerySet.update()``.
+
+Matching entries and cached searches carry the truck owner's rating, so
+the active routes of every user whose rating moved are re-ranked too.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Greatest, Round
+from django.utils import timezone
+
+from accounts.models import User
+from api.search_cache import invalidate_route_ids
+from matching.incremental import queue_route_change
+from routes.models import Route
+
+from .models import Review
+
+RECOMPUTE_CHUNK_SIZE = 2000
+
+
+def review_state(review):
+    # __dict__ so deferred fields are not loaded just to be recorded.
+    values = review.__dict__
+    if values.get('reviewee_id') is None or values.get('rating') is None:
+        return None
+    return values['reviewee_id'], int(values['rating'])
+
+
+def record_review_changes(transitions):
+    """
+    Apply ``(old review_state, new review_state)`` pairs; None stands for no review.
+
+    Costs one UPDATE per affected user, whatever the number of reviews they have.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for old, new in transitions:
+        if new is not None:
+            deltas[new[0]][0] += new[1]
+            deltas[new[0]][1] += 1
+        if old is not None:
+            deltas[old[0]][0] -= old[1]
+            deltas[old[0]][1] -= 1
+    changed = [user_id for user_id, (total, count) in deltas.items() if total or count]
+    for user_id in changed:
+        _apply_delta(user_id, *deltas[user_id])
+    if changed:
+        refresh_owner_routes(changed)
+
+
+def _apply_delta(user_id, total, count):
+    new_total = F('rating_total') + total
+    new_count = F('total_reviews') + count
+    User.objects.filter(pk=user_id).update(
+        # Listed first: MySQL assigns left to right, so this must still read the old totals.
+        average_rating=Round(Cast(new_total, FloatField()) / Greatest(new_count, 1), 2),
+        rating_total=new_total,
+        total_reviews=new_count,
+    )
+
+
+def refresh_owner_routes(user_ids):
+    """Re-rank the active routes of truck owners whose rating changed and drop their cached searches."""
+    route_ids = list(
+        Route.objects.filter(truck__owner_id__in=user_ids, status='active').values_list('pk', flat=True)
+    )
+    if not route_ids:
+        return
+    # Touching updated_at lets the index sync of other processes pick up the new rating.
+    Route.objects.filter(pk__in=route_ids).update(updated_at=timezone.now())
+    for route_id in route_ids:
+        queue_route_change(route_id)
+    transaction.on_commit(lambda: invalidate_route_ids(route_ids), robust=True)
+
+
+def average(total, count):
+    if not count:
+        return Decimal('0.00')
+    return (Decimal(total) / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def recompute_ratings(user_ids=None, chunk_size=RECOMPUTE_CHUNK_SIZE):
+    """Rebuild the rating columns of ``user_ids`` (all users by default) from their reviews; returns users written."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    written = 0
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) == chunk_size:
+            written += _recompute_chunk(chunk)
+            chunk = []
+    if chunk:
+        written += _recompute_chunk(chunk)
+    return written
+
+
+def _recompute_chunk(user_ids):
+    with transaction.atomic():
+        # Lock the chunk so reviews landing mid-recompute are applied after it, not overwritten.
+        users = list(User.objects.select_for_update().filter(pk__in=user_ids).only('pk', 'average_rating'))
+        rows = Review.objects.filter(reviewee_id__in=user_ids).order_by().values('reviewee_id')
+        totals = {
+            row['reviewee_id']: (row['total'], row['count'])
+            for row in rows.annotate(total=Sum('rating'), count=Count('id'))
+        }
+        changed = []
+        for user in users:
+            total, count = totals.get(user.pk, (0, 0))
+            if user.average_rating != average(total, count):
+                changed.append(user.pk)
+            user.rating_total, user.total_reviews, user.average_rating = total, count, average(total, count)
+        User.objects.bulk_update(users, ['rating_total', 'total_reviews', 'average_rating'])
+        if changed:
+            refresh_owner_routes(changed)
+    return len(users)
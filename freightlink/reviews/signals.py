@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from freightlink.stored_state import deleted_state, saved_transition, track
+
+from .models import Review
+from .ratings import record_review_changes, review_state
+
+track(Review)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, update_fields=None, **kwargs):
+    old, new = saved_transition(instance, review_state, update_fields)
+    if old != new:
+        record_review_changes([(old, new)])
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    old = deleted_state(instance, review_state)
+    if old is not None:
+        record_review_changes([(old, None)])
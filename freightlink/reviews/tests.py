@@ -0,0 +1,95 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from freightlink.testing import create_booking, create_business, create_cargo, create_owner, create_route, create_truck
+from matching.index import ROUTE_FIELDS, get_cargo_index, get_route_index, loaded_index, reset_indexes, route_entry
+from matching.scoring import load_route_columns, top_k
+from matching.synthetic import CargoEntry
+from routes.models import Route
+
+from .models import Review
+from .ratings import recompute_ratings
+
+
+class RatingAggregationTests(TestCase):
+    def setUp(self):
+        # Run the commit hooks now, so later changes are not folded into this transaction's batches.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.business = create_business()
+            self.owner = create_owner()
+            self.route = create_route(create_truck(self.owner))
+            self.cargo = create_cargo(self.business)
+
+    def booking(self):
+        return create_booking(self.cargo, self.route)
+
+    def review(self, rating, booking=None):
+        return Review.objects.create(
+            booking=booking or self.booking(), reviewer=self.business, reviewee=self.owner, rating=rating,
+        )
+
+    def rating(self):
+        self.owner.refresh_from_db()
+        return self.owner.average_rating, self.owner.total_reviews
+
+    def test_create_edit_and_delete_update_the_average(self):
+        booking = self.booking()
+        with self.assertNumQueries(4):  # review insert, user update, owner's route ids, route touch
+            self.review(5, booking)
+        self.review(4)
+        review = self.review(2)
+        self.assertEqual(self.rating(), (Decimal('3.67'), 3))
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 3
+        with self.assertNumQueries(5):  # locked review read, review update, user update, owner's route ids, route touch
+            review.save()
+        self.assertEqual(self.rating(), (Decimal('4.00'), 3))
+
+        stale = Review.objects.get(pk=review.pk)
+        review.delete()
+        self.assertEqual(self.rating(), (Decimal('4.50'), 2))
+        stale.delete()  # already gone, so it must not be subtracted again
+        self.assertEqual(self.rating(), (Decimal('4.50'), 2))
+        Review.objects.all().delete()
+        self.assertEqual(self.rating(), (Decimal('0.00'), 0))
+
+    def test_recompute_matches_incremental_values(self):
+        for rating in (5, 4, 4, 1):
+            self.review(rating)
+        Review.objects.filter(rating=1).update(rating=3)
+        self.assertEqual(recompute_ratings(), 2)
+        self.assertEqual(self.rating(), (Decimal('4.00'), 4))
+        self.assertEqual(self.owner.rating_total, 16)
+
+    def test_matching_reads_the_owner_rating(self):
+        self.review(5)
+        entry = route_entry(Route.objects.values_list(*ROUTE_FIELDS).get())
+        self.assertEqual(entry.owner_rating, 5.0)
+
+        cargo = CargoEntry(1, -1.29, 36.82, -4.04, 39.67, 738521, 738521, 5.0, None)
+        with self.assertNumQueries(1):
+            rated = top_k(cargo, load_route_columns(Route.objects.all()))[0].score
+        Review.objects.all().delete()
+        unrated = top_k(cargo, load_route_columns(Route.objects.all()))[0].score
+        self.assertAlmostEqual(rated - unrated, 100 * 0.10 * (5.0 - 3.0) / 5.0)
+
+    def test_rating_change_refreshes_the_owner_routes(self):
+        self.addCleanup(reset_indexes)
+        get_route_index(), get_cargo_index()
+        self.assertEqual(loaded_index('route').get(self.route.pk).owner_rating, 0.0)
+
+        with mock.patch('reviews.ratings.invalidate_route_ids') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.review(4)
+        self.assertEqual(loaded_index('route').get(self.route.pk).owner_rating, 4.0)
+        invalidate.assert_called_once_with([self.route.pk])
+
+        Review.objects.update(rating=2)
+        with mock.patch('reviews.ratings.invalidate_route_ids') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                recompute_ratings()
+        self.assertEqual(loaded_index('route').get(self.route.pk).owner_rating, 2.0)
+        invalidate.assert_called_once_with([self.route.pk])
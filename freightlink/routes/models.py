@@ -1,8 +1,9 @@
 from django.db import models
 from django.utils import timezone
 from trucks.models import Truck
+from freightlink.stored_state import LockedSaveModel
 
-class Route(models.Model):
+class Route(LockedSaveModel):
     STATUS_CHOICES = (
         ('active', 'Active'),
         ('in_progress', 'In Progress'),
@@ -24,6 +25,7 @@ class Route(models.Model):
     available_capacity_volume = models.DecimalField(max_digits=10, decimal_places=2, help_text='Available volume in cubic meters')
     available_capacity_weight = models.DecimalField(max_digits=10, decimal_places=2, help_text='Available weight in tons')
     price_per_km = models.DecimalField(max_digits=10, decimal_places=2, help_text='Price per kilometer in KES')
+    path = models.TextField(blank=True, default='', help_text='Planned path as an encoded polyline; empty means a straight line')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -31,6 +33,22 @@ class Route(models.Model):
     
     def __str__(self):
         return f"{self.origin_name} to {self.destination_name} on {self.departure_date}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        route = super().from_db(db, field_names, values)
+        # Endpoints as loaded, so moving a route can also invalidate searches along its old corridor.
+        route.loaded_endpoints = route.endpoints()
+        return route
+
+    def endpoints(self):
+        """``((lat, lng), (lat, lng))`` of origin and destination, or None if they were not loaded."""
+        values = [self.__dict__.get(field) for field in (
+            'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+        )]
+        if None in values:
+            return None
+        return (float(values[0]), float(values[1])), (float(values[2]), float(values[3]))
     
     @property
     def is_past_due(self):
@@ -43,4 +61,10 @@ class Route(models.Model):
         return (today > self.departure_date) or (today == self.departure_date and now > self.departure_time)
     
     class Meta:
-        ordering = ['departure_date', 'departure_time']
\ No newline at end of file
+        ordering = ['departure_date', 'departure_time']
+        indexes = [
+            # Active routes listed by departure
+            models.Index(fields=['status', 'departure_date', 'departure_time', 'id'], name='route_status_departure_idx'),
+            # Rows changed since a process last synced its matching indexes
+            models.Index(fields=['updated_at'], name='route_updated_idx'),
+        ]
\ No newline at end of file
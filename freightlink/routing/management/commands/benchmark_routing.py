@@ -0,0 +1,88 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from routing.contraction import dijkstra
+from routing.network import RoadNetwork
+from routing.synthetic import generate_road_grid
+
+
+class Command(BaseCommand):
+    help = (
+        'Contract a synthetic road grid, or load a built graph, and report point-to-point queries per second '
+        'against plain Dijkstra and the throughput of distance matrices.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100, help='Grid side; the graph has size² junctions.')
+        parser.add_argument('--graph', help='Benchmark a file written by build_road_graph instead.')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--matrix', type=int, nargs='+', default=[10, 50, 100])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        reference = None
+        started = time.perf_counter()
+        if options['graph']:
+            network = RoadNetwork.load(options['graph'])
+            self.stdout.write(f'Loaded {len(network)} nodes in {time.perf_counter() - started:.1f}s')
+        else:
+            latitudes, longitudes, edges = generate_road_grid(options['size'], seed=options['seed'])
+            network = RoadNetwork.build(latitudes, longitudes, edges)
+            self.stdout.write(
+                f'Contracted {len(network)} nodes and {len(edges)} edges in {time.perf_counter() - started:.1f}s; '
+                f'{len(network.up_csr[1]) + len(network.down_csr[1])} hierarchy edges'
+            )
+            reference = self._reference(network, latitudes, longitudes, edges)
+
+        pairs = [(rng.randrange(len(network)), rng.randrange(len(network))) for _ in range(options['queries'])]
+        started = time.perf_counter()
+        results = [network.node_route(source, target) for source, target in pairs]
+        hierarchy_s = time.perf_counter() - started
+        self.stdout.write(f"{'method':>10} {'queries/s':>10} {'ms/query':>9}")
+        self.stdout.write(f"{'hierarchy':>10} {len(pairs) / hierarchy_s:>10.0f} {hierarchy_s * 1000 / len(pairs):>9.3f}")
+
+        if reference is not None:
+            sample = pairs[:max(len(pairs) // 10, 1)]
+            started = time.perf_counter()
+            expected = [dijkstra(reference, source, target) for source, target in sample]
+            dijkstra_s = time.perf_counter() - started
+            self.stdout.write(
+                f"{'dijkstra':>10} {len(sample) / dijkstra_s:>10.0f} {dijkstra_s * 1000 / len(sample):>9.3f}"
+            )
+            mismatches = sum(
+                not self._same(result, wanted) for result, wanted in zip(results, expected)
+            )
+            if mismatches:
+                self.stderr.write(self.style.ERROR(f'{mismatches} of {len(sample)} hierarchy results differ.'))
+
+        self.stdout.write(f"{'matrix':>10} {'seconds':>10} {'pairs/s':>9}")
+        for size in options['matrix']:
+            nodes = [rng.randrange(len(network)) for _ in range(size * 2)]
+            points = [(network.latitudes[node], network.longitudes[node]) for node in nodes]
+            started = time.perf_counter()
+            network.matrix(points[:size], points[size:])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{f'{size}x{size}':>10} {elapsed:>10.3f} {size * size / elapsed:>9.0f}")
+
+    @staticmethod
+    def _reference(network, latitudes, longitudes, edges):
+        """Adjacency of the original edges, numbered like the network's nodes."""
+        numbers = {
+            (lat, lng): node for node, (lat, lng) in enumerate(zip(network.latitudes, network.longitudes))
+        }
+        index = [numbers.get((lat, lng)) for lat, lng in zip(latitudes, longitudes)]
+        out = [[] for _ in range(len(network))]
+        for tail, head, seconds, metres in edges:
+            if index[tail] is not None:
+                out[index[tail]].append((index[head], seconds, metres))
+        return out
+
+    @staticmethod
+    def _same(result, expected, tolerance=1e-4):
+        if expected is None:
+            return result[0] == math.inf
+        return math.isclose(result[0], expected[0], rel_tol=tolerance)
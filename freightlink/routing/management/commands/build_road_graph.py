@@ -0,0 +1,33 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from routing.network import RoadNetwork
+from routing.osm import read_osm
+
+
+class Command(BaseCommand):
+    help = 'Extract the drivable roads from an OpenStreetMap XML extract and precompute their contraction hierarchy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('osm_path', help='.osm, .osm.gz or .osm.bz2 extract, e.g. of East Africa.')
+        parser.add_argument('--output', default=None, help='Defaults to ROAD_GRAPH_PATH.')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.ROAD_GRAPH_PATH
+        started = time.perf_counter()
+        latitudes, longitudes, edges = read_osm(options['osm_path'])
+        self.stdout.write(
+            f'Read {len(latitudes)} junctions and {len(edges)} road edges in {time.perf_counter() - started:.1f}s'
+        )
+
+        started = time.perf_counter()
+        network = RoadNetwork.build(latitudes, longitudes, edges)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        network.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f'Contracted the {len(network)} connected junctions in {time.perf_counter() - started:.1f}s '
+            f'into {output}; restart the web workers to load it'
+        ))
@@ -0,0 +1,312 @@
+"""
+Road distances and travel times from a preprocessed road graph.
+
+The graph is an ``.npz`` file written by ``build_road_graph``. It holds
+node coordinates and a contraction hierarchy (see ``contraction.py``), so
+point-to-point and many-to-many queries only settle nodes on the way up
+the hierarchy from each end. Points are snapped to the nearest road node,
+and the straight line to that node counts as an access leg driven at
+``ACCESS_SPEED_KMH``.
+"""
+import functools
+import heapq
+import math
+
+import numpy as np
+from django.conf import settings
+
+from matching.geo import EARTH_RADIUS_KM, KM_PER_DEGREE, cell_span, grid_cell
+
+from .contraction import contract
+
+SNAP_CELL_KM = 2
+ACCESS_SPEED_KMH = 30
+NO_PATH = (math.inf, math.inf)
+
+
+def _haversine(lat, lng, latitudes, longitudes):
+    lat, lng, latitudes, longitudes = (np.radians(value) for value in (lat, lng, latitudes, longitudes))
+    a = (np.sin((latitudes - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _largest_component(num_nodes, edges):
+    """Nodes of the largest weakly connected component; snapping elsewhere would strand queries."""
+    parent = list(range(num_nodes))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for tail, head, _, _ in edges:
+        parent[find(tail)] = find(head)
+    roots = [find(node) for node in range(num_nodes)]
+    counts = np.bincount(roots, minlength=num_nodes)
+    return np.flatnonzero(np.asarray(roots) == counts.argmax())
+
+
+CSR_ARRAYS = ('offsets', 'heads', 'seconds', 'metres', 'via')
+
+
+def _to_csr(adjacency):
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(edges) for edges in adjacency])
+    flat = [edge for edges in adjacency for edge in edges]
+    heads = np.array([edge[0] for edge in flat], dtype=np.int32)
+    seconds = np.array([edge[1] for edge in flat], dtype=np.float32)
+    metres = np.array([edge[2] for edge in flat], dtype=np.float32)
+    via = np.array([edge[3] for edge in flat], dtype=np.int32)
+    return offsets, heads, seconds, metres, via
+
+
+def _from_csr(offsets, heads, seconds, metres, via):
+    edges = list(zip(heads.tolist(), seconds.tolist(), metres.tolist()))
+    offsets = offsets.tolist()
+    return [edges[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def _upward(graph, reverse, source, seconds, metres, parents=None):
+    """
+    Settle every node reachable upwards in rank from ``source``.
+
+    Returns ``{node: (seconds, metres)}`` without the nodes that
+    stall-on-demand proves are reached faster from above; those can never
+    be where a shortest path turns back down. ``parents``, if given, is
+    filled with the node each settled node was reached from.
+    """
+    best = {source: seconds}
+    heap = [(seconds, metres, source)]
+    settled = {}
+    while heap:
+        seconds, metres, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        if any(best.get(higher, math.inf) + edge_seconds < seconds for higher, edge_seconds, _ in reverse[node]):
+            settled[node] = None
+            continue
+        settled[node] = (seconds, metres)
+        for head, edge_seconds, edge_metres in graph[node]:
+            candidate = seconds + edge_seconds
+            if candidate < best.get(head, math.inf):
+                best[head] = candidate
+                heapq.heappush(heap, (candidate, metres + edge_metres, head))
+                if parents is not None:
+                    parents[head] = node
+    return {node: value for node, value in settled.items() if value is not None}
+
+
+class RoadNetwork:
+    """A contraction-hierarchy road graph answering distance and travel-time queries."""
+
+    def __init__(self, latitudes, longitudes, up, down, max_snap_km=None):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.up_csr = up
+        self.down_csr = down
+        self.up = _from_csr(*up)
+        self.down = _from_csr(*down)
+        self.max_snap_km = max_snap_km if max_snap_km is not None else settings.ROUTING_MAX_SNAP_KM
+        self._vias = None
+
+        # The cells grid_cell would give, computed for every node at once.
+        rows = np.floor(self.latitudes * KM_PER_DEGREE / SNAP_CELL_KM).astype(np.int64)
+        cols = np.floor(self.longitudes * KM_PER_DEGREE / SNAP_CELL_KM).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self._cell_order = order
+        self._cells = {}
+        keys = list(zip(rows[order].tolist(), cols[order].tolist()))
+        start = 0
+        for end in range(1, len(keys) + 1):
+            if end == len(keys) or keys[end] != keys[start]:
+                self._cells[keys[start]] = (start, end)
+                start = end
+
+    @classmethod
+    def build(cls, latitudes, longitudes, edges, **kwargs):
+        """Contract ``edges`` of ``(tail, head, seconds, metres)`` into a network, keeping the largest component."""
+        edges = list(edges)
+        kept = _largest_component(len(latitudes), edges)
+        index = np.full(len(latitudes), -1, dtype=np.int64)
+        index[kept] = np.arange(len(kept))
+        index = index.tolist()
+        renumbered = [
+            (index[tail], index[head], seconds, metres)
+            for tail, head, seconds, metres in edges
+            if index[tail] >= 0
+        ]
+        up, down = contract(len(kept), renumbered)
+        return cls(
+            np.asarray(latitudes)[kept], np.asarray(longitudes)[kept], _to_csr(up), _to_csr(down), **kwargs,
+        )
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            return cls(
+                data['latitudes'], data['longitudes'],
+                tuple(data[f'up_{name}'] for name in CSR_ARRAYS),
+                tuple(data[f'down_{name}'] for name in CSR_ARRAYS),
+                **kwargs,
+            )
+
+    def save(self, path):
+        arrays = {'latitudes': self.latitudes, 'longitudes': self.longitudes}
+        for prefix, csr in (('up', self.up_csr), ('down', self.down_csr)):
+            arrays.update(zip((f'{prefix}_{name}' for name in CSR_ARRAYS), csr))
+        np.savez(path, **arrays)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def nearest(self, lat, lng):
+        """Return ``(node, km)`` for the road node closest to a point, or None beyond ``max_snap_km``."""
+        row, col = grid_cell(lat, lng, SNAP_CELL_KM)
+        radius_km = SNAP_CELL_KM
+        while True:
+            row_span, col_span = cell_span(lat, radius_km, SNAP_CELL_KM)
+            candidates = [
+                self._cell_order[start:end]
+                for r in range(row - row_span, row + row_span + 1)
+                for c in range(col - col_span, col + col_span + 1)
+                for start, end in [self._cells.get((r, c), (0, 0))]
+            ]
+            candidates = np.concatenate(candidates)
+            if len(candidates):
+                distances = _haversine(lat, lng, self.latitudes[candidates], self.longitudes[candidates])
+                closest = distances.argmin()
+                # Anything outside the searched cells is further away than radius_km.
+                if distances[closest] <= min(radius_km, self.max_snap_km):
+                    return int(candidates[closest]), float(distances[closest])
+            if radius_km >= self.max_snap_km:
+                return None
+            radius_km = min(radius_km * 2, self.max_snap_km)
+
+    def _access(self, point):
+        snapped = self.nearest(*point)
+        if snapped is None:
+            return None
+        node, km = snapped
+        return node, km * 3600 / ACCESS_SPEED_KMH, km * 1000
+
+    def node_route(self, source, target):
+        """``(seconds, metres)`` of the fastest path between two nodes, or ``NO_PATH``."""
+        forward = _upward(self.up, self.down, source, 0.0, 0.0)
+        backward = _upward(self.down, self.up, target, 0.0, 0.0)
+        if len(backward) < len(forward):
+            forward, backward = backward, forward
+        best = NO_PATH
+        for node, (seconds, metres) in forward.items():
+            other = backward.get(node)
+            if other is not None and seconds + other[0] < best[0]:
+                best = (seconds + other[0], metres + other[1])
+        return best
+
+    def _unpack(self, tail, head):
+        """The road junctions after ``tail`` up to ``head`` along a hierarchy edge, shortcuts expanded."""
+        if self._vias is None:
+            # Only path queries need to know what each shortcut bypasses.
+            self._vias = {}
+            for (offsets, heads, _, _, via), upward in ((self.up_csr, True), (self.down_csr, False)):
+                nodes = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+                shortcut = via >= 0
+                for node, other, middle in zip(
+                    nodes[shortcut].tolist(), heads[shortcut].tolist(), via[shortcut].tolist(),
+                ):
+                    self._vias[(node, other) if upward else (other, node)] = middle
+        nodes = []
+        stack = [(tail, head)]
+        while stack:
+            tail, head = stack.pop()
+            via = self._vias.get((tail, head))
+            if via is None:
+                nodes.append(head)
+            else:
+                stack.extend(((via, head), (tail, via)))
+        return nodes
+
+    def path(self, origin, destination):
+        """
+        ``[(lat, lng), ...]`` along the fastest road path between two points.
+
+        Starts at ``origin``, passes every road junction on the way and ends
+        at ``destination``; None when the points are not connected by road.
+        """
+        start, end = self._access(origin), self._access(destination)
+        if start is None or end is None:
+            return None
+        forward_parents, backward_parents = {}, {}
+        forward = _upward(self.up, self.down, *start, forward_parents)
+        backward = _upward(self.down, self.up, *end, backward_parents)
+        meeting = min(
+            (node for node in forward if node in backward),
+            key=lambda node: forward[node][0] + backward[node][0], default=None,
+        )
+        if meeting is None:
+            return None
+        chain = [meeting]
+        while chain[-1] != start[0]:
+            chain.append(forward_parents[chain[-1]])
+        chain.reverse()
+        while chain[-1] != end[0]:
+            chain.append(backward_parents[chain[-1]])
+        nodes = [chain[0]]
+        for tail, head in zip(chain, chain[1:]):
+            nodes.extend(self._unpack(tail, head))
+        return [tuple(origin)] + [
+            (float(self.latitudes[node]), float(self.longitudes[node])) for node in nodes
+        ] + [tuple(destination)]
+
+    def route(self, origin, destination):
+        """
+        ``(km, minutes)`` by road between two ``(lat, lng)`` points.
+
+        Returns None when either point is further than ``max_snap_km``
+        from the road network or no road connects them.
+        """
+        return self.matrix([origin], [destination])[0][0]
+
+    def matrix(self, origins, destinations):
+        """
+        ``(km, minutes)`` by road from every origin to every destination.
+
+        Each destination's upward search leaves ``(destination, seconds,
+        metres)`` in a bucket at every node it settles; each origin's upward
+        search then scans the buckets of the nodes it settles. That is one
+        search per point instead of one per pair. Unreachable pairs are None.
+        """
+        buckets = {}
+        for column, point in enumerate(destinations):
+            access = self._access(point)
+            if access is None:
+                continue
+            for node, (seconds, metres) in _upward(self.down, self.up, *access).items():
+                buckets.setdefault(node, []).append((column, seconds, metres))
+
+        rows = []
+        for point in origins:
+            best = [NO_PATH] * len(destinations)
+            access = self._access(point)
+            if access is not None:
+                for node, (seconds, metres) in _upward(self.up, self.down, *access).items():
+                    for column, other_seconds, other_metres in buckets.get(node, ()):
+                        if seconds + other_seconds < best[column][0]:
+                            best[column] = (seconds + other_seconds, metres + other_metres)
+            rows.append([
+                None if seconds == math.inf else (metres / 1000, seconds / 60)
+                for seconds, metres in best
+            ])
+        return rows
+
+
+@functools.lru_cache(maxsize=None)
+def _load(path):
+    return RoadNetwork.load(path)
+
+
+def get_road_network():
+    """The road network from ``ROAD_GRAPH_PATH``, loaded once per process; raises OSError if it is missing."""
+    return _load(settings.ROAD_GRAPH_PATH)
+
@@ -0,0 +1,128 @@
+"""
+Road graph extraction from an OpenStreetMap XML extract.
+
+Reads ``.osm``, ``.osm.gz`` or ``.osm.bz2`` files in two streaming passes
+(ways, then the coordinates of the nodes they use). PBF extracts such as
+Geofabrik's East Africa download need converting first, e.g. with
+``osmium cat east-africa-latest.osm.pbf -o east-africa.osm.bz2``.
+Shape points that only bend a road are folded into the edge between the
+surrounding junctions, which is most of the nodes in an extract.
+"""
+import bz2
+import gzip
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+
+from matching.geo import haversine_km
+
+# Free-flow truck speeds by road class.
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 80, 'motorway_link': 45,
+    'trunk': 70, 'trunk_link': 40,
+    'primary': 60, 'primary_link': 35,
+    'secondary': 50, 'secondary_link': 30,
+    'tertiary': 40, 'tertiary_link': 25,
+    'unclassified': 30,
+    'residential': 20,
+}
+TRUCK_SPEED_LIMIT_KMH = 80  # Kenyan limit for commercial vehicles over 3 tons
+ONEWAY_VALUES = {'yes', 'true', '1'}
+CLOSED_ACCESS_VALUES = {'no', 'private'}
+
+
+def _open(path):
+    if str(path).endswith('.bz2'):
+        return bz2.open(path)
+    if str(path).endswith('.gz'):
+        return gzip.open(path)
+    return open(path, 'rb')
+
+
+def _elements(path, tag):
+    """Yield every ``tag`` element of the file, discarding each one once it has been read."""
+    with _open(path) as stream:
+        root = None
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = element
+            elif event == 'end' and element.tag == tag:
+                yield element
+                root.clear()
+
+
+def _speed_kmh(tags):
+    speed = HIGHWAY_SPEEDS_KMH[tags['highway']]
+    maxspeed = tags.get('maxspeed', '').split(' ')[0]
+    if maxspeed.isdigit():
+        speed = min(speed, int(maxspeed))
+    return min(speed, TRUCK_SPEED_LIMIT_KMH)
+
+
+def read_ways(path):
+    """Return ``[(node refs, speed km/h, oneway)]`` for the roads a truck may use, ``oneway`` being 1, -1 or 0."""
+    ways = []
+    for element in _elements(path, 'way'):
+        tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+        if tags.get('highway') not in HIGHWAY_SPEEDS_KMH or tags.get('access') in CLOSED_ACCESS_VALUES:
+            continue
+        refs = [int(nd.get('ref')) for nd in element.iter('nd')]
+        if len(refs) < 2:
+            continue
+        oneway = tags.get('oneway', '')
+        if oneway == '-1':
+            direction = -1
+        elif oneway in ONEWAY_VALUES or tags['highway'] == 'motorway' or tags.get('junction') == 'roundabout':
+            direction = 1
+        else:
+            direction = 0
+        ways.append((refs, _speed_kmh(tags), direction))
+    return ways
+
+
+def read_osm(path):
+    """
+    Return ``(latitudes, longitudes, edges)`` for the drivable roads in an extract.
+
+    ``edges`` are ``(tail, head, seconds, metres)`` between junction nodes
+    numbered from 0. Roads leaving the extract stop at its last node.
+    """
+    ways = read_ways(path)
+    uses = Counter(ref for refs, _, _ in ways for ref in refs)
+    for refs, _, _ in ways:
+        # Way ends are junctions even when nothing else touches them.
+        uses[refs[0]] += 1
+        uses[refs[-1]] += 1
+
+    coordinates = {}
+    for element in _elements(path, 'node'):
+        ref = int(element.get('id'))
+        if ref in uses:
+            coordinates[ref] = (float(element.get('lat')), float(element.get('lon')))
+
+    numbers = {}
+    latitudes, longitudes, edges = [], [], []
+
+    def number(ref):
+        if ref not in numbers:
+            numbers[ref] = len(latitudes)
+            latitudes.append(coordinates[ref][0])
+            longitudes.append(coordinates[ref][1])
+        return numbers[ref]
+
+    for refs, speed, direction in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        if len(refs) < 2:
+            continue
+        start, km = refs[0], 0.0
+        for previous, ref in zip(refs, refs[1:]):
+            km += haversine_km(*coordinates[previous], *coordinates[ref])
+            if uses[ref] < 2 and ref != refs[-1]:
+                continue
+            tail, head = number(start), number(ref)
+            seconds, metres = km * 3600 / speed, km * 1000
+            if direction >= 0:
+                edges.append((tail, head, seconds, metres))
+            if direction <= 0:
+                edges.append((head, tail, seconds, metres))
+            start, km = ref, 0.0
+    return latitudes, longitudes, edges
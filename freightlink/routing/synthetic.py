@@ -0,0 +1,42 @@
+"""Synthetic road grids for routing benchmarks and tests."""
+import random
+
+from matching.geo import KM_PER_DEGREE, haversine_km
+
+
+def generate_road_grid(size, seed=0, spacing_km=3.0, origin=(-1.286389, 36.817223), arterial_every=8):
+    """
+    Return ``(latitudes, longitudes, edges)`` for a ``size`` x ``size`` road grid.
+
+    Every ``arterial_every``-th row and column is a fast trunk road and the
+    rest are slower local roads, a few of them one-way or missing, which
+    gives the hierarchy real road networks have. ``edges`` are ``(tail,
+    head, seconds, metres)``.
+    """
+    rng = random.Random(seed)
+    step = spacing_km / KM_PER_DEGREE
+    latitudes, longitudes = [], []
+    for row in range(size):
+        for col in range(size):
+            latitudes.append(origin[0] + (row + rng.uniform(-0.3, 0.3)) * step)
+            longitudes.append(origin[1] + (col + rng.uniform(-0.3, 0.3)) * step)
+
+    edges = []
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            for neighbour, line in ((node + 1, row), (node + size, col)):
+                if (neighbour == node + 1 and col == size - 1) or neighbour >= size * size:
+                    continue
+                arterial = line % arterial_every == 0
+                if not arterial and rng.random() < 0.1:
+                    continue
+                speed = 70 if arterial else rng.choice((20, 30, 40))
+                metres = haversine_km(latitudes[node], longitudes[node], latitudes[neighbour], longitudes[neighbour])
+                metres *= rng.uniform(1.0, 1.3) * 1000
+                seconds = metres * 3.6 / speed
+                oneway = not arterial and rng.random() < 0.05
+                edges.append((node, neighbour, seconds, metres))
+                if not oneway:
+                    edges.append((neighbour, node, seconds, metres))
+    return latitudes, longitudes, edges
@@ -0,0 +1,171 @@
+import math
+import os
+import random
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+
+from .contraction import dijkstra
+from .network import ACCESS_SPEED_KMH, RoadNetwork, _load
+from .osm import read_osm
+from .synthetic import generate_road_grid
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="-1.2900" lon="36.8200"/>
+  <node id="2" lat="-1.2900" lon="36.8300"/>
+  <node id="3" lat="-1.2900" lon="36.8400"/>
+  <node id="4" lat="-1.3000" lon="36.8400"/>
+  <node id="5" lat="-1.3000" lon="36.8200"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="primary"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/><nd ref="4"/>
+    <tag k="highway" v="secondary"/><tag k="oneway" v="yes"/>
+  </way>
+  <way id="12">
+    <nd ref="4"/><nd ref="5"/><nd ref="1"/>
+    <tag k="highway" v="residential"/><tag k="maxspeed" v="10"/>
+  </way>
+  <way id="13">
+    <nd ref="1"/><nd ref="4"/>
+    <tag k="highway" v="footway"/>
+  </way>
+</osm>
+"""
+
+
+class ContractionHierarchyTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        latitudes, longitudes, edges = generate_road_grid(20, seed=3)
+        cls.network = RoadNetwork.build(latitudes, longitudes, edges, max_snap_km=10)
+        # The grid is connected, so build() keeps the node numbering.
+        cls.out = [[] for _ in latitudes]
+        for tail, head, seconds, metres in edges:
+            cls.out[tail].append((head, seconds, metres))
+
+    def test_matches_dijkstra(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            source, target = rng.randrange(len(self.network)), rng.randrange(len(self.network))
+            seconds, metres = self.network.node_route(source, target)
+            expected = dijkstra(self.out, source, target)
+            if expected is None:
+                self.assertEqual(seconds, math.inf)
+            else:
+                self.assertAlmostEqual(seconds, expected[0], delta=expected[0] * 1e-5)
+
+    def test_matrix_matches_point_queries_including_the_access_legs(self):
+        network = self.network
+        points = [(network.latitudes[node], network.longitudes[node]) for node in (0, 57, 230, 399)]
+        points.append((points[0][0] + 0.01, points[0][1]))
+        matrix = network.matrix(points[:3], points[2:])
+        for row, origin in enumerate(points[:3]):
+            for column, destination in enumerate(points[2:]):
+                self.assertEqual(matrix[row][column], network.route(origin, destination))
+
+        node, km = network.nearest(*points[4])
+        direct = network.node_route(0, node)
+        self.assertAlmostEqual(matrix[0][2][0], (direct[1] + km * 1000) / 1000)
+        self.assertAlmostEqual(matrix[0][2][1], (direct[0] + km * 3600 / ACCESS_SPEED_KMH) / 60)
+        self.assertEqual(matrix[2][0], (0.0, 0.0))
+
+    def test_path_follows_road_edges(self):
+        network = self.network
+        points = list(zip(network.latitudes.tolist(), network.longitudes.tolist()))
+        numbers = {point: node for node, point in enumerate(points)}
+        origin, destination = points[3], points[388]
+        nodes = [numbers[point] for point in network.path(origin, destination)[1:-1]]
+        self.assertEqual((nodes[0], nodes[-1]), (3, 388))
+        metres = 0
+        for tail, head in zip(nodes, nodes[1:]):
+            metres += min(edge_metres for other, _, edge_metres in self.out[tail] if other == head)
+        self.assertAlmostEqual(metres, network.node_route(3, 388)[1], delta=1)
+
+    def test_points_far_from_roads_have_no_distance(self):
+        self.assertIsNone(self.network.nearest(-3.0, 36.8))
+        self.assertIsNone(self.network.route((-3.0, 36.8), (self.network.latitudes[0], self.network.longitudes[0])))
+
+
+class OsmExtractTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'roads.osm')
+        with open(self.path, 'w') as extract:
+            extract.write(OSM_EXTRACT)
+
+    def test_junctions_oneways_and_speeds(self):
+        latitudes, longitudes, edges = read_osm(self.path)
+        # Nodes 2 and 5 only shape their roads, and the footway is not drivable.
+        self.assertEqual(len(latitudes), 3)
+        nodes = {(lat, lng): number for number, (lat, lng) in enumerate(zip(latitudes, longitudes))}
+        junction_1, junction_3, junction_4 = nodes[(-1.29, 36.82)], nodes[(-1.29, 36.84)], nodes[(-1.3, 36.84)]
+        by_pair = {(tail, head): (seconds, metres) for tail, head, seconds, metres in edges}
+        self.assertEqual(len(edges), 5)
+        self.assertIn((junction_3, junction_4), by_pair)
+        self.assertNotIn((junction_4, junction_3), by_pair)
+
+        seconds, metres = by_pair[(junction_1, junction_3)]
+        self.assertAlmostEqual(metres, 2224, delta=5)
+        self.assertAlmostEqual(seconds, metres * 3.6 / 60)
+        seconds, metres = by_pair[(junction_4, junction_1)]
+        self.assertAlmostEqual(seconds, metres * 3.6 / 10)
+
+    def test_built_graph_survives_a_round_trip(self):
+        network = RoadNetwork.build(*read_osm(self.path), max_snap_km=10)
+        path = os.path.join(os.path.dirname(self.path), 'roads.npz')
+        network.save(path)
+        loaded = RoadNetwork.load(path, max_snap_km=10)
+        origin, destination = (-1.29, 36.84), (-1.30, 36.84)
+        self.assertEqual(loaded.route(origin, destination), network.route(origin, destination))
+        # The way back has to go round the block through the slow residential street.
+        there, back = loaded.route(origin, destination), loaded.route(destination, origin)
+        self.assertGreater(back[0], there[0] * 3)
+
+
+class DistanceMatrixApiTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'roads.npz')
+        latitudes, longitudes, edges = generate_road_grid(10)
+        self.network = RoadNetwork.build(latitudes, longitudes, edges)
+        self.network.save(self.path)
+        _load.cache_clear()
+        self.addCleanup(_load.cache_clear)
+        self.client.force_login(User.objects.create(phone_number='+254700000001', user_type='business'))
+
+    def post(self, body):
+        return self.client.post(reverse('api:distance_matrix'), body, content_type='application/json')
+
+    def test_matrix(self):
+        origin = [self.network.latitudes[0], self.network.longitudes[0]]
+        destination = [self.network.latitudes[99], self.network.longitudes[99]]
+        with override_settings(ROAD_GRAPH_PATH=self.path):
+            response = self.post({'origins': [origin], 'destinations': [destination, [-3.0, 36.8]]})
+        self.assertEqual(response.status_code, 200)
+        km, minutes = self.network.route(origin, destination)
+        self.assertEqual(response.json(), {
+            'distances_km': [[round(km, 2), None]], 'durations_min': [[round(minutes, 1), None]],
+        })
+
+    @override_settings(ROUTING_MATRIX_MAX_POINTS=2)
+    def test_rejects_bad_points(self):
+        self.assertEqual(self.post({'origins': [[95, 36.8]], 'destinations': [[-1.2, 36.8]]}).status_code, 400)
+        self.assertEqual(self.post({'origins': [[-1.2, 36.8]] * 3, 'destinations': [[-1.2, 36.8]]}).status_code, 400)
+        for value in ('nan', 'inf', '-Infinity'):
+            response = self.post({'origins': [[-1.2, 36.8]], 'destinations': [[value, 36.8]]})
+            self.assertEqual(response.status_code, 400)
+
+    def test_missing_graph(self):
+        with override_settings(ROAD_GRAPH_PATH=self.path + '.missing'):
+            response = self.post({'origins': [[-1.2, 36.8]], 'destinations': [[-1.2, 36.8]]})
+        self.assertEqual(response.status_code, 503)
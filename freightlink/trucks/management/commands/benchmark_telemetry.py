@@ -0,0 +1,71 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from accounts.models import User
+from api.benchmarking import disposable_database
+from trucks.models import Truck, TruckPosition
+from trucks.telemetry import get_position_writer
+
+
+class Command(BaseCommand):
+    help = 'Post batched GPS pings through the ingestion endpoint and report sustained pings per second.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trucks', type=int, default=1000)
+        parser.add_argument('--pings', type=int, default=500000)
+        parser.add_argument('--batch', type=int, default=50, help='Pings per request, as sent by one driver app.')
+
+    def handle(self, *args, **options):
+        with disposable_database():
+            owner = User.objects.create(phone_number='+254700000001', user_type='truck_owner')
+            Truck.objects.bulk_create(
+                Truck(
+                    owner=owner, licence_plate=f'KBN{index:05d}', truck_type='lorry',
+                    capacity_volume=60, capacity_weight=20,
+                )
+                for index in range(options['trucks'])
+            )
+            truck_ids = list(Truck.objects.values_list('id', flat=True))
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(owner)
+            url = reverse('trucks:position_ingest')
+
+            rng = random.Random(0)
+            now = int(time.time())
+            bodies = []
+            for start in range(0, options['pings'], options['batch']):
+                size = min(options['batch'], options['pings'] - start)
+                bodies.append(json.dumps({'pings': [
+                    [rng.choice(truck_ids), now - rng.randrange(600), -1.3 + rng.random(), 36.8 + rng.random(), 60, 90]
+                    for _ in range(size)
+                ]}))
+
+            writer = get_position_writer()
+            latencies = []
+            started = time.perf_counter()
+            for body in bodies:
+                sent = time.perf_counter()
+                response = client.post(url, body, content_type='application/json')
+                latencies.append((time.perf_counter() - sent) * 1000)
+                if response.status_code != 202:
+                    self.stderr.write(f'Unexpected response {response.status_code}: {response.content[:200]}')
+                    return
+            accepted = time.perf_counter() - started
+            while writer.pending():
+                writer.flush()
+            stored = time.perf_counter() - started
+
+            latencies.sort()
+            self.stdout.write(f"Requests: {len(bodies)} of {options['batch']} pings")
+            self.stdout.write(f"Accepted: {options['pings'] / accepted:,.0f} pings/s")
+            self.stdout.write(f"Stored:   {TruckPosition.objects.count() / stored:,.0f} pings/s")
+            self.stdout.write(
+                f'Latency ms: median {statistics.median(latencies):.2f}, '
+                f'p99 {latencies[int(len(latencies) * 0.99)]:.2f}'
+            )
@@ -0,0 +1,113 @@
+import asyncio
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import current_rss
+from trucks.tracking import Subscriber, TrackingHub
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many idle live-tracking subscribers on one hub, publish truck fixes at a fixed rate and report '
+        'memory per connection and delivery latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=10000)
+        parser.add_argument('--trucks', type=int, default=5000, help='Trucks the subscribers are spread over.')
+        parser.add_argument('--rate', type=int, default=1000, help='Truck updates published per second.')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--slow', type=float, default=0.01,
+                            help='Fraction of subscribers whose sends take 200ms, to exercise coalescing.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        rng = random.Random(options['seed'])
+        hub = TrackingHub()
+        published = {}
+        latencies = []
+        slow_latencies = []
+
+        def sender(slow):
+            record = slow_latencies if slow else latencies
+
+            async def send(message):
+                if slow:
+                    await asyncio.sleep(0.2)
+                record.append(time.perf_counter() - published[message['text']])
+            return send
+
+        gc.collect()
+        rss_before = current_rss()
+        tracemalloc.start()
+        writers = []
+        for index in range(options['subscribers']):
+            subscriber = Subscriber(
+                sender(rng.random() < options['slow']), booking_id=index, truck_id=rng.randrange(options['trucks']),
+            )
+            hub.add(subscriber)
+            writers.append(asyncio.create_task(subscriber.run()))
+        await asyncio.sleep(0)
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gc.collect()
+        per_connection = traced / options['subscribers']
+        rss_per_connection = (current_rss() - rss_before) / options['subscribers']
+
+        # Publish in 10ms ticks, as a Redis listener would apply a stream of small ingestion batches.
+        tick = 0.01
+        per_tick = options['rate'] * tick
+        ticks = int(options['seconds'] / tick)
+        fixes = 0
+        lag = []
+        started = time.perf_counter()
+        for number in range(ticks):
+            due = started + number * tick
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag.append(time.perf_counter() - due)
+            count = int((number + 1) * per_tick) - int(number * per_tick)
+            for _ in range(count):
+                truck_id = rng.randrange(options['trucks'])
+                fix = (fixes, -1.29 + rng.random(), 36.82 + rng.random(), 80, 90)
+                now = time.perf_counter()
+                message = hub.publish_position(truck_id, fix)
+                if message is not None:
+                    published[message] = now
+                fixes += 1
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.5)
+        coalesced = sum(subscriber.coalesced for subscribers in hub.by_booking.values() for subscriber in subscribers)
+        for writer in writers:
+            writer.cancel()
+        await asyncio.gather(*writers, return_exceptions=True)
+
+        def percentile(values, fraction):
+            return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else float('nan')
+
+        latencies.sort()
+        slow_latencies.sort()
+        self.stdout.write(
+            f"{options['subscribers']} subscribers: {per_connection / 1024:.2f} KiB/connection traced, "
+            f"{rss_per_connection / 1024:.2f} KiB/connection RSS"
+        )
+        self.stdout.write(
+            f'Published {fixes} fixes in {elapsed:.1f}s ({fixes / elapsed:.0f}/s), '
+            f'{len(latencies) + len(slow_latencies)} deliveries, {coalesced} coalesced for slow clients; '
+            f'publisher lag p99={percentile(sorted(lag), 0.99):.2f}ms'
+        )
+        self.stdout.write(
+            f'Delivery latency p50={percentile(latencies, 0.5):.3f}ms p99={percentile(latencies, 0.99):.3f}ms '
+            f'max={percentile(latencies, 1.0):.3f}ms; slow clients p50={percentile(slow_latencies, 0.5):.0f}ms'
+        )
+        if latencies:
+            self.stdout.write(f'Mean delivery latency {statistics.fmean(latencies) * 1000:.3f}ms')
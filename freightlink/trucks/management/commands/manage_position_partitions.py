@@ -0,0 +1,86 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from trucks.models import TruckPosition
+
+
+def partition_name(day):
+    return f'p{day:%Y%m%d}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep one MySQL partition per day for truck positions: create upcoming days '
+        'and drop days past the retention window. Other backends delete old rows instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=7, help='Days of future partitions to keep ready.')
+        parser.add_argument('--retention', type=int, default=settings.TELEMETRY_RETENTION_DAYS)
+        parser.add_argument(
+            '--init', action='store_true',
+            help='Partition the existing table (rewrites it; run once during a quiet period).',
+        )
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        cutoff = today - datetime.timedelta(days=options['retention'])
+        if connection.vendor != 'mysql':
+            deleted, _ = TruckPosition.objects.filter(day__lt=cutoff).delete()
+            self.stdout.write(f'Deleted {deleted} positions older than {cutoff}')
+            return
+
+        table = connection.ops.quote_name(TruckPosition._meta.db_table)
+        wanted = [today + datetime.timedelta(days=offset) for offset in range(options['ahead'] + 1)]
+        if options['init']:
+            self._init(table, wanted)
+            return
+
+        existing = self._partitions()
+        if not existing:
+            self.stderr.write('Table is not partitioned yet; run with --init first.')
+            return
+        expired = [name for name, bound in existing if bound <= cutoff]
+        if expired:
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+        last_bound = existing[-1][1]
+        new_days = [day for day in wanted if day >= last_bound]
+        if new_days:
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {table} ADD PARTITION ({self._definitions(new_days)})")
+        self.stdout.write(f'Dropped {len(expired)} partitions, added {len(new_days)}')
+
+    def _definitions(self, days):
+        # Each partition holds rows strictly before the next day, so the bound is day + 1.
+        return ', '.join(
+            f"PARTITION {partition_name(day)} VALUES LESS THAN ('{day + datetime.timedelta(days=1):%Y-%m-%d}')"
+            for day in days
+        )
+
+    def _partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT partition_name, partition_description FROM information_schema.partitions '
+                'WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL '
+                'ORDER BY partition_ordinal_position',
+                [TruckPosition._meta.db_table],
+            )
+            return [
+                (name, datetime.date.fromisoformat(bound.strip("'")))
+                for name, bound in cursor.fetchall()
+            ]
+
+    def _init(self, table, days):
+        # MySQL requires the partitioning column in every unique key, including the primary key.
+        oldest = TruckPosition.objects.order_by('day').values_list('day', flat=True).first() or days[0]
+        history = [oldest + datetime.timedelta(days=offset) for offset in range((days[0] - oldest).days)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, day), '
+                f'PARTITION BY RANGE COLUMNS(day) ({self._definitions(history + days)})'
+            )
+        self.stdout.write(f'Partitioned {table} into {len(history) + len(days)} daily partitions')
@@ -11,8 +11,40 @@ class Truck(models.Model):
 	)
 
 	owner = models.ForeignKey(User, on_delete=models.CASCADE,related_name='trucks')
-	licence_plate = models.CharField
+	licence_plate = models.CharField(max_length=20, unique=True)
+	truck_type = models.CharField(max_length=20, choices=TRUCK_TYPE_CHOICES)
+	capacity_volume = models.DecimalField(max_digits=10, decimal_places=2, help_text='Capacity in cubic meters')
+	capacity_weight = models.DecimalField(max_digits=10, decimal_places=2, help_text='Capacity in tons')
+	is_verified = models.BooleanField(default=False)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
 
-# Create your models here.
+	def __str__(self):
+		return f"{self.licence_plate} - {self.truck_type}"
 
 
+class TruckPosition(models.Model):
+	"""
+	Append-only GPS fix from a driver app.
+
+	Columns are kept small and numeric (microdegrees, unix seconds) and rows
+	are partitioned by ``day`` on MySQL, so old days are dropped rather than
+	deleted. There is no database foreign key because MySQL does not allow
+	them on partitioned tables.
+	"""
+
+	truck = models.ForeignKey(Truck, on_delete=models.DO_NOTHING, db_constraint=False, related_name='positions')
+	day = models.DateField()
+	timestamp = models.PositiveIntegerField(help_text='Unix time of the fix')
+	latitude_e6 = models.IntegerField(help_text='Latitude in microdegrees')
+	longitude_e6 = models.IntegerField(help_text='Longitude in microdegrees')
+	speed = models.PositiveSmallIntegerField(default=0, help_text='Speed in km/h')
+	heading = models.PositiveSmallIntegerField(default=0, help_text='Heading in degrees')
+
+	def __str__(self):
+		return f"Truck {self.truck_id} at {self.latitude_e6 / 1e6}, {self.longitude_e6 / 1e6}"
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['truck', 'timestamp'], name='position_truck_time_idx'),
+		]
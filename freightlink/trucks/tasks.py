@@ -0,0 +1,8 @@
+from celery import shared_task
+from django.core.management import call_command
+
+
+@shared_task
+def manage_position_partitions_task():
+    """Daily partition upkeep for truck positions: add the coming days, drop expired ones."""
+    call_command('manage_position_partitions')
@@ -0,0 +1,249 @@
+"""
+GPS telemetry ingestion: validation, coalesced bulk writes, the
+last-known-position cache and live tracking pushes.
+
+Pings from many requests are buffered in process and written by a
+background thread in large ``bulk_create`` batches. A crash can lose at
+most one flush interval of pings, which is acceptable for telemetry. A
+batch the database rejects as invalid is split until the offending rows
+are found; those are quarantined rather than retried, so one bad ping
+cannot hold up the rest.
+"""
+import collections
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.db.models import Max
+
+from .models import Truck, TruckPosition
+from .tracking import publish_positions
+
+logger = logging.getLogger(__name__)
+
+LAST_POSITION_KEY = 'truck-position:{}'
+OWNED_TRUCKS_KEY = 'owned-trucks:{}'
+# Fixes further in the future than this are treated as clock errors.
+MAX_CLOCK_SKEW = 300
+# Rejected pings kept in memory for inspection; older ones are forgotten.
+QUARANTINE_SIZE = 1000
+
+
+def parse_pings(rows, allowed_trucks, now=None):
+    """
+    Validate ``[truck_id, unix_time, lat, lng, speed, heading]`` rows.
+
+    Returns ``(positions, rejected)`` where positions are unsaved
+    TruckPosition objects for trucks in ``allowed_trucks``.
+    """
+    now = now or time.time()
+    oldest = now - settings.TELEMETRY_MAX_PING_AGE
+    positions = []
+    rejected = 0
+    for row in rows:
+        try:
+            truck_id, timestamp, lat, lng, speed, heading = row
+            timestamp = int(timestamp)
+            lat, lng = float(lat), float(lng)
+            speed = min(max(int(speed or 0), 0), 32767)
+            heading = int(heading or 0) % 360
+            valid = (
+                truck_id in allowed_trucks
+                and oldest <= timestamp <= now + MAX_CLOCK_SKEW
+                and -90 <= lat <= 90 and -180 <= lng <= 180
+            )
+        except (TypeError, ValueError, OverflowError):
+            valid = False
+        if not valid:
+            rejected += 1
+            continue
+        positions.append(TruckPosition(
+            truck_id=truck_id,
+            day=datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date(),
+            timestamp=timestamp,
+            latitude_e6=round(lat * 1_000_000),
+            longitude_e6=round(lng * 1_000_000),
+            speed=speed,
+            heading=heading,
+        ))
+    return positions, rejected
+
+
+def owned_truck_ids(user_id):
+    """Truck ids owned by a user, cached briefly so ingestion skips the lookup."""
+    key = OWNED_TRUCKS_KEY.format(user_id)
+    truck_ids = cache.get(key)
+    if truck_ids is None:
+        truck_ids = frozenset(Truck.objects.filter(owner_id=user_id).values_list('id', flat=True))
+        cache.set(key, truck_ids, 60)
+    return truck_ids
+
+
+def _as_fix(position):
+    return (
+        position.timestamp, position.latitude_e6 / 1e6, position.longitude_e6 / 1e6,
+        position.speed, position.heading,
+    )
+
+
+def update_last_positions(positions):
+    """Store the newest fix per truck; returns ``{truck_id: fix}`` for the trucks that moved on."""
+    newest = {}
+    for position in positions:
+        current = newest.get(position.truck_id)
+        if current is None or position.timestamp > current.timestamp:
+            newest[position.truck_id] = position
+    if not newest:
+        return {}
+    keys = {LAST_POSITION_KEY.format(truck_id): truck_id for truck_id in newest}
+    cached = cache.get_many(keys)
+    updates = {}
+    for key, truck_id in keys.items():
+        position = newest[truck_id]
+        if key not in cached or cached[key][0] < position.timestamp:
+            updates[key] = _as_fix(position)
+    cache.set_many(updates, settings.TELEMETRY_LAST_POSITION_TTL)
+    return {keys[key]: fix for key, fix in updates.items()}
+
+
+def last_positions(truck_ids):
+    """
+    Return ``{truck_id: (unix_time, lat, lng, speed, heading)}`` from the cache,
+    falling back to the position table for trucks the cache does not know.
+    """
+    keys = {LAST_POSITION_KEY.format(truck_id): truck_id for truck_id in truck_ids}
+    found = {keys[key]: tuple(fix) for key, fix in cache.get_many(keys).items()}
+    missing = [truck_id for truck_id in truck_ids if truck_id not in found]
+    if missing:
+        latest = TruckPosition.objects.filter(truck_id__in=missing).values('truck_id').annotate(latest=Max('timestamp'))
+        lookup = {(row['truck_id'], row['latest']) for row in latest}
+        if lookup:
+            rows = TruckPosition.objects.filter(
+                truck_id__in=[truck_id for truck_id, _ in lookup],
+                timestamp__in=[timestamp for _, timestamp in lookup],
+            )
+            for position in rows:
+                if (position.truck_id, position.timestamp) in lookup:
+                    found[position.truck_id] = _as_fix(position)
+    return found
+
+
+class PositionWriter:
+    """Buffers TruckPosition objects and bulk inserts them from a background thread."""
+
+    def __init__(self, flush_size=None, flush_interval=None, max_buffer=None):
+        self.flush_size = flush_size or settings.TELEMETRY_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.TELEMETRY_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.TELEMETRY_MAX_BUFFER
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.quarantined = 0
+        self.quarantine = collections.deque(maxlen=QUARANTINE_SIZE)
+
+    def append(self, positions):
+        with self._lock:
+            self._buffer.extend(positions)
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                # The database is not keeping up; shed the oldest pings.
+                del self._buffer[:overflow]
+                self.dropped += overflow
+            full = len(self._buffer) >= self.flush_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='position-writer', daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write everything buffered so far; returns the number of rows written.
+
+        Chunks with rows the database refuses (integrity or data errors) are
+        halved and retried, and single rows that still fail are quarantined.
+        Other database errors, such as a lost connection, a deadlock or a lock
+        wait timeout, hand the unwritten remainder back to the buffer and are
+        raised, to be retried on the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            written = 0
+            chunks = [batch] if batch else []
+            try:
+                while chunks:
+                    chunk = chunks.pop()
+                    try:
+                        with transaction.atomic():
+                            TruckPosition.objects.bulk_create(chunk, batch_size=self.flush_size)
+                    except (IntegrityError, DataError):
+                        if len(chunk) == 1:
+                            self._quarantine(chunk[0])
+                        else:
+                            middle = len(chunk) // 2
+                            chunks += [chunk[middle:], chunk[:middle]]
+                        continue
+                    except Exception:
+                        chunks.append(chunk)
+                        raise
+                    written += len(chunk)
+            except Exception:
+                with self._lock:
+                    # Still the oldest pings, so they stay first in line to be shed.
+                    self._buffer[:0] = [position for pending in reversed(chunks) for position in pending]
+                raise
+            finally:
+                self.written += written
+            return written
+
+    def _quarantine(self, position):
+        logger.exception(
+            'Quarantined position of truck %s at %s rejected by the database', position.truck_id, position.timestamp,
+        )
+        self.quarantine.append(position)
+        self.quarantined += 1
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing truck positions failed; retrying on the next flush')
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_position_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = PositionWriter()
+    return _writer
+
+
+def ingest_pings(user_id, rows):
+    """Validate, buffer and cache a batch of pings; returns ``(accepted, rejected)``."""
+    positions, rejected = parse_pings(rows, owned_truck_ids(user_id))
+    if positions:
+        get_position_writer().append(positions)
+        publish_positions(update_last_positions(positions))
+    return len(positions), rejected
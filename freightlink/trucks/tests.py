@@ -1,3 +1,207 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import User
+from freightlink.testing import create_booking, create_business, create_cargo, create_owner, create_route, create_truck
+
+from .models import TruckPosition
+from .tasks import manage_position_partitions_task
+from .telemetry import PositionWriter, ingest_pings, parse_pings
+from .tracking import CLOSE_OVERLOADED, Subscriber
+from .websocket import CLOSE_REFUSED, tracking_application
+
+
+class LiveTrackingTests(TestCase):
+    def setUp(self):
+        self.business = create_business()
+        self.owner = create_owner()
+        self.truck = create_truck(self.owner)
+        self.booking = create_booking(create_cargo(self.business), create_route(self.truck))
+
+    @sync_to_async
+    def connect(self, user=None):
+        headers = []
+        if user is not None:
+            self.client.force_login(user)
+            cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+            headers.append((b'cookie', cookie.encode()))
+        scope = {'type': 'websocket', 'path': f'/ws/tracking/{self.booking.pk}/', 'headers': headers}
+        return ApplicationCommunicator(tracking_application, scope)
+
+    async def receive_json(self, communicator):
+        message = await communicator.receive_output(2)
+        self.assertEqual(message['type'], 'websocket.send')
+        return json.loads(message['text'])
+
+    def set_status(self, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.status = status
+            self.booking.save()
+
+    async def test_strangers_are_refused(self):
+        stranger = await sync_to_async(User.objects.create)(phone_number='+254700000003')
+        for communicator in (await self.connect(), await self.connect(stranger)):
+            await communicator.send_input({'type': 'websocket.connect'})
+            self.assertEqual(await communicator.receive_output(2), {'type': 'websocket.close', 'code': CLOSE_REFUSED})
+
+    async def test_shipper_receives_positions_and_status(self):
+        communicator = await self.connect(self.business)
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await communicator.receive_output(2), {'type': 'websocket.accept'})
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'status', 'booking': self.booking.pk, 'status': 'pending',
+        })
+
+        now = int(time.time())
+        await sync_to_async(ingest_pings)(self.owner.pk, [[self.truck.pk, now, -1.5, 37.0, 80, 90]])
+        position = await self.receive_json(communicator)
+        self.assertEqual((position['truck'], position['latitude'], position['speed']), (self.truck.pk, -1.5, 80))
+
+        await sync_to_async(self.set_status)('in_progress')
+        self.assertEqual((await self.receive_json(communicator))['status'], 'in_progress')
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(2)
+
+
+class SubscriberBackpressureTests(SimpleTestCase):
+    async def test_slow_client_gets_newest_position_then_is_closed(self):
+        sent = []
+        unblock = asyncio.Event()
+
+        async def send(message):
+            await unblock.wait()
+            sent.append(message)
+
+        subscriber = Subscriber(send, booking_id=1, truck_id=1, max_backlog=3)
+        writer = asyncio.create_task(subscriber.run())
+        subscriber.push_event('first')
+        await asyncio.sleep(0)
+        for index in range(100):
+            subscriber.push_position(f'fix {index}')
+        unblock.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual([message['text'] for message in sent], ['first', 'fix 99'])
+        self.assertEqual(subscriber.coalesced, 99)
+
+        unblock.clear()
+        for index in range(5):
+            subscriber.push_event(f'event {index}')
+        self.assertTrue(subscriber.overloaded)
+        unblock.set()
+        await asyncio.wait_for(writer, 1)
+        self.assertEqual(sent[-1], {'type': 'websocket.close', 'code': CLOSE_OVERLOADED})
+
+
+class PositionWriterTests(TestCase):
+    def setUp(self):
+        self.truck = create_truck(create_owner())
+        # The buffer never fills a flush and the interval is long, so the background thread stays asleep.
+        self.writer = PositionWriter(flush_size=100, flush_interval=3600, max_buffer=10)
+
+    def positions(self, count, start=0):
+        return [
+            TruckPosition(
+                truck=self.truck, day=datetime.date(2025, 1, 1), timestamp=1735718400 + index,
+                latitude_e6=-1290000, longitude_e6=36820000,
+            )
+            for index in range(start, start + count)
+        ]
+
+    def test_pings_are_buffered_until_flushed(self):
+        self.writer.append(self.positions(3))
+        self.assertEqual(self.writer.pending(), 3)
+        self.assertFalse(TruckPosition.objects.exists())
+
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(self.writer.pending(), 0)
+        self.assertEqual(TruckPosition.objects.count(), 3)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_overflow_sheds_the_oldest_pings(self):
+        self.writer.append(self.positions(8))
+        self.writer.append(self.positions(5, start=8))
+        self.assertEqual(self.writer.dropped, 3)
+        self.writer.flush()
+        self.assertEqual(
+            list(TruckPosition.objects.order_by('timestamp').values_list('timestamp', flat=True)),
+            [1735718400 + index for index in range(3, 13)],
+        )
+
+    def test_rejected_rows_are_quarantined_and_the_rest_written(self):
+        batch = self.positions(7)
+        batch[2].latitude_e6 = None
+        batch[5].longitude_e6 = None
+        self.writer.append(batch)
+        with self.assertLogs('trucks.telemetry', 'ERROR'):
+            self.assertEqual(self.writer.flush(), 5)
+
+        self.assertEqual(TruckPosition.objects.count(), 5)
+        self.assertEqual(self.writer.quarantined, 2)
+        self.assertEqual(list(self.writer.quarantine), [batch[2], batch[5]])
+        self.assertEqual(self.writer.pending(), 0)
+
+    def test_batch_is_kept_on_transient_errors(self):
+        batch = self.positions(6)
+        self.writer.append(batch)
+        with mock.patch.object(TruckPosition.objects, 'bulk_create', side_effect=OperationalError('Deadlock found')):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        self.assertEqual(self.writer.pending(), 6)
+        self.assertEqual(self.writer.quarantined, 0)
+
+        self.assertEqual(self.writer.flush(), 6)
+        self.assertEqual(TruckPosition.objects.count(), 6)
+
+    def test_transient_error_while_splitting_keeps_the_unwritten_rest(self):
+        batch = self.positions(6)
+        batch[4].latitude_e6 = None
+        self.writer.append(batch)
+        bulk_create = TruckPosition.objects.bulk_create
+        outcomes = iter([None, 'write', OperationalError('Lock wait timeout exceeded')])
+
+        def flaky(objs, **kwargs):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(TruckPosition.objects, 'bulk_create', side_effect=flaky):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        self.assertEqual(self.writer.written, 3)
+        self.assertEqual(self.writer.quarantined, 0)
+        with self.writer._lock:
+            self.assertEqual(self.writer._buffer, batch[3:])
+
+    def test_unreadable_pings_are_rejected(self):
+        now = int(time.time())
+        rows = [
+            [self.truck.pk, now, -1.29, 36.82, 'n/a', 90],
+            [self.truck.pk, now, -1.29, 36.82, 40, 'N'],
+            [self.truck.pk, 1e999, -1.29, 36.82, 40, 90],
+            [self.truck.pk, now, -1.29, 36.82, 40, float('inf')],
+            [self.truck.pk, now, -1.29, 36.82, 40, 90],
+        ]
+        positions, rejected = parse_pings(rows, {self.truck.pk}, now=now)
+        self.assertEqual((len(positions), rejected), (1, 4))
+
+    def test_scheduled_maintenance_removes_expired_days(self):
+        self.assertIn('trucks.tasks.manage_position_partitions_task',
+                      [entry['task'] for entry in settings.CELERY_BEAT_SCHEDULE.values()])
+        positions = self.positions(2)
+        positions[0].day = datetime.date.today() - datetime.timedelta(days=settings.TELEMETRY_RETENTION_DAYS + 1)
+        positions[1].day = datetime.date.today()
+        TruckPosition.objects.bulk_create(positions)
+        with mock.patch('sys.stdout'):
+            manage_position_partitions_task()
+        self.assertEqual(list(TruckPosition.objects.values_list('day', flat=True)), [datetime.date.today()])
@@ -0,0 +1,205 @@
+"""
+Live shipment tracking pushed over WebSockets.
+
+Shippers connect to ``/ws/tracking/<booking_id>/`` and receive the truck's
+position fixes and the booking's status changes as JSON text frames.
+
+One TrackingHub per ASGI process maps trucks and bookings to the open
+connections following them. Each update is encoded once and the same
+string is handed to every subscriber; no message costs a database query,
+since a connection resolves its booking's truck once when it subscribes.
+
+Every connection is drained by its own writer task, which gives each one
+backpressure without slowing the others. Position fixes are coalesced, so
+a subscriber that falls behind only receives the newest fix. Status
+events are queued, and a connection whose queue passes
+TRACKING_MAX_BACKLOG is closed (1013, try again later) so one stalled
+client cannot grow the process without bound.
+
+Web and worker processes publish through Redis pub/sub when
+TRACKING_REDIS_URL is set. Without it, only updates published inside the
+ASGI process itself are delivered, which suits development and tests.
+"""
+import asyncio
+import collections
+import logging
+import threading
+
+import orjson
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FIX_FIELDS = ('timestamp', 'latitude', 'longitude', 'speed', 'heading')
+# WebSocket close code for clients that fell too far behind ("try again later").
+CLOSE_OVERLOADED = 1013
+
+
+def position_message(truck_id, fix):
+    return orjson.dumps({'type': 'position', 'truck': truck_id, **dict(zip(FIX_FIELDS, fix))}).decode()
+
+
+def status_message(booking_id, status):
+    return orjson.dumps({'type': 'status', 'booking': booking_id, 'status': status}).decode()
+
+
+class Subscriber:
+    """One WebSocket connection following a booking and its truck."""
+
+    __slots__ = ('send', 'booking_id', 'truck_id', 'max_backlog', 'position', 'events', 'wakeup', 'overloaded',
+                 'coalesced')
+
+    def __init__(self, send, booking_id, truck_id, max_backlog=None):
+        self.send = send
+        self.booking_id = booking_id
+        self.truck_id = truck_id
+        self.max_backlog = max_backlog or settings.TRACKING_MAX_BACKLOG
+        self.position = None
+        self.events = collections.deque()
+        self.wakeup = asyncio.Event()
+        self.overloaded = False
+        self.coalesced = 0
+
+    def push_position(self, message):
+        if self.position is not None:
+            self.coalesced += 1
+        self.position = message
+        self.wakeup.set()
+
+    def push_event(self, message):
+        if len(self.events) >= self.max_backlog:
+            self.overloaded = True
+        else:
+            self.events.append(message)
+        self.wakeup.set()
+
+    async def run(self):
+        """Write pending messages until cancelled, closed for falling behind or the client goes away."""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                if self.overloaded:
+                    await self.send({'type': 'websocket.close', 'code': CLOSE_OVERLOADED})
+                    return
+                while self.events:
+                    await self.send({'type': 'websocket.send', 'text': self.events.popleft()})
+                if self.position is not None:
+                    message, self.position = self.position, None
+                    await self.send({'type': 'websocket.send', 'text': message})
+        except OSError:
+            # The server raises once the socket is gone; the disconnect event cleans up.
+            return
+
+
+class TrackingHub:
+    """Fans updates out to the subscribers of one process; call it from the event loop only."""
+
+    def __init__(self):
+        self.by_truck = collections.defaultdict(set)
+        self.by_booking = collections.defaultdict(set)
+        self.loop = None
+        self.listener = None
+
+    def __len__(self):
+        return sum(len(subscribers) for subscribers in self.by_booking.values())
+
+    def add(self, subscriber):
+        self.by_truck[subscriber.truck_id].add(subscriber)
+        self.by_booking[subscriber.booking_id].add(subscriber)
+
+    def remove(self, subscriber):
+        for index, key in ((self.by_truck, subscriber.truck_id), (self.by_booking, subscriber.booking_id)):
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del index[key]
+
+    def publish_position(self, truck_id, fix):
+        """Queue a fix for the truck's subscribers; returns the encoded message, or None if nobody follows it."""
+        subscribers = self.by_truck.get(truck_id)
+        if not subscribers:
+            return None
+        message = position_message(truck_id, fix)
+        for subscriber in subscribers:
+            subscriber.push_position(message)
+        return message
+
+    def publish_status(self, booking_id, status):
+        subscribers = self.by_booking.get(booking_id)
+        if not subscribers:
+            return None
+        message = status_message(booking_id, status)
+        for subscriber in subscribers:
+            subscriber.push_event(message)
+        return message
+
+    def dispatch(self, data):
+        """Apply one payload built by ``publish_positions`` or ``publish_booking_status``."""
+        payload = orjson.loads(data)
+        if payload['kind'] == 'positions':
+            for truck_id, *fix in payload['fixes']:
+                self.publish_position(truck_id, fix)
+        elif payload['kind'] == 'status':
+            self.publish_status(payload['booking'], payload['status'])
+
+    def start(self):
+        """Bind the hub to the running loop and start listening to Redis if it is configured."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            if settings.TRACKING_REDIS_URL:
+                self.listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        import redis.asyncio as redis
+
+        while True:
+            try:
+                client = redis.Redis.from_url(settings.TRACKING_REDIS_URL)
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.TRACKING_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.dispatch(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Tracking listener lost Redis; reconnecting')
+                await asyncio.sleep(1)
+
+
+_hub = TrackingHub()
+_publisher = threading.local()
+
+
+def get_tracking_hub():
+    return _hub
+
+
+def _publish(payload):
+    data = orjson.dumps(payload)
+    if settings.TRACKING_REDIS_URL:
+        client = getattr(_publisher, 'client', None)
+        if client is None:
+            import redis
+
+            client = _publisher.client = redis.Redis.from_url(settings.TRACKING_REDIS_URL)
+        try:
+            client.publish(settings.TRACKING_CHANNEL, data)
+        except Exception:
+            # Live tracking is best effort; the next fix supersedes a lost one.
+            logger.exception('Publishing a tracking update failed')
+    elif _hub.loop is not None and not _hub.loop.is_closed():
+        _hub.loop.call_soon_threadsafe(_hub.dispatch, data)
+
+
+def publish_positions(fixes):
+    """Push ``{truck_id: (unix_time, lat, lng, speed, heading)}`` to live tracking subscribers."""
+    if fixes:
+        _publish({'kind': 'positions', 'fixes': [[truck_id, *fix] for truck_id, fix in fixes.items()]})
+
+
+def publish_booking_status(booking_id, status):
+    _publish({'kind': 'status', 'booking': booking_id, 'status': status})
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'trucks'
+
+urlpatterns = [
+    path('positions/', views.PositionIngestView.as_view(), name='position_ingest'),
+    path('positions/latest/', views.LastPositionView.as_view(), name='last_positions'),
+]
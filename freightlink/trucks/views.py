@@ -1,3 +1,36 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .telemetry import ingest_pings, last_positions, owned_truck_ids
+
+
+class PositionIngestView(APIView):
+    """
+    Accepts batched GPS pings from driver apps.
+
+    Body: ``{"pings": [[truck_id, unix_time, lat, lng, speed_kmh, heading], ...]}``.
+    Pings are buffered and written asynchronously, hence 202.
+    """
+
+    def post(self, request):
+        rows = request.data.get('pings') if isinstance(request.data, dict) else None
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a "pings" list.'}, status=status.HTTP_400_BAD_REQUEST)
+        accepted, rejected = ingest_pings(request.user.id, rows)
+        return Response({'accepted': accepted, 'rejected': rejected}, status=status.HTTP_202_ACCEPTED)
+
+
+class LastPositionView(APIView):
+    """Last known position of the requesting owner's trucks, served from the cache."""
+
+    def get(self, request):
+        truck_ids = owned_truck_ids(request.user.id)
+        requested = request.query_params.get('trucks')
+        if requested:
+            truck_ids = truck_ids & {int(value) for value in requested.split(',') if value.isdigit()}
+        positions = last_positions(sorted(truck_ids))
+        return Response({
+            str(truck_id): dict(zip(('timestamp', 'latitude', 'longitude', 'speed', 'heading'), fix))
+            for truck_id, fix in positions.items()
+        })
@@ -0,0 +1,78 @@
+"""ASGI WebSocket endpoint for live tracking: ``/ws/tracking/<booking_id>/``."""
+import asyncio
+import re
+import types
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db.models import Q
+
+from bookings.models import Booking
+
+from .telemetry import last_positions
+from .tracking import Subscriber, get_tracking_hub, position_message, status_message
+
+PATH_PATTERN = re.compile(r'^/ws/tracking/(?P<booking_id>\d+)/$')
+# Close code sent instead of accepting when the user may not follow the booking.
+CLOSE_REFUSED = 4403
+
+
+def session_user_id(scope):
+    """Id of the user logged in through the scope's session cookie, or None."""
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    user = get_user(types.SimpleNamespace(session=session))
+    return user.pk if user.is_authenticated else None
+
+
+@sync_to_async
+def subscription(scope, booking_id):
+    """``(truck_id, status, last fix or None)`` for a booking the user is a party to, or None."""
+    user_id = session_user_id(scope)
+    if user_id is None:
+        return None
+    row = Booking.objects.filter(
+        Q(business_id=user_id) | Q(truck_owner_id=user_id), pk=booking_id,
+    ).values_list('route__truck_id', 'status').first()
+    if row is None:
+        return None
+    truck_id, status = row
+    return truck_id, status, last_positions([truck_id]).get(truck_id)
+
+
+async def tracking_application(scope, receive, send):
+    """Accept a subscriber, send the current status and position, then push updates until it disconnects."""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    match = PATH_PATTERN.match(scope['path'])
+    booking_id = int(match['booking_id']) if match else None
+    found = await subscription(scope, booking_id) if match else None
+    if found is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_REFUSED})
+        return
+    truck_id, status, fix = found
+    await send({'type': 'websocket.accept'})
+
+    hub = get_tracking_hub()
+    hub.start()
+    subscriber = Subscriber(send, booking_id, truck_id)
+    subscriber.push_event(status_message(booking_id, status))
+    if fix is not None:
+        subscriber.push_position(position_message(truck_id, fix))
+    hub.add(subscriber)
+    writer = asyncio.create_task(subscriber.run())
+    try:
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+    finally:
+        hub.remove(subscriber)
+        writer.cancel()